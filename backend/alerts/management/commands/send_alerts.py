@@ -0,0 +1,138 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from alerts.utils.dispatcher import AlertDispatcher, due_alerts
+
+
+class Command(BaseCommand):
+    help = '''
+    Envoie par email les alertes en attente. Les alertes sont réservées par lots
+    (SELECT ... FOR UPDATE SKIP LOCKED, plusieurs workers peuvent tourner en parallèle)
+    et chaque lot est envoyé sur une seule connexion SMTP. Un envoi en échec est retenté
+    avec un délai doublé à chaque tentative, puis l'alerte passe en échec.
+
+    Les alertes d'un même destinataire, site et type créées dans la même fenêtre sont
+    regroupées en un email récapitulatif (ALERT_DIGEST_WINDOW, ALERT_DIGEST_MIN_SIZE).
+
+    Exemples d'utilisation :
+
+    # Envoyer les alertes en attente puis s'arrêter
+    python manage.py send_alerts
+
+    # Tourner en continu (worker)
+    python manage.py send_alerts --loop
+
+    # Lots de 200 alertes, 8 tentatives au plus
+    python manage.py send_alerts --loop --batch-size 200 --max-attempts 8
+
+    # Regrouper par fenêtres de 10 minutes, récapitulatif à partir de 5 alertes
+    python manage.py send_alerts --loop --digest-window 600 --digest-min-size 5
+
+    # Envoyer immédiatement, sans regroupement
+    python manage.py send_alerts --digest-window 0
+
+    # Exécuter en mode simulation sans envoyer d'email
+    python manage.py send_alerts --dry-run
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.verbose = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Tourner en continu au lieu de s\'arrêter quand aucune alerte n\'est à envoyer'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Attente en secondes entre deux passages quand aucune alerte n\'est à envoyer (par défaut: 5)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Nombre d\'alertes envoyées par connexion SMTP (par défaut: 100)'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='Nombre de tentatives avant de passer une alerte en échec (par défaut: 5)'
+        )
+        parser.add_argument(
+            '--backoff',
+            type=int,
+            default=60,
+            help='Délai en secondes avant la première nouvelle tentative, doublé à chaque échec (par défaut: 60)'
+        )
+        parser.add_argument(
+            '--lease',
+            type=int,
+            default=300,
+            help='Durée en secondes de la réservation d\'un lot par un worker (par défaut: 300)'
+        )
+        parser.add_argument(
+            '--digest-window',
+            type=int,
+            help='Fenêtre de regroupement des alertes en secondes, 0 pour désactiver (par défaut: ALERT_DIGEST_WINDOW)'
+        )
+        parser.add_argument(
+            '--digest-min-size',
+            type=int,
+            help='Nombre minimal d\'alertes pour envoyer un récapitulatif (par défaut: ALERT_DIGEST_MIN_SIZE)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Exécuter en mode simulation sans envoyer d\'email'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Afficher des informations détaillées pendant l\'exécution'
+        )
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose']
+
+        dispatcher = AlertDispatcher(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts'],
+            backoff=options['backoff'],
+            lease=options['lease'],
+            digest_window=options['digest_window'],
+            digest_min_size=options['digest_min_size']
+        )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Mode simulation activé - aucun email ne sera envoyé"))
+            self.stdout.write(f"{due_alerts(digest_window=dispatcher.digest_window).count()} alerte(s) à envoyer")
+            return
+
+        total_sent = total_failed = 0
+        try:
+            while True:
+                claimed, sent, failed = dispatcher.dispatch()
+                total_sent += sent
+                total_failed += failed
+                if claimed:
+                    if self.verbose:
+                        self.stdout.write(f"Lot de {claimed} alerte(s): {sent} envoyée(s), {failed} échec(s)")
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interruption demandée, arrêt du worker"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Envoi terminé: {total_sent} alerte(s) envoyée(s), {total_failed} échec(s)"
+        ))
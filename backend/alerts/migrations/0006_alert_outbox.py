@@ -0,0 +1,41 @@
+# Generated by Django 4.2.10 on 2026-10-17 19:13
+
+from django.db import migrations, models
+
+
+def retire_unsent_alerts(apps, schema_editor):
+    """Sort de la file d'envoi les alertes en attente créées avant le worker
+
+    Ces alertes n'ont jamais été envoyées et peuvent dater de plusieurs mois : sans
+    cette étape, le premier passage de send_alerts les enverrait toutes.
+    """
+    Alert = apps.get_model('alerts', 'Alert')
+    Alert.objects.filter(status='PENDING').update(
+        status='RESOLVED',
+        error_message="Non envoyée : alerte créée avant la mise en place de l'envoi par send_alerts."
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0005_alter_alert_alert_type'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name="tentatives d'envoi"),
+        ),
+        migrations.AddField(
+            model_name='alert',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, help_text="Vide : envoi dès que possible. Sert aussi de bail pendant l'envoi par un worker.", null=True, verbose_name='prochaine tentative le'),
+        ),
+        migrations.AddIndex(
+            model_name='alert',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='alert_outbox_idx'),
+        ),
+        migrations.RunPython(retire_unsent_alerts, migrations.RunPython.noop),
+    ]
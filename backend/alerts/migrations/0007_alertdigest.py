@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-17 19:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0018_schedule_activation_dates'),
+        ('alerts', '0006_alert_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254, verbose_name='destinataire')),
+                ('alert_type', models.CharField(choices=[('LATE', 'Retard'), ('EARLY_DEPARTURE', 'Départ anticipé'), ('MISSING_ARRIVAL', 'Arrivée manquante'), ('MISSING_DEPARTURE', 'Départ manquant'), ('INSUFFICIENT_HOURS', 'Heures insuffisantes'), ('CONSECUTIVE_SAME_TYPE', 'Pointages consécutifs du même type'), ('UNLINKED_SCHEDULE', 'Planning non lié'), ('ANOMALY_REPORTED', 'Anomalie signalée'), ('OTHER', 'Autre')], max_length=30, verbose_name="type d'alerte")),
+                ('window_start', models.DateTimeField(blank=True, null=True, verbose_name='début de la fenêtre')),
+                ('alert_count', models.PositiveIntegerField(verbose_name="nombre d'alertes")),
+                ('sent_at', models.DateTimeField(verbose_name='envoyé le')),
+                ('alerts', models.ManyToManyField(related_name='digests', to='alerts.alert', verbose_name='alertes')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_digests', to='sites.site', verbose_name='site')),
+            ],
+            options={
+                'verbose_name': "récapitulatif d'alertes",
+                'verbose_name_plural': "récapitulatifs d'alertes",
+                'ordering': ['-sent_at'],
+            },
+        ),
+    ]
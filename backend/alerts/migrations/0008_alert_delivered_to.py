@@ -0,0 +1,18 @@
+# Generated by Django 4.2.10 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('alerts', '0007_alertdigest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alert',
+            name='delivered_to',
+            field=models.TextField(blank=True, help_text="Destinataires déjà servis, séparés par des virgules : une nouvelle tentative ne leur renvoie pas l'alerte.", verbose_name='envoyé à'),
+        ),
+    ]
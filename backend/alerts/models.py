@@ -59,6 +59,18 @@ class Alert(models.Model):
     )
     sent_at = models.DateTimeField(_('envoyé le'), null=True, blank=True)
     error_message = models.TextField(_('message d\'erreur'), blank=True)
+    attempts = models.PositiveSmallIntegerField(_('tentatives d\'envoi'), default=0)
+    delivered_to = models.TextField(
+        _('envoyé à'),
+        blank=True,
+        help_text=_('Destinataires déjà servis, séparés par des virgules : une nouvelle tentative ne leur renvoie pas l\'alerte.')
+    )
+    next_attempt_at = models.DateTimeField(
+        _('prochaine tentative le'),
+        null=True,
+        blank=True,
+        help_text=_('Vide : envoi dès que possible. Sert aussi de bail pendant l\'envoi par un worker.')
+    )
 
     created_at = models.DateTimeField(_('créé le'), auto_now_add=True)
     updated_at = models.DateTimeField(_('mis à jour le'), auto_now=True)
@@ -67,6 +79,9 @@ class Alert(models.Model):
         verbose_name = _('alerte')
         verbose_name_plural = _('alertes')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='alert_outbox_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_alert_type_display()} - {self.employee.get_full_name()} - {self.site.name}"
@@ -79,7 +94,18 @@ class Alert(models.Model):
             emails.extend([email.strip() for email in self.recipients.split(',')])
         # Ajouter les emails du site (qui incluent déjà le manager)
         emails.extend(self.site.alert_email_list)
-        return list(set(emails))  # Dédupliquer les emails
+        return list(set(email for email in emails if email))  # Dédupliquer les emails
+
+    @property
+    def delivered_list(self):
+        """Destinataires ayant déjà reçu l'alerte (individuellement ou dans un récapitulatif)"""
+        return [email for email in self.delivered_to.split(',') if email]
+
+    @property
+    def pending_recipients(self):
+        """Destinataires restant à servir"""
+        delivered = set(self.delivered_list)
+        return [email for email in self.recipient_list if email not in delivered]
 
     def save(self, *args, **kwargs):
         """Surcharge de la méthode save pour s'assurer que le manager est inclus dans les destinataires"""
@@ -87,3 +113,38 @@ class Alert(models.Model):
             self.recipients = self.site.alert_emails
         super().save(*args, **kwargs)
 
+
+class AlertDigest(models.Model):
+    """Email récapitulatif envoyé à un destinataire pour les alertes d'un site et d'un type
+
+    Seuls le destinataire, la fenêtre et les liens vers les alertes regroupées sont
+    conservés : le contenu est reconstruit à partir des alertes et de leurs anomalies.
+    """
+    recipient = models.EmailField(_('destinataire'))
+    site = models.ForeignKey(
+        'sites.Site',
+        on_delete=models.CASCADE,
+        related_name='alert_digests',
+        verbose_name=_('site')
+    )
+    alert_type = models.CharField(
+        _('type d\'alerte'),
+        max_length=30,
+        choices=Alert.AlertType.choices
+    )
+    window_start = models.DateTimeField(_('début de la fenêtre'), null=True, blank=True)
+    alert_count = models.PositiveIntegerField(_('nombre d\'alertes'))
+    alerts = models.ManyToManyField(
+        Alert,
+        related_name='digests',
+        verbose_name=_('alertes')
+    )
+    sent_at = models.DateTimeField(_('envoyé le'))
+
+    class Meta:
+        verbose_name = _('récapitulatif d\'alertes')
+        verbose_name_plural = _('récapitulatifs d\'alertes')
+        ordering = ['-sent_at']
+
+    def __str__(self):
+        return f"{self.get_alert_type_display()} - {self.site.name} - {self.recipient} ({self.alert_count})"
@@ -0,0 +1,125 @@
+"""
+Tests pour le regroupement des alertes en emails récapitulatifs
+"""
+from datetime import date, timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from alerts.models import Alert, AlertDigest
+from alerts.tests.test_send_alerts import create_site
+from timesheets.models import Anomaly
+
+User = get_user_model()
+
+
+class RejectingBackend(EmailBackend):
+    """Backend mémoire refusant les envois adressés à rh@example.com"""
+
+    def send_messages(self, messages):
+        if any('rh@example.com' in message.to for message in messages):
+            raise SMTPException("Boîte aux lettres indisponible")
+        return super().send_messages(messages)
+
+
+class AlertDigestTestCase(TestCase):
+    """Tests pour les récapitulatifs envoyés par send_alerts"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.site = create_site()
+        self.site.alert_emails = "manager@example.com, rh@example.com"
+        self.site.save()
+        self.employees = [
+            User.objects.create_user(
+                username=f"employee{index}",
+                email=f"employee{index}@example.com",
+                password="password",
+                first_name="Employé",
+                last_name=str(index),
+                role="EMPLOYEE"
+            )
+            for index in range(4)
+        ]
+
+    def _create_anomalies(self, anomaly_type, employees, minutes=0):
+        """Crée des anomalies (leurs alertes sont créées par signal)"""
+        for employee in employees:
+            Anomaly.objects.create(
+                employee=employee,
+                site=self.site,
+                date=date(2025, 3, 3),
+                anomaly_type=anomaly_type,
+                minutes=minutes
+            )
+
+    def _close_window(self):
+        """Place les alertes existantes dans une fenêtre de regroupement terminée"""
+        Alert.objects.update(created_at=timezone.now() - timedelta(minutes=20))
+
+    def test_burst_is_sent_as_one_digest_per_recipient(self):
+        """Test qu'une rafale d'alertes produit un récapitulatif par destinataire"""
+        self._create_anomalies(Anomaly.AnomalyType.LATE, self.employees, minutes=25)
+        self._create_anomalies(Anomaly.AnomalyType.MISSING_DEPARTURE, self.employees[:1])
+        self._close_window()
+
+        call_command('send_alerts', digest_window=300, digest_min_size=3, stdout=StringIO())
+
+        # Deux récapitulatifs (un par destinataire du site) et un email individuel
+        self.assertEqual(len(mail.outbox), 3)
+        digests = [message for message in mail.outbox if len(message.to) == 1]
+        self.assertEqual(sorted(message.to[0] for message in digests), ['manager@example.com', 'rh@example.com'])
+        self.assertIn("(4)", digests[0].subject)
+        self.assertIn("Employé 3", digests[0].body)
+        self.assertIn("25", digests[0].body)
+
+        self.assertFalse(Alert.objects.exclude(status=Alert.AlertStatus.SENT).exists())
+        late_alerts = set(Alert.objects.filter(alert_type=Alert.AlertType.LATE).values_list('id', flat=True))
+        for digest in AlertDigest.objects.all():
+            self.assertEqual(digest.alert_count, 4)
+            self.assertEqual(set(digest.alerts.values_list('id', flat=True)), late_alerts)
+        self.assertEqual(AlertDigest.objects.count(), 2)
+
+    def test_small_groups_are_sent_individually(self):
+        """Test qu'un groupe sous le seuil est envoyé alerte par alerte"""
+        self._create_anomalies(Anomaly.AnomalyType.LATE, self.employees[:2], minutes=10)
+        self._close_window()
+
+        call_command('send_alerts', digest_window=300, digest_min_size=3, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(AlertDigest.objects.exists())
+
+    def test_alerts_wait_for_their_window_to_close(self):
+        """Test que les alertes de la fenêtre en cours ne sont pas encore envoyées"""
+        self._create_anomalies(Anomaly.AnomalyType.LATE, self.employees, minutes=25)
+
+        call_command('send_alerts', digest_window=3600, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(Alert.objects.exclude(status=Alert.AlertStatus.PENDING).exists())
+
+    def test_retry_is_sent_only_to_failed_recipients(self):
+        """Test qu'une nouvelle tentative n'est envoyée qu'aux destinataires en échec"""
+        self._create_anomalies(Anomaly.AnomalyType.LATE, self.employees, minutes=25)
+        self._close_window()
+
+        with override_settings(EMAIL_BACKEND='alerts.tests.test_alert_digests.RejectingBackend'):
+            call_command('send_alerts', digest_window=300, digest_min_size=3, stdout=StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [['manager@example.com']])
+        for alert in Alert.objects.all():
+            self.assertEqual(alert.status, Alert.AlertStatus.PENDING)
+            self.assertEqual(alert.delivered_to, 'manager@example.com')
+            self.assertEqual(alert.pending_recipients, ['rh@example.com'])
+
+        Alert.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        call_command('send_alerts', digest_window=300, digest_min_size=3, stdout=StringIO())
+
+        self.assertEqual([message.to for message in mail.outbox], [['manager@example.com'], ['rh@example.com']])
+        self.assertFalse(Alert.objects.exclude(status=Alert.AlertStatus.SENT).exists())
+        self.assertEqual(set(Alert.objects.values_list('delivered_to', flat=True)), {'manager@example.com,rh@example.com'})
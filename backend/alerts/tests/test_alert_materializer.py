@@ -0,0 +1,93 @@
+"""
+Tests pour la création des alertes par lot d'anomalies
+"""
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models.signals import post_save
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from alerts.models import Alert
+from alerts.tests.test_send_alerts import create_site
+from timesheets.models import Anomaly
+from timesheets.utils import anomaly_dedup
+
+User = get_user_model()
+
+
+class AlertMaterializerTestCase(TestCase):
+    """Tests pour materialize_alerts et son utilisation par les écritures groupées"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.site = create_site()
+        self.employees = [
+            User.objects.create_user(
+                username=f"employee{index}",
+                email=f"employee{index}@example.com",
+                password="password",
+                first_name="Employé",
+                last_name=str(index),
+                role="EMPLOYEE"
+            )
+            for index in range(8)
+        ]
+
+    def _anomalies(self, employees, day):
+        return [
+            Anomaly(
+                employee_id=employee.id,
+                site_id=self.site.id,
+                date=day,
+                anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
+                dedup_subtype=anomaly_dedup.DAILY,
+                description="Pointage manquant selon le planning"
+            )
+            for employee in employees
+        ]
+
+    def test_single_anomaly_creates_alert(self):
+        """Test que l'enregistrement d'une anomalie crée son alerte via le signal"""
+        anomaly = Anomaly.objects.create(
+            employee=self.employees[0],
+            site=self.site,
+            date=date(2025, 3, 3),
+            anomaly_type=Anomaly.AnomalyType.LATE,
+            minutes=25,
+            description="Arrivée à 08:25"
+        )
+
+        alert = Alert.objects.get(anomaly=anomaly)
+        self.assertEqual(alert.alert_type, Alert.AlertType.LATE)
+        self.assertEqual(alert.status, Alert.AlertStatus.PENDING)
+        self.assertEqual(alert.recipients, self.site.alert_emails)
+        self.assertEqual(alert.message, (
+            "Anomalie détectée : Retard\n"
+            "Employé : Employé 0\n"
+            f"Site : {self.site.name}\n"
+            "Date : 2025-03-03\n"
+            "Minutes de retard : 25\n"
+            "Description : Arrivée à 08:25"
+        ))
+
+    def test_bulk_insert_creates_alerts_with_constant_queries(self):
+        """Test que le coût de création des alertes ne dépend pas de la taille du lot"""
+        with CaptureQueriesContext(connection) as small:
+            anomaly_dedup.bulk_upsert(self._anomalies(self.employees[:2], date(2025, 3, 3)))
+        with CaptureQueriesContext(connection) as large:
+            anomaly_dedup.bulk_upsert(self._anomalies(self.employees, date(2025, 3, 4)))
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(Alert.objects.filter(anomaly__date=date(2025, 3, 4)).count(), 8)
+        self.assertEqual(Alert.objects.count(), 10)
+
+    def test_post_save_after_bulk_insert_does_not_duplicate(self):
+        """Test que le signal émis après une insertion groupée ne recrée pas les alertes"""
+        inserted = anomaly_dedup.bulk_upsert(self._anomalies(self.employees[:3], date(2025, 3, 3)))
+        for anomaly in inserted:
+            post_save.send(sender=Anomaly, instance=anomaly, created=True, update_fields=None,
+                           raw=False, using=anomaly._state.db)
+
+        self.assertEqual(Alert.objects.count(), 3)
+        self.assertEqual(set(Alert.objects.values_list('anomaly_id', flat=True)), {a.pk for a in inserted})
@@ -0,0 +1,159 @@
+"""
+Tests pour l'envoi des alertes par le worker send_alerts
+"""
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from alerts.models import Alert
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class CountingBackend(EmailBackend):
+    """Backend mémoire comptant les connexions ouvertes"""
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+
+class FailingBackend(EmailBackend):
+    """Backend refusant tous les envois"""
+
+    def send_messages(self, messages):
+        raise SMTPException("Serveur indisponible")
+
+
+def create_site():
+    organization = Organization.objects.create(
+        name="Test Organization",
+        address="123 Test Street",
+        postal_code="12345",
+        city="Test City",
+        country="France",
+        siret="12345678901234"
+    )
+    return Site.objects.create(
+        name="Test Site",
+        address="123 Test Street",
+        postal_code="12345",
+        city="Test City",
+        country="France",
+        organization=organization,
+        nfc_id="TST-S0001",
+        alert_emails="manager@example.com"
+    )
+
+
+class SendAlertsCommandTestCase(TestCase):
+    """Tests pour la commande send_alerts"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.site = create_site()
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            first_name="Jean",
+            last_name="Dupont",
+            role="EMPLOYEE"
+        )
+
+    def _create_alerts(self, count):
+        return [
+            Alert.objects.create(
+                employee=self.employee,
+                site=self.site,
+                alert_type=Alert.AlertType.LATE,
+                message=f"Retard de {index + 5} minutes"
+            )
+            for index in range(count)
+        ]
+
+    @override_settings(EMAIL_BACKEND='alerts.tests.test_send_alerts.CountingBackend')
+    def test_batch_is_sent_on_one_connection(self):
+        """Test que chaque lot d'alertes est envoyé sur une seule connexion"""
+        alerts = self._create_alerts(5)
+        CountingBackend.opened = 0
+
+        call_command('send_alerts', digest_window=0, batch_size=3, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingBackend.opened, 2)
+        self.assertEqual(mail.outbox[0].to, ['manager@example.com'])
+        self.assertIn("Retard", mail.outbox[0].body)
+        for alert in alerts:
+            alert.refresh_from_db()
+            self.assertEqual(alert.status, Alert.AlertStatus.SENT)
+            self.assertIsNotNone(alert.sent_at)
+            self.assertEqual(alert.attempts, 1)
+
+    @override_settings(EMAIL_BACKEND='alerts.tests.test_send_alerts.FailingBackend')
+    def test_failed_delivery_is_retried_with_backoff(self):
+        """Test qu'un échec est retenté après le délai, puis marqué FAILED"""
+        alert = self._create_alerts(1)[0]
+
+        call_command('send_alerts', digest_window=0, max_attempts=2, backoff=60, stdout=StringIO())
+        alert.refresh_from_db()
+        self.assertEqual(alert.status, Alert.AlertStatus.PENDING)
+        self.assertEqual(alert.attempts, 1)
+        self.assertIn("Serveur indisponible", alert.error_message)
+        self.assertGreater(alert.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # La nouvelle tentative n'est pas due avant la fin du délai
+        call_command('send_alerts', digest_window=0, max_attempts=2, stdout=StringIO())
+        alert.refresh_from_db()
+        self.assertEqual(alert.attempts, 1)
+
+        Alert.objects.filter(id=alert.id).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        call_command('send_alerts', digest_window=0, max_attempts=2, stdout=StringIO())
+        alert.refresh_from_db()
+        self.assertEqual(alert.status, Alert.AlertStatus.FAILED)
+        self.assertEqual(alert.attempts, 2)
+        self.assertIsNone(alert.sent_at)
+
+
+class AlertCreateViewTestCase(APITestCase):
+    """Tests pour la création d'alertes via l'API"""
+
+    def test_create_does_not_send_mail(self):
+        """Test que la création d'une alerte n'envoie pas d'email pendant la requête"""
+        site = create_site()
+        employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        admin = User.objects.create_user(
+            username="admin",
+            email="admin@example.com",
+            password="password",
+            role="SUPER_ADMIN"
+        )
+        self.client.force_authenticate(user=admin)
+
+        response = self.client.post(reverse('alert-list'), {
+            'employee': employee.id,
+            'site': site.id,
+            'alert_type': Alert.AlertType.OTHER
+        })
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        alert = Alert.objects.get(id=response.data['id'])
+        self.assertEqual(alert.status, Alert.AlertStatus.PENDING)
+        self.assertEqual(sorted(alert.recipient_list), ['employee@example.com', 'manager@example.com'])
@@ -0,0 +1,106 @@
+"""Regroupement des alertes en emails récapitulatifs
+
+Lorsqu'un site est désactivé ou qu'un planning est mal configuré, chaque anomalie
+produit une alerte : les destinataires recevraient des centaines d'emails presque
+identiques. Les alertes réservées par le worker send_alerts sont donc regroupées
+par (destinataire, site, type d'alerte, fenêtre de création) ; un groupe d'au moins
+ALERT_DIGEST_MIN_SIZE alertes est envoyé en un seul email récapitulatif, les
+autres alertes restent envoyées individuellement.
+
+Les fenêtres sont alignées sur l'horloge (tranches de window secondes) : une
+alerte n'est envoyée qu'une fois sa fenêtre terminée, afin que toutes les
+alertes de la fenêtre puissent être regroupées.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+
+def window_start(moment, window):
+    """Début de la fenêtre de window secondes contenant moment (None sans regroupement)"""
+    if not window:
+        return None
+    timestamp = moment.timestamp()
+    return datetime.fromtimestamp(timestamp - timestamp % window, tz=dt_timezone.utc)
+
+
+class DigestGroup:
+    """Alertes d'un destinataire pour un site et un type, dans une même fenêtre"""
+
+    def __init__(self, recipient, site, alert_type, start):
+        self.recipient = recipient
+        self.site = site
+        self.alert_type = alert_type
+        self.window_start = start
+        self.alerts = []
+
+
+def coalesce(alerts, window, min_size):
+    """Répartit des alertes entre emails récapitulatifs et envois individuels
+
+    Args:
+        alerts: alertes à envoyer (site chargé) ; seuls les destinataires non encore servis sont retenus
+        window: durée des fenêtres de regroupement en secondes (0 : pas de regroupement)
+        min_size: nombre minimal d'alertes pour envoyer un récapitulatif
+
+    Returns:
+        tuple: (groupes récapitulatifs, {alerte: destinataires restant à servir individuellement})
+    """
+    individual = {alert: alert.pending_recipients for alert in alerts}
+    if not window:
+        return [], {alert: recipients for alert, recipients in individual.items() if recipients}
+
+    groups = {}
+    for alert in alerts:
+        start = window_start(alert.created_at, window)
+        for recipient in individual[alert]:
+            key = (recipient, alert.site_id, alert.alert_type, start)
+            if key not in groups:
+                groups[key] = DigestGroup(recipient, alert.site, alert.alert_type, start)
+            groups[key].alerts.append(alert)
+
+    digests = [group for group in groups.values() if len(group.alerts) >= max(min_size, 2)]
+    digested = defaultdict(set)
+    for group in digests:
+        for alert in group.alerts:
+            digested[alert].add(group.recipient)
+    for alert, recipients in digested.items():
+        individual[alert] = [recipient for recipient in individual[alert] if recipient not in recipients]
+    return digests, {alert: recipients for alert, recipients in individual.items() if recipients}
+
+
+def build_digest_message(group, connection=None):
+    """Construit l'email récapitulatif d'un groupe d'alertes"""
+    rows = []
+    for alert in sorted(group.alerts, key=lambda alert: alert.created_at):
+        anomaly = alert.anomaly
+        rows.append({
+            'employee_name': alert.employee.get_full_name(),
+            'date': anomaly.date if anomaly else timezone.localtime(alert.created_at).date(),
+            'minutes': anomaly.minutes if anomaly else None,
+            'status': anomaly.get_status_display() if anomaly else alert.get_status_display(),
+        })
+
+    alert_type_display = group.alerts[0].get_alert_type_display()
+    context = {
+        'site_name': group.site.name,
+        'anomaly_type': alert_type_display,
+        'alert_count': len(rows),
+        'rows': rows,
+        'window_start': timezone.localtime(group.window_start).strftime('%d/%m/%Y %H:%M') if group.window_start else None,
+    }
+    html_message = render_to_string('emails/alert_digest.html', context)
+    message = EmailMultiAlternatives(
+        subject=f'Alertes : {alert_type_display} - {group.site.name} ({len(rows)})',
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[group.recipient],
+        connection=connection
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
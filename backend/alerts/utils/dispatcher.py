@@ -0,0 +1,228 @@
+"""Envoi des alertes par email (boîte d'envoi)
+
+Les alertes sont créées en statut PENDING (voir timesheets.signals) et ne sont
+jamais envoyées depuis une requête HTTP : le worker send_alerts les réserve par
+lots avec SELECT ... FOR UPDATE SKIP LOCKED, puis envoie chaque lot sur une
+seule connexion SMTP.
+
+La réservation repousse next_attempt_at de la durée du bail : un worker
+interrompu en cours d'envoi ne bloque pas ses alertes, elles redeviennent
+éligibles à l'expiration du bail. Un envoi en échec est retenté avec un délai
+exponentiel, puis l'alerte passe en FAILED après max_attempts tentatives. Les
+destinataires déjà servis sont enregistrés (delivered_to) : une nouvelle
+tentative n'est envoyée qu'aux destinataires en échec.
+
+Les alertes d'un même destinataire, site et type sont regroupées en emails
+récapitulatifs (voir alerts.utils.digest) ; une alerte est marquée envoyée
+lorsque tous ses envois, individuels ou récapitulatifs, ont réussi.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from alerts.models import Alert, AlertDigest
+from alerts.utils.digest import build_digest_message, coalesce, window_start
+
+logger = logging.getLogger(__name__)
+
+UPDATE_FIELDS = ['status', 'attempts', 'delivered_to', 'sent_at', 'error_message', 'next_attempt_at', 'updated_at']
+
+
+def due_alerts(now=None, digest_window=0):
+    """Alertes en attente dont l'envoi est dû (fenêtre de regroupement terminée)"""
+    now = now or timezone.now()
+    alerts = Alert.objects.filter(status=Alert.AlertStatus.PENDING).filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+    )
+    if digest_window:
+        alerts = alerts.filter(created_at__lt=window_start(now, digest_window))
+    return alerts
+
+
+def build_message(alert, recipients=None, connection=None):
+    """Construit l'email d'une alerte (par défaut pour tous ses destinataires)"""
+    context = {
+        'alert': alert,
+        'site_name': alert.site.name if alert.site else 'Non spécifié',
+        'employee_name': alert.employee.get_full_name(),
+        'anomaly_type': alert.get_alert_type_display(),
+        'description': alert.message,
+        'date': timezone.localtime(alert.created_at).strftime('%d/%m/%Y %H:%M'),
+    }
+    html_message = render_to_string('emails/alert_notification.html', context)
+    message = EmailMultiAlternatives(
+        subject=f'Alerte : {alert.get_alert_type_display()}',
+        body=strip_tags(html_message),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=recipients if recipients is not None else alert.recipient_list,
+        connection=connection
+    )
+    message.attach_alternative(html_message, 'text/html')
+    return message
+
+
+class AlertDispatcher:
+    """Réserve et envoie les alertes en attente par lots"""
+
+    def __init__(self, batch_size=100, max_attempts=5, backoff=60, lease=300,
+                 digest_window=None, digest_min_size=None):
+        """
+        Args:
+            batch_size: nombre d'alertes réservées et envoyées par connexion SMTP
+            max_attempts: nombre de tentatives avant le passage en FAILED
+            backoff: délai en secondes avant la première nouvelle tentative (doublé à chaque échec)
+            lease: durée en secondes de la réservation d'un lot
+            digest_window: fenêtre de regroupement en secondes, 0 pour désactiver (par défaut: ALERT_DIGEST_WINDOW)
+            digest_min_size: nombre minimal d'alertes d'un récapitulatif (par défaut: ALERT_DIGEST_MIN_SIZE)
+        """
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.digest_window = settings.ALERT_DIGEST_WINDOW if digest_window is None else digest_window
+        self.digest_min_size = settings.ALERT_DIGEST_MIN_SIZE if digest_min_size is None else digest_min_size
+
+    def claim_batch(self):
+        """Réserve un lot d'alertes dues sans bloquer les autres workers
+
+        Returns:
+            list: alertes réservées (site, employé et anomalie chargés)
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            alerts = list(
+                due_alerts(now, self.digest_window).select_for_update(skip_locked=True, of=('self',))
+                .select_related('site', 'employee', 'anomaly')
+                .order_by('created_at', 'id')[:self.batch_size]
+            )
+            if alerts:
+                Alert.objects.filter(id__in=[alert.id for alert in alerts]).update(
+                    next_attempt_at=now + timedelta(seconds=self.lease),
+                    updated_at=now
+                )
+        return alerts
+
+    def send_batch(self, alerts):
+        """Envoie un lot d'alertes sur une seule connexion SMTP et enregistre les résultats
+
+        Returns:
+            tuple: (nombre d'alertes envoyées, nombre d'échecs)
+        """
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Connexion SMTP impossible: {str(e)}")
+            for alert in alerts:
+                self._record_failure(alert, e)
+            Alert.objects.bulk_update(alerts, UPDATE_FIELDS)
+            return 0, len(alerts)
+
+        digests, individual = coalesce(alerts, self.digest_window, self.digest_min_size)
+        errors = {}
+        delivered = defaultdict(set)
+        delivered_digests = []
+        try:
+            # Un message par appel : le résultat est connu envoi par envoi, sur la même connexion
+            for group in digests:
+                try:
+                    connection.send_messages([build_digest_message(group, connection)])
+                except Exception as e:
+                    logger.warning(f"Échec de l'envoi du récapitulatif pour {group.recipient}: {str(e)}")
+                    for alert in group.alerts:
+                        errors.setdefault(alert.id, e)
+                else:
+                    delivered_digests.append(group)
+                    for alert in group.alerts:
+                        delivered[alert.id].add(group.recipient)
+            for alert, recipients in individual.items():
+                try:
+                    connection.send_messages([build_message(alert, recipients, connection)])
+                except Exception as e:
+                    logger.warning(f"Échec de l'envoi de l'alerte {alert.id}: {str(e)}")
+                    errors.setdefault(alert.id, e)
+                else:
+                    delivered[alert.id].update(recipients)
+        finally:
+            connection.close()
+
+        sent = failed = 0
+        for alert in alerts:
+            if delivered[alert.id]:
+                alert.delivered_to = ','.join(sorted(set(alert.delivered_list) | delivered[alert.id]))
+            if not alert.recipient_list:
+                self._record_failure(alert, 'Aucun destinataire', retry=False)
+                failed += 1
+            elif alert.id in errors:
+                self._record_failure(alert, errors[alert.id])
+                failed += 1
+            else:
+                self._record_success(alert)
+                sent += 1
+
+        Alert.objects.bulk_update(alerts, UPDATE_FIELDS)
+        self._save_digests(delivered_digests)
+        return sent, failed
+
+    def _save_digests(self, groups):
+        """Enregistre les récapitulatifs envoyés et leurs alertes"""
+        if not groups:
+            return
+        now = timezone.now()
+        digests = AlertDigest.objects.bulk_create([
+            AlertDigest(
+                recipient=group.recipient,
+                site=group.site,
+                alert_type=group.alert_type,
+                window_start=group.window_start,
+                alert_count=len(group.alerts),
+                sent_at=now
+            )
+            for group in groups
+        ])
+        AlertDigest.alerts.through.objects.bulk_create([
+            AlertDigest.alerts.through(alertdigest_id=digest.id, alert_id=alert.id)
+            for digest, group in zip(digests, groups)
+            for alert in group.alerts
+        ])
+
+    def dispatch(self):
+        """Réserve et envoie un lot
+
+        Returns:
+            tuple: (nombre d'alertes réservées, envoyées, en échec)
+        """
+        alerts = self.claim_batch()
+        if not alerts:
+            return 0, 0, 0
+        sent, failed = self.send_batch(alerts)
+        return len(alerts), sent, failed
+
+    def _record_success(self, alert):
+        now = timezone.now()
+        alert.attempts += 1
+        alert.status = Alert.AlertStatus.SENT
+        alert.sent_at = now
+        alert.error_message = ''
+        alert.next_attempt_at = None
+        alert.updated_at = now
+
+    def _record_failure(self, alert, error, retry=True):
+        """Planifie une nouvelle tentative, ou passe l'alerte en FAILED"""
+        now = timezone.now()
+        alert.attempts += 1
+        alert.error_message = str(error)
+        alert.updated_at = now
+        if retry and alert.attempts < self.max_attempts:
+            alert.next_attempt_at = now + timedelta(seconds=self.backoff * 2 ** (alert.attempts - 1))
+        else:
+            alert.status = Alert.AlertStatus.FAILED
+            alert.next_attempt_at = None
@@ -0,0 +1,98 @@
+"""Création des alertes à partir des anomalies détectées
+
+Les alertes d'un lot d'anomalies sont créées ensemble : l'employé, le site et
+le planning de toutes les anomalies sont chargés en une requête par relation,
+puis les alertes sont insérées en un seul bulk_create. Les écritures groupées
+d'anomalies (anomaly_dedup.bulk_upsert) appellent materialize_alerts sur les
+anomalies insérées ; le signal post_save des anomalies créées une à une
+l'appelle avec une seule anomalie.
+"""
+import logging
+
+from django.db.models import prefetch_related_objects
+
+from alerts.models import Alert
+from timesheets.models import Anomaly
+
+logger = logging.getLogger(__name__)
+
+# Type d'alerte de chaque type d'anomalie et libellé des minutes reprises dans le message
+ALERT_TYPES = {
+    Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE: (Alert.AlertType.CONSECUTIVE_SAME_TYPE, None),
+    Anomaly.AnomalyType.LATE: (Alert.AlertType.LATE, 'Minutes de retard'),
+    Anomaly.AnomalyType.EARLY_DEPARTURE: (Alert.AlertType.EARLY_DEPARTURE, 'Minutes de départ anticipé'),
+    Anomaly.AnomalyType.MISSING_ARRIVAL: (Alert.AlertType.MISSING_ARRIVAL, None),
+    Anomaly.AnomalyType.MISSING_DEPARTURE: (Alert.AlertType.MISSING_DEPARTURE, None),
+    Anomaly.AnomalyType.INSUFFICIENT_HOURS: (Alert.AlertType.INSUFFICIENT_HOURS, 'Minutes manquantes'),
+    Anomaly.AnomalyType.UNLINKED_SCHEDULE: (Alert.AlertType.UNLINKED_SCHEDULE, None),
+    Anomaly.AnomalyType.OTHER: (Alert.AlertType.OTHER, None),
+}
+
+
+def build_alert_message(anomaly, alert_type, minutes_label=None):
+    """Message d'une alerte (relations employee et site de l'anomalie chargées)"""
+    lines = [
+        f'Anomalie détectée : {alert_type.label}',
+        f'Employé : {anomaly.employee.get_full_name()}',
+        f'Site : {anomaly.site.name}',
+        f'Date : {anomaly.date}',
+    ]
+    if minutes_label:
+        lines.append(f'{minutes_label} : {anomaly.minutes}')
+    lines.append(f'Description : {anomaly.description}')
+    return '\n'.join(lines)
+
+
+def _log_within_margin(anomaly):
+    """Journalise les retards et départs anticipés compris dans la marge (alerte tout de même créée)"""
+    schedule = anomaly.schedule
+    site = anomaly.site
+    if anomaly.anomaly_type == Anomaly.AnomalyType.LATE:
+        margin = (schedule.late_arrival_margin if schedule else None) or site.late_margin
+        if anomaly.minutes <= margin:
+            logger.info(f"Alerte créée pour le retard de {anomaly.minutes} minutes qui est dans la marge de {margin} minutes.")
+    elif anomaly.anomaly_type == Anomaly.AnomalyType.EARLY_DEPARTURE:
+        margin = (schedule.early_departure_margin if schedule else None) or site.early_departure_margin
+        if anomaly.minutes <= margin:
+            logger.info(f"Alerte créée pour le départ anticipé de {anomaly.minutes} minutes qui est dans la marge de {margin} minutes.")
+
+
+def materialize_alerts(anomalies):
+    """Crée les alertes d'anomalies nouvellement enregistrées
+
+    Args:
+        anomalies: anomalies enregistrées (pk renseigné)
+
+    Returns:
+        list: alertes créées
+    """
+    anomalies = [anomaly for anomaly in anomalies if anomaly.pk]
+    if not anomalies:
+        return []
+
+    # Une requête par relation pour tout le lot (les relations déjà chargées ne sont pas relues)
+    prefetch_related_objects(anomalies, 'employee', 'site', 'schedule')
+
+    alerts = []
+    for anomaly in anomalies:
+        anomaly._alert_materialized = True
+        if anomaly.anomaly_type not in ALERT_TYPES:
+            logger.warning(f"Impossible de créer une alerte pour l'anomalie {anomaly.id} de type {anomaly.anomaly_type} : type non géré")
+            continue
+
+        alert_type, minutes_label = ALERT_TYPES[anomaly.anomaly_type]
+        _log_within_margin(anomaly)
+        alerts.append(Alert(
+            employee=anomaly.employee,
+            site=anomaly.site,
+            anomaly=anomaly,
+            alert_type=alert_type,
+            message=build_alert_message(anomaly, alert_type, minutes_label),
+            recipients=anomaly.site.alert_emails,
+            status=Alert.AlertStatus.PENDING
+        ))
+
+    if alerts:
+        Alert.objects.bulk_create(alerts)
+        logger.info(f"{len(alerts)} alerte(s) créée(s) pour {len(anomalies)} anomalie(s)")
+    return alerts
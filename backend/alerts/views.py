@@ -4,10 +4,7 @@ from .models import Alert
 from .serializers import AlertSerializer
 from sites.permissions import IsSiteOrganizationManager
 from django.db import models
-from django.core.mail import send_mail
-from django.conf import settings
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from core.access import get_access_context
 
 class IsAdminOrManager(BasePermission):
     """Permission composée pour autoriser les admin ou les managers d'organisation"""
@@ -31,36 +28,17 @@ class AlertListView(generics.ListCreateAPIView):
         if user.is_super_admin:
             return Alert.objects.all()
         elif user.is_admin or user.is_manager:
-            return Alert.objects.filter(site__organization__in=user.organizations.all())
+            return Alert.objects.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         else:
             return Alert.objects.filter(employee=user)
 
     def perform_create(self, serializer):
-        alert = serializer.save()
-        
-        # Préparer le contexte pour le template
-        context = {
-            'alert': alert,
-            'site_name': alert.site.name if alert.site else 'Non spécifié',
-            'employee_name': f"{alert.employee.first_name} {alert.employee.last_name}",
-            'anomaly_type': alert.get_anomaly_type_display(),
-            'description': alert.description,
-            'date': alert.created_at.strftime('%d/%m/%Y %H:%M'),
-        }
-        
-        # Rendre le template HTML
-        html_message = render_to_string('emails/alert_notification.html', context)
-        plain_message = strip_tags(html_message)
-        
-        # Envoyer l'email
-        send_mail(
-            subject=f'Alerte : {alert.get_anomaly_type_display()}',
-            message=plain_message,
-            html_message=html_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[alert.employee.email],
-            fail_silently=False,
-        )
+        # L'alerte est créée en attente : l'email (employé et destinataires du site)
+        # est envoyé par le worker send_alerts, jamais pendant la requête
+        site = serializer.validated_data['site']
+        employee = serializer.validated_data['employee']
+        recipients = [emails for emails in (employee.email, site.alert_emails) if emails]
+        serializer.save(status=Alert.AlertStatus.PENDING, recipients=','.join(recipients))
 
 class AlertDetailView(generics.RetrieveUpdateAPIView):
     """Vue pour obtenir et mettre à jour une alerte"""
@@ -76,7 +54,7 @@ class AlertDetailView(generics.RetrieveUpdateAPIView):
         if user.is_super_admin:
             return Alert.objects.all()
         elif user.is_admin or user.is_manager:
-            return Alert.objects.filter(site__organization__in=user.organizations.all())
+            return Alert.objects.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         else:
             return Alert.objects.filter(employee=user)
 
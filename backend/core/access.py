@@ -0,0 +1,96 @@
+"""Contexte d'accès d'un utilisateur, chargé une fois par requête
+
+Les organisations de l'utilisateur, les sites qu'il manage et les sites auxquels
+il est affecté sont lus au premier besoin puis conservés sur la requête : les
+mixins de core.mixins, les classes de permission et les get_queryset des vues
+s'appuient sur ce contexte au lieu de réinterroger user.organizations pour chaque
+objet sérialisé ou vérifié.
+"""
+from functools import cached_property
+
+
+class AccessContext:
+    """Droits d'accès d'un utilisateur (identifiants chargés à la demande, une seule fois)"""
+
+    def __init__(self, user):
+        self.user = user
+        self._target_organization_ids = {}
+
+    @property
+    def is_super_admin(self):
+        return bool(getattr(self.user, 'is_super_admin', False))
+
+    @cached_property
+    def organization_ids(self):
+        """Identifiants des organisations de l'utilisateur"""
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(self.user.organizations.values_list('id', flat=True))
+
+    @cached_property
+    def managed_site_ids(self):
+        """Identifiants des sites dont l'utilisateur est le manager"""
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(self.user.managed_sites.values_list('id', flat=True))
+
+    @cached_property
+    def assigned_site_ids(self):
+        """Identifiants des sites auxquels l'utilisateur est affecté (affectations actives)"""
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(self.user.employee_sites.filter(is_active=True).values_list('site_id', flat=True))
+
+    def has_organization(self, organization):
+        """Vérifie l'accès à une organisation (instance ou identifiant)"""
+        if self.is_super_admin:
+            return True
+        if organization is None:
+            return False
+        organization_id = getattr(organization, 'pk', organization)
+        try:
+            return int(organization_id) in self.organization_ids
+        except (TypeError, ValueError):
+            return False
+
+    def has_site(self, site):
+        """Vérifie l'accès à un site par son organisation"""
+        if self.is_super_admin:
+            return True
+        if site is None:
+            return False
+        return site.organization_id in self.organization_ids
+
+    def is_assigned_to_site(self, site):
+        """Vérifie que l'utilisateur est affecté au site (instance ou identifiant)"""
+        return getattr(site, 'pk', site) in self.assigned_site_ids
+
+    def organization_ids_of(self, target_user):
+        """Organisations d'un autre utilisateur (mémorisées pour la durée de la requête)"""
+        if target_user.pk == self.user.pk:
+            return self.organization_ids
+        if target_user.pk not in self._target_organization_ids:
+            self._target_organization_ids[target_user.pk] = frozenset(
+                target_user.organizations.values_list('id', flat=True)
+            )
+        return self._target_organization_ids[target_user.pk]
+
+    def shares_organization(self, target_user):
+        """Vérifie que l'utilisateur et la cible ont au moins une organisation en commun"""
+        return bool(self.organization_ids & self.organization_ids_of(target_user))
+
+
+def get_access_context(request):
+    """Retourne le contexte d'accès de l'utilisateur de la requête (créé au premier appel)
+
+    Le contexte est conservé sur la requête Django sous-jacente, partagée par la
+    requête DRF, les permissions et les sérialiseurs ; il est recréé si
+    l'utilisateur authentifié change en cours de requête.
+    """
+    http_request = getattr(request, '_request', request)
+    user = request.user
+    context = getattr(http_request, 'access_context', None)
+    if context is None or context.user is not user:
+        context = AccessContext(user)
+        http_request.access_context = context
+    return context
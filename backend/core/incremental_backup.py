@@ -0,0 +1,478 @@
+"""Sauvegardes incrémentales applicatives (lignes modifiées depuis la dernière sauvegarde)
+
+Une exportation écrit, table par table, les lignes dont updated_at est postérieur
+au filigrane de l'exportation précédente, en fichiers NDJSON compressés (gzip)
+de chunk_rows lignes lus par curseur côté serveur. Un manifeste (manifest.json)
+décrit l'exportation : période couverte, fichiers, nombre de lignes et somme de
+contrôle SHA-256 de chaque fichier. Le manifeste est écrit en dernier : une
+exportation interrompue n'est jamais prise comme point de départ.
+
+Le filigrane est lu dans le manifeste de la dernière exportation du répertoire ;
+l'exportation suivante repart de ce filigrane moins un recouvrement, afin de ne
+pas manquer les lignes validées par une transaction commencée avant
+l'exportation. Les lignes sont restaurées par upsert sur la clé primaire : une
+ligne exportée deux fois est simplement réécrite.
+
+Les tables sans updated_at sont exportées différemment :
+- les détails des plannings (sans horodatage) sont exportés avec leur planning
+  et remplacent, à la restauration, les détails existants de ce planning ;
+- les affectations (SiteEmployee) et les utilisateurs, petites tables sans date
+  de modification, sont exportés entièrement à chaque fois.
+Les suppressions ne sont pas reportées : une sauvegarde complète (pg_dump)
+régulière reste nécessaire. Une ligne supprimée puis recréée sous une autre clé
+primaire (anomalies recalculées par force_update ou timesheets_repair) est
+toutefois remplacée à la restauration : la ligne existante qui occupe sa clé
+unique et n'appartient pas à l'exportation est supprimée.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+CHUNK_ROWS = 50000
+CURSOR_CHUNK_SIZE = 2000
+OVERLAP_SECONDS = 300
+
+
+class TableSpec:
+    """Table exportée et règle de sélection de ses lignes"""
+
+    def __init__(self, label, watermark=None, children=(), m2m=(), unique_keys=()):
+        """
+        Args:
+            label: modèle (app_label.ModelName)
+            watermark: champ de date de modification (None : table exportée entièrement)
+            children: couples (modèle enfant, clé étrangère) exportés avec chaque ligne
+            m2m: relations plusieurs-à-plusieurs exportées avec chaque ligne
+            unique_keys: clés uniques (hors clé primaire) des lignes recréées à la source
+        """
+        self.label = label
+        self.watermark = watermark
+        self.children = children
+        self.m2m = m2m
+        self.unique_keys = unique_keys
+
+    @property
+    def model(self):
+        return apps.get_model(self.label)
+
+    def child_sets(self):
+        """Tables enfants remplacées avec leur parent : (modèle, clé étrangère vers le parent)"""
+        for label, parent_field in self.children:
+            yield apps.get_model(label), parent_field
+        for name in self.m2m:
+            field = self.model._meta.get_field(name)
+            yield field.remote_field.through, f'{field.m2m_field_name()}_id'
+
+
+# Ordre d'exportation et de restauration (les tables référencées d'abord)
+TABLES = [
+    TableSpec('organizations.Organization', watermark='updated_at'),
+    TableSpec('users.User', m2m=('organizations',)),
+    TableSpec('sites.Site', watermark='updated_at'),
+    TableSpec('sites.Schedule', watermark='updated_at', children=(('sites.ScheduleDetail', 'schedule_id'),)),
+    TableSpec('sites.SiteEmployee'),
+    TableSpec('timesheets.Timesheet', watermark='updated_at'),
+    TableSpec(
+        'timesheets.Anomaly',
+        watermark='updated_at',
+        m2m=('related_timesheets',),
+        # Contrainte anomaly_dedup_key_uniq
+        unique_keys=(('employee_id', 'site_id', 'date', 'anomaly_type', 'dedup_subtype'),)
+    ),
+    TableSpec('alerts.Alert', watermark='updated_at'),
+]
+
+
+class _Encoder(DjangoJSONEncoder):
+    """Encodeur JSON conservant les microsecondes des dates et heures"""
+
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _attnames(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def read_manifest(path):
+    """Manifeste d'une exportation (None si l'exportation est incomplète)"""
+    try:
+        with open(os.path.join(path, MANIFEST_NAME), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def list_exports(directory):
+    """Exportations complètes d'un répertoire, de la plus ancienne à la plus récente
+
+    Returns:
+        list: couples (chemin, manifeste)
+    """
+    if not os.path.isdir(directory):
+        return []
+    exports = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        manifest = read_manifest(path) if os.path.isdir(path) else None
+        if manifest is not None:
+            exports.append((path, manifest))
+    return sorted(exports, key=lambda export: export[1]['until'])
+
+
+def restore_chain(directory, since=None, until=None):
+    """Exportations à rejouer, dans l'ordre
+
+    Args:
+        since: date de la sauvegarde complète restaurée au préalable (None : partir
+            de la dernière exportation de base)
+        until: ne pas rejouer les exportations postérieures à cette date
+
+    Returns:
+        list: couples (chemin, manifeste)
+    """
+    exports = [
+        export for export in list_exports(directory)
+        if until is None or parse_datetime(export[1]['until']) <= until
+    ]
+    if since is not None:
+        return [export for export in exports if parse_datetime(export[1]['until']) > since]
+
+    bases = [index for index, (_, manifest) in enumerate(exports) if manifest['kind'] == 'base']
+    if not bases:
+        return []
+    return exports[bases[-1]:]
+
+
+class _ChunkWriter:
+    """Écrit des lignes NDJSON compressées en fichiers de chunk_rows lignes (None : un seul fichier)"""
+
+    def __init__(self, directory, prefix, chunk_rows):
+        self.directory = directory
+        self.prefix = prefix
+        self.chunk_rows = chunk_rows
+        self.files = []
+        self._file = None
+        self._entry = None
+        self._digest = None
+
+    def write(self, row):
+        if self._file is None:
+            self._open()
+        self._file.write(json.dumps(row, cls=_Encoder).encode() + b'\n')
+        self._entry['rows'] += 1
+        if self.chunk_rows and self._entry['rows'] >= self.chunk_rows:
+            self.close()
+
+    def _open(self):
+        name = f'{self.prefix}_{len(self.files):05d}.ndjson.gz'
+        self._raw = open(os.path.join(self.directory, name), 'wb')
+        self._digest = hashlib.sha256()
+        self._file = gzip.GzipFile(fileobj=_HashingFile(self._raw, self._digest), mode='wb')
+        self._entry = {'name': name, 'rows': 0}
+
+    def close(self):
+        """Termine le fichier en cours (sa somme de contrôle est alors connue)"""
+        if self._file is None:
+            return None
+        self._file.close()
+        self._raw.close()
+        self._entry['sha256'] = self._digest.hexdigest()
+        entry = self._entry
+        self.files.append(entry)
+        self._file = self._entry = None
+        return entry
+
+
+class _HashingFile:
+    """Fichier en écriture calculant la somme de contrôle des octets écrits"""
+
+    def __init__(self, file, digest):
+        self.file = file
+        self.digest = digest
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+
+class IncrementalExporter:
+    """Exporte les lignes modifiées depuis la dernière exportation d'un répertoire"""
+
+    def __init__(self, directory, chunk_rows=CHUNK_ROWS, overlap=OVERLAP_SECONDS):
+        self.directory = directory
+        self.chunk_rows = chunk_rows
+        self.overlap = overlap
+
+    def previous(self):
+        """Dernière exportation complète (None s'il n'y en a pas)"""
+        exports = list_exports(self.directory)
+        return exports[-1] if exports else None
+
+    def export(self, name, base=False):
+        """Écrit une exportation dans directory/name
+
+        Args:
+            name: nom du répertoire de l'exportation
+            base: exporter toutes les lignes, même s'il existe une exportation précédente
+
+        Returns:
+            dict: manifeste de l'exportation
+        """
+        previous = None if base else self.previous()
+        since = None
+        if previous is not None:
+            since = parse_datetime(previous[1]['until']) - timedelta(seconds=self.overlap)
+        until = timezone.now()
+
+        final_path = os.path.join(self.directory, name)
+        path = f'{final_path}.partial'
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'kind': 'delta' if previous else 'base',
+            'previous': os.path.basename(previous[0]) if previous else None,
+            'since': since.isoformat() if since else None,
+            'until': until.isoformat(),
+            'tables': [],
+        }
+        try:
+            # Un seul instantané pour toutes les tables : les clés étrangères d'une exportation sont cohérentes
+            snapshot = connection.vendor == 'postgresql' and not connection.in_atomic_block
+            with transaction.atomic():
+                if snapshot:
+                    with connection.cursor() as cursor:
+                        cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+                for index, spec in enumerate(TABLES):
+                    manifest['tables'].append(self._export_table(path, index, spec, since))
+        except Exception:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+        manifest['rows'] = sum(table['rows'] for table in manifest['tables'])
+        manifest['bytes'] = sum(
+            os.path.getsize(os.path.join(path, entry))
+            for entry in os.listdir(path)
+        )
+        with open(os.path.join(path, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(path, final_path)
+        return manifest
+
+    def _export_table(self, path, index, spec, since):
+        """Exporte les lignes d'une table (et de ses tables enfants) par curseur côté serveur"""
+        model = spec.model
+        rows = model._default_manager.order_by('pk')
+        if spec.watermark and since is not None:
+            rows = rows.filter(**{f'{spec.watermark}__gt': since})
+
+        prefix = f'{index:02d}_{model._meta.label_lower}'
+        writer = _ChunkWriter(path, prefix, self.chunk_rows)
+        child_sets = list(spec.child_sets())
+        children = {child._meta.label_lower: [] for child, _ in child_sets}
+        pending_ids = []
+
+        def flush_children():
+            # Les lignes enfants d'un fichier parent sont écrites dans un fichier de même rang
+            chunk = len(writer.files) - 1
+            for child, parent_field in child_sets:
+                child_writer = _ChunkWriter(path, f'{prefix}_{child._meta.label_lower}_{chunk:05d}', None)
+                child_rows = child._default_manager.filter(**{f'{parent_field}__in': pending_ids}).order_by('pk')
+                for row in child_rows.values(*_attnames(child)).iterator(chunk_size=CURSOR_CHUNK_SIZE):
+                    child_writer.write(row)
+                entry = child_writer.close()
+                children[child._meta.label_lower].append(entry)
+            pending_ids.clear()
+
+        for row in rows.values(*_attnames(model)).iterator(chunk_size=CURSOR_CHUNK_SIZE):
+            pending_ids.append(row[model._meta.pk.attname])
+            files_before = len(writer.files)
+            writer.write(row)
+            if len(writer.files) > files_before:
+                flush_children()
+        if writer.close() is not None:
+            flush_children()
+
+        table = {
+            'model': model._meta.label_lower,
+            'rows': sum(entry['rows'] for entry in writer.files),
+            'files': writer.files,
+            'children': [
+                {
+                    'model': child._meta.label_lower,
+                    'parent_field': parent_field,
+                    'files': children[child._meta.label_lower],
+                }
+                for child, parent_field in child_sets
+            ],
+        }
+        logger.info(f"Exportation incrémentale {model._meta.label}: {table['rows']} ligne(s)")
+        return table
+
+
+def _read_rows(path, entry):
+    """Lit un fichier NDJSON compressé après vérification de sa somme de contrôle"""
+    if entry is None:
+        return []
+    file_path = os.path.join(path, entry['name'])
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    if digest.hexdigest() != entry['sha256']:
+        raise ValueError(f"Somme de contrôle invalide pour {file_path}")
+    with gzip.open(file_path, 'rb') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@contextmanager
+def _preserve_timestamps(models):
+    """Désactive auto_now / auto_now_add : les dates restaurées sont celles de la sauvegarde"""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _instances(model, rows):
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    return [
+        model(**{attname: fields[attname].to_python(value) for attname, value in row.items()})
+        for row in rows
+    ]
+
+
+def _delete_replaced(model, rows, unique_keys, exported_pks):
+    """Supprime les lignes existantes dont une ligne restaurée reprend la clé unique
+
+    Une telle ligne, absente de l'exportation, a été supprimée à la source puis
+    recréée sous une autre clé primaire (les suppressions ne sont pas exportées).
+    Les lignes présentes dans l'exportation sont conservées : leur nouvelle
+    version libère la clé.
+
+    Returns:
+        int: nombre de lignes supprimées
+    """
+    fields = {field.attname: field for field in model._meta.concrete_fields}
+    pk = model._meta.pk.attname
+    replaced = set()
+    for key_fields in unique_keys:
+        keys = {}
+        for row in rows:
+            key = tuple(fields[name].to_python(row[name]) for name in key_fields)
+            # Une clé contenant NULL n'est soumise à aucune contrainte d'unicité
+            if None not in key:
+                keys[key] = fields[pk].to_python(row[pk])
+        if not keys:
+            continue
+        # Pré-filtrage par valeurs de chaque champ, correspondance exacte vérifiée ensuite
+        candidates = model._default_manager.filter(**{
+            f'{name}__in': {key[index] for key in keys}
+            for index, name in enumerate(key_fields)
+        }).values_list(pk, *key_fields)
+        for existing_pk, *key in candidates.iterator(chunk_size=CURSOR_CHUNK_SIZE):
+            restored_pk = keys.get(tuple(key))
+            if restored_pk is not None and restored_pk != existing_pk and existing_pk not in exported_pks:
+                replaced.add(existing_pk)
+    if not replaced:
+        return 0
+    model._default_manager.filter(pk__in=replaced).delete()
+    logger.info(f"Restauration {model._meta.label}: {len(replaced)} ligne(s) recréée(s) à la source remplacée(s)")
+    return len(replaced)
+
+
+def _upsert(model, rows, batch_size):
+    """Insère ou met à jour des lignes par clé primaire (sans signaux)"""
+    if not rows:
+        return 0
+    pk = model._meta.pk
+    update_fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    model._default_manager.bulk_create(
+        _instances(model, rows),
+        batch_size=batch_size,
+        update_conflicts=bool(update_fields),
+        ignore_conflicts=not update_fields,
+        unique_fields=[pk.name] if update_fields else None,
+        update_fields=update_fields or None
+    )
+    return len(rows)
+
+
+def restore_export(path, manifest, batch_size=1000):
+    """Rejoue une exportation dans la base (une transaction par exportation)
+
+    Returns:
+        int: nombre de lignes restaurées
+    """
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Version de manifeste non prise en charge: {manifest.get('version')}")
+
+    specs = {spec.label.lower(): spec for spec in TABLES}
+    models = []
+    restored = 0
+    with transaction.atomic():
+        for table in manifest['tables']:
+            model = apps.get_model(table['model'])
+            spec = specs.get(table['model'])
+            unique_keys = spec.unique_keys if spec else ()
+            exported_pks = set()
+            if unique_keys:
+                pk_field = model._meta.pk
+                exported_pks = {
+                    pk_field.to_python(row[pk_field.attname])
+                    for entry in table['files'] for row in _read_rows(path, entry)
+                }
+            child_sets = [
+                (apps.get_model(child['model']), child['parent_field'], child['files'])
+                for child in table['children']
+            ]
+            models.append(model)
+            models.extend(child for child, _, _ in child_sets)
+            with _preserve_timestamps([model] + [child for child, _, _ in child_sets]):
+                for chunk, entry in enumerate(table['files']):
+                    rows = _read_rows(path, entry)
+                    if unique_keys:
+                        _delete_replaced(model, rows, unique_keys, exported_pks)
+                    restored += _upsert(model, rows, batch_size)
+                    parent_ids = [row[model._meta.pk.attname] for row in rows]
+                    for child, parent_field, files in child_sets:
+                        # L'ensemble des lignes enfants du parent est remplacé
+                        child._default_manager.filter(**{f'{parent_field}__in': parent_ids}).delete()
+                        restored += _upsert(child, _read_rows(path, files[chunk] if chunk < len(files) else None), batch_size)
+
+        # Les séquences des clés primaires reprennent après les identifiants restaurés
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+    return restored
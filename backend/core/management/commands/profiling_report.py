@@ -0,0 +1,142 @@
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import parse_profile_line, percentile
+
+
+class Command(BaseCommand):
+    help = '''
+    Résume le journal de profilage des requêtes (REQUEST_PROFILING) : pour chaque vue,
+    nombre d'appels, p50/p95 du temps total, des requêtes SQL, du temps base de données
+    et du temps de sérialisation, et nombre de dépassements du budget de requêtes.
+
+    Exemples d'utilisation :
+
+    # Résumer le journal configuré par REQUEST_PROFILING_LOG_FILE
+    python manage.py profiling_report
+
+    # Résumer un autre fichier
+    python manage.py profiling_report --log-file /var/log/pg-pointage/profiling.log
+
+    # Les 10 vues les plus lentes au p95 ayant au moins 20 appels
+    python manage.py profiling_report --limit 10 --min-requests 20
+
+    # Trier par nombre de requêtes SQL au p95
+    python manage.py profiling_report --sort queries
+    '''
+
+    SORT_KEYS = {
+        'total': 'total_p95',
+        'queries': 'queries_p95',
+        'db': 'db_p95',
+        'count': 'requests',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.verbose = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--log-file',
+            type=str,
+            help='Journal de profilage à lire (par défaut: REQUEST_PROFILING_LOG_FILE)'
+        )
+        parser.add_argument(
+            '--view',
+            type=str,
+            help='Limiter le résumé aux vues dont le nom contient cette chaîne'
+        )
+        parser.add_argument(
+            '--min-requests',
+            type=int,
+            default=1,
+            help='Nombre minimal d\'appels pour qu\'une vue soit affichée (par défaut: 1)'
+        )
+        parser.add_argument(
+            '--sort',
+            choices=sorted(self.SORT_KEYS),
+            default='total',
+            help='Critère de tri décroissant (par défaut: total, le temps total au p95)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Nombre maximal de vues affichées'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Afficher des informations détaillées pendant l\'exécution'
+        )
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose']
+        log_file = options['log_file'] or settings.REQUEST_PROFILING_LOG_FILE
+        if not log_file:
+            raise CommandError("Aucun journal de profilage: utiliser --log-file ou REQUEST_PROFILING_LOG_FILE")
+
+        records = defaultdict(list)
+        skipped = 0
+        try:
+            with open(log_file, encoding='utf-8') as handle:
+                for line in handle:
+                    record = parse_profile_line(line)
+                    if record is None:
+                        skipped += 1
+                        continue
+                    view = record['view'] or record.get('path') or '?'
+                    if options['view'] and options['view'] not in view:
+                        continue
+                    records[view].append(record)
+        except OSError as e:
+            raise CommandError(f"Impossible de lire le journal {log_file}: {str(e)}")
+
+        if self.verbose:
+            self.stdout.write(f"{sum(len(rows) for rows in records.values())} lignes lues, {skipped} lignes ignorées")
+
+        summaries = [
+            self._summarize(view, rows)
+            for view, rows in records.items()
+            if len(rows) >= options['min_requests']
+        ]
+        if not summaries:
+            self.stdout.write(self.style.WARNING("Aucune requête profilée"))
+            return
+
+        summaries.sort(key=lambda summary: summary[self.SORT_KEYS[options['sort']]], reverse=True)
+        if options['limit']:
+            summaries = summaries[:options['limit']]
+
+        header = (f"{'Vue':<40} {'Appels':>7} {'p50 ms':>9} {'p95 ms':>9} {'p50 SQL':>8} {'p95 SQL':>8} "
+                  f"{'p95 BDD ms':>11} {'p95 sér. ms':>12} {'Budget':>7} {'Dépass.':>8}")
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for summary in summaries:
+            line = (
+                f"{summary['view'][:40]:<40} {summary['requests']:>7} {summary['total_p50']:>9.1f} "
+                f"{summary['total_p95']:>9.1f} {summary['queries_p50']:>8} {summary['queries_p95']:>8} "
+                f"{summary['db_p95']:>11.1f} {summary['serializer_p95']:>12.1f} "
+                f"{summary['budget'] if summary['budget'] is not None else '-':>7} {summary['over_budget']:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if summary['over_budget'] else line)
+
+    def _summarize(self, view, rows):
+        """Percentiles des mesures d'une vue"""
+        budget = settings.QUERY_BUDGETS.get(view)
+        return {
+            'view': view,
+            'requests': len(rows),
+            'total_p50': percentile([row['total_ms'] for row in rows], 0.5),
+            'total_p95': percentile([row['total_ms'] for row in rows], 0.95),
+            'queries_p50': percentile([row['queries'] for row in rows], 0.5),
+            'queries_p95': percentile([row['queries'] for row in rows], 0.95),
+            'db_p95': percentile([row.get('db_ms', 0) for row in rows], 0.95),
+            'serializer_p95': percentile([row.get('serializer_ms', 0) for row in rows], 0.95),
+            'budget': budget,
+            'over_budget': sum(1 for row in rows if budget is not None and row['queries'] > budget),
+        }
@@ -0,0 +1,220 @@
+import os
+import gzip
+import logging
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import incremental_backup
+
+
+class Command(BaseCommand):
+    help = '''
+    Restaure la base de données à partir d'une sauvegarde complète et des exportations
+    incrémentales créées par backup_database --incremental.
+
+    Avec --full, la sauvegarde pg_dump indiquée est d'abord restaurée (pg_restore pour les
+    formats custom et directory, psql pour le format plain ; les sauvegardes plain créées
+    sans --clean doivent être restaurées dans une base vide), puis les exportations
+    incrémentales postérieures à cette sauvegarde sont rejouées dans l'ordre. Sans --full,
+    la dernière exportation de base et les exportations suivantes sont rejouées.
+
+    Les lignes sont restaurées par upsert sur la clé primaire ; la somme de contrôle de
+    chaque fichier est vérifiée avant sa lecture.
+
+    Exemples d'utilisation :
+
+    # Rejouer la dernière exportation de base et ses exportations incrémentales
+    python manage.py restore_backup
+
+    # Restaurer une sauvegarde complète puis les exportations incrémentales suivantes
+    python manage.py restore_backup --full /opt/pg-pointage/backups/pointage_20250301_000000.sql
+
+    # Restaurer l'état de la base à une date donnée
+    python manage.py restore_backup --until 2025-03-04T12:00:00+01:00
+
+    # Afficher les exportations qui seraient rejouées
+    python manage.py restore_backup --dry-run --verbose
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.verbose = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backup-dir',
+            type=str,
+            help='Répertoire des sauvegardes (par défaut: /opt/pg-pointage/backups)'
+        )
+        parser.add_argument(
+            '--full',
+            type=str,
+            help='Sauvegarde complète (pg_dump) à restaurer avant les exportations incrémentales'
+        )
+        parser.add_argument(
+            '--until',
+            type=str,
+            help='Ne pas rejouer les exportations postérieures à cette date (format ISO 8601)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de lignes par requête d\'insertion (par défaut: 1000)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les sauvegardes à restaurer sans modifier la base'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Afficher des informations détaillées pendant l\'exécution'
+        )
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose']
+        dry_run = options['dry_run']
+        backup_dir = options['backup_dir'] or '/opt/pg-pointage/backups'
+        full_path = options['full']
+
+        until = None
+        if options['until']:
+            until = parse_datetime(options['until'])
+            if until is None:
+                raise CommandError(f"Date invalide pour --until: {options['until']}")
+            if timezone.is_naive(until):
+                until = timezone.make_aware(until)
+
+        since = None
+        if full_path:
+            if not os.path.exists(full_path):
+                raise CommandError(f"Sauvegarde introuvable: {full_path}")
+            since = self.backup_timestamp(full_path)
+
+        chain = incremental_backup.restore_chain(os.path.join(backup_dir, 'incremental'), since=since, until=until)
+        if not full_path and not chain:
+            raise CommandError(f"Aucune exportation de base dans {os.path.join(backup_dir, 'incremental')}")
+
+        if full_path:
+            self.log_info(f"Sauvegarde complète: {full_path} ({since.isoformat()})")
+        for path, manifest in chain:
+            self.log_info(
+                f"Exportation {manifest['kind']}: {os.path.basename(path)} "
+                f"jusqu'au {manifest['until']} ({manifest['rows']} ligne(s))"
+            )
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Mode simulation: la base de données ne sera pas modifiée"))
+            return
+
+        started = time.monotonic()
+        restored = 0
+        try:
+            if full_path:
+                self.restore_full(full_path)
+            for path, manifest in chain:
+                restored += incremental_backup.restore_export(path, manifest, batch_size=options['batch_size'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f"Erreur lors de la restauration: {str(e)}"))
+            raise CommandError(f"Échec de la restauration: {str(e)}")
+
+        duration = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Restauration terminée: {len(chain)} exportation(s) incrémentale(s), {restored} ligne(s)"
+        ))
+        self.logger.info(
+            f"Métriques de restauration: complète={'oui' if full_path else 'non'} "
+            f"exportations={len(chain)} lignes={restored} durée={duration:.1f}s"
+        )
+
+    def backup_timestamp(self, backup_path):
+        """Date d'une sauvegarde complète, lue dans son nom (base_AAAAMMJJ_HHMMSS.ext)"""
+        match = re.search(r'_(\d{8}_\d{6})(\.sql(\.gz|\.zst)?|\.dir)$', os.path.basename(backup_path.rstrip(os.sep)))
+        if not match:
+            raise CommandError(f"Date de sauvegarde introuvable dans le nom: {backup_path}")
+        return timezone.make_aware(datetime.strptime(match.group(1), '%Y%m%d_%H%M%S'))
+
+    def is_plain_sql(self, backup_path):
+        """Vrai pour une sauvegarde SQL (format plain), faux pour une archive pg_restore"""
+        if os.path.isdir(backup_path):
+            return False
+        if backup_path.endswith(('.sql.gz', '.sql.zst')):
+            return True
+        # Les archives au format custom commencent par la signature PGDMP
+        with open(backup_path, 'rb') as f:
+            return f.read(5) != b'PGDMP'
+
+    def restore_full(self, backup_path):
+        """Restaure une sauvegarde pg_dump (custom, directory ou plain)"""
+        db_settings = settings.DATABASES['default']
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db_settings['PASSWORD']
+        connection_args = [
+            '--host', db_settings['HOST'],
+            '--port', str(db_settings['PORT']),
+            '--username', db_settings['USER'],
+        ]
+
+        if self.is_plain_sql(backup_path):
+            cmd = ['psql', *connection_args, '--dbname', db_settings['NAME'], '--set', 'ON_ERROR_STOP=1', '--quiet']
+            self.log_info(f"Restauration SQL: {backup_path}")
+            self.run_psql(cmd, env, backup_path)
+            return
+
+        cmd = ['pg_restore', *connection_args, '--dbname', db_settings['NAME'], '--clean', '--if-exists', backup_path]
+        self.log_info(f"Restauration pg_restore: {backup_path}")
+        process = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        if process.returncode != 0:
+            raise CommandError(f"Erreur pg_restore: {process.stderr}")
+
+    def run_psql(self, cmd, env, backup_path):
+        """Envoie une sauvegarde SQL (éventuellement compressée) à psql au travers d'un tube
+
+        Les messages de psql sont écrits dans un fichier temporaire, lu à la fin :
+        un tube non lu bloquerait psql (et donc l'écriture du script) une fois plein.
+        """
+        with tempfile.TemporaryFile() as errors:
+            process = subprocess.Popen(cmd, env=env, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=errors)
+            decompressor = None
+            try:
+                if backup_path.endswith('.sql.zst'):
+                    decompressor = subprocess.Popen(['zstd', '-dc', backup_path], stdout=subprocess.PIPE)
+                    shutil.copyfileobj(decompressor.stdout, process.stdin)
+                else:
+                    opener = gzip.open if backup_path.endswith('.sql.gz') else open
+                    with opener(backup_path, 'rb') as source:
+                        shutil.copyfileobj(source, process.stdin)
+            except BrokenPipeError:
+                # psql s'est arrêté à la première erreur (ON_ERROR_STOP) : son message est lu ci-dessous
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                if decompressor is not None:
+                    decompressor.stdout.close()
+
+            if process.wait() != 0:
+                errors.seek(0)
+                raise CommandError(f"Erreur psql: {errors.read().decode(errors='replace')}")
+            if decompressor is not None and decompressor.wait() != 0:
+                raise CommandError(f"Échec de la décompression zstd: {backup_path}")
+
+    def log_info(self, message):
+        """Affiche un message d'information si le mode verbose est activé."""
+        if self.verbose:
+            self.stdout.write(message)
+        self.logger.info(message)
@@ -1,8 +1,12 @@
+from contextlib import ExitStack
 from django.utils import translation
 from django.utils.deprecation import MiddlewareMixin
 from django.conf import settings
+from django.db import connections
 import logging
 
+from .profiling import QueryBudgetExceeded, RequestProfile, install_serializer_timing, log_profile, profiling
+
 
 class UserLanguageMiddleware(MiddlewareMixin):
     """
@@ -40,3 +44,65 @@ class UserLanguageMiddleware(MiddlewareMixin):
             translation.activate(settings.LANGUAGE_CODE)
             request.LANGUAGE_CODE = settings.LANGUAGE_CODE
             logger.debug(f"Langue par défaut activée: {settings.LANGUAGE_CODE}")
+
+
+class RequestProfilingMiddleware:
+    """
+    Middleware de profilage : nombre de requêtes SQL, temps base de données,
+    temps Python et temps de sérialisation de chaque requête.
+
+    - REQUEST_PROFILING : journalise une ligne JSON par requête (logger core.profiling)
+    - REQUEST_PROFILING_HEADERS : ajoute les mesures aux en-têtes de réponse
+      (X-Query-Count, Server-Timing)
+    - QUERY_BUDGETS : nombre maximal de requêtes SQL par vue (nom d'URL) ; en mode
+      QUERY_BUDGET_STRICT (activé par les paramètres des tests) un dépassement lève QueryBudgetExceeded
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.REQUEST_PROFILING or settings.QUERY_BUDGET_STRICT
+        if self.enabled:
+            install_serializer_timing()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        with ExitStack() as stack:
+            stack.enter_context(profiling(profile))
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record_query))
+            response = self.get_response(request)
+        profile.finish()
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name or match._func_path) if match else None
+        record = profile.as_dict()
+        record.update({
+            'method': request.method,
+            'path': request.path,
+            'view': view,
+            'status': response.status_code,
+        })
+        budget = settings.QUERY_BUDGETS.get(view) if view else None
+        if budget is not None:
+            record['query_budget'] = budget
+
+        if settings.REQUEST_PROFILING:
+            log_profile(record)
+
+        if settings.REQUEST_PROFILING_HEADERS:
+            response['X-Query-Count'] = str(record['queries'])
+            response['Server-Timing'] = (
+                f"db;dur={record['db_ms']}, python;dur={record['python_ms']}, "
+                f"serializer;dur={record['serializer_ms']}, total;dur={record['total_ms']}"
+            )
+
+        if budget is not None and record['queries'] > budget:
+            message = f"La vue {view} a exécuté {record['queries']} requêtes SQL (budget: {budget})"
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logging.getLogger('core.profiling').warning(message)
+
+        return response
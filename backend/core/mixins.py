@@ -3,6 +3,7 @@
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 from users.models import User
+from .access import get_access_context
 
 
 class OrganizationPermissionMixin:
@@ -17,10 +18,7 @@ class OrganizationPermissionMixin:
         Returns:
             bool: True si l'utilisateur a accès, False sinon.
         """
-        user = self.context['request'].user
-        if user.is_super_admin:
-            return True
-        return user.organizations.filter(id=organization_id).exists()
+        return get_access_context(self.context['request']).has_organization(organization_id)
 
     def validate_organization(self, organization_id):
         """Valide l'accès à l'organisation.
@@ -45,7 +43,8 @@ class OrganizationPermissionMixin:
         Returns:
             bool: True si l'utilisateur a accès, False sinon.
         """
-        user = self.context['request'].user
+        access = get_access_context(self.context['request'])
+        user = access.user
 
         # Super admin peut accéder à tous les utilisateurs
         if user.is_super_admin:
@@ -56,11 +55,7 @@ class OrganizationPermissionMixin:
             return True
 
         # Vérifier si l'utilisateur et la cible sont dans la même organisation
-        user_orgs = set(user.organizations.values_list('id', flat=True))
-        target_orgs = set(target_user.organizations.values_list('id', flat=True))
-        common_orgs = user_orgs & target_orgs
-
-        if not common_orgs:
+        if not access.shares_organization(target_user):
             return False
 
         # Admin peut accéder à tous les utilisateurs de son organisation
@@ -126,12 +121,7 @@ class SitePermissionMixin:
         Returns:
             bool: True si l'utilisateur a accès, False sinon.
         """
-        user = self.context['request'].user
-        if user.is_super_admin:
-            return True
-        if site is None:
-            return False
-        return user.organizations.filter(id=site.organization.id).exists()
+        return get_access_context(self.context['request']).has_site(site)
 
     def validate_site(self, site):
         """Valide l'accès au site.
@@ -0,0 +1,120 @@
+"""Profilage des requêtes HTTP (nombre de requêtes SQL, temps base, Python et sérialisation)
+
+Le profil de la requête en cours est conservé dans une variable de contexte :
+le middleware RequestProfilingMiddleware le crée, le compteur de requêtes SQL
+(execute_wrapper) et la mesure de sérialisation l'alimentent.
+"""
+import contextvars
+import json
+import logging
+import math
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('core.profiling')
+
+_current_profile = contextvars.ContextVar('request_profile', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Levée lorsqu'une vue dépasse son budget de requêtes SQL en mode strict"""
+
+
+class RequestProfile:
+    """Mesures d'une requête HTTP"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serializer_seconds = 0.0
+        self.total_seconds = None
+        self._serializer_depth = 0
+
+    def record_query(self, execute, sql, params, many, context):
+        """execute_wrapper : compte les requêtes SQL et leur durée"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_seconds += time.perf_counter() - started
+
+    def finish(self):
+        self.total_seconds = time.perf_counter() - self.started
+
+    def as_dict(self):
+        total_ms = self.total_seconds * 1000
+        db_ms = self.db_seconds * 1000
+        return {
+            'queries': self.queries,
+            'total_ms': round(total_ms, 2),
+            'db_ms': round(db_ms, 2),
+            'python_ms': round(max(total_ms - db_ms, 0), 2),
+            'serializer_ms': round(self.serializer_seconds * 1000, 2),
+        }
+
+
+@contextmanager
+def profiling(profile):
+    """Rattache un profil au contexte courant le temps du bloc"""
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def install_serializer_timing():
+    """Mesure le temps passé dans BaseSerializer.data (sérialiseur le plus externe uniquement)
+
+    Les sérialiseurs imbriqués appellent to_representation directement : seul
+    l'accès à .data du sérialiseur de la vue est chronométré.
+    """
+    from rest_framework.serializers import BaseSerializer
+
+    original = BaseSerializer.data
+    if getattr(original.fget, 'profiled', False):
+        return
+
+    def data(serializer):
+        profile = _current_profile.get()
+        if profile is None:
+            return original.fget(serializer)
+        profile._serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return original.fget(serializer)
+        finally:
+            profile._serializer_depth -= 1
+            if profile._serializer_depth == 0:
+                profile.serializer_seconds += time.perf_counter() - started
+
+    data.profiled = True
+    BaseSerializer.data = property(data)
+
+
+def log_profile(record):
+    """Écrit une ligne de profil structurée (JSON) dans le journal core.profiling"""
+    logger.info(json.dumps(record, default=str, sort_keys=True))
+
+
+def parse_profile_line(line):
+    """Lit une ligne du journal de profilage (None si la ligne n'en est pas une)"""
+    start = line.find('{')
+    if start < 0:
+        return None
+    try:
+        record = json.loads(line[start:])
+    except ValueError:
+        return None
+    if not isinstance(record, dict) or 'view' not in record or 'total_ms' not in record:
+        return None
+    return record
+
+
+def percentile(values, fraction):
+    """Percentile par rang le plus proche (values non vide)"""
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
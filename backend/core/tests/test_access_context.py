@@ -0,0 +1,163 @@
+"""
+Tests pour le contexte d'accès chargé une fois par requête
+"""
+from django.test import TestCase, RequestFactory
+from django.contrib.auth import get_user_model
+from rest_framework.request import Request
+from rest_framework.test import APITestCase
+from rest_framework import status
+from core.access import get_access_context
+from sites.models import Site, SiteEmployee
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+def create_organization(name, siret):
+    return Organization.objects.create(
+        name=name,
+        address="123 Test Street",
+        postal_code="12345",
+        city="Test City",
+        country="France",
+        siret=siret
+    )
+
+
+def create_site(organization, nfc_id):
+    return Site.objects.create(
+        name=f"Site {nfc_id}",
+        address="123 Test Street",
+        postal_code="12345",
+        city="Test City",
+        country="France",
+        organization=organization,
+        nfc_id=nfc_id
+    )
+
+
+class AccessContextTestCase(TestCase):
+    """Tests pour AccessContext et son rattachement à la requête"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = create_organization("Test Organization", "12345678901234")
+        other_organization = create_organization("Other Organization", "98765432109876")
+        self.sites = [create_site(self.organization, f"TST-S000{i}") for i in range(1, 4)]
+        self.other_site = create_site(other_organization, "OTH-S0001")
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.employee.organizations.add(self.organization)
+        SiteEmployee.objects.create(site=self.sites[0], employee=self.employee)
+
+    def _request(self):
+        request = Request(RequestFactory().get('/'))
+        request.user = self.employee
+        return request
+
+    def test_memberships_are_loaded_once_per_request(self):
+        """Test que les vérifications répétées ne réinterrogent pas la base"""
+        request = self._request()
+        with self.assertNumQueries(2):
+            for _ in range(50):
+                access = get_access_context(request)
+                self.assertTrue(all(access.has_site(site) for site in self.sites))
+                self.assertFalse(access.has_site(self.other_site))
+                self.assertTrue(access.is_assigned_to_site(self.sites[0]))
+                self.assertFalse(access.is_assigned_to_site(self.sites[1]))
+
+        self.assertIs(get_access_context(request), get_access_context(request._request))
+        self.assertIsNot(get_access_context(self._request()), get_access_context(request))
+
+    def test_managed_sites_are_loaded_once_per_request(self):
+        """Test que les sites managés sont chargés une seule fois"""
+        manager = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="password",
+            role="MANAGER"
+        )
+        Site.objects.filter(id=self.sites[1].id).update(manager=manager)
+        request = Request(RequestFactory().get('/'))
+        request.user = manager
+
+        with self.assertNumQueries(1):
+            for _ in range(10):
+                self.assertEqual(get_access_context(request).managed_site_ids, {self.sites[1].id})
+
+    def test_organization_accepts_instance_or_identifier(self):
+        """Test que l'accès à une organisation se vérifie par instance ou par identifiant"""
+        access = get_access_context(self._request())
+        self.assertTrue(access.has_organization(self.organization))
+        self.assertTrue(access.has_organization(str(self.organization.id)))
+        self.assertFalse(access.has_organization(self.other_site.organization_id))
+        self.assertFalse(access.has_organization(None))
+
+
+class SiteDetailAccessTestCase(APITestCase):
+    """Tests pour les vérifications d'accès des vues s'appuyant sur le contexte"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = create_organization("Test Organization", "12345678901234")
+        self.site = create_site(organization, "TST-S0001")
+        self.unassigned_site = create_site(organization, "TST-S0002")
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.employee.organizations.add(organization)
+        SiteEmployee.objects.create(site=self.site, employee=self.employee)
+        self.client.force_authenticate(user=self.employee)
+
+    def test_employee_only_sees_assigned_sites(self):
+        """Test qu'un employé n'accède qu'aux sites auxquels il est affecté"""
+        response = self.client.get(f'/api/v1/sites/{self.site.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(f'/api/v1/sites/{self.unassigned_site.id}/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class OrganizationAccessTestCase(APITestCase):
+    """Tests pour les vues des organisations et des utilisateurs s'appuyant sur le contexte"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = create_organization("Test Organization", "12345678901234")
+        self.other_organization = create_organization("Other Organization", "98765432109876")
+        self.site = create_site(self.organization, "TST-S0001")
+        self.manager = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="password",
+            role="MANAGER"
+        )
+        self.manager.organizations.add(self.organization)
+        Site.objects.filter(id=self.site.id).update(manager=self.manager)
+        self.client.force_authenticate(user=self.manager)
+
+    def test_manager_only_sees_own_organizations(self):
+        """Test qu'un manager ne voit que ses organisations"""
+        response = self.client.get('/api/v1/organizations/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([organization['id'] for organization in results], [self.organization.id])
+
+        response = self.client.get(f'/api/v1/organizations/{self.organization.id}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(f'/api/v1/organizations/{self.other_organization.id}/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_sites_include_managed_sites(self):
+        """Test que les sites managés par l'utilisateur connecté sont listés"""
+        response = self.client.get(f'/api/v1/users/{self.manager.id}/sites/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual([site['id'] for site in results], [self.site.id])
@@ -2,13 +2,17 @@
 Tests pour vérifier que la commande backup_database fonctionne correctement
 """
 import os
+import gzip
+import hashlib
 import tempfile
 import shutil
+import time
 from unittest.mock import patch, MagicMock
-from io import StringIO
+from io import BytesIO, StringIO
 
 from django.test import TestCase
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.conf import settings
 
 from core.management.commands.backup_database import Command
@@ -122,3 +126,97 @@ class BackupDatabaseTestCase(TestCase):
         # Vérifier que le message de simulation est affiché
         output = out.getvalue()
         self.assertIn("Mode simulation", output)
+
+    @patch('core.management.commands.backup_database.subprocess.run')
+    def test_backup_directory_format_parallel(self, mock_run):
+        """Tester le format répertoire avec dump parallèle et sommes de contrôle"""
+        mock_process = MagicMock()
+        mock_process.returncode = 0
+        mock_process.stderr = ""
+
+        def side_effect(*args, **kwargs):
+            # Simuler pg_dump -Fd : un fichier par table dans le répertoire de sauvegarde
+            cmd = args[0]
+            backup_path = cmd[cmd.index('--file') + 1]
+            os.makedirs(backup_path)
+            for name in ('toc.dat', '3001.dat.gz'):
+                with open(os.path.join(backup_path, name), 'wb') as f:
+                    f.write(name.encode())
+            return mock_process
+
+        mock_run.side_effect = side_effect
+
+        out = StringIO()
+        call_command('backup_database', backup_dir=self.temp_dir, format='directory', jobs=4, stdout=out)
+
+        cmd_args = mock_run.call_args[0][0]
+        self.assertEqual(cmd_args[cmd_args.index('--format') + 1], 'd')
+        self.assertEqual(cmd_args[cmd_args.index('--jobs') + 1], '4')
+
+        backup_path = cmd_args[cmd_args.index('--file') + 1]
+        self.assertTrue(backup_path.endswith('.dir'))
+        with open(f"{backup_path}.sha256") as f:
+            lines = f.read().splitlines()
+        directory = os.path.basename(backup_path)
+        self.assertEqual(lines, [
+            f"{hashlib.sha256(b'3001.dat.gz').hexdigest()}  {directory}/3001.dat.gz",
+            f"{hashlib.sha256(b'toc.dat').hexdigest()}  {directory}/toc.dat",
+        ])
+
+    def test_jobs_require_directory_format(self):
+        """Tester que le dump parallèle est refusé hors format répertoire"""
+        with self.assertRaises(CommandError):
+            call_command('backup_database', backup_dir=self.temp_dir, jobs=4, stdout=StringIO())
+
+    @patch('core.management.commands.backup_database.shutil.which', return_value=None)
+    @patch('core.management.commands.backup_database.subprocess.Popen')
+    def test_backup_plain_format_streams_compressed(self, mock_popen, mock_which):
+        """Tester que le format plain est compressé à la volée avec sa somme de contrôle"""
+        sql = b"-- Contenu de test pour la sauvegarde\n" * 1000
+        mock_process = MagicMock()
+        mock_process.stdout = BytesIO(sql)
+        mock_process.wait.return_value = 0
+        mock_popen.return_value = mock_process
+
+        out = StringIO()
+        call_command('backup_database', backup_dir=self.temp_dir, format='plain', stdout=out)
+
+        cmd_args = mock_popen.call_args[0][0]
+        self.assertEqual(cmd_args[cmd_args.index('--format') + 1], 'p')
+        self.assertIn('--clean', cmd_args)
+        self.assertNotIn('--file', cmd_args)
+
+        archives = [name for name in os.listdir(self.temp_dir) if name.endswith('.sql.gz')]
+        self.assertEqual(len(archives), 1)
+        archive_path = os.path.join(self.temp_dir, archives[0])
+        with gzip.open(archive_path, 'rb') as f:
+            self.assertEqual(f.read(), sql)
+        with open(archive_path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        with open(f"{archive_path}.sha256") as f:
+            self.assertEqual(f.read(), f"{checksum}  {archives[0]}\n")
+
+    def test_cleanup_old_backups_all_formats(self):
+        """Tester que la rétention supprime les anciennes sauvegardes de tous les formats"""
+        old = time.time() - 40 * 86400
+        names = ['old.sql', 'old.sql.gz', 'old.sql.zst', 'old.dir', 'recent.sql.gz', 'notes.txt']
+        for name in names:
+            path = os.path.join(self.temp_dir, name)
+            if name.endswith('.dir'):
+                os.makedirs(path)
+                with open(os.path.join(path, 'toc.dat'), 'w') as f:
+                    f.write("toc")
+            else:
+                with open(path, 'w') as f:
+                    f.write("-- sauvegarde")
+            with open(f"{path}.sha256", 'w') as f:
+                f.write("0  checksum\n")
+            if name != 'recent.sql.gz':
+                os.utime(path, (old, old))
+
+        command = Command(stdout=StringIO())
+        command.cleanup_old_backups(self.temp_dir, 30)
+
+        self.assertEqual(sorted(os.listdir(self.temp_dir)), [
+            'notes.txt', 'notes.txt.sha256', 'recent.sql.gz', 'recent.sql.gz.sha256'
+        ])
@@ -0,0 +1,199 @@
+"""
+Tests pour les sauvegardes incrémentales (backup_database --incremental et restore_backup)
+"""
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+
+from alerts.tests.test_send_alerts import create_site
+from core import incremental_backup
+from core.management.commands.restore_backup import Command as RestoreCommand
+from sites.models import Schedule, ScheduleDetail
+from timesheets.models import Anomaly, Timesheet
+from timesheets.utils import anomaly_dedup
+
+User = get_user_model()
+
+
+class IncrementalBackupTestCase(TestCase):
+    """Tests pour l'exportation et la restauration des lignes modifiées"""
+
+    def setUp(self):
+        """Créer un répertoire temporaire et des données de test"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.incremental_dir = os.path.join(self.temp_dir, 'incremental')
+        self.exporter = incremental_backup.IncrementalExporter(self.incremental_dir, chunk_rows=2, overlap=0)
+
+        self.site = create_site()
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=self.schedule,
+            day_of_week=ScheduleDetail.DayOfWeek.MONDAY,
+            day_type=ScheduleDetail.DayType.AM,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0)
+        )
+        self.timesheets = [
+            Timesheet.objects.create(
+                employee=self.employee,
+                site=self.site,
+                timestamp=timezone.make_aware(datetime(2025, 3, 3, hour, 0)),
+                entry_type=entry_type
+            )
+            for hour, entry_type in (
+                (8, Timesheet.EntryType.ARRIVAL),
+                (12, Timesheet.EntryType.DEPARTURE),
+                (13, Timesheet.EntryType.ARRIVAL),
+            )
+        ]
+
+    def tearDown(self):
+        """Supprimer le répertoire temporaire"""
+        shutil.rmtree(self.temp_dir)
+
+    def _table(self, manifest, label):
+        return next(table for table in manifest['tables'] if table['model'] == label)
+
+    def _rows(self, name, manifest, label):
+        rows = []
+        for entry in self._table(manifest, label)['files']:
+            with gzip.open(os.path.join(self.incremental_dir, name, entry['name']), 'rb') as f:
+                rows.extend(json.loads(line) for line in f)
+        return rows
+
+    def test_command_writes_base_export(self):
+        """Test que la commande crée une exportation de base complète avec son manifeste"""
+        call_command('backup_database', backup_dir=self.temp_dir, incremental=True, chunk_rows=2, stdout=StringIO())
+
+        exports = incremental_backup.list_exports(self.incremental_dir)
+        self.assertEqual(len(exports), 1)
+        path, manifest = exports[0]
+        self.assertEqual(manifest['kind'], 'base')
+        self.assertIsNone(manifest['since'])
+
+        # Trois pointages répartis en fichiers de deux lignes, chacun avec sa somme de contrôle
+        timesheets = self._table(manifest, 'timesheets.timesheet')
+        self.assertEqual(timesheets['rows'], 3)
+        self.assertEqual([entry['rows'] for entry in timesheets['files']], [2, 1])
+        for entry in timesheets['files']:
+            self.assertEqual(len(entry['sha256']), 64)
+        self.assertFalse(os.path.exists(f'{path}.partial'))
+
+    def test_delta_contains_only_changed_rows(self):
+        """Test qu'une exportation delta ne contient que les lignes modifiées depuis la précédente"""
+        self.exporter.export('base')
+        timesheet = self.timesheets[1]
+        timesheet.scan_type = Timesheet.ScanType.NFC
+        timesheet.save()
+
+        manifest = self.exporter.export('delta')
+
+        self.assertEqual(manifest['kind'], 'delta')
+        self.assertEqual(manifest['previous'], 'base')
+        rows = self._rows('delta', manifest, 'timesheets.timesheet')
+        self.assertEqual([row['id'] for row in rows], [timesheet.id])
+        self.assertEqual(rows[0]['scan_type'], Timesheet.ScanType.NFC)
+        self.assertEqual(self._table(manifest, 'sites.schedule')['rows'], 0)
+        self.assertEqual(self._table(manifest, 'sites.site')['rows'], 0)
+
+    def test_restore_replays_base_and_deltas(self):
+        """Test que la restauration rejoue la base puis les deltas en conservant les dates"""
+        self.exporter.export('base')
+        original = Timesheet.objects.get(id=self.timesheets[0].id)
+
+        # Détails du planning remplacés après l'exportation de base
+        self.schedule.details.all().delete()
+        ScheduleDetail.objects.create(
+            schedule=self.schedule,
+            day_of_week=ScheduleDetail.DayOfWeek.TUESDAY,
+            day_type=ScheduleDetail.DayType.PM,
+            start_time_2=time(13, 0),
+            end_time_2=time(17, 0)
+        )
+        self.schedule.save()
+        self.exporter.export('delta')
+
+        # Perte de données après la dernière exportation
+        Timesheet.objects.all().delete()
+        ScheduleDetail.objects.all().delete()
+
+        chain = incremental_backup.restore_chain(self.incremental_dir)
+        self.assertEqual([os.path.basename(path) for path, _ in chain], ['base', 'delta'])
+        out = StringIO()
+        call_command('restore_backup', backup_dir=self.temp_dir, batch_size=2, stdout=out)
+        self.assertIn("2 exportation(s)", out.getvalue())
+
+        restored = Timesheet.objects.get(id=original.id)
+        self.assertEqual(restored.created_at, original.created_at)
+        self.assertEqual(restored.updated_at, original.updated_at)
+        self.assertEqual(Timesheet.objects.count(), 3)
+        self.assertEqual(
+            list(self.schedule.details.values_list('day_of_week', flat=True)),
+            [ScheduleDetail.DayOfWeek.TUESDAY]
+        )
+
+    def test_restore_replaces_recreated_anomaly(self):
+        """Test qu'une anomalie supprimée puis recréée sous la même clé est remplacée à la restauration"""
+        values = {
+            'employee': self.employee,
+            'site': self.site,
+            'date': date(2025, 3, 4),
+            'anomaly_type': Anomaly.AnomalyType.MISSING_ARRIVAL,
+            'dedup_subtype': anomaly_dedup.DAILY,
+        }
+        original = Anomaly.objects.create(**values)
+        self.exporter.export('base')
+        original.delete()
+        recreated = Anomaly.objects.create(**values)
+        self.exporter.export('delta')
+
+        for path, manifest in incremental_backup.restore_chain(self.incremental_dir):
+            incremental_backup.restore_export(path, manifest)
+
+        self.assertEqual(list(Anomaly.objects.filter(date=date(2025, 3, 4)).values_list('id', flat=True)), [recreated.id])
+
+    def test_restore_rejects_corrupted_file(self):
+        """Test qu'un fichier dont la somme de contrôle ne correspond pas n'est pas restauré"""
+        manifest = self.exporter.export('base')
+        entry = self._table(manifest, 'timesheets.timesheet')['files'][0]
+        with open(os.path.join(self.incremental_dir, 'base', entry['name']), 'ab') as f:
+            f.write(b'corruption')
+
+        with self.assertRaises(ValueError):
+            incremental_backup.restore_export(os.path.join(self.incremental_dir, 'base'), manifest)
+
+    def test_plain_restore_reads_errors_without_blocking(self):
+        """Test que les messages abondants de psql ne bloquent pas l'envoi du script SQL"""
+        backup_path = os.path.join(self.temp_dir, 'pg_pointage_20250301_000000.sql.gz')
+        with gzip.open(backup_path, 'wb') as f:
+            f.write(b"SELECT 1;\n" * 200000)
+        # psql simulé : écrit 1 Mo de messages avant de lire le script, puis échoue
+        fake_psql = [
+            sys.executable, '-c',
+            'import sys; sys.stderr.write("x" * 1000000); sys.stderr.flush(); sys.stdin.buffer.read(); sys.exit(3)'
+        ]
+
+        with self.assertRaises(CommandError) as error:
+            RestoreCommand().run_psql(fake_psql, os.environ.copy(), backup_path)
+        self.assertIn("x" * 100, str(error.exception))
@@ -0,0 +1,117 @@
+"""
+Tests pour le middleware de profilage des requêtes et les budgets de requêtes SQL
+"""
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from core.profiling import QueryBudgetExceeded, parse_profile_line, percentile
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class RequestProfilingMiddlewareTestCase(APITestCase):
+    """Tests pour RequestProfilingMiddleware"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=organization,
+            nfc_id="TST-S0001"
+        )
+        self.admin = User.objects.create_user(
+            username="admin",
+            email="admin@example.com",
+            password="password",
+            role="SUPER_ADMIN"
+        )
+        self.client.force_authenticate(user=self.admin)
+        self.url = reverse('site-statistics', kwargs={'pk': self.site.pk})
+
+    @override_settings(REQUEST_PROFILING=True, REQUEST_PROFILING_HEADERS=True)
+    def test_profile_is_logged_and_exposed_in_headers(self):
+        """Test que les mesures sont journalisées et ajoutées aux en-têtes"""
+        with self.assertLogs('core.profiling', level='INFO') as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        record = parse_profile_line(logs.output[0])
+        self.assertEqual(record['view'], 'site-statistics')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['query_budget'], 4)
+        self.assertEqual(response['X-Query-Count'], str(record['queries']))
+        self.assertGreater(record['queries'], 0)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+
+    @override_settings(QUERY_BUDGET_STRICT=True, QUERY_BUDGETS={'site-statistics': 1})
+    def test_budget_overrun_raises_in_strict_mode(self):
+        """Test qu'un dépassement de budget fait échouer la requête en mode strict"""
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(self.url)
+
+    @override_settings(REQUEST_PROFILING=True, QUERY_BUDGET_STRICT=False, QUERY_BUDGETS={'site-statistics': 1})
+    def test_budget_overrun_is_logged_outside_strict_mode(self):
+        """Test qu'un dépassement de budget est signalé sans échec hors mode strict"""
+        with self.assertLogs('core.profiling', level='WARNING') as logs:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(any('budget: 1' in line for line in logs.output))
+
+
+class ProfilingReportCommandTestCase(TestCase):
+    """Tests pour la commande profiling_report"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        handle, self.log_file = tempfile.mkstemp(suffix='.log')
+        with os.fdopen(handle, 'w') as log:
+            for queries, total_ms in [(2, 10.0), (3, 20.0), (8, 90.0)]:
+                record = {'view': 'anomaly-list', 'queries': queries, 'total_ms': total_ms,
+                          'db_ms': 1.0, 'serializer_ms': 2.0}
+                log.write(f"2026-01-05 10:00:00,000 {json.dumps(record)}\n")
+            log.write("ligne sans profil\n")
+        self.addCleanup(os.remove, self.log_file)
+
+    def test_report_summarizes_percentiles_and_overruns(self):
+        """Test que le rapport agrège les percentiles et les dépassements par vue"""
+        out = StringIO()
+        call_command('profiling_report', log_file=self.log_file, stdout=out)
+
+        row = next(line for line in out.getvalue().splitlines() if line.startswith('anomaly-list'))
+        self.assertEqual(row.split()[1:6], ['3', '20.0', '90.0', '3', '8'])
+        self.assertEqual(row.split()[-2:], ['5', '1'])
+
+    def test_missing_log_file_raises(self):
+        """Test qu'un journal absent est signalé par une erreur de commande"""
+        with self.assertRaises(CommandError):
+            call_command('profiling_report', log_file=self.log_file + '.absent', stdout=StringIO())
+
+    def test_percentile_nearest_rank(self):
+        """Test du percentile par rang le plus proche"""
+        self.assertEqual(percentile([5, 1, 3], 0.5), 3)
+        self.assertEqual(percentile([5, 1, 3], 0.95), 5)
+        self.assertEqual(percentile([7], 0.5), 7)
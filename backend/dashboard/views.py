@@ -4,10 +4,9 @@ from rest_framework.response import Response
 from django.db.models import Count
 from django.utils import timezone
 from datetime import timedelta
-from sites.models import Site
-from users.models import User
 from timesheets.models import Timesheet, Anomaly
 from timesheets.serializers import AnomalySerializer
+from organizations.utils import get_dashboard_statistics
 from drf_spectacular.utils import extend_schema
 import logging
 
@@ -27,45 +26,9 @@ class DashboardView(APIView):
         description="Obtenir les statistiques du tableau de bord"
     )
     def get(self, request):
-        user = request.user
-        
-        if user.is_super_admin:
-            total_employees = User.objects.filter(is_active=True).count()
-            total_sites = Site.objects.all().count()
-            active_sites = Site.objects.filter(is_active=True).count()
-            pending_anomalies = Anomaly.objects.filter(status='PENDING').count()
-        elif user.is_manager and user.organization:
-            total_employees = User.objects.filter(
-                organization=user.organization,
-                is_active=True
-            ).count()
-            total_sites = Site.objects.filter(
-                organization=user.organization
-            ).count()
-            active_sites = Site.objects.filter(
-                organization=user.organization,
-                is_active=True
-            ).count()
-            pending_anomalies = Anomaly.objects.filter(
-                site__organization=user.organization,
-                status='PENDING'
-            ).count()
-        else:
-            total_employees = 1
-            total_sites = user.assigned_sites.count()
-            active_sites = user.assigned_sites.filter(is_active=True).count()
-            pending_anomalies = Anomaly.objects.filter(
-                employee=user,
-                status='PENDING'
-            ).count()
-        
-        stats = {
-            'total_employees': total_employees,
-            'total_sites': total_sites,
-            'active_sites': active_sites,
-            'pending_anomalies': pending_anomalies
-        }
-        
+        # Compteurs calculés par agrégation conditionnelle et mis en cache par périmètre
+        stats = get_dashboard_statistics(request.user)
+
         serializer = DashboardStatsSerializer(stats)
         return Response(serializer.data)
 
@@ -98,6 +61,6 @@ class RecentAnomaliesView(APIView):
             )
         
         # Limiter à 10 anomalies
-        anomalies = anomalies.order_by('-created_at')[:10]
+        anomalies = AnomalySerializer.setup_eager_loading(anomalies).order_by('-created_at')[:10]
         serializer = AnomalySerializer(anomalies, many=True)
         return Response(serializer.data) 
\ No newline at end of file
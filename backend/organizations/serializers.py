@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Organization
 from core.mixins import RolePermissionMixin
+from core.access import get_access_context
 from users.models import User
 
 class OrganizationSerializer(serializers.ModelSerializer, RolePermissionMixin):
@@ -23,7 +24,7 @@ class OrganizationSerializer(serializers.ModelSerializer, RolePermissionMixin):
                 raise serializers.ValidationError("Seul un super admin peut créer une organisation")
 
             # Modification : vérifier si l'utilisateur est admin de cette organisation
-            if user.is_admin and not user.organizations.filter(id=self.instance.id).exists():
+            if user.is_admin and not get_access_context(self.context['request']).has_organization(self.instance):
                 raise serializers.ValidationError("Vous n'avez pas les droits pour modifier cette organisation")
             elif not user.is_admin:
                 raise serializers.ValidationError("Vous n'avez pas les droits pour modifier une organisation")
@@ -53,7 +54,7 @@ class OrganizationSerializer(serializers.ModelSerializer, RolePermissionMixin):
             user = self.context['request'].user
             if user.is_super_admin:
                 instance.users.set(users)
-            elif user.is_admin and instance in user.organizations.all():
+            elif user.is_admin and get_access_context(self.context['request']).has_organization(instance):
                 # Admin peut seulement modifier les utilisateurs de son organisation
                 current_users = set(instance.users.values_list('id', flat=True))
                 new_users = set(users)
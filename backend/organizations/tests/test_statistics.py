@@ -0,0 +1,150 @@
+"""
+Tests pour les statistiques des organisations et du tableau de bord (agrégation et cache)
+"""
+from datetime import date
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from timesheets.models import Anomaly
+from timesheets.utils import daily_attendance
+from sites.models import Site, SiteEmployee
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class OrganizationStatisticsTestCase(APITestCase):
+    """Tests pour les compteurs calculés en une passe par table et leur invalidation"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        Site.objects.create(
+            name="Inactive Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0002",
+            is_active=False
+        )
+        self.manager = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="password",
+            role="MANAGER"
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.manager.organizations.add(self.organization)
+        self.employee.organizations.add(self.organization)
+        SiteEmployee.objects.create(site=self.site, employee=self.employee)
+
+        for anomaly_status in (Anomaly.AnomalyStatus.PENDING, Anomaly.AnomalyStatus.RESOLVED):
+            Anomaly.objects.create(
+                employee=self.employee,
+                site=self.site,
+                date=date(2025, 3, 3),
+                anomaly_type=Anomaly.AnomalyType.OTHER,
+                status=anomaly_status
+            )
+        self.url = f'/api/v1/organizations/{self.organization.id}/statistics/'
+
+    def test_statistics_are_cached_until_an_anomaly_changes(self):
+        """Test que les statistiques sont servies depuis le cache puis recalculées après une anomalie"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'total_employees': 2,
+            'total_sites': 2,
+            'active_sites': 1,
+            'total_anomalies': 2,
+            'pending_anomalies': 1,
+        })
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertFalse(any('timesheets_anomaly' in query['sql'] for query in queries.captured_queries))
+
+        Anomaly.objects.create(
+            employee=self.employee,
+            site=self.site,
+            date=date(2025, 3, 4),
+            anomaly_type=Anomaly.AnomalyType.OTHER
+        )
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total_anomalies'], 3)
+        self.assertEqual(response.data['pending_anomalies'], 2)
+
+    def test_batch_invalidation_reads_sites_once(self):
+        """Test qu'une suppression groupée d'anomalies n'invalide qu'une fois, sans requête par ligne"""
+        self.client.force_authenticate(user=self.manager)
+        self.client.get(self.url)
+        for day in range(4, 9):
+            Anomaly.objects.create(
+                employee=self.employee,
+                site=self.site,
+                date=date(2025, 3, day),
+                anomaly_type=Anomaly.AnomalyType.OTHER
+            )
+
+        with CaptureQueriesContext(connection) as queries:
+            with daily_attendance.deferred_recompute():
+                Anomaly.objects.filter(date__gte=date(2025, 3, 4)).delete()
+        site_queries = [
+            query for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "sites_site"' in query['sql']
+        ]
+        self.assertEqual(len(site_queries), 1)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['total_anomalies'], 2)
+
+    def test_dashboard_statistics_by_role(self):
+        """Test les compteurs du tableau de bord d'un manager et d'un employé"""
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/v1/dashboard/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total_employees'], 2)
+        self.assertEqual(response.data['active_sites'], 1)
+        self.assertEqual(response.data['pending_anomalies'], 1)
+
+        self.client.force_authenticate(user=self.employee)
+        response = self.client.get('/api/v1/dashboard/stats/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'total_employees': 1,
+            'total_sites': 1,
+            'active_sites': 1,
+            'pending_anomalies': 1,
+        })
+
+        self.employee.is_active = False
+        self.employee.save()
+        self.client.force_authenticate(user=self.manager)
+        response = self.client.get('/api/v1/dashboard/stats/')
+        self.assertEqual(response.data['total_employees'], 1)
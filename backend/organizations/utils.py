@@ -0,0 +1,207 @@
+"""Statistiques des organisations et du tableau de bord
+
+Les compteurs sont calculés par agrégation conditionnelle (une requête par table,
+chaque table n'étant lue qu'une fois) puis mis en cache via le cache Django.
+
+Les clés de cache sont versionnées par périmètre (toutes les organisations, une
+organisation, un employé) : les signaux des anomalies, sites et utilisateurs
+incrémentent la version des périmètres touchés (voir timesheets.signals), ce qui
+rend immédiatement obsolètes les statistiques calculées auparavant. Dans un bloc
+deferred_invalidation, les périmètres sont regroupés et chaque version n'est
+incrémentée qu'une fois à la sortie du bloc.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.apps import apps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+ALL_SCOPE = 'all'
+
+# Invalidations différées par thread (voir deferred_invalidation)
+_state = threading.local()
+
+
+def organization_scope(organization_id):
+    return f'org:{organization_id}'
+
+
+def employee_scope(employee_id):
+    return f'user:{employee_id}'
+
+
+def _version_key(scope):
+    return f'stats:version:{scope}'
+
+
+def _get_versions(scopes):
+    """Version courante de chaque périmètre (créée si absente)"""
+    keys = [_version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Une version horodatée évite de retrouver d'anciennes statistiques si la clé a été évincée
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_statistics(*scopes):
+    """Rend obsolètes les statistiques des périmètres indiqués (immédiat ou différé selon le contexte)"""
+    pending = getattr(_state, 'scopes', None)
+    if pending is not None:
+        pending.update(scopes)
+        return
+    _incr_versions(scopes)
+
+
+def invalidate_site_statistics(site_id, *scopes):
+    """Rend obsolètes les statistiques de l'organisation d'un site et des périmètres indiqués
+
+    Dans un bloc deferred_invalidation, les organisations des sites sont lues en
+    une seule requête à la sortie du bloc.
+    """
+    pending_sites = getattr(_state, 'site_ids', None)
+    if pending_sites is not None:
+        pending_sites.add(site_id)
+        invalidate_statistics(*scopes)
+        return
+    organization_ids = _site_organization_ids({site_id})
+    invalidate_statistics(*scopes, *[organization_scope(organization_id) for organization_id in organization_ids])
+
+
+def _site_organization_ids(site_ids):
+    Site = apps.get_model('sites', 'Site')
+    return set(Site.objects.filter(pk__in=site_ids).values_list('organization_id', flat=True))
+
+
+@contextmanager
+def deferred_invalidation():
+    """Regroupe les invalidations demandées dans le bloc et les applique une seule fois à la sortie
+
+    Les blocs imbriqués sont rattachés au bloc le plus externe.
+    """
+    if getattr(_state, 'scopes', None) is not None:
+        yield
+        return
+
+    _state.scopes, _state.site_ids = set(), set()
+    try:
+        yield
+    finally:
+        # Appliquées même en cas d'erreur : une invalidation de trop est sans conséquence
+        scopes, site_ids = _state.scopes, _state.site_ids
+        _state.scopes = _state.site_ids = None
+        if site_ids:
+            scopes.update(organization_scope(organization_id) for organization_id in _site_organization_ids(site_ids))
+        _incr_versions(scopes)
+
+
+def _incr_versions(scopes):
+    for scope in set(scopes):
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def _cached(name, scopes, compute):
+    """Retourne les statistiques en cache ou les calcule"""
+    versions = _get_versions(scopes)
+    key = f'stats:{name}:' + ':'.join(f'{scope}={version}' for scope, version in zip(scopes, versions))
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute()
+        cache.set(key, stats, settings.STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def _site_counters(sites):
+    return sites.aggregate(
+        total_sites=Count('id', distinct=True),
+        active_sites=Count('id', filter=Q(is_active=True), distinct=True)
+    )
+
+
+def _anomaly_counters(anomalies):
+    return anomalies.aggregate(
+        total_anomalies=Count('id'),
+        pending_anomalies=Count('id', filter=Q(status='PENDING'))
+    )
+
+
+def compute_organization_statistics(organization_ids=None, active_employees_only=False):
+    """Compteurs d'un ensemble d'organisations (None = toutes)
+
+    Returns:
+        dict: total_employees, total_sites, active_sites, total_anomalies, pending_anomalies
+    """
+    from sites.models import Site
+    from timesheets.models import Anomaly
+    from users.models import User
+
+    users = User.objects.all()
+    sites = Site.objects.all()
+    anomalies = Anomaly.objects.all()
+    if organization_ids is not None:
+        users = users.filter(organizations__id__in=organization_ids)
+        sites = sites.filter(organization_id__in=organization_ids)
+        anomalies = anomalies.filter(site__organization_id__in=organization_ids)
+    if active_employees_only:
+        users = users.filter(is_active=True)
+
+    stats = users.aggregate(total_employees=Count('id', distinct=True))
+    stats.update(_site_counters(sites))
+    stats.update(_anomaly_counters(anomalies))
+    return stats
+
+
+def compute_employee_statistics(employee):
+    """Compteurs du tableau de bord d'un employé (ses sites et ses anomalies)"""
+    from sites.models import Site
+    from timesheets.models import Anomaly
+
+    stats = {'total_employees': 1}
+    stats.update(_site_counters(Site.objects.filter(
+        site_employees__employee=employee,
+        site_employees__is_active=True
+    )))
+    stats.update(_anomaly_counters(Anomaly.objects.filter(employee=employee)))
+    return stats
+
+
+def get_organization_statistics(organization):
+    """Statistiques d'une organisation (vue des statistiques d'organisation)"""
+    return _cached(
+        'organization',
+        [organization_scope(organization.id)],
+        lambda: compute_organization_statistics([organization.id])
+    )
+
+
+def get_dashboard_statistics(user):
+    """Statistiques du tableau de bord selon le rôle de l'utilisateur"""
+    if user.is_super_admin:
+        return _cached(
+            'dashboard',
+            [ALL_SCOPE],
+            lambda: compute_organization_statistics(active_employees_only=True)
+        )
+    if user.is_manager:
+        organization_ids = sorted(user.organizations.values_list('id', flat=True))
+        if organization_ids:
+            return _cached(
+                'dashboard',
+                [organization_scope(organization_id) for organization_id in organization_ids],
+                lambda: compute_organization_statistics(organization_ids, active_employees_only=True)
+            )
+    return _cached(
+        'dashboard',
+        [employee_scope(user.id)],
+        lambda: compute_employee_statistics(user)
+    )
@@ -4,17 +4,20 @@ from rest_framework.decorators import api_view, permission_classes
 from django.db.models import Count, Q
 from .models import Organization
 from .serializers import OrganizationSerializer
+from .utils import get_organization_statistics
 from users.models import User
 from users.serializers import UserSerializer
 from sites.models import Site
 from sites.serializers import SiteSerializer
 from timesheets.models import Anomaly, Timesheet
 from timesheets.serializers import AnomalySerializer, TimesheetSerializer
+from timesheets.pagination import AnomalyCursorPagination
 from reports.models import Report
 from reports.serializers import ReportSerializer
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
+from core.access import get_access_context
 
 class OrganizationStatisticsSerializer(serializers.Serializer):
     total_employees = serializers.IntegerField()
@@ -36,7 +39,7 @@ class OrganizationListView(generics.ListCreateAPIView):
             return Organization.objects.all()
 
         # Les autres utilisateurs ne voient que leurs organisations
-        return user.organizations.all()
+        return Organization.objects.filter(id__in=get_access_context(self.request).organization_ids)
 
 class OrganizationDetailView(generics.RetrieveUpdateDestroyAPIView):
     """Vue pour afficher, modifier et supprimer une organisation"""
@@ -53,7 +56,7 @@ class OrganizationDetailView(generics.RetrieveUpdateDestroyAPIView):
             return obj
 
         # Les autres utilisateurs ne peuvent voir que leurs organisations
-        if not user.organizations.filter(id=obj.id).exists():
+        if not get_access_context(self.request).has_organization(obj):
             raise PermissionDenied("Vous n'avez pas accès à cette organisation")
 
         return obj
@@ -82,23 +85,8 @@ class OrganizationStatisticsView(generics.RetrieveAPIView):
     def get(self, request, *args, **kwargs):
         organization = self.get_object()
 
-        # Calculer les statistiques directement dans la vue
-        total_anomalies = Anomaly.objects.filter(
-            site__organization=organization
-        ).count()
-
-        pending_anomalies = Anomaly.objects.filter(
-            site__organization=organization,
-            status='PENDING'
-        ).count()
-
-        stats = {
-            'total_employees': User.objects.filter(organizations=organization).count(),
-            'total_sites': organization.sites.count(),
-            'active_sites': organization.sites.filter(is_active=True).count(),
-            'total_anomalies': total_anomalies,
-            'pending_anomalies': pending_anomalies
-        }
+        # Compteurs calculés par agrégation conditionnelle et mis en cache
+        stats = get_organization_statistics(organization)
 
         serializer = self.get_serializer(stats)
         return Response(serializer.data)
@@ -215,16 +203,16 @@ class OrganizationAnomaliesView(generics.ListAPIView):
     """Vue pour lister toutes les anomalies des sites d'une organisation"""
     serializer_class = AnomalySerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = None  # Désactiver la pagination pour cette vue
+    pagination_class = AnomalyCursorPagination
 
     def get_queryset(self):
         if getattr(self, 'swagger_fake_view', False):
             return Anomaly.objects.none()
 
         organization_pk = self.kwargs.get('pk')
-        return Anomaly.objects.filter(
+        return AnomalySerializer.setup_eager_loading(Anomaly.objects.filter(
             site__organization_id=organization_pk
-        ).order_by('-created_at')
+        ))
 
 class OrganizationReportsView(generics.ListAPIView):
     """Vue pour lister tous les rapports d'une organisation"""
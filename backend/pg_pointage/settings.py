@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -64,7 +65,7 @@ ROOT_URLCONF = 'pg_pointage.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -193,6 +194,61 @@ EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@planetegardiens.com')
 
+# Cache Django (mémoire locale par défaut ; un cache partagé, fichier ou autre, permet
+# aux invalidations des workers d'atteindre les processus web)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'pg-pointage'),
+    }
+}
+
+# Durée de conservation des statistiques du tableau de bord (invalidées par signaux)
+STATS_CACHE_TIMEOUT = int(os.getenv('STATS_CACHE_TIMEOUT', 300))
+
+# Cache de résolution des plannings (en mémoire, propre à chaque processus)
+SCHEDULE_CACHE_MAX_SIZE = int(os.getenv('SCHEDULE_CACHE_MAX_SIZE', 4096))
+SCHEDULE_CACHE_TTL = int(os.getenv('SCHEDULE_CACHE_TTL', 300))
+
+# Traitement asynchrone des anomalies : les pointages sont ajoutés à une file
+# consommée par la commande process_anomaly_queue au lieu d'être analysés pendant la requête
+TIMESHEET_ASYNC_PROCESSING = os.getenv('TIMESHEET_ASYNC_PROCESSING', 'False') == 'True'
+
+# Nombre maximal de pointages hors ligne acceptés par requête de synchronisation
+TIMESHEET_SYNC_MAX_BATCH_SIZE = int(os.getenv('TIMESHEET_SYNC_MAX_BATCH_SIZE', 500))
+
+# Nombre de lignes lues par aller-retour du curseur lors de la génération des rapports
+REPORT_CHUNK_SIZE = int(os.getenv('REPORT_CHUNK_SIZE', 2000))
+
+# Regroupement des alertes envoyées par send_alerts : les alertes d'un même destinataire,
+# site et type créées dans la même fenêtre (en secondes) sont envoyées en un seul email
+# récapitulatif à partir de ALERT_DIGEST_MIN_SIZE alertes. Une fenêtre de 0 désactive
+# le regroupement ; sinon une alerte attend la fin de sa fenêtre avant d'être envoyée.
+ALERT_DIGEST_WINDOW = int(os.getenv('ALERT_DIGEST_WINDOW', 300))
+ALERT_DIGEST_MIN_SIZE = int(os.getenv('ALERT_DIGEST_MIN_SIZE', 3))
+
+# Profilage des requêtes (core.middleware.RequestProfilingMiddleware) : une ligne JSON
+# par requête dans le journal core.profiling, résumée par la commande profiling_report
+REQUEST_PROFILING = os.getenv('REQUEST_PROFILING', 'False') == 'True'
+REQUEST_PROFILING_HEADERS = os.getenv('REQUEST_PROFILING_HEADERS', 'False') == 'True'
+REQUEST_PROFILING_LOG_FILE = os.getenv('REQUEST_PROFILING_LOG_FILE')
+
+# Nombre maximal de requêtes SQL par vue (nom d'URL). En mode strict (activé par les
+# paramètres des tests, pg_pointage.settings_test), un dépassement fait échouer la
+# requête ; sinon il est journalisé
+QUERY_BUDGETS = {
+    'anomaly-list': 5,
+    'organization-anomalies': 5,
+    'site-anomalies': 5,
+    'dashboard:dashboard-stats': 6,
+    'organization-statistics': 6,
+    'site-statistics': 4,
+    'user-statistics': 3,
+    'report-job': 6,
+    'report-download': 3,
+}
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+
 # drf-spectacular settings
 SPECTACULAR_SETTINGS = {
     'TITLE': 'PG Pointage API',
@@ -273,3 +329,19 @@ if not DEBUG:
         'propagate': True,
     }
 
+if REQUEST_PROFILING_LOG_FILE:
+    LOGGING['formatters']['profiling'] = {
+        'format': '{asctime} {message}',
+        'style': '{',
+    }
+    LOGGING['handlers']['profiling'] = {
+        'level': 'INFO',
+        'class': 'logging.handlers.WatchedFileHandler',
+        'filename': REQUEST_PROFILING_LOG_FILE,
+        'formatter': 'profiling',
+    }
+    LOGGING['loggers']['core.profiling'] = {
+        'handlers': ['profiling'],
+        'level': 'INFO',
+        'propagate': False,
+    }
@@ -0,0 +1,5 @@
+"""Paramètres utilisés par la suite de tests (pytest.ini)"""
+from .settings import *  # noqa: F401,F403
+
+# Un dépassement du budget de requêtes d'une vue fait échouer la requête
+QUERY_BUDGET_STRICT = True
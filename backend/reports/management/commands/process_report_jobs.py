@@ -0,0 +1,196 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from reports.models import ReportJob
+from reports.utils.report_builder import ReportBuilder, ReportCancelled
+
+
+class Command(BaseCommand):
+    help = '''
+    Traite la file des rapports à générer. Chaque tâche est réservée par un seul worker,
+    sa progression (pourcentage, lignes écrites) est enregistrée au fil de l'écriture et
+    une annulation demandée via l'API interrompt la génération au lot de lignes suivant.
+
+    Exemples d'utilisation :
+
+    # Générer les rapports en attente puis s'arrêter
+    python manage.py process_report_jobs
+
+    # Tourner en continu (worker)
+    python manage.py process_report_jobs --loop
+
+    # Exécuter en mode simulation sans modifier la base de données
+    python manage.py process_report_jobs --dry-run
+
+    # Afficher des informations détaillées pendant l'exécution
+    python manage.py process_report_jobs --verbose
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.verbose = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Tourner en continu au lieu de s\'arrêter quand la file est vide'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5.0,
+            help='Attente en secondes entre deux passages quand la file est vide (par défaut: 5)'
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            help='Nombre maximal de rapports à générer avant de s\'arrêter (par défaut: illimité)'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=3,
+            help='Nombre maximal de reprises d\'une tâche abandonnée par un worker (par défaut: 3)'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=900,
+            help='Délai en secondes sans activité après lequel une tâche en cours est considérée abandonnée (par défaut: 900)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Exécuter en mode simulation sans modifier la base de données'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Afficher des informations détaillées pendant l\'exécution'
+        )
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose']
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Mode simulation activé - aucune modification ne sera effectuée"))
+            queued = ReportJob.objects.filter(status=ReportJob.JobStatus.QUEUED).count()
+            self.stdout.write(f"{queued} rapport(s) en attente de génération")
+            return
+
+        counts = {ReportJob.JobStatus.DONE: 0, ReportJob.JobStatus.FAILED: 0, ReportJob.JobStatus.CANCELLED: 0}
+        try:
+            while options['max_jobs'] is None or sum(counts.values()) < options['max_jobs']:
+                self._release_stale_jobs(options['stale_after'], options['max_attempts'])
+                job = self._claim_job()
+                if job is not None:
+                    counts[self._process_job(job)] += 1
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interruption demandée, arrêt du worker"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Traitement terminé: {counts[ReportJob.JobStatus.DONE]} rapport(s) généré(s), "
+            f"{counts[ReportJob.JobStatus.FAILED]} échec(s), {counts[ReportJob.JobStatus.CANCELLED]} annulation(s)"
+        ))
+
+    def _claim_job(self):
+        """Réserve la plus ancienne tâche en attente (sans bloquer les autres workers)"""
+        now = timezone.now()
+        with transaction.atomic():
+            job = ReportJob.objects.select_for_update(skip_locked=True).select_related('report').filter(
+                status=ReportJob.JobStatus.QUEUED
+            ).order_by('enqueued_at').first()
+            if job is None:
+                return None
+            ReportJob.objects.filter(id=job.id).update(
+                status=ReportJob.JobStatus.RUNNING,
+                started_at=now,
+                heartbeat_at=now,
+                attempts=F('attempts') + 1
+            )
+        job.status = ReportJob.JobStatus.RUNNING
+        job.started_at = now
+        job.heartbeat_at = now
+        job.attempts += 1
+        return job
+
+    def _process_job(self, job):
+        """Génère le fichier d'un rapport et enregistre le résultat de la tâche
+
+        Returns:
+            str: statut final de la tâche
+        """
+        running_job = ReportJob.objects.filter(id=job.id, status=ReportJob.JobStatus.RUNNING)
+
+        def on_progress(rows_written, total_rows):
+            # Appelé une fois par lot de lignes : enregistre la progression et vérifie l'annulation
+            progress = min(int(rows_written * 100 / total_rows), 99) if total_rows else 0
+            running_job.update(progress=progress, row_count=rows_written, heartbeat_at=timezone.now())
+            if running_job.filter(cancel_requested=True).exists():
+                raise ReportCancelled()
+            if self.verbose:
+                self.stdout.write(f"Rapport {job.report_id}: {rows_written}/{total_rows} ligne(s) ({progress}%)")
+
+        try:
+            row_count = ReportBuilder(job.report).build(progress_callback=on_progress)
+        except ReportCancelled:
+            running_job.update(status=ReportJob.JobStatus.CANCELLED, finished_at=timezone.now())
+            self.stdout.write(self.style.WARNING(f"Génération du rapport {job.report_id} annulée"))
+            return ReportJob.JobStatus.CANCELLED
+        except Exception as e:
+            self.logger.error(f"Erreur lors de la génération du rapport {job.report_id}: {str(e)}", exc_info=True)
+            running_job.update(status=ReportJob.JobStatus.FAILED, finished_at=timezone.now(), error=str(e))
+            self.stdout.write(self.style.ERROR(f"Génération du rapport {job.report_id} en échec: {str(e)}"))
+            return ReportJob.JobStatus.FAILED
+
+        byte_size = job.report.file.size
+        running_job.update(
+            status=ReportJob.JobStatus.DONE,
+            progress=100,
+            row_count=row_count,
+            byte_size=byte_size,
+            finished_at=timezone.now(),
+            error=''
+        )
+        if self.verbose:
+            self.stdout.write(f"Rapport {job.report_id} généré: {row_count} ligne(s), {byte_size} octet(s)")
+        return ReportJob.JobStatus.DONE
+
+    def _release_stale_jobs(self, stale_after, max_attempts):
+        """Remet dans la file les tâches sans activité (worker interrompu), ou les passe en échec"""
+        stale = ReportJob.objects.filter(
+            status=ReportJob.JobStatus.RUNNING,
+            heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_after)
+        )
+        stale.filter(cancel_requested=True).update(
+            status=ReportJob.JobStatus.CANCELLED,
+            finished_at=timezone.now()
+        )
+        failed = stale.filter(attempts__gte=max_attempts).update(
+            status=ReportJob.JobStatus.FAILED,
+            finished_at=timezone.now(),
+            error='Génération abandonnée par le worker'
+        )
+        released = stale.filter(attempts__lt=max_attempts).update(
+            status=ReportJob.JobStatus.QUEUED,
+            progress=0,
+            row_count=0
+        )
+        if released or failed:
+            self.stdout.write(self.style.WARNING(
+                f"{released} tâche(s) abandonnée(s) remise(s) dans la file, {failed} passée(s) en échec"
+            ))
+        return released
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:11
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_alter_report_organization'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('QUEUED', 'En attente'), ('RUNNING', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échec'), ('CANCELLED', 'Annulé')], default='QUEUED', max_length=20, verbose_name='statut')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='progression (%)')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='annulation demandée')),
+                ('row_count', models.PositiveIntegerField(default=0, verbose_name='nombre de lignes')),
+                ('byte_size', models.PositiveBigIntegerField(default=0, verbose_name='taille du fichier (octets)')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='tentatives')),
+                ('enqueued_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='ajouté à la file le')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='démarré le')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='dernière activité le')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='terminé le')),
+                ('error', models.TextField(blank=True, verbose_name='erreur')),
+                ('report', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='job', to='reports.report', verbose_name='rapport')),
+            ],
+            options={
+                'verbose_name': 'tâche de génération de rapport',
+                'verbose_name_plural': 'tâches de génération de rapport',
+                'ordering': ['enqueued_at'],
+                'indexes': [models.Index(fields=['status', 'enqueued_at'], name='reports_rep_status_725778_idx')],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 class Report(models.Model):
@@ -67,3 +68,87 @@ class Report(models.Model):
     def __str__(self):
         return f"{self.get_report_type_display()} - {self.created_at.strftime('%d/%m/%Y')}"
 
+
+class ReportJob(models.Model):
+    """Tâche de génération du fichier d'un rapport, traitée par la commande process_report_jobs"""
+
+    class JobStatus(models.TextChoices):
+        QUEUED = 'QUEUED', _('En attente')
+        RUNNING = 'RUNNING', _('En cours')
+        DONE = 'DONE', _('Terminé')
+        FAILED = 'FAILED', _('Échec')
+        CANCELLED = 'CANCELLED', _('Annulé')
+
+    ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+
+    report = models.OneToOneField(
+        Report,
+        on_delete=models.CASCADE,
+        related_name='job',
+        verbose_name=_('rapport')
+    )
+    status = models.CharField(
+        _('statut'),
+        max_length=20,
+        choices=JobStatus.choices,
+        default=JobStatus.QUEUED
+    )
+    progress = models.PositiveSmallIntegerField(_('progression (%)'), default=0)
+    cancel_requested = models.BooleanField(_('annulation demandée'), default=False)
+    row_count = models.PositiveIntegerField(_('nombre de lignes'), default=0)
+    byte_size = models.PositiveBigIntegerField(_('taille du fichier (octets)'), default=0)
+    attempts = models.PositiveIntegerField(_('tentatives'), default=0)
+    enqueued_at = models.DateTimeField(_('ajouté à la file le'), default=timezone.now)
+    started_at = models.DateTimeField(_('démarré le'), null=True, blank=True)
+    heartbeat_at = models.DateTimeField(_('dernière activité le'), null=True, blank=True)
+    finished_at = models.DateTimeField(_('terminé le'), null=True, blank=True)
+    error = models.TextField(_('erreur'), blank=True)
+
+    class Meta:
+        verbose_name = _('tâche de génération de rapport')
+        verbose_name_plural = _('tâches de génération de rapport')
+        ordering = ['enqueued_at']
+        indexes = [
+            models.Index(fields=['status', 'enqueued_at']),
+        ]
+
+    def __str__(self):
+        return f"Génération du rapport {self.report_id} - {self.get_status_display()}"
+
+    @classmethod
+    def enqueue(cls, report):
+        """Ajoute (ou remet) la génération d'un rapport dans la file"""
+        job, created = cls.objects.get_or_create(report=report)
+        if not created and job.status not in cls.ACTIVE_STATUSES:
+            job.status = cls.JobStatus.QUEUED
+            job.progress = 0
+            job.cancel_requested = False
+            job.row_count = 0
+            job.byte_size = 0
+            job.attempts = 0
+            job.enqueued_at = timezone.now()
+            job.started_at = None
+            job.heartbeat_at = None
+            job.finished_at = None
+            job.error = ''
+            job.save()
+        return job
+
+    def cancel(self):
+        """Annule la tâche : immédiatement si elle est en attente, sinon au prochain lot de lignes
+
+        Returns:
+            bool: False si la tâche est déjà terminée
+        """
+        now = timezone.now()
+        if ReportJob.objects.filter(id=self.id, status=self.JobStatus.QUEUED).update(
+                status=self.JobStatus.CANCELLED, cancel_requested=True, finished_at=now):
+            self.status = self.JobStatus.CANCELLED
+            self.cancel_requested = True
+            self.finished_at = now
+            return True
+        if ReportJob.objects.filter(id=self.id, status=self.JobStatus.RUNNING).update(cancel_requested=True):
+            self.cancel_requested = True
+            return True
+        self.refresh_from_db()
+        return False
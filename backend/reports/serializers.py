@@ -1,10 +1,23 @@
 from rest_framework import serializers
-from .models import Report
+from .models import Report, ReportJob
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from core.mixins import OrganizationPermissionMixin, RolePermissionMixin, SitePermissionMixin
 from users.models import User
 
+class ReportJobSerializer(serializers.ModelSerializer):
+    """Serializer pour l'état de génération d'un rapport"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = ReportJob
+        fields = [
+            'status', 'status_display', 'progress', 'cancel_requested', 'row_count',
+            'byte_size', 'enqueued_at', 'started_at', 'finished_at', 'error'
+        ]
+        read_only_fields = fields
+
+
 class ReportSerializer(serializers.ModelSerializer, OrganizationPermissionMixin, RolePermissionMixin, SitePermissionMixin):
     """Serializer pour les rapports"""
     organization_name = serializers.SerializerMethodField()
@@ -13,6 +26,7 @@ class ReportSerializer(serializers.ModelSerializer, OrganizationPermissionMixin,
     report_format_display = serializers.CharField(source='get_report_format_display', read_only=True)
     created_by_name = serializers.SerializerMethodField()
     period = serializers.SerializerMethodField()
+    job = ReportJobSerializer(read_only=True)
     
     class Meta:
         model = Report
@@ -20,7 +34,7 @@ class ReportSerializer(serializers.ModelSerializer, OrganizationPermissionMixin,
             'id', 'organization', 'organization_name', 'site', 'site_name',
             'report_type', 'report_type_display', 'report_format',
             'report_format_display', 'start_date', 'end_date', 'file',
-            'created_by', 'created_by_name', 'created_at', 'period'
+            'created_by', 'created_by_name', 'created_at', 'period', 'job'
         ]
         read_only_fields = ['created_at', 'file', 'created_by']
     
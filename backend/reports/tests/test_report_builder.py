@@ -0,0 +1,171 @@
+"""
+Tests pour la génération des fichiers de rapports
+"""
+import csv
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import date, datetime, time
+from django.test import override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from reports.models import Report
+from reports.utils.report_builder import ReportBuilder
+from timesheets.models import DailyAttendance
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class ReportBuilderTestCase(APITestCase):
+    """Tests pour le rendu CSV / Excel / PDF des rapports"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.other_organization = Organization.objects.create(
+            name="Other Organization",
+            address="456 Other Street",
+            postal_code="54321",
+            city="Other City",
+            country="France",
+            siret="43210987654321"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        self.other_site = Site.objects.create(
+            name="Other Site",
+            address="456 Other Street",
+            postal_code="54321",
+            city="Other City",
+            country="France",
+            organization=self.other_organization,
+            nfc_id="TST-S0002"
+        )
+        self.manager = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="password",
+            role="MANAGER"
+        )
+        self.manager.organizations.add(self.organization)
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            first_name="Jean",
+            last_name="Dupont",
+            role="EMPLOYEE"
+        )
+
+        # Trois jours en mars (deux semaines différentes) et un jour hors organisation
+        for day, worked, late in ((date(2025, 3, 6), 480, 10), (date(2025, 3, 7), 450, 0), (date(2025, 3, 10), 420, 5)):
+            DailyAttendance.objects.create(
+                employee=self.employee,
+                site=self.site,
+                date=day,
+                first_arrival=timezone.make_aware(datetime.combine(day, time(8, 0))),
+                last_departure=timezone.make_aware(datetime.combine(day, time(17, 0))),
+                worked_minutes=worked,
+                late_minutes=late,
+                scan_count=4,
+                anomaly_count=1 if late else 0
+            )
+        DailyAttendance.objects.create(
+            employee=self.employee,
+            site=self.other_site,
+            date=date(2025, 3, 6),
+            worked_minutes=60,
+            scan_count=2
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _report(self, report_type, report_format, **kwargs):
+        return Report.objects.create(
+            name="Présences",
+            organization=self.organization,
+            report_type=report_type,
+            report_format=report_format,
+            start_date=date(2025, 3, 1),
+            end_date=date(2025, 3, 31),
+            **kwargs
+        )
+
+    def _csv_rows(self, report):
+        with report.file.open('rb') as fh:
+            return list(csv.reader(io.StringIO(fh.read().decode('utf-8-sig')), delimiter=';'))
+
+    def test_daily_csv_streams_one_row_per_day(self):
+        """Test qu'un rapport journalier CSV contient une ligne par synthèse de l'organisation"""
+        report = self._report(Report.ReportType.DAILY, Report.ReportFormat.CSV)
+        row_count = ReportBuilder(report, chunk_size=1).build()
+
+        rows = self._csv_rows(report)
+        self.assertEqual(row_count, 3)
+        self.assertEqual(rows[0][0], 'Date')
+        self.assertEqual([row[0] for row in rows[1:]], ['06/03/2025', '07/03/2025', '10/03/2025'])
+        self.assertEqual(rows[1][1:4], ['Test Site', self.employee.employee_id, 'Jean Dupont'])
+        self.assertEqual(rows[1][6], '8.0')
+
+    def test_times_are_written_in_local_time(self):
+        """Test que les heures d'arrivée et de départ sont écrites dans le fuseau local"""
+        report = self._report(Report.ReportType.DAILY, Report.ReportFormat.CSV)
+        ReportBuilder(report).build()
+
+        rows = self._csv_rows(report)
+        self.assertIn('06/03/2025 08:00', rows[1])
+        self.assertIn('06/03/2025 17:00', rows[1])
+
+    def test_weekly_and_monthly_rows_are_aggregated(self):
+        """Test l'agrégation par semaine et par mois"""
+        weekly = self._report(Report.ReportType.WEEKLY, Report.ReportFormat.CSV)
+        ReportBuilder(weekly).build()
+        rows = self._csv_rows(weekly)
+        self.assertEqual([(row[0], row[4], row[5]) for row in rows[1:]],
+                         [('03/03/2025', '2', '15.5'), ('10/03/2025', '1', '7.0')])
+
+        monthly = self._report(Report.ReportType.MONTHLY, Report.ReportFormat.CSV, site=self.site)
+        ReportBuilder(monthly).build()
+        rows = self._csv_rows(monthly)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][4:], ['3', '22.5', '15', '0', '12', '2'])
+
+    def test_excel_and_pdf_files(self):
+        """Test que les fichiers Excel et PDF sont valides"""
+        excel = self._report(Report.ReportType.DAILY, Report.ReportFormat.EXCEL)
+        ReportBuilder(excel).build()
+        self.assertTrue(excel.file.name.endswith('.xlsx'))
+        with excel.file.open('rb') as fh, zipfile.ZipFile(fh) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertEqual(sheet.count('<row '), 4)
+        self.assertIn('Jean Dupont', sheet)
+
+        pdf = self._report(Report.ReportType.MONTHLY, Report.ReportFormat.PDF)
+        ReportBuilder(pdf).build()
+        with pdf.file.open('rb') as fh:
+            self.assertTrue(fh.read(5).startswith(b'%PDF'))
@@ -0,0 +1,152 @@
+"""
+Tests pour la file de génération des rapports (process_report_jobs)
+"""
+import shutil
+import tempfile
+from datetime import date
+from io import StringIO
+from django.core.management import call_command
+from django.test import override_settings
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from reports.models import Report, ReportJob
+from reports.management.commands.process_report_jobs import Command as ProcessReportJobsCommand
+from timesheets.models import DailyAttendance
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class ReportJobTestCase(APITestCase):
+    """Tests pour les états, la progression et l'annulation des générations"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root, REPORT_CHUNK_SIZE=2)
+        self.settings_override.enable()
+
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        self.manager = User.objects.create_user(
+            username="manager",
+            email="manager@example.com",
+            password="password",
+            role="MANAGER"
+        )
+        self.manager.organizations.add(self.organization)
+        employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        for day in range(1, 6):
+            DailyAttendance.objects.create(
+                employee=employee,
+                site=self.site,
+                date=date(2025, 3, day),
+                worked_minutes=420,
+                scan_count=2
+            )
+        self.client.force_authenticate(user=self.manager)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def _generate(self):
+        response = self.client.post('/api/v1/reports/generate/', {
+            'name': 'Présences',
+            'report_type': 'DAILY',
+            'report_format': 'CSV',
+            'start_date': '2025-03-01',
+            'end_date': '2025-03-31'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['job']['status'], ReportJob.JobStatus.QUEUED)
+        return Report.objects.get(id=response.data['id'])
+
+    def test_generation_is_queued_then_processed(self):
+        """Test que la requête ne fait qu'ajouter la tâche, générée ensuite par le worker"""
+        report = self._generate()
+        self.assertFalse(report.file)
+
+        response = self.client.get(f'/api/v1/reports/{report.id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data['job']['progress'], 0)
+
+        out = StringIO()
+        call_command('process_report_jobs', stdout=out)
+        self.assertIn("1 rapport(s) généré(s)", out.getvalue())
+
+        job = ReportJob.objects.get(report=report)
+        report.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.JobStatus.DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.row_count, 5)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(job.byte_size, report.file.size)
+        self.assertGreater(job.byte_size, 0)
+
+        response = self.client.get(f'/api/v1/reports/{report.id}/job/')
+        self.assertEqual(response.data['status'], ReportJob.JobStatus.DONE)
+
+        response = self.client.get(f'/api/v1/reports/{report.id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        self.assertEqual(len(content.strip().splitlines()), 6)
+
+    def test_cancel_queued_job(self):
+        """Test qu'une tâche en attente annulée n'est jamais générée"""
+        report = self._generate()
+
+        response = self.client.post(f'/api/v1/reports/{report.id}/job/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], ReportJob.JobStatus.CANCELLED)
+
+        call_command('process_report_jobs', stdout=StringIO())
+        report.refresh_from_db()
+        self.assertFalse(report.file)
+
+        response = self.client.post(f'/api/v1/reports/{report.id}/job/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cancel_running_job_stops_at_next_chunk(self):
+        """Test qu'une annulation pendant la génération interrompt l'écriture sans fichier partiel"""
+        report = self._generate()
+        job = ReportJob.objects.get(report=report)
+        ReportJob.objects.filter(id=job.id).update(status=ReportJob.JobStatus.RUNNING)
+        job.refresh_from_db()
+        self.assertTrue(job.cancel())
+
+        # Le worker reprend la tâche comme s'il l'avait réservée lui-même
+        command = ProcessReportJobsCommand(stdout=StringIO())
+        job.report = report
+        self.assertEqual(command._process_job(job), ReportJob.JobStatus.CANCELLED)
+
+        job.refresh_from_db()
+        report.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.JobStatus.CANCELLED)
+        self.assertFalse(report.file)
+
+        response = self.client.get(f'/api/v1/reports/{report.id}/download/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn('annulée', response.data['error'])
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     ReportListView, ReportDetailView, ReportGenerateView,
-    ReportDownloadView, ReportDeleteView
+    ReportDownloadView, ReportDeleteView, ReportJobView
 )
 
 urlpatterns = [
@@ -9,6 +9,7 @@ urlpatterns = [
     path('<int:pk>/', ReportDetailView.as_view(), name='report-detail'),
     path('generate/', ReportGenerateView.as_view(), name='report-generate'),
     path('<int:pk>/download/', ReportDownloadView.as_view(), name='report-download'),
+    path('<int:pk>/job/', ReportJobView.as_view(), name='report-job'),
     path('<int:pk>/delete/', ReportDeleteView.as_view(), name='report-delete'),
 ]
 
@@ -0,0 +1,182 @@
+"""Génération des fichiers de rapports de présence
+
+Les lignes sont lues depuis les synthèses journalières (DailyAttendance) par un
+curseur côté serveur (.iterator) et transmises une à une à l'écrivain du format
+demandé, qui écrit dans un fichier temporaire sur disque. Le fichier est ensuite
+copié par blocs dans le stockage du champ Report.file.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from reports.models import Report
+from reports.utils.report_writers import WRITERS
+from timesheets.models import DailyAttendance
+
+logger = logging.getLogger(__name__)
+
+DAILY_COLUMNS = [
+    'Date', 'Site', 'Matricule', 'Employé', 'Première arrivée', 'Dernier départ',
+    'Heures travaillées', 'Retard (min)', 'Départ anticipé (min)', 'Pointages', 'Anomalies',
+]
+
+PERIOD_COLUMNS = [
+    'Période', 'Site', 'Matricule', 'Employé', 'Jours de présence',
+    'Heures travaillées', 'Retard (min)', 'Départ anticipé (min)', 'Pointages', 'Anomalies',
+]
+
+PERIOD_TRUNCATIONS = {
+    Report.ReportType.WEEKLY: TruncWeek,
+    Report.ReportType.MONTHLY: TruncMonth,
+}
+
+
+class ReportCancelled(Exception):
+    """Levée par le suivi de progression pour interrompre la génération d'un rapport"""
+
+
+def _hours(minutes):
+    return round((minutes or 0) / 60, 2)
+
+
+def _employee_name(first_name, last_name, email):
+    return f"{first_name} {last_name}".strip() or email
+
+
+class ReportBuilder:
+    """Construit le fichier d'un rapport (journalier, hebdomadaire ou mensuel)"""
+
+    def __init__(self, report, chunk_size=None):
+        self.report = report
+        self.chunk_size = chunk_size or settings.REPORT_CHUNK_SIZE
+
+    def get_queryset(self):
+        """Synthèses journalières couvertes par le rapport (site, organisation ou tout)"""
+        queryset = DailyAttendance.objects.filter(
+            date__gte=self.report.start_date,
+            date__lte=self.report.end_date
+        )
+        if self.report.site_id:
+            queryset = queryset.filter(site_id=self.report.site_id)
+        elif self.report.organization_id:
+            queryset = queryset.filter(site__organization_id=self.report.organization_id)
+        return queryset
+
+    def get_columns(self):
+        if self.report.report_type in PERIOD_TRUNCATIONS:
+            return PERIOD_COLUMNS
+        return DAILY_COLUMNS
+
+    def get_period_queryset(self, truncation):
+        """Synthèses agrégées par période (semaine ou mois), employé et site"""
+        return self.get_queryset().annotate(period=truncation('date')).values(
+            'period', 'site__name', 'employee__employee_id', 'employee__first_name',
+            'employee__last_name', 'employee__email'
+        ).annotate(
+            days=Count('id'),
+            worked=Sum('worked_minutes'),
+            late=Sum('late_minutes'),
+            early=Sum('early_departure_minutes'),
+            scans=Sum('scan_count'),
+            anomalies=Sum('anomaly_count'),
+        )
+
+    def count_rows(self):
+        """Nombre de lignes du rapport (utilisé pour le calcul de la progression)"""
+        truncation = PERIOD_TRUNCATIONS.get(self.report.report_type)
+        if truncation is None:
+            return self.get_queryset().count()
+        return self.get_period_queryset(truncation).count()
+
+    def iter_rows(self):
+        """Génère les lignes du rapport sans charger le jeu de résultats complet"""
+        truncation = PERIOD_TRUNCATIONS.get(self.report.report_type)
+
+        if truncation is None:
+            rows = self.get_queryset().order_by('date', 'site__name', 'employee__last_name', 'employee__first_name', 'id').values_list(
+                'date', 'site__name', 'employee__employee_id', 'employee__first_name', 'employee__last_name',
+                'employee__email', 'first_arrival', 'last_departure', 'worked_minutes', 'late_minutes',
+                'early_departure_minutes', 'scan_count', 'anomaly_count'
+            )
+            for (day, site_name, matricule, first_name, last_name, email, first_arrival, last_departure,
+                 worked, late, early, scans, anomalies) in rows.iterator(chunk_size=self.chunk_size):
+                yield [
+                    day, site_name, matricule or '', _employee_name(first_name, last_name, email),
+                    first_arrival, last_departure, _hours(worked), late, early, scans, anomalies,
+                ]
+            return
+
+        rows = self.get_period_queryset(truncation).order_by(
+            'period', 'site__name', 'employee__last_name', 'employee__first_name', 'employee__email'
+        )
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            yield [
+                row['period'], row['site__name'], row['employee__employee_id'] or '',
+                _employee_name(row['employee__first_name'], row['employee__last_name'], row['employee__email']),
+                row['days'], _hours(row['worked']), row['late'], row['early'], row['scans'], row['anomalies'],
+            ]
+
+    def get_title(self):
+        return (
+            f"{self.report.name} - {self.report.get_report_type_display()} du "
+            f"{self.report.start_date.strftime('%d/%m/%Y')} au {self.report.end_date.strftime('%d/%m/%Y')}"
+        )
+
+    def get_filename(self, extension):
+        return (
+            f"rapport_{self.report.id}_{self.report.report_type.lower()}_"
+            f"{self.report.start_date.isoformat()}_{self.report.end_date.isoformat()}.{extension}"
+        )
+
+    def render(self, fileobj, progress_callback=None):
+        """Écrit le rapport dans un fichier binaire ouvert et retourne le nombre de lignes
+
+        Args:
+            fileobj: fichier binaire ouvert en écriture
+            progress_callback: fonction appelée avec (lignes écrites, lignes totales) au
+                démarrage puis après chaque lot de chunk_size lignes ; elle peut lever
+                ReportCancelled pour interrompre la génération
+        """
+        total = None
+        if progress_callback is not None:
+            total = self.count_rows()
+            progress_callback(0, total)
+
+        writer_class = WRITERS[self.report.report_format]
+        writer = writer_class(fileobj, self.get_title(), self.get_columns())
+        for row in self.iter_rows():
+            writer.write_row(row)
+            if progress_callback is not None and writer.row_count % self.chunk_size == 0:
+                progress_callback(writer.row_count, total)
+        writer.close()
+        return writer.row_count
+
+    def build(self, progress_callback=None):
+        """Génère le fichier du rapport et l'enregistre dans Report.file
+
+        Le fichier n'est enregistré qu'une fois complet : une génération interrompue
+        (erreur ou ReportCancelled) ne laisse aucun fichier partiel.
+
+        Returns:
+            int: nombre de lignes écrites
+        """
+        writer_class = WRITERS[self.report.report_format]
+        with tempfile.TemporaryFile() as tmp:
+            row_count = self.render(tmp, progress_callback=progress_callback)
+            tmp.seek(0)
+
+            previous_name = self.report.file.name if self.report.file else None
+            self.report.file.save(self.get_filename(writer_class.extension), File(tmp), save=True)
+            if previous_name and previous_name != self.report.file.name:
+                self.report.file.storage.delete(previous_name)
+
+        logger.info(
+            f"Rapport {self.report.id} généré: {row_count} ligne(s), "
+            f"{self.report.file.size} octet(s) ({os.path.basename(self.report.file.name)})"
+        )
+        return row_count
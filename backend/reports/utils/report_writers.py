@@ -0,0 +1,232 @@
+"""Écrivains incrémentaux des fichiers de rapports (CSV, Excel, PDF)
+
+Chaque écrivain reçoit les lignes une par une et les écrit directement dans un
+fichier binaire : aucun ne conserve l'ensemble des lignes en mémoire.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.units import mm
+from reportlab.pdfgen import canvas
+
+from django.utils import timezone
+
+# Caractères de contrôle interdits dans un document XML
+_XML_ILLEGAL_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def format_value(value):
+    """Convertit une valeur de cellule en texte lisible"""
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        # Les dates et heures sont stockées en UTC : affichage dans le fuseau local
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%d/%m/%Y %H:%M')
+    if isinstance(value, date):
+        return value.strftime('%d/%m/%Y')
+    return str(value)
+
+
+class BaseReportWriter:
+    """Interface commune des écrivains de rapports"""
+
+    extension = None
+    content_type = 'application/octet-stream'
+
+    def __init__(self, fileobj, title, columns):
+        self.fileobj = fileobj
+        self.title = title
+        self.columns = columns
+        self.row_count = 0
+
+    def write_row(self, row):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CsvReportWriter(BaseReportWriter):
+    """Écriture CSV (séparateur « ; » et BOM UTF-8 pour l'ouverture dans Excel)"""
+
+    extension = 'csv'
+    content_type = 'text/csv'
+
+    def __init__(self, fileobj, title, columns):
+        super().__init__(fileobj, title, columns)
+        self.stream = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='', write_through=True)
+        self.writer = csv.writer(self.stream, delimiter=';')
+        self.writer.writerow(columns)
+
+    def write_row(self, row):
+        self.writer.writerow([format_value(value) for value in row])
+        self.row_count += 1
+
+    def close(self):
+        self.stream.flush()
+        # Le fichier sous-jacent reste ouvert : il appartient à l'appelant
+        self.stream.detach()
+
+
+class XlsxReportWriter(BaseReportWriter):
+    """Écriture Excel (XLSX) en flux
+
+    Le classeur est une archive ZIP de documents XML : la feuille est écrite ligne
+    par ligne dans son entrée de l'archive, puis les autres parties (fixes) sont
+    ajoutées à la fermeture.
+    """
+
+    extension = 'xlsx'
+    content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    def __init__(self, fileobj, title, columns):
+        super().__init__(fileobj, title, columns)
+        self.archive = zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.sheet = self.archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self.sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b'<sheetData>'
+        )
+        self.row_index = 0
+        self._write_cells(columns)
+
+    def _cell(self, value):
+        if isinstance(value, bool):
+            value = 'Oui' if value else 'Non'
+        if isinstance(value, (int, float, Decimal)):
+            return f'<c><v>{value}</v></c>'
+        text = _XML_ILLEGAL_CHARS.sub('', format_value(value))
+        return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+    def _write_cells(self, values):
+        self.row_index += 1
+        cells = ''.join(self._cell(value) for value in values)
+        self.sheet.write(f'<row r="{self.row_index}">{cells}</row>'.encode('utf-8'))
+
+    def write_row(self, row):
+        self._write_cells(row)
+        self.row_count += 1
+
+    def close(self):
+        self.sheet.write(b'</sheetData></worksheet>')
+        self.sheet.close()
+        sheet_name = escape(_XML_ILLEGAL_CHARS.sub('', self.title)[:31] or 'Rapport', {'"': '&quot;'})
+        self.archive.writestr(
+            '[Content_Types].xml',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            '</Types>'
+        )
+        self.archive.writestr(
+            '_rels/.rels',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        )
+        self.archive.writestr(
+            'xl/workbook.xml',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        )
+        self.archive.writestr(
+            'xl/_rels/workbook.xml.rels',
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            'Target="worksheets/sheet1.xml"/>'
+            '</Relationships>'
+        )
+        self.archive.close()
+
+
+class PdfReportWriter(BaseReportWriter):
+    """Écriture PDF avec reportlab, page par page
+
+    Les lignes sont dessinées directement sur le canevas ; chaque page terminée est
+    compressée et seules les lignes de la page courante sont manipulées.
+    """
+
+    extension = 'pdf'
+    content_type = 'application/pdf'
+
+    page_size = landscape(A4)
+    margin = 12 * mm
+    line_height = 5.5 * mm
+    font_size = 7.5
+    header_font_size = 13
+
+    def __init__(self, fileobj, title, columns):
+        super().__init__(fileobj, title, columns)
+        self.canvas = canvas.Canvas(fileobj, pagesize=self.page_size, pageCompression=1)
+        self.canvas.setTitle(title)
+        width, height = self.page_size
+        self.column_width = (width - 2 * self.margin) / len(columns)
+        self.max_chars = max(int(self.column_width / (self.font_size * 0.5)), 4)
+        self.page_number = 0
+        self._start_page()
+
+    def _truncate(self, text):
+        if len(text) <= self.max_chars:
+            return text
+        return text[:self.max_chars - 1] + '…'
+
+    def _draw_cells(self, values, font):
+        self.canvas.setFont(font, self.font_size)
+        for index, value in enumerate(values):
+            x = self.margin + index * self.column_width
+            self.canvas.drawString(x, self.y, self._truncate(format_value(value)))
+        self.y -= self.line_height
+
+    def _start_page(self):
+        width, height = self.page_size
+        self.page_number += 1
+        self.y = height - self.margin
+        self.canvas.setFont('Helvetica-Bold', self.header_font_size)
+        self.canvas.drawString(self.margin, self.y - self.header_font_size, self.title)
+        self.canvas.setFont('Helvetica', self.font_size)
+        self.canvas.drawRightString(width - self.margin, self.margin / 2, f'Page {self.page_number}')
+        self.y -= self.header_font_size + 2 * self.line_height
+        self._draw_cells(self.columns, 'Helvetica-Bold')
+        self.canvas.line(self.margin, self.y + self.line_height * 0.7, width - self.margin, self.y + self.line_height * 0.7)
+
+    def write_row(self, row):
+        if self.y < self.margin + self.line_height:
+            self.canvas.showPage()
+            self._start_page()
+        self._draw_cells(row, 'Helvetica')
+        self.row_count += 1
+
+    def close(self):
+        if self.row_count == 0:
+            self.canvas.setFont('Helvetica', self.font_size)
+            self.canvas.drawString(self.margin, self.y, 'Aucune donnée pour la période sélectionnée')
+        self.canvas.save()
+
+
+WRITERS = {
+    'CSV': CsvReportWriter,
+    'EXCEL': XlsxReportWriter,
+    'PDF': PdfReportWriter,
+}
@@ -1,13 +1,17 @@
 from rest_framework import generics, permissions, status, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.exceptions import NotFound
 from django.http import FileResponse
 import os
-from .models import Report
-from .serializers import ReportSerializer, ReportGenerateSerializer
+from .models import Report, ReportJob
+from organizations.models import Organization
+from .serializers import ReportSerializer, ReportGenerateSerializer, ReportJobSerializer
+from .utils.report_writers import WRITERS
 from sites.permissions import IsSiteOrganizationManager
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
+from core.access import get_access_context
 
 class ReportListView(generics.ListCreateAPIView):
     serializer_class = ReportSerializer
@@ -31,7 +35,7 @@ class ReportListView(generics.ListCreateAPIView):
         if site_id:
             queryset = queryset.filter(site_id=site_id)
             
-        return queryset.select_related('site')
+        return queryset.select_related('site', 'organization', 'created_by', 'job')
 
 class ReportDetailView(generics.RetrieveAPIView):
     """Vue pour obtenir les détails d'un rapport"""
@@ -41,11 +45,12 @@ class ReportDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.is_super_admin:
-            return Report.objects.all()
+            queryset = Report.objects.all()
         elif user.is_admin or user.is_manager:
-            return Report.objects.filter(organization__in=user.organizations.all())
+            queryset = Report.objects.filter(organization_id__in=get_access_context(self.request).organization_ids)
         else:
-            return Report.objects.filter(created_by=user)
+            queryset = Report.objects.filter(created_by=user)
+        return queryset.select_related('job')
 
 class ReportGenerateView(generics.CreateAPIView):
     serializer_class = ReportGenerateSerializer
@@ -54,7 +59,7 @@ class ReportGenerateView(generics.CreateAPIView):
     @extend_schema(
         request=ReportGenerateSerializer,
         responses={
-            201: OpenApiResponse(description='Rapport généré avec succès'),
+            202: OpenApiResponse(description='Génération du rapport ajoutée à la file'),
             400: OpenApiResponse(description='Données invalides')
         }
     )
@@ -85,7 +90,7 @@ class ReportGenerateView(generics.CreateAPIView):
             else:
                 print(f"[Reports][Generate] Utilisateur non super admin: {request.user.email}")
                 # Pour les autres utilisateurs, utiliser leur première organisation
-                organizations = request.user.organizations.all()
+                organizations = Organization.objects.filter(id__in=get_access_context(request).organization_ids)
                 if not organizations.exists():
                     print("[Reports][Generate] Erreur: Utilisateur non associé à une organisation")
                     raise serializers.ValidationError({
@@ -106,11 +111,16 @@ class ReportGenerateView(generics.CreateAPIView):
                 created_by=request.user
             )
             print(f"[Reports][Generate] Rapport créé avec succès - ID: {report.id}")
+
+            # La génération du fichier est réalisée par la commande process_report_jobs
+            job = ReportJob.enqueue(report)
+            print(f"[Reports][Generate] Génération ajoutée à la file - Tâche: {job.id}")
             
             return Response({
                 'id': report.id,
-                'message': 'Rapport en cours de génération'
-            }, status=status.HTTP_201_CREATED)
+                'message': 'Rapport en cours de génération',
+                'job': ReportJobSerializer(job).data
+            }, status=status.HTTP_202_ACCEPTED)
             
         except Exception as e:
             print(f"[Reports][Generate] Erreur lors de la génération du rapport: {str(e)}")
@@ -119,22 +129,38 @@ class ReportGenerateView(generics.CreateAPIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 class ReportDownloadView(generics.RetrieveAPIView):
-    queryset = Report.objects.all()
+    queryset = Report.objects.select_related('job')
     permission_classes = [permissions.IsAuthenticated]
 
     def get(self, request, *args, **kwargs):
         report = self.get_object()
+        job = getattr(report, 'job', None)
+        if job is not None and job.status in ReportJob.ACTIVE_STATUSES:
+            return Response(
+                {
+                    'error': 'Le rapport n\'est pas encore prêt',
+                    'job': ReportJobSerializer(job).data
+                },
+                status=status.HTTP_409_CONFLICT
+            )
         if not report.file:
+            error = 'Le fichier n\'est pas encore disponible'
+            if job is not None and job.status == ReportJob.JobStatus.FAILED:
+                error = f'La génération du rapport a échoué: {job.error}'
+            elif job is not None and job.status == ReportJob.JobStatus.CANCELLED:
+                error = 'La génération du rapport a été annulée'
             return Response(
-                {'error': 'Le fichier n\'est pas encore disponible'},
+                {'error': error},
                 status=status.HTTP_404_NOT_FOUND
             )
 
         file_path = report.file.path
         if os.path.exists(file_path):
+            writer_class = WRITERS.get(report.report_format)
+            content_type = writer_class.content_type if writer_class else 'application/octet-stream'
             response = FileResponse(
                 open(file_path, 'rb'),
-                content_type='application/octet-stream'
+                content_type=content_type
             )
             response['Content-Disposition'] = f'attachment; filename="{os.path.basename(file_path)}"'
             return response
@@ -144,6 +170,48 @@ class ReportDownloadView(generics.RetrieveAPIView):
             status=status.HTTP_404_NOT_FOUND
         )
 
+class ReportJobView(generics.GenericAPIView):
+    """Vue pour suivre (GET) ou annuler (POST) la génération d'un rapport"""
+    serializer_class = ReportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_super_admin:
+            queryset = Report.objects.all()
+        elif user.is_admin or user.is_manager:
+            queryset = Report.objects.filter(organization_id__in=get_access_context(self.request).organization_ids)
+        else:
+            queryset = Report.objects.filter(created_by=user)
+        return queryset.select_related('job')
+
+    def get_job(self):
+        report = self.get_object()
+        job = getattr(report, 'job', None)
+        if job is None:
+            raise NotFound('Aucune génération n\'est associée à ce rapport')
+        return job
+
+    @extend_schema(responses={200: ReportJobSerializer})
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_job()).data)
+
+    @extend_schema(
+        request=None,
+        responses={
+            200: ReportJobSerializer,
+            409: OpenApiResponse(description='La génération est déjà terminée')
+        }
+    )
+    def post(self, request, *args, **kwargs):
+        job = self.get_job()
+        if not job.cancel():
+            return Response(
+                {'error': 'La génération du rapport est déjà terminée'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(self.get_serializer(job).data)
+
 class ReportDeleteView(generics.DestroyAPIView):
     """Vue pour supprimer un rapport"""
     queryset = Report.objects.all()
@@ -154,7 +222,7 @@ class ReportDeleteView(generics.DestroyAPIView):
         if user.is_super_admin:
             return Report.objects.all()
         elif user.is_admin or user.is_manager:
-            return Report.objects.filter(organization__in=user.organizations.all())
+            return Report.objects.filter(organization_id__in=get_access_context(self.request).organization_ids)
         else:
             return Report.objects.filter(created_by=user)
             
@@ -1,6 +1,7 @@
 """Permissions pour les sites"""
 
 from rest_framework import permissions
+from core.access import get_access_context
 
 
 class HasOrganizationPermission(permissions.BasePermission):
@@ -17,7 +18,7 @@ class HasOrganizationPermission(permissions.BasePermission):
             'organization_id') or request.data.get('organization')
         if not organization_id:
             return False
-        return request.user.has_organization_permission(organization_id)
+        return get_access_context(request).has_organization(organization_id)
 
     def has_object_permission(self, request, view, obj):
         # Autoriser les super admins
@@ -29,7 +30,7 @@ class HasOrganizationPermission(permissions.BasePermission):
         if not organization:
             return False
 
-        return request.user.has_organization_permission(organization)
+        return get_access_context(request).has_organization(organization)
 
 
 class IsSiteOrganizationManager(permissions.BasePermission):
@@ -65,7 +66,7 @@ class IsSiteOrganizationManager(permissions.BasePermission):
         return (
             request.user.is_authenticated and
             (request.user.is_manager or request.user.is_admin) and
-            request.user.has_organization_permission(site.organization)
+            get_access_context(request).has_site(site)
         )
 
 
@@ -94,7 +95,7 @@ class IsFranchiseAdmin(permissions.BasePermission):
 
         # Les admins peuvent gérer uniquement leurs franchises assignées
         if request.user.is_admin:
-            return request.user.has_organization_permission(obj.id)
+            return get_access_context(request).has_organization(obj.id)
 
         return False
 
@@ -12,12 +12,15 @@ from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.db import models, IntegrityError, DatabaseError
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 # First party imports
+from core.access import get_access_context
 from reports.models import Report
 from reports.serializers import ReportSerializer
-from timesheets.models import Timesheet, Anomaly
+from timesheets.models import Timesheet, Anomaly, DailyAttendance
 from timesheets.serializers import TimesheetSerializer, AnomalySerializer
+from timesheets.pagination import AnomalyCursorPagination
 from users.models import User
 from users.serializers import UserSerializer
 
@@ -53,32 +56,18 @@ class SiteStatisticsView(generics.RetrieveAPIView):
         total_employees = SiteEmployee.objects.filter(
             site=site, is_active=True).count()
 
-        # Calculer le total des heures en utilisant les entrées/sorties
-        timesheets = Timesheet.objects.filter(
-            site=site,
-            entry_type__in=['IN', 'OUT']
-        ).order_by('employee', 'timestamp')
-
-        total_hours = 0
-        current_employee = None
-        entry_time = None
-
-        for timesheet in timesheets:
-            if timesheet.entry_type == 'IN':
-                entry_time = timesheet.timestamp
-                current_employee = timesheet.employee
-            elif timesheet.entry_type == 'OUT' and current_employee == timesheet.employee and entry_time:
-                duration = timesheet.timestamp - entry_time
-                total_hours += duration.total_seconds() / 3600
-                entry_time = None
-
-        # Calculer le nombre d'anomalies
-        anomalies = Anomaly.objects.filter(site=site).count()
+        # Heures et anomalies lues en une requête sur les synthèses journalières
+        # (une ligne par employé et par jour, quelle que soit la taille de l'historique)
+        totals = DailyAttendance.objects.filter(site=site).aggregate(
+            worked_minutes=models.Sum('worked_minutes'),
+            anomalies=models.Sum('anomaly_count')
+        )
+        total_hours = (totals['worked_minutes'] or 0) / 60
 
         stats = {
             'total_employees': total_employees,
             'total_hours': int(total_hours),
-            'anomalies': anomalies
+            'anomalies': totals['anomalies'] or 0
         }
 
         serializer = self.get_serializer(stats)
@@ -139,7 +128,7 @@ class SiteListView(generics.ListCreateAPIView):
         if user.is_super_admin:
             return base_queryset
         elif user.is_admin or user.is_manager:
-            return base_queryset.filter(organization__in=user.organizations.all())
+            return base_queryset.filter(organization_id__in=get_access_context(self.request).organization_ids)
         elif user.is_employee:
             return base_queryset.filter(site_employees__employee=user, site_employees__is_active=True)
         return Site.objects.none()
@@ -164,17 +153,16 @@ class SiteDetailView(generics.RetrieveUpdateDestroyAPIView):
         if user.is_super_admin:
             return obj
 
+        access = get_access_context(self.request)
+
         # Admin et Manager peuvent voir les sites de leurs organisations
         if user.is_admin or user.is_manager:
-            if not user.organizations.filter(sites=obj).exists():
+            if not access.has_site(obj):
                 raise PermissionDenied("Vous n'avez pas accès à ce site")
 
         # Employé ne peut voir que les sites auxquels il est assigné
         elif user.is_employee:
-            if not (
-                user.organizations.filter(id=obj.organization.id).exists() and
-                user.employee_sites.filter(site=obj, is_active=True).exists()
-            ):
+            if not (access.has_site(obj) and access.is_assigned_to_site(obj)):
                 raise PermissionDenied("Vous n'avez pas accès à ce site")
 
         return obj
@@ -191,13 +179,14 @@ class SiteEmployeesView(generics.ListCreateAPIView):
 
             # Vérifier les permissions
             user = self.request.user
+            access = get_access_context(self.request)
             if not user.is_super_admin:
                 if user.is_admin or user.is_manager:
-                    if not user.organizations.filter(sites=site).exists():
+                    if not access.has_site(site):
                         raise PermissionDenied(
                             "Vous n'avez pas accès à ce site")
                 elif user.is_employee:
-                    if not user.employee_sites.filter(site=site, is_active=True).exists():
+                    if not access.is_assigned_to_site(site):
                         raise PermissionDenied(
                             "Vous n'avez pas accès à ce site")
 
@@ -289,13 +278,14 @@ class SiteEmployeesView(generics.ListCreateAPIView):
 
             # Vérifier les permissions
             user = self.request.user
+            access = get_access_context(self.request)
             if not user.is_super_admin:
                 if user.is_admin or user.is_manager:
-                    if not user.organizations.filter(sites=site).exists():
+                    if not access.has_site(site):
                         raise PermissionDenied(
                             "Vous n'avez pas accès à ce site")
                 elif user.is_employee:
-                    if not user.employee_sites.filter(site=site, is_active=True).exists():
+                    if not access.is_assigned_to_site(site):
                         raise PermissionDenied(
                             "Vous n'avez pas accès à ce site")
 
@@ -412,6 +402,8 @@ class SiteScheduleDetailListView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         schedule_pk = self.kwargs.get('schedule_pk')
         serializer.save(schedule_id=schedule_pk)
+        # Les détails sont sauvegardés avec leur planning (sauvegardes incrémentales)
+        Schedule.objects.filter(pk=schedule_pk).update(updated_at=timezone.now())
 
 
 class SiteScheduleBatchEmployeeView(generics.CreateAPIView):
@@ -509,6 +501,10 @@ class SiteScheduleBatchEmployeeView(generics.CreateAPIView):
             ).update(is_active=False)
             print(f"[SiteScheduleBatchEmployeeView][Debug] {removed} assignation(s) désactivée(s) pour ce planning")
 
+            # update() ne déclenche pas les signaux : invalider explicitement le cache des plannings
+            from timesheets.utils.schedule_resolver import schedule_resolver
+            schedule_resolver.invalidate_schedule(schedule.id)
+
             # Assigner les employés au planning
             success_count = 0
             error_count = 0
@@ -578,13 +574,13 @@ class SiteAnomaliesView(generics.ListAPIView):
     """Vue pour lister les anomalies d'un site"""
     permission_classes = [IsAuthenticated]
     serializer_class = AnomalySerializer
-    pagination_class = None  # Désactiver la pagination pour cette vue
+    pagination_class = AnomalyCursorPagination
 
     def get_queryset(self):
         site_pk = self.kwargs.get('pk')
-        return Anomaly.objects.filter(
+        return AnomalySerializer.setup_eager_loading(Anomaly.objects.filter(
             site_id=site_pk
-        ).select_related('employee').order_by('-created_at')
+        ))
 
 
 class SiteReportsView(generics.ListAPIView):
@@ -617,7 +613,7 @@ class AllSchedulesView(generics.ListAPIView):
         if user.is_super_admin:
             return queryset.all()
         elif user.is_admin or user.is_manager:
-            return queryset.filter(site__organization__in=user.organizations.all())
+            return queryset.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         elif user.is_employee:
             return queryset.filter(
                 schedule_employees__employee=user,
@@ -691,11 +687,11 @@ class ScheduleAnomaliesView(generics.ListAPIView):
     """Vue pour lister les anomalies d'un planning"""
     permission_classes = [IsAuthenticated]
     serializer_class = AnomalySerializer
-    pagination_class = None  # Désactiver la pagination pour cette vue
+    pagination_class = AnomalyCursorPagination
 
     def get_queryset(self):
         schedule = get_object_or_404(Schedule, pk=self.kwargs['pk'])
-        return Anomaly.objects.filter(schedule=schedule).order_by('-created_at')
+        return AnomalySerializer.setup_eager_loading(Anomaly.objects.filter(schedule=schedule))
 
 
 class ScheduleReportsView(generics.ListAPIView):
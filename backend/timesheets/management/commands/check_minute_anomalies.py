@@ -1,11 +1,13 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, time
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Count, Q
 from django.contrib.auth import get_user_model
-from timesheets.models import Timesheet, Anomaly
-from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from timesheets.models import Timesheet, Anomaly, ProcessingCheckpoint
+from timesheets.utils import anomaly_dedup, minute_deadlines
+from sites.models import Site
 from core.utils import is_entity_active
 
 User = get_user_model()
@@ -15,6 +17,8 @@ class Command(BaseCommand):
     Vérifie les pointages manquants en temps réel pour tous les employés ayant un planning actif.
     Cette commande est conçue pour être exécutée toutes les minutes via un cron job.
     Elle suit l'arbre de décision défini dans .cursor/rules/minute_anomalies.mdc.
+    Les échéances d'arrivée de la journée sont indexées une fois par jour ; chaque
+    exécution ne traite que celles passées depuis l'exécution précédente.
 
     Exemples d'utilisation :
 
@@ -113,32 +117,68 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR(f"Erreur lors de la vérification des pointages manquants: {str(e)}"))
             raise
 
+    def _checkpoint_name(self, site=None, employee=None):
+        """Nom de la marque haute (une marque distincte par filtre site / employé)"""
+        name = 'check_minute_anomalies'
+        if site:
+            name += f':site={site.id}'
+        if employee:
+            name += f':employee={employee.id}'
+        return name
+
     def _check_minute_anomalies(self, current_time, site=None, employee=None, dry_run=False):
         """
         Vérifie les pointages manquants en temps réel selon l'arbre de décision.
         Suit la logique définie dans .cursor/rules/minute_anomalies.mdc
+
+        Seules les échéances d'arrivée (heure d'arrivée prévue + marge) passées depuis
+        l'exécution précédente sont examinées : le coût d'une exécution dépend du nombre
+        d'échéances de la minute écoulée et non du nombre d'employés.
         """
-        # Récupérer toutes les relations site-employé actives
-        site_employees = SiteEmployee.objects.filter(is_active=True).select_related('site', 'employee', 'schedule')
+        current_time = timezone.localtime(current_time)
+        current_date = current_time.date()
+        day_start = timezone.make_aware(datetime.combine(current_date, time.min))
 
-        # Filtrer par site si spécifié
-        if site:
-            site_employees = site_employees.filter(site=site)
+        # Fenêtre examinée : depuis la marque haute (au plus tôt le début de la journée)
+        checkpoint_name = self._checkpoint_name(site, employee)
+        high_water_mark = ProcessingCheckpoint.get_position(checkpoint_name)
+        window_start = max(high_water_mark, day_start) if high_water_mark else day_start
 
-        # Filtrer par employé si spécifié
+        built = minute_deadlines.ensure_index(current_date)
+        if built and self.verbose:
+            self.stdout.write(f"Index des échéances d'arrivée du {current_date} construit: {built} échéance(s)")
+
+        due = minute_deadlines.due_deadlines(current_date, window_start, current_time)
+        if site:
+            due = due.filter(site_employee__site=site)
         if employee:
-            site_employees = site_employees.filter(employee=employee)
+            due = due.filter(site_employee__employee=employee)
+        due = list(due)
 
-        # Date actuelle
-        current_date = current_time.date()
-        current_weekday = current_date.weekday()
-        current_time_obj = current_time.time()
+        if self.verbose:
+            self.stdout.write(
+                f"{len(due)} échéance(s) entre {timezone.localtime(window_start).strftime('%H:%M:%S')} "
+                f"et {current_time.strftime('%H:%M:%S')}"
+            )
+
+        # Nombre de pointages du jour des seuls employés concernés, en une requête
+        timesheet_counts = {}
+        if due:
+            pairs = Q()
+            for entry in due:
+                pairs |= Q(employee_id=entry.site_employee.employee_id, site_id=entry.site_employee.site_id)
+            timesheet_counts = {
+                (row['employee_id'], row['site_id']): row['count']
+                for row in Timesheet.objects.filter(pairs, date=current_date)
+                .values('employee_id', 'site_id').annotate(count=Count('id'))
+            }
 
         # Compter les anomalies créées
         anomalies_created = 0
 
-        # Parcourir toutes les relations site-employé
-        for site_employee in site_employees:
+        for entry in due:
+            site_employee = entry.site_employee
+
             # Vérifier si le site est actif
             if not is_entity_active(site_employee.site):
                 if self.verbose:
@@ -151,134 +191,53 @@ class Command(BaseCommand):
                     self.stdout.write(f"Employé {site_employee.employee.get_full_name()} inactif ou hors période d'activation, ignoré")
                 continue
 
-            # Récupérer le planning
-            schedule = site_employee.schedule
-            if not schedule or not is_entity_active(schedule):
+            # Vérifier le planning
+            schedule = entry.schedule
+            if not is_entity_active(schedule):
                 if self.verbose:
-                    self.stdout.write(f"Planning inactif ou non défini pour {site_employee.employee.get_full_name()} au site {site_employee.site.name}, ignoré")
+                    self.stdout.write(f"Planning inactif pour {site_employee.employee.get_full_name()} au site {site_employee.site.name}, ignoré")
                 continue
 
-            # Vérifier si le planning a des détails pour ce jour
-            try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=current_weekday
-                )
-            except ScheduleDetail.DoesNotExist:
-                if self.verbose:
-                    self.stdout.write(f"Pas de planning défini pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {self.day_names[current_weekday]}, ignoré")
+            # Journée complète : aucun pointage le matin, ou seulement les deux pointages du matin
+            # l'après-midi ; demi-journée : aucun pointage
+            timesheet_count = timesheet_counts.get((site_employee.employee_id, site_employee.site_id), 0)
+            if timesheet_count != entry.expected_timesheet_count:
                 continue
 
-            # Vérifier le type de planning
-            if schedule.schedule_type == Schedule.ScheduleType.FIXED:
-                # Récupérer les pointages de l'employé pour aujourd'hui
-                timesheets = Timesheet.objects.filter(
-                    employee=site_employee.employee,
-                    site=site_employee.site,
-                    timestamp__date=current_date
-                ).order_by('timestamp')
-
-                # Compter les pointages
-                timesheet_count = timesheets.count()
-
-                # Récupérer la marge de retard
-                late_margin = schedule.late_arrival_margin or site_employee.site.late_margin or 15  # Valeur par défaut: 15 minutes
-
-                # Vérifier selon le type de journée et le nombre de pointages
-                day_type = schedule_detail.day_type
-
-                # Cas 1: Planning journalier
-                if day_type == ScheduleDetail.DayType.FULL:
-                    # Cas 1.1: Aucun pointage
-                    if timesheet_count == 0:
-                        # Vérifier si l'heure actuelle dépasse l'heure d'arrivée du matin + marge
-                        if schedule_detail.start_time_1 and current_time_obj > self._add_minutes_to_time(schedule_detail.start_time_1, late_margin):
-                            # Créer une anomalie pour pointage manquant
-                            if not dry_run:
-                                self._create_missing_arrival_anomaly(site_employee, schedule, current_date)
-                                anomalies_created += 1
-                            if self.verbose:
-                                self.stdout.write(self.style.WARNING(
-                                    f"Anomalie détectée: Pointage manquant pour {site_employee.employee.get_full_name()} "
-                                    f"au site {site_employee.site.name} le {current_date} (heure actuelle: {current_time_obj}, "
-                                    f"heure d'arrivée prévue: {schedule_detail.start_time_1})"
-                                ))
-
-                    # Cas 1.2: Deux pointages (après-midi)
-                    elif timesheet_count == 2:
-                        # Vérifier si l'heure actuelle dépasse l'heure d'arrivée de l'après-midi + marge
-                        if schedule_detail.start_time_2 and current_time_obj > self._add_minutes_to_time(schedule_detail.start_time_2, late_margin):
-                            # Créer une anomalie pour pointage manquant
-                            if not dry_run:
-                                self._create_missing_arrival_anomaly(site_employee, schedule, current_date)
-                                anomalies_created += 1
-                            if self.verbose:
-                                self.stdout.write(self.style.WARNING(
-                                    f"Anomalie détectée: Pointage manquant pour {site_employee.employee.get_full_name()} "
-                                    f"au site {site_employee.site.name} le {current_date} (heure actuelle: {current_time_obj}, "
-                                    f"heure d'arrivée après-midi prévue: {schedule_detail.start_time_2})"
-                                ))
-
-                # Cas 2: Planning demi-journée (matin ou après-midi)
-                elif day_type in [ScheduleDetail.DayType.AM, ScheduleDetail.DayType.PM]:
-                    # Cas 2.1: Aucun pointage
-                    if timesheet_count == 0:
-                        # Déterminer l'heure d'arrivée selon le type de demi-journée
-                        arrival_time = None
-                        if day_type == ScheduleDetail.DayType.AM and schedule_detail.start_time_1:
-                            arrival_time = schedule_detail.start_time_1
-                        elif day_type == ScheduleDetail.DayType.PM and schedule_detail.start_time_2:
-                            arrival_time = schedule_detail.start_time_2
-
-                        # Vérifier si l'heure actuelle dépasse l'heure d'arrivée + marge
-                        if arrival_time and current_time_obj > self._add_minutes_to_time(arrival_time, late_margin):
-                            # Créer une anomalie pour pointage manquant
-                            if not dry_run:
-                                self._create_missing_arrival_anomaly(site_employee, schedule, current_date)
-                                anomalies_created += 1
-                            if self.verbose:
-                                self.stdout.write(self.style.WARNING(
-                                    f"Anomalie détectée: Pointage manquant pour {site_employee.employee.get_full_name()} "
-                                    f"au site {site_employee.site.name} le {current_date} (heure actuelle: {current_time_obj}, "
-                                    f"heure d'arrivée prévue: {arrival_time})"
-                                ))
-
-            # Pour les plannings de type fréquence, aucune anomalie n'est générée ici
-            # selon l'arbre de décision dans minute_anomalies.mdc
+            if not dry_run:
+                if self._create_missing_arrival_anomaly(site_employee, schedule, current_date):
+                    anomalies_created += 1
+            if self.verbose:
+                self.stdout.write(self.style.WARNING(
+                    f"Anomalie détectée: Pointage manquant pour {site_employee.employee.get_full_name()} "
+                    f"au site {site_employee.site.name} le {current_date} (heure actuelle: {current_time.time()}, "
+                    f"{entry.get_kind_display().lower()} au plus tard à {timezone.localtime(entry.deadline).time()})"
+                ))
 
-        return anomalies_created
+        # Pour les plannings de type fréquence, aucune anomalie n'est générée ici
+        # selon l'arbre de décision dans minute_anomalies.mdc
+
+        if not dry_run:
+            ProcessingCheckpoint.set_position(checkpoint_name, current_time)
 
-    def _add_minutes_to_time(self, time_obj, minutes):
-        """Ajoute des minutes à un objet time"""
-        datetime_obj = datetime.combine(datetime.today(), time_obj)
-        datetime_obj += timedelta(minutes=minutes)
-        return datetime_obj.time()
+        return anomalies_created
 
     def _create_missing_arrival_anomaly(self, site_employee, schedule, date):
-        """Crée une anomalie pour un pointage d'arrivée manquant"""
-        # Vérifier si une anomalie similaire existe déjà pour cette date/employé/site
-        existing_anomaly = Anomaly.objects.filter(
+        """Crée une anomalie pour un pointage d'arrivée manquant (une seule par jour)"""
+        anomaly, created = Anomaly.objects.get_or_create(
             employee=site_employee.employee,
             site=site_employee.site,
             date=date,
             anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
-            status=Anomaly.AnomalyStatus.PENDING
-        ).first()
-
-        if not existing_anomaly:
-            # Créer une anomalie pour pointage manquant
-            description = f"Pointage d'arrivée manquant détecté en temps réel"
-
-            anomaly = Anomaly.objects.create(
-                employee=site_employee.employee,
-                site=site_employee.site,
-                date=date,
-                anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
-                description=description,
-                status=Anomaly.AnomalyStatus.PENDING,
-                schedule=schedule
-            )
+            dedup_subtype=anomaly_dedup.DAILY,
+            defaults={
+                'description': f"Pointage d'arrivée manquant détecté en temps réel",
+                'status': Anomaly.AnomalyStatus.PENDING,
+                'schedule': schedule,
+            }
+        )
 
+        if created:
             self.stdout.write(self.style.SUCCESS(
                 f"Anomalie créée: Pointage d'arrivée manquant - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {date}"
             ))
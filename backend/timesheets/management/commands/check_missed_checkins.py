@@ -3,9 +3,12 @@ from datetime import datetime, timedelta
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_save
 from django.utils import timezone
 
 from timesheets.models import Timesheet, Anomaly
+from timesheets.utils import anomaly_dedup, daily_attendance
 from sites.models import Site, SiteEmployee, Schedule, ScheduleDetail
 from users.models import User
 from core.utils import is_entity_active
@@ -37,6 +40,9 @@ class Command(BaseCommand):
     python manage.py check_missed_checkins --verbose
     '''
 
+    # Nombre d'anomalies insérées par requête
+    BATCH_SIZE = 500
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.logger = logging.getLogger(__name__)
@@ -116,6 +122,12 @@ class Command(BaseCommand):
             raise
 
     def _check_missed_checkins(self, check_date, site=None, employee=None, dry_run=False):
+        """
+        Vérifie les pointages manquants de la journée de façon ensembliste : les plannings
+        du jour, le nombre d'arrivées et de départs par (employé, site) et les anomalies
+        existantes sont lus en une requête chacun, puis les anomalies manquantes sont
+        créées par une seule insertion groupée.
+        """
         # Récupérer toutes les relations site-employé actives
         site_employees = SiteEmployee.objects.filter(is_active=True).select_related('site', 'employee', 'schedule')
 
@@ -127,8 +139,42 @@ class Command(BaseCommand):
         if employee:
             site_employees = site_employees.filter(employee=employee)
 
-        # Compter les anomalies créées
-        anomalies_created = 0
+        site_employees = list(site_employees)
+        day_of_week = check_date.weekday()  # 0 = Lundi, 6 = Dimanche
+
+        # Détails de planning du jour, une requête pour tous les plannings concernés
+        schedule_details = {
+            detail.schedule_id: detail
+            for detail in ScheduleDetail.objects.filter(
+                schedule_id__in={se.schedule_id for se in site_employees if se.schedule_id},
+                day_of_week=day_of_week
+            )
+        }
+
+        # Nombre d'arrivées et de départs par (employé, site), une requête agrégée
+        timesheets = Timesheet.objects.filter(date=check_date)
+        anomalies = Anomaly.objects.filter(
+            date=check_date,
+            anomaly_type__in=[Anomaly.AnomalyType.MISSING_ARRIVAL, Anomaly.AnomalyType.MISSING_DEPARTURE]
+        )
+        if site:
+            timesheets = timesheets.filter(site=site)
+            anomalies = anomalies.filter(site=site)
+        if employee:
+            timesheets = timesheets.filter(employee=employee)
+            anomalies = anomalies.filter(employee=employee)
+        counts = {
+            (row['employee_id'], row['site_id']): (row['arrivals'], row['departures'])
+            for row in timesheets.values('employee_id', 'site_id').annotate(
+                arrivals=Count('id', filter=Q(entry_type=Timesheet.EntryType.ARRIVAL)),
+                departures=Count('id', filter=Q(entry_type=Timesheet.EntryType.DEPARTURE))
+            )
+        }
+
+        # Anomalies déjà présentes (ou prévues pendant ce passage) : (employé, site, type)
+        self._existing = set(anomalies.values_list('employee_id', 'site_id', 'anomaly_type'))
+        self._pending = []
+        self._dry_run = dry_run
 
         # Pour chaque relation site-employé
         for site_employee in site_employees:
@@ -152,31 +198,17 @@ class Command(BaseCommand):
                 continue
 
             # Vérifier si le planning a des détails pour ce jour de la semaine
-            day_of_week = check_date.weekday()  # 0 = Lundi, 6 = Dimanche
-            try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=day_of_week
-                )
-            except ScheduleDetail.DoesNotExist:
+            schedule_detail = schedule_details.get(schedule.id)
+            if schedule_detail is None:
                 if self.verbose:
                     self.stdout.write(f"Pas de détails de planning pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le jour {day_of_week}")
                 continue
 
+            arrivals, departures = counts.get((site_employee.employee_id, site_employee.site_id), (0, 0))
+            total_entries = arrivals + departures
+
             # Pour les plannings fixes, vérifier si l'employé a pointé
             if schedule.schedule_type == Schedule.ScheduleType.FIXED:
-                # Récupérer tous les pointages de l'employé pour ce jour
-                timesheets = Timesheet.objects.filter(
-                    employee=site_employee.employee,
-                    site=site_employee.site,
-                    timestamp__date=check_date
-                )
-
-                # Compter les arrivées et départs
-                arrivals = timesheets.filter(entry_type=Timesheet.EntryType.ARRIVAL).count()
-                departures = timesheets.filter(entry_type=Timesheet.EntryType.DEPARTURE).count()
-                total_entries = arrivals + departures
-
                 # Déterminer si c'est un planning journalier ou demi-journée
                 is_full_day = schedule_detail.start_time_1 and schedule_detail.end_time_1 and schedule_detail.start_time_2 and schedule_detail.end_time_2
                 is_half_day = (schedule_detail.start_time_1 and schedule_detail.end_time_1 and not schedule_detail.start_time_2) or \
@@ -189,230 +221,108 @@ class Command(BaseCommand):
 
                 # Vérifier les arrivées manquantes
                 if arrivals == 0 and (schedule_detail.start_time_1 or schedule_detail.start_time_2):
-                    # Vérifier si une anomalie similaire existe déjà
-                    existing_anomaly = Anomaly.objects.filter(
-                        employee=site_employee.employee,
-                        site=site_employee.site,
-                        date=check_date,
-                        anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL
-                    ).first()
-
-                    if not existing_anomaly and not dry_run:
-                        # Créer une anomalie pour l'arrivée manquante
-                        description = f"Arrivée manquante selon le planning"
-                        if schedule_detail.start_time_1:
-                            description += f" (heure prévue: {schedule_detail.start_time_1})"
-                        elif schedule_detail.start_time_2:
-                            description += f" (heure prévue: {schedule_detail.start_time_2})"
-
-                        anomaly = Anomaly.objects.create(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            date=check_date,
-                            anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
-                            description=description,
-                            status=Anomaly.AnomalyStatus.PENDING,
-                            schedule=schedule
-                        )
-
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie créée: MISSING_ARRIVAL - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
-                    elif existing_anomaly:
-                        if self.verbose:
-                            self.stdout.write(f"Anomalie existante pour arrivée manquante de {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}")
-                    elif dry_run:
-                        # En mode simulation, on compte quand même l'anomalie
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie simulée: MISSING_ARRIVAL - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
+                    description = f"Arrivée manquante selon le planning"
+                    if schedule_detail.start_time_1:
+                        description += f" (heure prévue: {schedule_detail.start_time_1})"
+                    elif schedule_detail.start_time_2:
+                        description += f" (heure prévue: {schedule_detail.start_time_2})"
+                    self._add_anomaly(site_employee, schedule, check_date, Anomaly.AnomalyType.MISSING_ARRIVAL,
+                                      description, "arrivée manquante")
 
                 # Vérifier les départs manquants
                 if departures < arrivals and (schedule_detail.end_time_1 or schedule_detail.end_time_2):
-                    # Vérifier si une anomalie similaire existe déjà
-                    existing_anomaly = Anomaly.objects.filter(
-                        employee=site_employee.employee,
-                        site=site_employee.site,
-                        date=check_date,
-                        anomaly_type=Anomaly.AnomalyType.MISSING_DEPARTURE
-                    ).first()
-
-                    if not existing_anomaly and not dry_run:
-                        # Créer une anomalie pour le départ manquant
-                        description = f"Départ manquant selon le planning"
-                        if schedule_detail.end_time_1 and not schedule_detail.end_time_2:
-                            description += f" (heure prévue: {schedule_detail.end_time_1})"
-                        elif schedule_detail.end_time_2:
-                            description += f" (heure prévue: {schedule_detail.end_time_2})"
-
-                        anomaly = Anomaly.objects.create(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            date=check_date,
-                            anomaly_type=Anomaly.AnomalyType.MISSING_DEPARTURE,
-                            description=description,
-                            status=Anomaly.AnomalyStatus.PENDING,
-                            schedule=schedule
-                        )
-
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie créée: MISSING_DEPARTURE - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
-                    elif existing_anomaly:
-                        if self.verbose:
-                            self.stdout.write(f"Anomalie existante pour départ manquant de {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}")
-                    elif dry_run:
-                        # En mode simulation, on compte quand même l'anomalie
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie simulée: MISSING_DEPARTURE - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
+                    description = f"Départ manquant selon le planning"
+                    if schedule_detail.end_time_1 and not schedule_detail.end_time_2:
+                        description += f" (heure prévue: {schedule_detail.end_time_1})"
+                    elif schedule_detail.end_time_2:
+                        description += f" (heure prévue: {schedule_detail.end_time_2})"
+                    self._add_anomaly(site_employee, schedule, check_date, Anomaly.AnomalyType.MISSING_DEPARTURE,
+                                      description, "départ manquant")
 
                 # Vérifier le nombre total de pointages selon le type de journée
                 expected_entries = 4 if is_full_day else 2 if is_half_day else 0
                 if expected_entries > 0 and total_entries < expected_entries and total_entries > 0:
-                    # Vérifier si une anomalie similaire existe déjà
-                    existing_anomaly = Anomaly.objects.filter(
-                        employee=site_employee.employee,
-                        site=site_employee.site,
-                        date=check_date,
-                        anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL
-                    ).first() or Anomaly.objects.filter(
-                        employee=site_employee.employee,
-                        site=site_employee.site,
-                        date=check_date,
-                        anomaly_type=Anomaly.AnomalyType.MISSING_DEPARTURE
-                    ).first()
-
-                    if not existing_anomaly and not dry_run:
-                        # Créer une anomalie pour pointage manquant
-                        description = f"Pointage manquant selon le planning ({total_entries}/{expected_entries})"
-
-                        anomaly = Anomaly.objects.create(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            date=check_date,
-                            anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL if arrivals < (expected_entries // 2) else Anomaly.AnomalyType.MISSING_DEPARTURE,
-                            description=description,
-                            status=Anomaly.AnomalyStatus.PENDING,
-                            schedule=schedule
-                        )
-
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie créée: Pointage manquant - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
-                    elif existing_anomaly:
+                    # Une seule anomalie de pointage manquant, quel que soit son type
+                    if self._has_anomaly(site_employee, Anomaly.AnomalyType.MISSING_ARRIVAL) or \
+                            self._has_anomaly(site_employee, Anomaly.AnomalyType.MISSING_DEPARTURE):
                         if self.verbose:
                             self.stdout.write(f"Anomalie existante pour pointage manquant de {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}")
-                    elif dry_run:
-                        # En mode simulation, on compte quand même l'anomalie
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie simulée: Pointage manquant - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
+                    else:
+                        anomaly_type = Anomaly.AnomalyType.MISSING_ARRIVAL if arrivals < (expected_entries // 2) else Anomaly.AnomalyType.MISSING_DEPARTURE
+                        self._add_anomaly(site_employee, schedule, check_date, anomaly_type,
+                                          f"Pointage manquant selon le planning ({total_entries}/{expected_entries})",
+                                          "pointage manquant")
 
             # Pour les plannings fréquence, la logique est différente
             # On vérifie le nombre de pointages dans la journée
             elif schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
-                # Récupérer tous les pointages de l'employé pour ce jour
-                timesheets = Timesheet.objects.filter(
-                    employee=site_employee.employee,
-                    site=site_employee.site,
-                    timestamp__date=check_date
-                )
-
-                # Compter les arrivées et départs
-                arrivals = timesheets.filter(entry_type=Timesheet.EntryType.ARRIVAL).count()
-                departures = timesheets.filter(entry_type=Timesheet.EntryType.DEPARTURE).count()
-                total_entries = arrivals + departures
-
                 if self.verbose:
                     self.stdout.write(f"Pointages pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date} (fréquence): "
                                      f"{arrivals} arrivées, {departures} départs, {total_entries} total")
 
                 # Si l'employé n'a pas pointé du tout et qu'il devrait avoir un planning ce jour-là
                 if total_entries == 0 and schedule_detail.frequency_duration:
-                    # Vérifier si une anomalie similaire existe déjà
-                    existing_anomaly = Anomaly.objects.filter(
-                        employee=site_employee.employee,
-                        site=site_employee.site,
-                        date=check_date,
-                        anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL
-                    ).first()
-
-                    if not existing_anomaly and not dry_run:
-                        # Créer une anomalie pour le passage manqué
-                        description = f"Passage manqué selon le planning fréquence (durée prévue: {schedule_detail.frequency_duration} minutes)"
-
-                        anomaly = Anomaly.objects.create(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            date=check_date,
-                            anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
-                            description=description,
-                            status=Anomaly.AnomalyStatus.PENDING,
-                            schedule=schedule
-                        )
-
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie créée: MISSING_ARRIVAL - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
-                    elif existing_anomaly:
-                        if self.verbose:
-                            self.stdout.write(f"Anomalie existante pour passage manqué de {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}")
-                    elif dry_run:
-                        # En mode simulation, on compte quand même l'anomalie
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie simulée: MISSING_ARRIVAL - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
+                    self._add_anomaly(
+                        site_employee, schedule, check_date, Anomaly.AnomalyType.MISSING_ARRIVAL,
+                        f"Passage manqué selon le planning fréquence (durée prévue: {schedule_detail.frequency_duration} minutes)",
+                        "passage manqué"
+                    )
                 # Si l'employé a pointé une seule fois (arrivée sans départ ou départ sans arrivée)
                 elif total_entries == 1 and schedule_detail.frequency_duration:
-                    # Vérifier si une anomalie similaire existe déjà
-                    existing_anomaly = Anomaly.objects.filter(
-                        employee=site_employee.employee,
-                        site=site_employee.site,
-                        date=check_date,
-                        anomaly_type=Anomaly.AnomalyType.MISSING_DEPARTURE if arrivals > departures else Anomaly.AnomalyType.MISSING_ARRIVAL
-                    ).first()
-
-                    if not existing_anomaly and not dry_run:
-                        # Créer une anomalie pour le pointage manquant
-                        anomaly_type = Anomaly.AnomalyType.MISSING_DEPARTURE if arrivals > departures else Anomaly.AnomalyType.MISSING_ARRIVAL
-                        description = f"Pointage manquant selon le planning fréquence (durée prévue: {schedule_detail.frequency_duration} minutes)"
-
-                        anomaly = Anomaly.objects.create(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            date=check_date,
-                            anomaly_type=anomaly_type,
-                            description=description,
-                            status=Anomaly.AnomalyStatus.PENDING,
-                            schedule=schedule
-                        )
-
-                        anomalies_created += 1
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie créée: {anomaly_type} - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
-                    elif existing_anomaly:
-                        if self.verbose:
-                            self.stdout.write(f"Anomalie existante pour pointage manquant de {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}")
-                    elif dry_run:
-                        # En mode simulation, on compte quand même l'anomalie
-                        anomalies_created += 1
-                        anomaly_type = Anomaly.AnomalyType.MISSING_DEPARTURE if arrivals > departures else Anomaly.AnomalyType.MISSING_ARRIVAL
-                        self.stdout.write(self.style.SUCCESS(
-                            f"Anomalie simulée: {anomaly_type} - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
-                        ))
+                    anomaly_type = Anomaly.AnomalyType.MISSING_DEPARTURE if arrivals > departures else Anomaly.AnomalyType.MISSING_ARRIVAL
+                    self._add_anomaly(
+                        site_employee, schedule, check_date, anomaly_type,
+                        f"Pointage manquant selon le planning fréquence (durée prévue: {schedule_detail.frequency_duration} minutes)",
+                        "pointage manquant"
+                    )
                 # Si l'employé a pointé au moins 2 fois, c'est déjà traité dans le scan
                 elif total_entries >= 2:
                     if self.verbose:
                         self.stdout.write(f"{site_employee.employee.get_full_name()} a pointé {total_entries} fois au site {site_employee.site.name} le {check_date} (déjà traité dans le scan)")
 
+        anomalies_created = len(self._pending)
+        if not dry_run and self._pending:
+            anomalies_created = self._save_anomalies(self._pending)
+
         self.stdout.write(self.style.SUCCESS(f"{anomalies_created} anomalies créées pour les pointages manquants"))
+
+    def _has_anomaly(self, site_employee, anomaly_type):
+        return (site_employee.employee_id, site_employee.site_id, anomaly_type) in self._existing
+
+    def _add_anomaly(self, site_employee, schedule, check_date, anomaly_type, description, label):
+        """Prévoit la création d'une anomalie si aucune du même type n'existe pour la journée"""
+        if self._has_anomaly(site_employee, anomaly_type):
+            if self.verbose:
+                self.stdout.write(f"Anomalie existante pour {label} de {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}")
+            return
+
+        self._existing.add((site_employee.employee_id, site_employee.site_id, anomaly_type))
+        self._pending.append(Anomaly(
+            employee=site_employee.employee,
+            site=site_employee.site,
+            date=check_date,
+            anomaly_type=anomaly_type,
+            dedup_subtype=anomaly_dedup.DAILY,
+            description=description,
+            status=Anomaly.AnomalyStatus.PENDING,
+            schedule=schedule
+        ))
+        action = "simulée" if self._dry_run else "créée"
+        self.stdout.write(self.style.SUCCESS(
+            f"Anomalie {action}: {anomaly_type} - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {check_date}"
+        ))
+
+    def _save_anomalies(self, anomalies):
+        """Insère les anomalies en masse et retourne le nombre d'anomalies insérées
+
+        Les alertes sont créées par lot lors de l'insertion ; les synthèses journalières
+        sont mises à jour via le signal post_save, émis manuellement après l'insertion
+        comme pour les autres écritures groupées.
+        """
+        with daily_attendance.deferred_recompute():
+            # Une anomalie enregistrée entre-temps par un autre traitement n'est pas dupliquée
+            anomalies = anomaly_dedup.bulk_upsert(anomalies, batch_size=self.BATCH_SIZE)
+            for anomaly in anomalies:
+                post_save.send(sender=Anomaly, instance=anomaly, created=True, update_fields=None,
+                               raw=False, using=anomaly._state.db)
+        return len(anomalies)
@@ -152,13 +152,13 @@ class Command(BaseCommand):
                     timesheets = Timesheet.objects.filter(
                         employee=employee,
                         site=site,
-                        timestamp__date__range=[start_date, end_date]
+                        date__range=[start_date, end_date]
                     ).order_by('timestamp')
                     
                     # Récupérer les anomalies de l'employé pour ce site dans la période
                     anomalies = Anomaly.objects.filter(
                         Q(employee=employee, site=site, date__range=[start_date, end_date]) |
-                        Q(timesheet__employee=employee, timesheet__site=site, timesheet__timestamp__date__range=[start_date, end_date])
+                        Q(timesheet__employee=employee, timesheet__site=site, timesheet__date__range=[start_date, end_date])
                     ).distinct()
                     
                     # Si on veut uniquement les données avec anomalies et qu'il n'y en a pas, passer
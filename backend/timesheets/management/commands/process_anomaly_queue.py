@@ -0,0 +1,263 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from timesheets.models import Timesheet, AnomalyProcessingJob
+from timesheets.utils.anomaly_processor import AnomalyProcessor
+from timesheets.utils import daily_attendance
+
+
+class Command(BaseCommand):
+    help = '''
+    Traite la file d'attente des pointages à analyser (mode TIMESHEET_ASYNC_PROCESSING).
+    Chaque pointage est analysé par AnomalyProcessor (anomalies et alertes). Les tâches
+    en échec sont réessayées avec un délai croissant.
+
+    Exemples d'utilisation :
+
+    # Vider la file une fois puis s'arrêter
+    python manage.py process_anomaly_queue
+
+    # Tourner en continu (worker)
+    python manage.py process_anomaly_queue --loop
+
+    # Traiter les tâches par lots de 50
+    python manage.py process_anomaly_queue --batch-size 50
+
+    # Afficher uniquement les métriques de la file (profondeur, délai de traitement)
+    python manage.py process_anomaly_queue --stats
+
+    # Exécuter en mode simulation sans modifier la base de données
+    python manage.py process_anomaly_queue --dry-run
+
+    # Afficher des informations détaillées pendant l'exécution
+    python manage.py process_anomaly_queue --verbose
+    '''
+
+    # Délai avant nouvelle tentative : BACKOFF_BASE * 2^(tentatives - 1), plafonné
+    BACKOFF_BASE_SECONDS = 30
+    BACKOFF_MAX_SECONDS = 3600
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.verbose = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Nombre de tâches réservées par lot (par défaut: 100)'
+        )
+        parser.add_argument(
+            '--max-attempts',
+            type=int,
+            default=5,
+            help='Nombre maximal de tentatives avant de marquer une tâche en échec (par défaut: 5)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Tourner en continu au lieu de s\'arrêter quand la file est vide'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Attente en secondes entre deux passages quand la file est vide (par défaut: 2)'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Délai en secondes après lequel une tâche en cours est considérée abandonnée (par défaut: 600)'
+        )
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            default=7,
+            help='Supprimer les tâches terminées depuis plus de N jours (par défaut: 7)'
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Afficher les métriques de la file et s\'arrêter'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Exécuter en mode simulation sans modifier la base de données'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Afficher des informations détaillées pendant l\'exécution'
+        )
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose']
+
+        if options['stats']:
+            self._display_metrics()
+            return
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Mode simulation activé - aucune modification ne sera effectuée"))
+            pending = AnomalyProcessingJob.objects.filter(
+                status=AnomalyProcessingJob.JobStatus.PENDING,
+                available_at__lte=timezone.now()
+            ).count()
+            self.stdout.write(f"{pending} tâche(s) prête(s) à être traitée(s)")
+            self._display_metrics()
+            return
+
+        total_processed = 0
+        total_failed = 0
+        try:
+            while True:
+                self._release_stale_jobs(options['stale_after'])
+                jobs = self._claim_jobs(options['batch_size'])
+
+                for job in jobs:
+                    if self._process_job(job, options['max_attempts']):
+                        total_processed += 1
+                    else:
+                        total_failed += 1
+
+                if jobs:
+                    metrics = AnomalyProcessingJob.get_queue_metrics()
+                    self.logger.info(f"Lot traité: {len(jobs)} tâche(s), file: {metrics['pending']} en attente, "
+                                     f"délai moyen: {metrics['avg_lag_seconds']:.1f}s, délai max: {metrics['max_lag_seconds']:.1f}s")
+                    continue
+
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interruption demandée, arrêt du worker"))
+
+        purged = self._purge_done_jobs(options['purge_days'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Traitement terminé: {total_processed} pointage(s) analysé(s), {total_failed} échec(s), "
+            f"{purged} tâche(s) terminée(s) purgée(s)"
+        ))
+        self._display_metrics()
+
+    def _claim_jobs(self, batch_size):
+        """Réserve un lot de tâches prêtes (sans bloquer les autres workers)"""
+        now = timezone.now()
+        with transaction.atomic():
+            jobs = list(
+                AnomalyProcessingJob.objects.select_for_update(skip_locked=True).filter(
+                    status=AnomalyProcessingJob.JobStatus.PENDING,
+                    available_at__lte=now
+                ).order_by('available_at')[:batch_size]
+            )
+            if jobs:
+                AnomalyProcessingJob.objects.filter(id__in=[job.id for job in jobs]).update(
+                    status=AnomalyProcessingJob.JobStatus.PROCESSING,
+                    started_at=now,
+                    attempts=F('attempts') + 1
+                )
+                for job in jobs:
+                    job.status = AnomalyProcessingJob.JobStatus.PROCESSING
+                    job.started_at = now
+                    job.attempts += 1
+        return jobs
+
+    def _process_job(self, job, max_attempts):
+        """Analyse le pointage d'une tâche et met à jour son statut"""
+        error = None
+        try:
+            timesheet = Timesheet.objects.select_related('employee', 'site').get(id=job.timesheet_id)
+            # Empêcher le signal post_save de remettre le pointage dans la file pendant son analyse
+            timesheet._processing_anomalies = True
+            with daily_attendance.deferred_recompute(), transaction.atomic():
+                result = AnomalyProcessor().process_timesheet(timesheet)
+            if not result.get('success', False):
+                error = result.get('message', 'Erreur inconnue')
+        except Timesheet.DoesNotExist:
+            # Le pointage a été supprimé entre-temps : la tâche est supprimée en cascade
+            return True
+        except Exception as e:
+            self.logger.error(f"Erreur lors de l'analyse du pointage {job.timesheet_id}: {str(e)}", exc_info=True)
+            error = str(e)
+
+        # Ne mettre à jour que si la tâche n'a pas été remise dans la file entre-temps
+        current_job = AnomalyProcessingJob.objects.filter(
+            id=job.id,
+            status=AnomalyProcessingJob.JobStatus.PROCESSING,
+            enqueued_at=job.enqueued_at
+        )
+        now = timezone.now()
+
+        if error is None:
+            current_job.update(
+                status=AnomalyProcessingJob.JobStatus.DONE,
+                processed_at=now,
+                last_error=''
+            )
+            if self.verbose:
+                self.stdout.write(f"Pointage {job.timesheet_id} analysé (délai: {(now - job.enqueued_at).total_seconds():.1f}s)")
+            return True
+
+        if job.attempts >= max_attempts:
+            current_job.update(
+                status=AnomalyProcessingJob.JobStatus.FAILED,
+                processed_at=now,
+                last_error=error
+            )
+            self.stdout.write(self.style.ERROR(
+                f"Pointage {job.timesheet_id} en échec après {job.attempts} tentative(s): {error}"
+            ))
+        else:
+            delay = min(self.BACKOFF_BASE_SECONDS * 2 ** (job.attempts - 1), self.BACKOFF_MAX_SECONDS)
+            current_job.update(
+                status=AnomalyProcessingJob.JobStatus.PENDING,
+                available_at=now + timedelta(seconds=delay),
+                last_error=error
+            )
+            self.stdout.write(self.style.WARNING(
+                f"Pointage {job.timesheet_id} en erreur (tentative {job.attempts}/{max_attempts}), "
+                f"nouvelle tentative dans {delay}s: {error}"
+            ))
+        return False
+
+    def _release_stale_jobs(self, stale_after):
+        """Remet dans la file les tâches restées en cours (worker interrompu)"""
+        released = AnomalyProcessingJob.objects.filter(
+            status=AnomalyProcessingJob.JobStatus.PROCESSING,
+            started_at__lt=timezone.now() - timedelta(seconds=stale_after)
+        ).update(status=AnomalyProcessingJob.JobStatus.PENDING, available_at=timezone.now())
+        if released:
+            self.stdout.write(self.style.WARNING(f"{released} tâche(s) abandonnée(s) remise(s) dans la file"))
+        return released
+
+    def _purge_done_jobs(self, purge_days):
+        """Supprime les tâches terminées les plus anciennes"""
+        if purge_days is None or purge_days < 0:
+            return 0
+        purged, _ = AnomalyProcessingJob.objects.filter(
+            status=AnomalyProcessingJob.JobStatus.DONE,
+            processed_at__lt=timezone.now() - timedelta(days=purge_days)
+        ).delete()
+        return purged
+
+    def _display_metrics(self):
+        """Affiche les métriques de la file d'analyse"""
+        metrics = AnomalyProcessingJob.get_queue_metrics()
+        self.stdout.write(
+            f"File d'analyse: {metrics['pending']} en attente, {metrics['processing']} en cours, "
+            f"{metrics['failed']} en échec, plus ancienne tâche en attente: {metrics['oldest_pending_seconds']:.1f}s"
+        )
+        self.stdout.write(
+            f"Délai de traitement (dernière heure, {metrics['processed_in_window']} tâche(s)): "
+            f"moyen {metrics['avg_lag_seconds']:.1f}s, maximal {metrics['max_lag_seconds']:.1f}s"
+        )
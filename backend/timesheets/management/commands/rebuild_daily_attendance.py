@@ -0,0 +1,111 @@
+import logging
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from timesheets.utils import daily_attendance
+
+
+class Command(BaseCommand):
+    help = '''
+    Reconstruit la table des synthèses journalières (DailyAttendance) à partir des
+    pointages et des anomalies. À utiliser pour l'initialisation de la table ou après
+    une modification en masse des données (import, réparation, etc.).
+
+    Exemples d'utilisation :
+
+    # Reconstruire les synthèses des 30 derniers jours
+    python manage.py rebuild_daily_attendance
+
+    # Reconstruire les synthèses d'une période spécifique
+    python manage.py rebuild_daily_attendance --start-date 2025-01-01 --end-date 2025-04-30
+
+    # Reconstruire les synthèses d'un site ou d'un employé
+    python manage.py rebuild_daily_attendance --site 1
+    python manage.py rebuild_daily_attendance --employee 1
+
+    # Exécuter en mode simulation sans modifier la base de données
+    python manage.py rebuild_daily_attendance --dry-run
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.verbose = False
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start-date',
+            type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help='Date de début au format YYYY-MM-DD (par défaut: 30 jours avant aujourd\'hui)'
+        )
+        parser.add_argument(
+            '--end-date',
+            type=lambda s: datetime.strptime(s, '%Y-%m-%d').date(),
+            help='Date de fin au format YYYY-MM-DD (par défaut: aujourd\'hui)'
+        )
+        parser.add_argument(
+            '--site',
+            type=int,
+            help='ID du site à traiter (par défaut: tous les sites)'
+        )
+        parser.add_argument(
+            '--employee',
+            type=int,
+            help='ID de l\'employé à traiter (par défaut: tous les employés)'
+        )
+        parser.add_argument(
+            '--days-per-batch',
+            type=int,
+            default=31,
+            help='Nombre de jours reconstruits par transaction (par défaut: 31)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Exécuter en mode simulation sans modifier la base de données'
+        )
+        parser.add_argument(
+            '--verbose',
+            action='store_true',
+            help='Afficher des informations détaillées pendant l\'exécution'
+        )
+
+    def handle(self, *args, **options):
+        self.verbose = options['verbose']
+        end_date = options['end_date'] or timezone.localtime(timezone.now()).date()
+        start_date = options['start_date'] or (end_date - timedelta(days=30))
+        if start_date > end_date:
+            raise CommandError("La date de début doit être antérieure à la date de fin")
+        if options['days_per_batch'] < 1:
+            raise CommandError("--days-per-batch doit être supérieur ou égal à 1")
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING("Mode simulation activé - aucune modification ne sera effectuée"))
+
+        self.stdout.write(f"Reconstruction des synthèses journalières du {start_date} au {end_date}")
+
+        total = 0
+        batch_start = start_date
+        while batch_start <= end_date:
+            batch_end = min(batch_start + timedelta(days=options['days_per_batch'] - 1), end_date)
+            try:
+                count = daily_attendance.rebuild(
+                    batch_start,
+                    batch_end,
+                    site_id=options['site'],
+                    employee_id=options['employee'],
+                    dry_run=options['dry_run']
+                )
+            except Exception as e:
+                self.logger.error(f"Erreur lors de la reconstruction des synthèses: {str(e)}", exc_info=True)
+                raise CommandError(f"Erreur lors de la reconstruction des synthèses: {str(e)}")
+
+            total += count
+            if self.verbose:
+                self.stdout.write(f"Du {batch_start} au {batch_end}: {count} synthèse(s)")
+            batch_start = batch_end + timedelta(days=1)
+
+        action = "à reconstruire" if options['dry_run'] else "reconstruite(s)"
+        self.stdout.write(self.style.SUCCESS(f"{total} synthèse(s) journalière(s) {action}"))
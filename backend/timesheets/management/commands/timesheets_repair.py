@@ -2,7 +2,6 @@ import logging
 from datetime import datetime, timedelta
 
 from django.core.management.base import BaseCommand, CommandError
-from django.db import transaction
 from django.utils import timezone
 
 from timesheets.models import Timesheet, Anomaly
@@ -11,16 +10,18 @@ from users.models import User
 from timesheets.views import ScanAnomaliesView
 from rest_framework.test import APIRequestFactory
 from rest_framework.serializers import ValidationError
-from timesheets.utils.anomaly_processor import AnomalyProcessor
+from timesheets.utils import parallel_scan, repair_stream
 
 
 class Command(BaseCommand):
     help = '''
-    Répare les pointages et les anomalies en supprimant toutes les anomalies existantes
-    et en recréant les pointages dans l'ordre chronologique.
+    Répare les pointages et les anomalies en supprimant les anomalies existantes
+    et en recalculant les pointages dans l'ordre chronologique.
 
-    Par défaut, la commande supprime et recrée les pointages dans l'ordre chronologique
-    pour éviter les problèmes de validation liés à l'ordre des pointages.
+    La période est parcourue par partition (employé, site) et par fenêtre de quelques
+    jours, chaque fenêtre dans sa propre transaction : les pointages sont recalculés
+    sur place (identifiants et dates de création conservés). Une réparation
+    interrompue reprend automatiquement à la dernière fenêtre terminée.
 
     Exemples d'utilisation :
 
@@ -45,6 +46,12 @@ class Command(BaseCommand):
     # Ignorer les validations lors de la sauvegarde des pointages
     python manage.py timesheets_repair --skip-validation
 
+    # Réanalyser 7 jours par transaction
+    python manage.py timesheets_repair --chunk-days 7
+
+    # Ignorer le point de reprise d'une exécution interrompue et tout recommencer
+    python manage.py timesheets_repair --restart
+
     # Ignorer les erreurs et continuer le traitement
     python manage.py timesheets_repair --ignore-errors
 
@@ -53,6 +60,10 @@ class Command(BaseCommand):
 
     # Ne pas vérifier les absences des employés selon leur planning (désactiver la vérification par défaut)
     python manage.py timesheets_repair --no-check-absences
+
+    # Réanalyser en parallèle sur 8 processus (une transaction courte par couple site-employé,
+    # les pointages sont recalculés sans être recréés)
+    python manage.py timesheets_repair --start-date 2025-01-01 --end-date 2025-03-31 --workers 8
     '''
 
     def _is_timesheet_matching_schedule(self, timesheet, schedule):
@@ -215,18 +226,35 @@ class Command(BaseCommand):
         parser.add_argument(
             '--skip-validation',
             action='store_true',
-            help='Ignorer les validations lors de la sauvegarde des pointages'
+            help='Sans effet, conservée pour compatibilité (les pointages ne sont plus réenregistrés)'
         )
         parser.add_argument(
             '--no-recreate-entries',
             action='store_true',
-            help='Ne pas supprimer et recréer les pointages (utiliser le recalcul simple)'
+            help='Sans effet, conservée pour compatibilité (les pointages sont toujours recalculés sur place)'
         )
         parser.add_argument(
             '--no-check-absences',
             action='store_true',
             help='Ne pas vérifier les absences des employés selon leur planning'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Nombre de processus pour une réanalyse parallèle par couple site-employé (par défaut: 1, sans parallélisme)'
+        )
+        parser.add_argument(
+            '--chunk-days',
+            type=int,
+            default=repair_stream.CHUNK_DAYS,
+            help=f'Nombre de jours réanalysés par transaction pour un couple employé-site (par défaut: {repair_stream.CHUNK_DAYS})'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignorer le point de reprise d\'une exécution interrompue et reprendre depuis le début'
+        )
 
     def handle(self, *args, **options):
         # Configurer le logger
@@ -250,7 +278,6 @@ class Command(BaseCommand):
         logger.setLevel(log_level)
 
         # Initialiser les options
-        self.skip_validation = options.get('skip_validation', False)
         self.ignore_errors = options.get('ignore_errors', False)
 
         # Configurer les dates
@@ -280,9 +307,6 @@ class Command(BaseCommand):
         if options['dry_run']:
             self.stdout.write(self.style.WARNING("Mode simulation activé - aucune modification ne sera effectuée"))
 
-        if self.skip_validation:
-            self.stdout.write(self.style.WARNING("Validation des pointages désactivée - les pointages seront sauvegardés sans validation"))
-
         if self.ignore_errors:
             self.stdout.write(self.style.WARNING("Ignorer les erreurs activé - les erreurs seront ignorées et le traitement continuera"))
 
@@ -291,274 +315,115 @@ class Command(BaseCommand):
         else:
             self.stdout.write(self.style.WARNING("Vérification des absences désactivée - les absences des employés ne seront pas vérifiées"))
 
-        # Commencer la réparation
-        try:
-            with transaction.atomic():
-                # 1. Supprimer toutes les anomalies existantes
-                anomalies_count = self._delete_anomalies(start_date, end_date, options['site'], options['employee'], options['dry_run'])
-                self.stdout.write(self.style.SUCCESS(f"{anomalies_count} anomalies supprimées"))
-
-                # 2. Par défaut, supprimer et recréer les pointages, sauf si l'option no-recreate-entries est activée
-                if options.get('no_recreate_entries', False):
-                    # Recalculer le statut des pointages existants
-                    processed_count = self._recalculate_timesheet_status(start_date, end_date, options['site'], options['employee'], options['dry_run'])
-                    self.stdout.write(self.style.SUCCESS(f"{processed_count} pointages recalculés"))
-                else:
-                    # Supprimer et recréer les pointages
-                    processed_count = self._recreate_timesheet_entries(start_date, end_date, options['site'], options['employee'], options['dry_run'])
-                    self.stdout.write(self.style.SUCCESS(f"{processed_count} pointages recréés"))
-
-                # 3. Vérifier les absences par défaut, sauf si l'option no-check-absences est activée
-                if not options.get('no_check_absences', False):
-                    self.stdout.write("Vérification des absences des employés...")
-                    processor = AnomalyProcessor()
-                    absences_detected = processor.check_employee_absences(
-                        start_date=start_date,
-                        end_date=end_date,
-                        site_id=options['site'],
-                        employee_id=options['employee']
-                    )
-                    self.stdout.write(self.style.SUCCESS(f"{absences_detected} anomalies d'absence détectées"))
-
-                if options['dry_run']:
-                    # Annuler la transaction en mode simulation
-                    transaction.set_rollback(True)
-                    self.stdout.write(self.style.WARNING("Mode simulation - toutes les modifications ont été annulées"))
-
-            self.stdout.write(self.style.SUCCESS("Réparation terminée avec succès"))
-
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f"Erreur lors de la réparation: {str(e)}"))
-            logger.error(f"Erreur lors de la réparation: {str(e)}", exc_info=True)
-            raise CommandError(f"Erreur lors de la réparation: {str(e)}")
-
-    def _delete_anomalies(self, start_date, end_date, site_id=None, employee_id=None, dry_run=False):
-        """Supprime toutes les anomalies existantes dans la période spécifiée"""
-        query = Anomaly.objects.filter(date__gte=start_date, date__lte=end_date)
-
-        if site_id:
-            query = query.filter(site_id=site_id)
-
-        if employee_id:
-            query = query.filter(employee_id=employee_id)
-
-        count = query.count()
-
-        if not dry_run:
-            # Supprimer réellement les anomalies au lieu de les marquer comme ignorées
-            # pour éviter les doublons lors des exécutions répétées de la commande
-            query.delete()
-            self.stdout.write(self.style.SUCCESS(f"Suppression de {count} anomalies existantes"))
-
-        return count
-
-    def _process_timesheet_anomalies(self, timesheet):
-        """Traite les anomalies pour un pointage donné en utilisant l'AnomalyProcessor"""
-        processor = AnomalyProcessor()
-
-        # Traiter les anomalies avec l'AnomalyProcessor
-        result = processor.process_timesheet(
-            timesheet=timesheet,
-            force_update=True  # Force la mise à jour car on est en mode réparation
-        )
+        # Réanalyse parallèle : transactions courtes par couple site-employé
+        if options['workers'] > 1:
+            self._repair_in_parallel(start_date, end_date, options)
+            return
 
-        # Afficher les détails des anomalies détectées
-        if result['success'] and result.get('has_anomalies', False):
-            anomalies = result.get('anomalies', [])
-            if anomalies:
-                self.stdout.write(self.style.WARNING(f"Détails des anomalies détectées pour le pointage {timesheet.id}:"))
-                for anomaly in anomalies:
-                    anomaly_type = anomaly.get_anomaly_type_display()
-                    self.stdout.write(self.style.WARNING(f"  - Type: {anomaly_type}"))
-                    self.stdout.write(self.style.WARNING(f"    Description: {anomaly.description}"))
-                    if anomaly.schedule:
-                        self.stdout.write(self.style.WARNING(f"    Planning: {anomaly.schedule} (ID: {anomaly.schedule.id})"))
-                    if anomaly.minutes:
-                        self.stdout.write(self.style.WARNING(f"    Minutes: {anomaly.minutes}"))
-
-        return processor.has_anomalies(), result.get('anomalies', [])
-
-    def _recreate_timesheet_entries(self, start_date, end_date, site_id=None, employee_id=None, dry_run=False):
-        """Supprime et recrée les pointages dans l'ordre chronologique"""
-        # Configurer le logger
-        logger = logging.getLogger(__name__)
+        self._repair_streaming(start_date, end_date, options)
 
-        # Récupérer tous les pointages pour la période spécifiée
-        query = Timesheet.objects.filter(timestamp__date__gte=start_date, timestamp__date__lte=end_date)
-
-        if site_id:
-            query = query.filter(site_id=site_id)
-
-        if employee_id:
-            query = query.filter(employee_id=employee_id)
-
-        # Ordonner les pointages par timestamp croissant (du plus ancien au plus récent)
-        query = query.order_by('timestamp')
-
-        # Stocker les pointages en mémoire avant de les supprimer
-        timesheet_data = []
-        for timesheet in query:
-            # Stocker toutes les données nécessaires pour recréer le pointage
-            timesheet_data.append({
-                'employee_id': timesheet.employee_id,
-                'site_id': timesheet.site_id,
-                'timestamp': timesheet.timestamp,
-                'entry_type': timesheet.entry_type,
-                'scan_type': timesheet.scan_type,
-                'latitude': timesheet.latitude,
-                'longitude': timesheet.longitude,
-                'created_at': timesheet.created_at,
-                'updated_at': timesheet.updated_at
-            })
-
-        # Compter le nombre de pointages à recréer
-        count = len(timesheet_data)
-        self.stdout.write(f"Suppression et recréation de {count} pointages")
-
-        if dry_run:
-            return count
-
-        # Supprimer tous les pointages
-        query.delete()
-        self.stdout.write(f"{count} pointages supprimés")
-
-        # Recréer les pointages dans l'ordre chronologique
-        processed_count = 0
-        error_count = 0
-
-        # Désactiver temporairement les signaux pour éviter les effets secondaires
-        from django.db.models.signals import pre_save, post_save
-        from django.dispatch import receiver
-
-        # Sauvegarder les récepteurs actuels
-        saved_pre_save_receivers = pre_save.receivers
-        saved_post_save_receivers = post_save.receivers
-
-        # Vider les récepteurs
-        pre_save.receivers = []
-        post_save.receivers = []
+    def _repair_streaming(self, start_date, end_date, options):
+        """Réanalyse la période partition par partition, une transaction par fenêtre"""
+        check_absences = not options.get('no_check_absences', False)
+        verbose = options['verbose']
 
-        try:
-            # Recréer les pointages
-            for data in timesheet_data:
-                try:
-                    # Créer un nouveau pointage avec les données sauvegardées
-                    timesheet = Timesheet(
-                        employee_id=data['employee_id'],
-                        site_id=data['site_id'],
-                        timestamp=data['timestamp'],
-                        entry_type=data['entry_type'],
-                        scan_type=data['scan_type'],
-                        latitude=data['latitude'],
-                        longitude=data['longitude']
-                    )
-
-                    # Sauvegarder sans validation
-                    if self.skip_validation:
-                        # Sauvegarder directement sans appeler clean()
-                        timesheet.save()
-                        # Mettre à jour les champs created_at et updated_at
-                        from django.db import connection
-                        cursor = connection.cursor()
-                        cursor.execute(
-                            "UPDATE timesheets_timesheet SET created_at = %s, updated_at = %s "
-                            "WHERE id = %s",
-                            [data['created_at'], data['updated_at'], timesheet.id]
-                        )
-                    else:
-                        # Sauvegarder normalement avec validation
-                        timesheet.save()
-
-                    # Afficher les informations détaillées sur le pointage
-                    self.stdout.write(f"Traitement du pointage pour {timesheet.site.nfc_id} {timesheet.employee.get_full_name()} - "
-                                     f"{timesheet.timestamp} - {timesheet.get_entry_type_display()}")
-
-                    # Utiliser l'AnomalyProcessor pour détecter les anomalies
-                    has_anomalies, anomalies = self._process_timesheet_anomalies(timesheet)
-
-                    if has_anomalies:
-                        self.stdout.write(self.style.WARNING(
-                            f"Anomalies détectées pour le pointage {timesheet.id} du {timesheet.timestamp} - {timesheet.get_entry_type_display()} - {timesheet.employee.get_full_name()} - {timesheet.site.name}"
-                        ))
-
-                    processed_count += 1
-                    self.stdout.write(f"Pointage recréé: {timesheet.timestamp} - {timesheet.get_entry_type_display()}")
-
-                except Exception as e:
-                    error_count += 1
-                    error_message = str(e)
-                    self.stdout.write(self.style.ERROR(f"Erreur lors de la recréation du pointage: {error_message}"))
-
-                    # Si l'option ignore-errors n'est pas activée, lever l'exception
-                    if not self.ignore_errors:
-                        raise
-
-        finally:
-            # Restaurer les récepteurs
-            pre_save.receivers = saved_pre_save_receivers
-            post_save.receivers = saved_post_save_receivers
-
-        if error_count > 0:
-            self.stdout.write(self.style.WARNING(f"{error_count} erreurs rencontrées lors de la recréation des pointages"))
-
-        return processed_count
-
-    def _recalculate_timesheet_status(self, start_date, end_date, site_id=None, employee_id=None, dry_run=False):
-        """Recalcule le statut de tous les pointages dans la période spécifiée"""
-        # Configurer le logger
-        logger = logging.getLogger(__name__)
-
-        query = Timesheet.objects.filter(timestamp__date__gte=start_date, timestamp__date__lte=end_date)
-
-        if site_id:
-            query = query.filter(site_id=site_id)
-
-        if employee_id:
-            query = query.filter(employee_id=employee_id)
-
-        # Ordonner les pointages par timestamp croissant (du plus ancien au plus récent)
-        # pour traiter les arrivées avant les départs
-        query = query.order_by('timestamp')
-
-        count = query.count()
-        processed_count = 0
-        error_count = 0
-
-        if not dry_run:
-            # Réinitialiser les statuts des pointages
-            for timesheet in query:
-                try:
-                    # Réinitialiser les champs de statut
-                    timesheet.is_late = False
-                    timesheet.late_minutes = 0
-                    timesheet.is_early_departure = False
-                    timesheet.early_departure_minutes = 0
-                    timesheet.is_out_of_schedule = False
-                    timesheet.is_ambiguous = False
-
-                    # Utiliser l'AnomalyProcessor au lieu de l'ancien code
-                    has_anomalies, anomalies = self._process_timesheet_anomalies(timesheet)
-
-                    if has_anomalies:
-                        self.stdout.write(self.style.WARNING(
-                            f"Anomalies détectées pour le pointage {timesheet.id} du {timesheet.timestamp} - {timesheet.get_entry_type_display()} - {timesheet.employee.get_full_name()} - {timesheet.site.name}"
-                        ))
-
-                    processed_count += 1
-                    self.stdout.write(f"Pointage {timesheet.id} recalculé: {timesheet.timestamp} - {timesheet.get_entry_type_display()}")
-
-                except Exception as e:
-                    error_count += 1
-                    error_message = str(e)
-                    self.stdout.write(self.style.ERROR(f"Erreur lors du recalcul du pointage {timesheet.id}: {error_message}"))
-
-                    # Si l'option ignore-errors n'est pas activée, lever l'exception
-                    if not self.ignore_errors:
-                        raise
+        if options['dry_run']:
+            partitions = repair_stream.iter_partitions(start_date, end_date, options['site'], options['employee'],
+                                                       include_assignments=check_absences)
+            partitions_count = sum(1 for _ in partitions)
+            query = Timesheet.objects.filter(date__gte=start_date, date__lte=end_date)
+            anomalies = Anomaly.objects.filter(date__gte=start_date, date__lte=end_date)
+            if options['site']:
+                query = query.filter(site_id=options['site'])
+                anomalies = anomalies.filter(site_id=options['site'])
+            if options['employee']:
+                query = query.filter(employee_id=options['employee'])
+                anomalies = anomalies.filter(employee_id=options['employee'])
+            self.stdout.write(f"{partitions_count} couple(s) employé-site, {query.count()} pointages à recalculer, "
+                              f"{anomalies.count()} anomalies à supprimer")
+            self.stdout.write(self.style.WARNING("Mode simulation - aucune modification effectuée"))
+            return
+
+        def on_chunk(employee_id, site_id, window_start, window_end, result):
+            if verbose:
+                self.stdout.write(
+                    f"Employé {employee_id} / site {site_id} du {window_start} au {window_end}: "
+                    f"{result['timesheets_processed']} pointages, {result['anomalies_created']} anomalies"
+                )
 
-        if error_count > 0:
-            self.stdout.write(self.style.WARNING(f"{error_count} erreurs rencontrées lors du recalcul des pointages"))
+        repair = repair_stream.StreamingRepair(
+            start_date, end_date,
+            site_id=options['site'],
+            employee_id=options['employee'],
+            check_absences=check_absences,
+            chunk_days=options['chunk_days'],
+            restart=options['restart'],
+            on_chunk=on_chunk
+        )
+        resume_partition, resume_date = repair.resume_position()
+        if resume_partition is not None:
+            self.stdout.write(self.style.WARNING(
+                f"Reprise d'une réparation interrompue: employé {resume_partition[0]} / site {resume_partition[1]} "
+                f"après le {resume_date} (--restart pour recommencer)"
+            ))
+
+        stats = repair.run(stop_on_error=not self.ignore_errors)
+
+        self.stdout.write(self.style.SUCCESS(f"{stats['timesheets_processed']} pointages recalculés"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['anomalies_created']} anomalies traitées dont {stats['absences_detected']} anomalies d'absence "
+            f"({stats['partitions']} couple(s) employé-site, {stats['chunks']} fenêtre(s))"
+        ))
+        for employee_id, site_id, window_start, message in stats['errors']:
+            self.stdout.write(self.style.ERROR(
+                f"Erreur pour l'employé {employee_id} / site {site_id} à partir du {window_start}: {message}"
+            ))
+        if stats['errors'] and not self.ignore_errors:
+            raise CommandError("Erreur lors de la réparation, relancer la commande pour reprendre au dernier point de reprise")
+        self.stdout.write(self.style.SUCCESS("Réparation terminée avec succès"))
+
+    def _repair_in_parallel(self, start_date, end_date, options):
+        """Réanalyse la période sur plusieurs processus, par lots de couples site-employé
+
+        Les pointages ne sont pas recréés : leurs statuts sont recalculés et les
+        anomalies de chaque couple sont supprimées puis recréées dans une transaction
+        propre au couple.
+        """
+        workers = options['workers']
+        check_absences = not options.get('no_check_absences', False)
 
-        return processed_count
+        if options['dry_run']:
+            pairs = parallel_scan.list_pairs(start_date, end_date, options['site'], options['employee'],
+                                             include_assignments=check_absences)
+            shards = parallel_scan.build_shards(pairs, workers * parallel_scan.SHARDS_PER_WORKER)
+            self.stdout.write(f"{len(pairs)} couple(s) site-employé répartis en {len(shards)} lot(s) sur {workers} processus")
+            self.stdout.write(self.style.WARNING("Mode simulation - aucune modification effectuée"))
+            return
+
+        def on_progress(done, total, result):
+            self.stdout.write(
+                f"Lot {done}/{total}: {result['pairs']} couple(s), {result['timesheets_processed']} pointage(s), "
+                f"{result['anomalies_created']} anomalie(s), {len(result['errors'])} erreur(s)"
+            )
 
+        self.stdout.write(f"Réanalyse parallèle sur {workers} processus")
+        summary = parallel_scan.run_parallel_scan(
+            start_date, end_date,
+            site_id=options['site'],
+            employee_id=options['employee'],
+            workers=workers,
+            force_update=True,
+            check_absences=check_absences,
+            progress_callback=on_progress
+        )
 
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['pairs']} couple(s) site-employé réanalysé(s) en {summary['duration']}s: "
+            f"{summary['timesheets_processed']} pointages recalculés, {summary['anomalies_created']} anomalies, "
+            f"{summary['absences_detected']} anomalies d'absence détectées"
+        ))
+        for site_id, employee_id, message in summary['errors']:
+            self.stdout.write(self.style.ERROR(f"Erreur pour le site {site_id} / employé {employee_id}: {message}"))
+        if summary['errors'] and not self.ignore_errors:
+            raise CommandError(f"{len(summary['errors'])} couple(s) site-employé en erreur")
+        self.stdout.write(self.style.SUCCESS("Réparation terminée avec succès"))
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheets', '0007_alter_anomaly_anomaly_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnomalyProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'En attente'), ('PROCESSING', 'En cours'), ('DONE', 'Terminé'), ('FAILED', 'Échec')], default='PENDING', max_length=20, verbose_name='statut')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='tentatives')),
+                ('enqueued_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='ajouté à la file le')),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='disponible à partir du')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='démarré le')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='traité le')),
+                ('last_error', models.TextField(blank=True, verbose_name='dernière erreur')),
+                ('timesheet', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='processing_job', to='timesheets.timesheet', verbose_name='pointage')),
+            ],
+            options={
+                'verbose_name': "tâche d'analyse de pointage",
+                'verbose_name_plural': "tâches d'analyse de pointage",
+                'ordering': ['available_at'],
+                'indexes': [models.Index(fields=['status', 'available_at'], name='timesheets__status_1fd0f0_idx')],
+            },
+        ),
+    ]
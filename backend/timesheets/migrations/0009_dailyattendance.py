@@ -0,0 +1,45 @@
+# Generated by Django 4.2.10 on 2026-10-17 17:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0018_schedule_activation_dates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('timesheets', '0008_anomalyprocessingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('first_arrival', models.DateTimeField(blank=True, null=True, verbose_name='première arrivée')),
+                ('last_departure', models.DateTimeField(blank=True, null=True, verbose_name='dernier départ')),
+                ('worked_minutes', models.PositiveIntegerField(default=0, verbose_name='minutes travaillées')),
+                ('late_minutes', models.PositiveIntegerField(default=0, verbose_name='minutes de retard')),
+                ('early_departure_minutes', models.PositiveIntegerField(default=0, verbose_name='minutes de départ anticipé')),
+                ('scan_count', models.PositiveIntegerField(default=0, verbose_name='nombre de pointages')),
+                ('anomaly_count', models.PositiveIntegerField(default=0, verbose_name="nombre d'anomalies")),
+                ('pending_anomaly_count', models.PositiveIntegerField(default=0, verbose_name="nombre d'anomalies en attente")),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mis à jour le')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendances', to=settings.AUTH_USER_MODEL, verbose_name='employé')),
+                ('site', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_attendances', to='sites.site', verbose_name='site')),
+            ],
+            options={
+                'verbose_name': 'présence journalière',
+                'verbose_name_plural': 'présences journalières',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['site', 'date'], name='timesheets__site_id_56718e_idx'), models.Index(fields=['employee', 'date'], name='timesheets__employe_92d6ed_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailyattendance',
+            constraint=models.UniqueConstraint(fields=('employee', 'site', 'date'), name='unique_daily_attendance'),
+        ),
+    ]
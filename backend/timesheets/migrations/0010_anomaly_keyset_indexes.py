@@ -0,0 +1,29 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheets', '0009_dailyattendance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['date', 'created_at', 'id'], name='anomaly_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['site', 'date', 'created_at', 'id'], name='anomaly_site_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['employee', 'date', 'created_at', 'id'], name='anomaly_employee_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['schedule', 'date', 'created_at', 'id'], name='anomaly_schedule_keyset_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.10 on 2026-10-17 18:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sites', '0018_schedule_activation_dates'),
+        ('timesheets', '0010_anomaly_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=150, unique=True, verbose_name='nom')),
+                ('position', models.DateTimeField(blank=True, null=True, verbose_name='position')),
+                ('data', models.JSONField(blank=True, default=dict, verbose_name='données')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='mis à jour le')),
+            ],
+            options={
+                'verbose_name': 'point de reprise',
+                'verbose_name_plural': 'points de reprise',
+            },
+        ),
+        migrations.CreateModel(
+            name='MinuteCheckDeadline',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('deadline', models.DateTimeField(verbose_name='échéance')),
+                ('kind', models.CharField(choices=[('MORNING', 'Arrivée du matin'), ('AFTERNOON', "Arrivée de l'après-midi")], max_length=20, verbose_name="type d'échéance")),
+                ('expected_timesheet_count', models.PositiveSmallIntegerField(help_text="Nombre de pointages de la journée pour lequel l'arrivée est considérée manquante", verbose_name='nombre de pointages attendu')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='minute_check_deadlines', to='sites.schedule', verbose_name='planning')),
+                ('site_employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='minute_check_deadlines', to='sites.siteemployee', verbose_name='relation site-employé')),
+            ],
+            options={
+                'verbose_name': "échéance d'arrivée",
+                'verbose_name_plural': "échéances d'arrivée",
+                'ordering': ['deadline'],
+                'indexes': [models.Index(fields=['date', 'deadline'], name='timesheets__date_b87c08_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='minutecheckdeadline',
+            constraint=models.UniqueConstraint(fields=('site_employee', 'date', 'kind'), name='unique_minute_check_deadline'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.10 on 2026-10-17 21:00
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_timesheet_date(apps, schema_editor):
+    """Renseigne la date locale des pointages existants (une seule requête UPDATE)"""
+    Timesheet = apps.get_model('timesheets', 'Timesheet')
+    # TruncDate convertit dans le fuseau courant (TIME_ZONE), comme timezone.localtime à l'enregistrement
+    Timesheet.objects.update(date=TruncDate('timestamp'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheets', '0011_minute_check_deadline_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timesheet',
+            name='date',
+            field=models.DateField(editable=False, null=True, verbose_name='date'),
+        ),
+        migrations.RunPython(backfill_timesheet_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='timesheet',
+            name='date',
+            field=models.DateField(editable=False, verbose_name='date'),
+        ),
+        migrations.AddIndex(
+            model_name='timesheet',
+            index=models.Index(fields=['employee', 'site', 'date', 'timestamp'], name='timesheet_emp_site_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['employee', 'site', 'date', 'anomaly_type'], name='anomaly_emp_site_date_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='anomaly',
+            index=models.Index(fields=['site', 'status', 'date'], name='anomaly_site_status_date_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.10 on 2026-10-17 22:00
+
+from django.db import migrations, models
+
+
+def _legacy_subtype(anomaly_type, description, minutes):
+    """Sous-type de déduplication d'une anomalie existante, déduit comme le fait l'analyse"""
+    description = description or ''
+    if anomaly_type == 'CONSECUTIVE_SAME_TYPE' and 'Scan multiple' in description:
+        return 'multiple_scans'
+    if anomaly_type == 'OTHER' and 'Site inactif' in description:
+        return 'inactive_site'
+    if anomaly_type in ('OTHER', 'UNLINKED_SCHEDULE') and 'Pointage hors planning' in description:
+        return 'out_of_schedule'
+    if anomaly_type in ('LATE', 'EARLY_DEPARTURE'):
+        return f'{minutes}min'
+    if anomaly_type in ('MISSING_ARRIVAL', 'MISSING_DEPARTURE'):
+        return ''
+    return None
+
+
+def backfill_dedup_subtype(apps, schema_editor):
+    """Renseigne le sous-type des anomalies existantes
+
+    En cas de doublons, seule la plus ancienne reçoit la clé ; les autres restent
+    hors contrainte (sous-type NULL).
+    """
+    Anomaly = apps.get_model('timesheets', 'Anomaly')
+    seen = set()
+    pending = []
+    rows = Anomaly.objects.order_by('created_at', 'id').values_list(
+        'id', 'employee_id', 'site_id', 'date', 'anomaly_type', 'description', 'minutes'
+    )
+    for pk, employee_id, site_id, date, anomaly_type, description, minutes in rows.iterator(chunk_size=2000):
+        subtype = _legacy_subtype(anomaly_type, description, minutes)
+        if subtype is None:
+            continue
+        key = (employee_id, site_id, date, anomaly_type, subtype)
+        if key in seen:
+            continue
+        seen.add(key)
+        pending.append(Anomaly(id=pk, dedup_subtype=subtype))
+        if len(pending) >= 2000:
+            Anomaly.objects.bulk_update(pending, ['dedup_subtype'])
+            pending = []
+    if pending:
+        Anomaly.objects.bulk_update(pending, ['dedup_subtype'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('timesheets', '0012_timesheet_date'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='anomaly',
+            name='dedup_subtype',
+            field=models.CharField(blank=True, editable=False, max_length=50, null=True, verbose_name='sous-type de déduplication'),
+        ),
+        migrations.RunPython(backfill_dedup_subtype, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='anomaly',
+            constraint=models.UniqueConstraint(condition=models.Q(('dedup_subtype__isnull', False)), fields=('employee', 'site', 'date', 'anomaly_type', 'dedup_subtype'), name='anomaly_dedup_key_uniq'),
+        ),
+    ]
@@ -29,6 +29,8 @@ class Timesheet(models.Model):
         verbose_name=_('site')
     )
     timestamp = models.DateTimeField(_('horodatage'), default=timezone.now)
+    # Date locale du pointage, dérivée de timestamp à l'enregistrement (filtrable par index)
+    date = models.DateField(_('date'), editable=False)
     entry_type = models.CharField(
         _('type d\'entrée'),
         max_length=20,
@@ -104,7 +106,7 @@ class Timesheet(models.Model):
         last_timesheet = Timesheet.objects.filter(
             employee=self.employee,
             site=self.site,
-            timestamp__date=timezone.localtime(self.timestamp).date()
+            date=timezone.localtime(self.timestamp).date()
         ).exclude(id=self.id).order_by('-timestamp').first()
 
         if last_timesheet and last_timesheet.entry_type == self.entry_type:
@@ -156,6 +158,10 @@ class Timesheet(models.Model):
             )
 
     def save(self, *args, **kwargs):
+        self.date = timezone.localtime(self.timestamp).date()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'timestamp' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'date'}
         self.clean()
         super().save(*args, **kwargs)
         # Créer l'anomalie après la sauvegarde
@@ -165,6 +171,9 @@ class Timesheet(models.Model):
         verbose_name = _('pointage')
         verbose_name_plural = _('pointages')
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['employee', 'site', 'date', 'timestamp'], name='timesheet_emp_site_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.employee.get_full_name()} - {self.site.name} - {self.timestamp}"
@@ -240,6 +249,16 @@ class Anomaly(models.Model):
     # Pour les retards et départs anticipés
     minutes = models.PositiveIntegerField(_('minutes'), default=0)
 
+    # Sous-type complétant la clé de déduplication (employé, site, date, type) des anomalies
+    # détectées automatiquement ; NULL pour les anomalies saisies manuellement
+    dedup_subtype = models.CharField(
+        _('sous-type de déduplication'),
+        max_length=50,
+        null=True,
+        blank=True,
+        editable=False
+    )
+
     # Pour les corrections manuelles
     corrected_by = models.ForeignKey(
         'users.User',
@@ -260,6 +279,23 @@ class Anomaly(models.Model):
         verbose_name = _('anomalie')
         verbose_name_plural = _('anomalies')
         ordering = ['-date', '-created_at']
+        # Index composites alignés sur la pagination par curseur (date, created_at, id)
+        indexes = [
+            models.Index(fields=['date', 'created_at', 'id'], name='anomaly_keyset_idx'),
+            models.Index(fields=['site', 'date', 'created_at', 'id'], name='anomaly_site_keyset_idx'),
+            models.Index(fields=['employee', 'date', 'created_at', 'id'], name='anomaly_employee_keyset_idx'),
+            models.Index(fields=['schedule', 'date', 'created_at', 'id'], name='anomaly_schedule_keyset_idx'),
+            # Recherche d'une anomalie existante et tableaux de bord par site
+            models.Index(fields=['employee', 'site', 'date', 'anomaly_type'], name='anomaly_emp_site_date_type_idx'),
+            models.Index(fields=['site', 'status', 'date'], name='anomaly_site_status_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['employee', 'site', 'date', 'anomaly_type', 'dedup_subtype'],
+                condition=models.Q(dedup_subtype__isnull=False),
+                name='anomaly_dedup_key_uniq'
+            ),
+        ]
 
     def __str__(self):
         return f"{self.employee.get_full_name()} - {self.site.name} - {self.date} - {self.get_anomaly_type_display()}"
@@ -309,3 +345,243 @@ class EmployeeReport(models.Model):
 
     def __str__(self):
         return f"Rapport de {self.employee.get_full_name()} - {self.start_date} à {self.end_date}"
+
+
+class AnomalyProcessingJob(models.Model):
+    """File d'attente des pointages à analyser en mode de traitement asynchrone"""
+
+    class JobStatus(models.TextChoices):
+        PENDING = 'PENDING', _('En attente')
+        PROCESSING = 'PROCESSING', _('En cours')
+        DONE = 'DONE', _('Terminé')
+        FAILED = 'FAILED', _('Échec')
+
+    # Une seule tâche par pointage : un nouvel ajout à la file réactive la tâche existante
+    timesheet = models.OneToOneField(
+        Timesheet,
+        on_delete=models.CASCADE,
+        related_name='processing_job',
+        verbose_name=_('pointage')
+    )
+    status = models.CharField(
+        _('statut'),
+        max_length=20,
+        choices=JobStatus.choices,
+        default=JobStatus.PENDING
+    )
+    attempts = models.PositiveIntegerField(_('tentatives'), default=0)
+    enqueued_at = models.DateTimeField(_('ajouté à la file le'), default=timezone.now)
+    available_at = models.DateTimeField(_('disponible à partir du'), default=timezone.now)
+    started_at = models.DateTimeField(_('démarré le'), null=True, blank=True)
+    processed_at = models.DateTimeField(_('traité le'), null=True, blank=True)
+    last_error = models.TextField(_('dernière erreur'), blank=True)
+
+    class Meta:
+        verbose_name = _('tâche d\'analyse de pointage')
+        verbose_name_plural = _('tâches d\'analyse de pointage')
+        ordering = ['available_at']
+        indexes = [
+            models.Index(fields=['status', 'available_at']),
+        ]
+
+    def __str__(self):
+        return f"Analyse du pointage {self.timesheet_id} - {self.get_status_display()}"
+
+    @classmethod
+    def enqueue(cls, timesheet):
+        """Ajoute un pointage à la file d'analyse sans créer de doublon"""
+        now = timezone.now()
+        job, created = cls.objects.get_or_create(
+            timesheet=timesheet,
+            defaults={'enqueued_at': now, 'available_at': now}
+        )
+        if not created and job.status != cls.JobStatus.PENDING:
+            job.status = cls.JobStatus.PENDING
+            job.attempts = 0
+            job.enqueued_at = now
+            job.available_at = now
+            job.started_at = None
+            job.processed_at = None
+            job.last_error = ''
+            job.save()
+        return job
+
+    @property
+    def lag_seconds(self):
+        """Délai entre l'ajout à la file et la fin du traitement, en secondes"""
+        if not self.processed_at:
+            return None
+        return (self.processed_at - self.enqueued_at).total_seconds()
+
+    @classmethod
+    def get_queue_metrics(cls, window=None):
+        """Retourne les métriques de la file : profondeur, ancienneté et délai de traitement
+
+        Args:
+            window: période (timedelta) sur laquelle calculer le délai de traitement (par défaut 1 heure)
+
+        Returns:
+            dict: nombre de tâches par statut, âge de la plus ancienne tâche en attente
+            et délai moyen / maximal de traitement en secondes
+        """
+        from datetime import timedelta
+        now = timezone.now()
+        window = window or timedelta(hours=1)
+
+        counts = dict(cls.objects.order_by().values_list('status').annotate(total=models.Count('id')))
+        oldest_pending = cls.objects.filter(status=cls.JobStatus.PENDING).aggregate(
+            oldest=models.Min('enqueued_at')
+        )['oldest']
+
+        lag = models.ExpressionWrapper(
+            models.F('processed_at') - models.F('enqueued_at'),
+            output_field=models.DurationField()
+        )
+        lag_stats = cls.objects.filter(
+            status=cls.JobStatus.DONE,
+            processed_at__gte=now - window
+        ).aggregate(avg_lag=models.Avg(lag), max_lag=models.Max(lag), processed=models.Count('id'))
+
+        return {
+            'pending': counts.get(cls.JobStatus.PENDING, 0),
+            'processing': counts.get(cls.JobStatus.PROCESSING, 0),
+            'done': counts.get(cls.JobStatus.DONE, 0),
+            'failed': counts.get(cls.JobStatus.FAILED, 0),
+            'oldest_pending_seconds': (now - oldest_pending).total_seconds() if oldest_pending else 0,
+            'processed_in_window': lag_stats['processed'],
+            'avg_lag_seconds': lag_stats['avg_lag'].total_seconds() if lag_stats['avg_lag'] else 0,
+            'max_lag_seconds': lag_stats['max_lag'].total_seconds() if lag_stats['max_lag'] else 0,
+        }
+
+
+class DailyAttendance(models.Model):
+    """Synthèse journalière des pointages d'un employé sur un site
+
+    Maintenue de façon incrémentale par les signaux des pointages et des anomalies
+    (voir timesheets.utils.daily_attendance) et reconstruite par la commande
+    rebuild_daily_attendance.
+    """
+
+    employee = models.ForeignKey(
+        'users.User',
+        on_delete=models.CASCADE,
+        related_name='daily_attendances',
+        verbose_name=_('employé')
+    )
+    site = models.ForeignKey(
+        'sites.Site',
+        on_delete=models.CASCADE,
+        related_name='daily_attendances',
+        verbose_name=_('site')
+    )
+    date = models.DateField(_('date'))
+
+    first_arrival = models.DateTimeField(_('première arrivée'), null=True, blank=True)
+    last_departure = models.DateTimeField(_('dernier départ'), null=True, blank=True)
+    worked_minutes = models.PositiveIntegerField(_('minutes travaillées'), default=0)
+    late_minutes = models.PositiveIntegerField(_('minutes de retard'), default=0)
+    early_departure_minutes = models.PositiveIntegerField(
+        _('minutes de départ anticipé'), default=0)
+    scan_count = models.PositiveIntegerField(_('nombre de pointages'), default=0)
+    anomaly_count = models.PositiveIntegerField(_('nombre d\'anomalies'), default=0)
+    pending_anomaly_count = models.PositiveIntegerField(
+        _('nombre d\'anomalies en attente'), default=0)
+
+    updated_at = models.DateTimeField(_('mis à jour le'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('présence journalière')
+        verbose_name_plural = _('présences journalières')
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'site', 'date'], name='unique_daily_attendance'),
+        ]
+        indexes = [
+            models.Index(fields=['site', 'date']),
+            models.Index(fields=['employee', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee.get_full_name()} - {self.site.name} - {self.date}"
+
+    @property
+    def worked_hours(self):
+        """Durée travaillée en heures"""
+        return round(self.worked_minutes / 60, 2)
+
+
+class ProcessingCheckpoint(models.Model):
+    """Position de reprise (marque haute) d'un traitement périodique"""
+
+    name = models.CharField(_('nom'), max_length=150, unique=True)
+    position = models.DateTimeField(_('position'), null=True, blank=True)
+    data = models.JSONField(_('données'), default=dict, blank=True)
+    updated_at = models.DateTimeField(_('mis à jour le'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('point de reprise')
+        verbose_name_plural = _('points de reprise')
+
+    def __str__(self):
+        return f"{self.name} - {self.position}"
+
+    @classmethod
+    def get_position(cls, name):
+        """Retourne la position enregistrée pour un traitement (None si aucune)"""
+        return cls.objects.filter(name=name).values_list('position', flat=True).first()
+
+    @classmethod
+    def set_position(cls, name, position, data=None):
+        """Enregistre la position atteinte par un traitement"""
+        defaults = {'position': position}
+        if data is not None:
+            defaults['data'] = data
+        checkpoint, _ = cls.objects.update_or_create(name=name, defaults=defaults)
+        return checkpoint
+
+
+class MinuteCheckDeadline(models.Model):
+    """Échéance d'arrivée d'un employé (heure d'arrivée prévue + marge de retard)
+
+    Index construit une fois par jour par la commande check_minute_anomalies (voir
+    timesheets.utils.minute_deadlines) : chaque exécution ne traite que les échéances
+    passées depuis l'exécution précédente.
+    """
+
+    class DeadlineKind(models.TextChoices):
+        MORNING = 'MORNING', _('Arrivée du matin')
+        AFTERNOON = 'AFTERNOON', _('Arrivée de l\'après-midi')
+
+    date = models.DateField(_('date'))
+    deadline = models.DateTimeField(_('échéance'))
+    site_employee = models.ForeignKey(
+        'sites.SiteEmployee',
+        on_delete=models.CASCADE,
+        related_name='minute_check_deadlines',
+        verbose_name=_('relation site-employé')
+    )
+    schedule = models.ForeignKey(
+        'sites.Schedule',
+        on_delete=models.CASCADE,
+        related_name='minute_check_deadlines',
+        verbose_name=_('planning')
+    )
+    kind = models.CharField(_('type d\'échéance'), max_length=20, choices=DeadlineKind.choices)
+    expected_timesheet_count = models.PositiveSmallIntegerField(
+        _('nombre de pointages attendu'),
+        help_text=_('Nombre de pointages de la journée pour lequel l\'arrivée est considérée manquante')
+    )
+
+    class Meta:
+        verbose_name = _('échéance d\'arrivée')
+        verbose_name_plural = _('échéances d\'arrivée')
+        ordering = ['deadline']
+        constraints = [
+            models.UniqueConstraint(fields=['site_employee', 'date', 'kind'], name='unique_minute_check_deadline'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'deadline']),
+        ]
+
+    def __str__(self):
+        return f"{self.site_employee_id} - {self.get_kind_display()} - {self.deadline}"
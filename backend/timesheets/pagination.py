@@ -0,0 +1,184 @@
+"""Pagination par curseur (keyset) pour les listes d'anomalies"""
+import base64
+import json
+import logging
+from collections import OrderedDict
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+logger = logging.getLogger(__name__)
+
+
+class AnomalyCursorPagination(BasePagination):
+    """Pagination par curseur sur (date, created_at, id) décroissants
+
+    Chaque page est lue avec une condition de type « après la dernière ligne vue »
+    au lieu d'un OFFSET : le coût d'une page ne dépend pas de sa position et l'ordre
+    reste stable même si des anomalies sont créées entre deux pages. Le nombre total
+    n'est calculé que sur demande (?total=estimate ou ?total=exact).
+    """
+
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    total_query_param = 'total'
+    ordering = ('-date', '-created_at', '-id')
+    invalid_cursor_message = 'Curseur invalide'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.total = self.get_total(queryset, request.query_params.get(self.total_query_param))
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        if reverse:
+            queryset = queryset.order_by('date', 'created_at', 'id')
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if cursor:
+            queryset = queryset.filter(self._keyset_filter(cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_total(self, queryset, mode):
+        """Retourne le nombre total de lignes si demandé (estimation du planificateur ou comptage exact)"""
+        if not mode:
+            return None
+        queryset = queryset.order_by()
+        if mode == 'exact' or connection.vendor != 'postgresql':
+            return queryset.count()
+        try:
+            plan = json.loads(queryset.explain(format='json'))
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.warning(f"Estimation du nombre d'anomalies impossible, comptage exact utilisé: {str(e)}")
+            return queryset.count()
+
+    def _keyset_filter(self, cursor):
+        """Condition (date, created_at, id) < curseur (ou > en sens inverse)"""
+        suffix = 'gt' if cursor['reverse'] else 'lt'
+        date, created_at, pk = cursor['date'], cursor['created_at'], cursor['id']
+        return (
+            Q(**{f'date__{suffix}': date})
+            | Q(date=date, **{f'created_at__{suffix}': created_at})
+            | Q(date=date, created_at=created_at, **{f'id__{suffix}': pk})
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor = {
+                'date': parse_date(data['d']),
+                'created_at': parse_datetime(data['c']),
+                'id': int(data['i']),
+                'reverse': bool(data.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['date'] is None or cursor['created_at'] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, anomaly, reverse=False):
+        data = {
+            'd': anomaly.date.isoformat(),
+            'c': anomaly.created_at.isoformat(),
+            'i': anomaly.id,
+            'r': 1 if reverse else 0,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.total is not None:
+            response['total'] = self.total
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'total': {
+                    'type': 'integer',
+                    'description': 'Présent uniquement avec ?total=estimate ou ?total=exact',
+                },
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Curseur de pagination (liens next / previous)',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Nombre de résultats par page (maximum {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+            {
+                'name': self.total_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Inclure le nombre total : « estimate » (estimation rapide) ou « exact »',
+                'schema': {'type': 'string', 'enum': ['estimate', 'exact']},
+            },
+        ]
@@ -1,10 +1,15 @@
 from rest_framework import serializers
 from .models import Timesheet, Anomaly, EmployeeReport
-from sites.models import Site
+from .utils.schedule_resolver import schedule_resolver
+from .utils.anomaly_translation import translate_anomaly_description
+from sites.models import Site, ScheduleDetail
+from django.db import models
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from django.utils import timezone
+from django.conf import settings
 from core.mixins import OrganizationPermissionMixin, RolePermissionMixin, SitePermissionMixin
+from core.access import get_access_context
 from users.models import User
 from datetime import timedelta
 
@@ -48,7 +53,8 @@ class TimesheetSerializer(serializers.ModelSerializer, OrganizationPermissionMix
 
             # Les managers ne peuvent modifier que les pointages des employés de leurs sites
             if user.is_manager:
-                if not user.organizations.filter(sites__employees=data['employee']).exists():
+                organization_ids = get_access_context(self.context['request']).organization_ids
+                if not Site.objects.filter(organization_id__in=organization_ids, employees=data['employee']).exists():
                     raise serializers.ValidationError({
                         "employee": "Vous ne pouvez pas modifier les pointages de cet employé"
                     })
@@ -68,55 +74,39 @@ class TimesheetSerializer(serializers.ModelSerializer, OrganizationPermissionMix
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_schedule_details(self, obj):
         """Récupère les détails du planning associé au pointage"""
-        # Récupérer le planning associé au pointage
-        from sites.models import SiteEmployee, Schedule, ScheduleDetail
-
-        # Récupérer la date du pointage
-        timestamp_date = obj.timestamp.date()
+        # Récupérer le jour du pointage
         day_of_week = obj.timestamp.weekday()
 
-        # Récupérer les relations site-employé pour cet employé et ce site
-        site_employee_relations = SiteEmployee.objects.filter(
-            site=obj.site,
-            employee=obj.employee,
-            is_active=True
-        ).select_related('schedule')
-
-        # Chercher le planning correspondant
-        for site_employee in site_employee_relations:
-            schedule = site_employee.schedule
+        # Chercher le planning correspondant parmi les relations site-employé actives
+        for resolved in schedule_resolver.resolve(obj.employee_id, obj.site_id, day_of_week):
+            schedule = resolved.schedule
+            schedule_detail = resolved.detail
             if not schedule or not schedule.is_active:
                 continue
 
             # Vérifier si le planning a des détails pour ce jour
-            try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=day_of_week
-                )
-
-                # Vérifier si le pointage correspond à ce planning
-                if schedule.schedule_type == 'FIXED':
-                    # Pour les plannings fixes, vérifier si l'heure du pointage est dans les plages horaires
-                    timesheet_time = obj.timestamp.time()
-
-                    # Plage du matin
-                    if schedule_detail.start_time_1 and schedule_detail.end_time_1:
-                        if schedule_detail.start_time_1 <= timesheet_time <= schedule_detail.end_time_1:
-                            return self._format_schedule_details(schedule, schedule_detail)
-
-                    # Plage de l'après-midi
-                    if schedule_detail.start_time_2 and schedule_detail.end_time_2:
-                        if schedule_detail.start_time_2 <= timesheet_time <= schedule_detail.end_time_2:
-                            return self._format_schedule_details(schedule, schedule_detail)
-
-                elif schedule.schedule_type == 'FREQUENCY':
-                    # Pour les plannings fréquence, tous les pointages du jour sont valides
-                    return self._format_schedule_details(schedule, schedule_detail)
-
-            except ScheduleDetail.DoesNotExist:
+            if schedule_detail is None:
                 continue
 
+            # Vérifier si le pointage correspond à ce planning
+            if schedule.schedule_type == 'FIXED':
+                # Pour les plannings fixes, vérifier si l'heure du pointage est dans les plages horaires
+                timesheet_time = obj.timestamp.time()
+
+                # Plage du matin
+                if schedule_detail.start_time_1 and schedule_detail.end_time_1:
+                    if schedule_detail.start_time_1 <= timesheet_time <= schedule_detail.end_time_1:
+                        return self._format_schedule_details(schedule, schedule_detail)
+
+                # Plage de l'après-midi
+                if schedule_detail.start_time_2 and schedule_detail.end_time_2:
+                    if schedule_detail.start_time_2 <= timesheet_time <= schedule_detail.end_time_2:
+                        return self._format_schedule_details(schedule, schedule_detail)
+
+            elif schedule.schedule_type == 'FREQUENCY':
+                # Pour les plannings fréquence, tous les pointages du jour sont valides
+                return self._format_schedule_details(schedule, schedule_detail)
+
         return None
 
     def _format_schedule_details(self, schedule, schedule_detail):
@@ -224,7 +214,7 @@ class TimesheetCreateSerializer(serializers.ModelSerializer, SitePermissionMixin
             last_timesheet = Timesheet.objects.filter(
                 employee=employee,
                 site=site,
-                timestamp__date=today
+                date=today
             ).order_by('-timestamp').first()
 
             entry_type = Timesheet.EntryType.ARRIVAL
@@ -278,8 +268,56 @@ class TimesheetCreateSerializer(serializers.ModelSerializer, SitePermissionMixin
         ret['message'] = getattr(self, '_message', '')
         return ret
 
+class TimesheetSyncItemSerializer(serializers.Serializer):
+    """Serializer pour un pointage réalisé hors ligne"""
+    client_id = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    site_id = serializers.CharField()
+    scan_type = serializers.ChoiceField(choices=Timesheet.ScanType.choices)
+    timestamp = serializers.DateTimeField()
+    entry_type = serializers.ChoiceField(choices=Timesheet.EntryType.choices, required=False, allow_null=True)
+    latitude = serializers.DecimalField(max_digits=12, decimal_places=10, required=False, allow_null=True)
+    longitude = serializers.DecimalField(max_digits=12, decimal_places=10, required=False, allow_null=True)
+
+class TimesheetSyncSerializer(serializers.Serializer):
+    """Serializer pour la synchronisation par lot des pointages hors ligne"""
+    scans = TimesheetSyncItemSerializer(many=True)
+
+    def validate_scans(self, value):
+        if not value:
+            raise serializers.ValidationError("Aucun pointage à synchroniser.")
+        max_batch_size = settings.TIMESHEET_SYNC_MAX_BATCH_SIZE
+        if len(value) > max_batch_size:
+            raise serializers.ValidationError(f"Un lot ne peut pas contenir plus de {max_batch_size} pointages.")
+        return value
+
+class AnomalyListSerializer(serializers.ListSerializer):
+    """Sérialisation d'une liste d'anomalies avec chargement groupé des détails de planning"""
+
+    def to_representation(self, data):
+        anomalies = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+
+        # Une seule requête pour tous les (planning, jour de la semaine) de la page
+        keys = {(anomaly.schedule_id, anomaly.date.weekday()) for anomaly in anomalies
+                if anomaly.schedule_id and anomaly.date}
+        schedule_details = {}
+        if keys:
+            details = ScheduleDetail.objects.filter(
+                schedule_id__in={schedule_id for schedule_id, _ in keys},
+                day_of_week__in={day_of_week for _, day_of_week in keys}
+            )
+            schedule_details = {(detail.schedule_id, detail.day_of_week): detail for detail in details}
+        self.child._schedule_details = schedule_details
+        try:
+            return [self.child.to_representation(anomaly) for anomaly in anomalies]
+        finally:
+            self.child._schedule_details = None
+
 class AnomalySerializer(serializers.ModelSerializer, OrganizationPermissionMixin, SitePermissionMixin):
     """Serializer pour les anomalies"""
+    # Relations lues par le serializer, à charger avec la requête (voir setup_eager_loading)
+    SELECT_RELATED = ('employee', 'site', 'timesheet', 'schedule', 'schedule__site')
+    PREFETCH_RELATED = ('related_timesheets',)
+
     employee_name = serializers.SerializerMethodField()
     site_name = serializers.SerializerMethodField()
     anomaly_type_display = serializers.SerializerMethodField()
@@ -298,6 +336,12 @@ class AnomalySerializer(serializers.ModelSerializer, OrganizationPermissionMixin
                  'created_at', 'updated_at', 'corrected_by']
         read_only_fields = ['created_at', 'updated_at', 'description', 'translated_description', 'date', 'minutes',
                            'timesheet_details', 'schedule_details', 'related_timesheets_details']
+        list_serializer_class = AnomalyListSerializer
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        """Ajoute au queryset les jointures et préchargements nécessaires à la sérialisation"""
+        return queryset.select_related(*cls.SELECT_RELATED).prefetch_related(*cls.PREFETCH_RELATED)
 
     def validate(self, data):
         user = self.context['request'].user
@@ -314,7 +358,7 @@ class AnomalySerializer(serializers.ModelSerializer, OrganizationPermissionMixin
 
         # Les managers ne peuvent gérer que les anomalies de leurs sites
         if user.is_manager:
-            if 'site' in data and not user.organizations.filter(sites=data['site']).exists():
+            if 'site' in data and not self.has_site_permission(data['site']):
                 raise serializers.ValidationError({
                     "site": "Vous ne pouvez pas gérer les anomalies de ce site"
                 })
@@ -363,16 +407,17 @@ class AnomalySerializer(serializers.ModelSerializer, OrganizationPermissionMixin
             return None
 
         schedule = obj.schedule
-        from sites.models import ScheduleDetail
 
         # Récupérer les détails du planning pour le jour de l'anomalie
+        # (préchargés pour toute la page lors de la sérialisation d'une liste)
         schedule_detail = None
         try:
             if obj.date:
-                schedule_detail = ScheduleDetail.objects.filter(
-                    schedule=schedule,
-                    day_of_week=obj.date.weekday()
-                ).first()
+                schedule_details = getattr(self, '_schedule_details', None)
+                if schedule_details is not None:
+                    schedule_detail = schedule_details.get((schedule.id, obj.date.weekday()))
+                else:
+                    schedule_detail = schedule_resolver.get_schedule_detail(schedule.id, obj.date.weekday())
         except Exception as e:
             # En cas d'erreur, on continue sans les détails
             pass
@@ -428,396 +473,16 @@ class AnomalySerializer(serializers.ModelSerializer, OrganizationPermissionMixin
     @extend_schema_field(OpenApiTypes.STR)
     def get_translated_description(self, obj):
         """Récupère la description traduite de l'anomalie en fonction de la langue de l'utilisateur"""
-        from django.utils.translation import gettext as _
-        import re
-        import logging
-
-        logger = logging.getLogger(__name__)
-
         # Récupérer la langue de l'utilisateur depuis la requête
         request = self.context.get('request')
         if not request or not obj.description:
-            logger.debug(f"Pas de requête ou pas de description: {obj.id}")
             return obj.description
 
         # Vérifier si l'utilisateur est authentifié et a une préférence de langue
         if not (hasattr(request, 'user') and request.user.is_authenticated):
-            logger.debug(f"Utilisateur non authentifié: {obj.id}")
-            return obj.description
-
-        # Log pour déboguer
-        logger.debug(f"Langue de l'utilisateur: {request.user.language}, Anomalie ID: {obj.id}, Type: {obj.anomaly_type}")
-
-        # Si l'utilisateur a choisi le français, retourner la description originale
-        if request.user.language == 'fr':
-            logger.debug(f"Utilisateur en français, retour de la description originale: {obj.id}")
             return obj.description
 
-        # Si l'utilisateur a choisi l'anglais, traduire la description
-        if request.user.language == 'en':
-            logger.debug(f"Utilisateur en anglais, traduction de la description: {obj.id}")
-
-            # Traduire les descriptions en fonction du type d'anomalie
-            if obj.anomaly_type == Anomaly.AnomalyType.LATE:
-                # Afficher la description complète pour le débogage
-                logger.debug(f"Description complète du retard: {obj.description}")
-
-                # Extraire les informations numériques avec des expressions régulières plus souples
-                minutes_match = re.search(r'Retard de (\d+)', obj.description)
-                tolerance_match = re.search(r'tolérance \((\d+)', obj.description)
-                expected_time_match = re.search(r'Heure prévue: ([\d:]+)', obj.description)
-                actual_time_match = re.search(r'heure effective: ([\d:.]+)', obj.description)
-
-                minutes = minutes_match.group(1) if minutes_match else ''
-                tolerance = tolerance_match.group(1) if tolerance_match else ''
-                expected_time = expected_time_match.group(1) if expected_time_match else ''
-                actual_time = actual_time_match.group(1) if actual_time_match else ''
-
-                logger.debug(f"Traduction d'un retard: minutes={minutes}, tolerance={tolerance}, expected_time={expected_time}, actual_time={actual_time}")
-
-                # Traduire en anglais
-                if minutes and tolerance:
-                    if expected_time and actual_time:
-                        return f"Late arrival of {minutes} minute(s) beyond the tolerance margin ({tolerance} min). Expected time: {expected_time}, actual time: {actual_time}."
-                    else:
-                        return f"Late arrival of {minutes} minute(s) beyond the tolerance margin ({tolerance} min)."
-                else:
-                    return "Late arrival"
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.EARLY_DEPARTURE:
-            # Afficher la description complète pour le débogage
-            logger.debug(f"Description complète du départ anticipé: {obj.description}")
-
-            # Traduire directement en fonction du type d'anomalie
-            if 'Durée insuffisante:' in obj.description:
-                # Extraire les informations numériques
-                actual_duration_match = re.search(r'Durée insuffisante:\s*([\d.]+)', obj.description)
-                expected_duration_match = re.search(r'au lieu de\s*([\d.]+)', obj.description)
-                tolerance_match = re.search(r'tolérance:\s*(\d+)', obj.description)
-
-                actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
-                expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
-                tolerance = tolerance_match.group(1) if tolerance_match else ''
-
-                logger.debug(f"Traduction d'une durée insuffisante (EARLY_DEPARTURE): actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
-
-                return _('Insufficient duration: %(actual_duration)s minutes instead of %(expected_duration)s minutes minimum (tolerance: %(tolerance)s%%).') % {
-                    'actual_duration': actual_duration,
-                    'expected_duration': expected_duration,
-                    'tolerance': tolerance
-                }
-            elif 'Départ anticipé de' in obj.description:
-                # Extraire les informations numériques
-                minutes_match = re.search(r'Départ anticipé de (\d+) minute\(s\)', obj.description)
-                tolerance_match = re.search(r'marge de tolérance \((\d+) min\)', obj.description)
-                expected_time_match = re.search(r'Heure prévue: ([\d:]+)', obj.description)
-                actual_time_match = re.search(r'heure effective: ([\d:.]+)', obj.description)
-
-                minutes = minutes_match.group(1) if minutes_match else ''
-                tolerance = tolerance_match.group(1) if tolerance_match else ''
-                expected_time = expected_time_match.group(1) if expected_time_match else ''
-                actual_time = actual_time_match.group(1) if actual_time_match else ''
-
-                logger.debug(f"Traduction d'un départ anticipé: minutes={minutes}, tolerance={tolerance}, expected_time={expected_time}, actual_time={actual_time}")
-
-                if expected_time and actual_time:
-                    return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min). Expected time: {expected_time}, actual time: {actual_time}"
-                else:
-                    return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min)"
-            elif 'Durée insuffisante:' in obj.description:
-                # Afficher la description complète pour le débogage
-                logger.debug(f"Description complète de la durée insuffisante: {obj.description}")
-
-                # Extraire les informations numériques
-                actual_duration_match = re.search(r'Durée insuffisante: ([\d.]+) minutes', obj.description)
-                expected_duration_match = re.search(r'au lieu de ([\d.]+) minutes minimum', obj.description)
-                tolerance_match = re.search(r'\(tolérance: (\d+)%\)', obj.description)
-
-                actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
-                expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
-                tolerance = tolerance_match.group(1) if tolerance_match else ''
-
-                logger.debug(f"Traduction d'une durée insuffisante: actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
-
-                # Si les expressions régulières n'ont pas trouvé de correspondance, essayer d'autres formats
-                if not actual_duration or not expected_duration:
-                    logger.debug("Tentative avec d'autres expressions régulières pour la durée insuffisante")
-                    # Essayer un autre format
-                    actual_duration_match = re.search(r'Durée insuffisante:\s*([\d.]+)', obj.description)
-                    expected_duration_match = re.search(r'au lieu de\s*([\d.]+)', obj.description)
-                    tolerance_match = re.search(r'tolérance:\s*(\d+)', obj.description)
-
-                    actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
-                    expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
-                    tolerance = tolerance_match.group(1) if tolerance_match else ''
-
-                    logger.debug(f"Nouvelle tentative: actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
-
-                return _('Insufficient duration: %(actual_duration)s minutes instead of %(expected_duration)s minutes minimum (tolerance: %(tolerance)s%%).') % {
-                    'actual_duration': actual_duration,
-                    'expected_duration': expected_duration,
-                    'tolerance': tolerance
-                }
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.MISSING_ARRIVAL:
-            if 'Arrivée manquante selon le planning' in obj.description:
-                expected_time_match = re.search(r'heure prévue: ([\d:]+)', obj.description)
-                expected_time = expected_time_match.group(1) if expected_time_match else ''
-
-                logger.debug(f"Traduction d'une arrivée manquante: expected_time={expected_time}")
-
-                if expected_time:
-                    return f"Missing arrival according to schedule (expected time: {expected_time})"
-                else:
-                    return "Missing arrival according to schedule"
-            elif 'Pointage manquant selon le planning fréquence' in obj.description:
-                duration_match = re.search(r'durée prévue: (\d+) minutes', obj.description)
-                duration = duration_match.group(1) if duration_match else ''
-
-                logger.debug(f"Traduction d'un pointage manquant (fréquence): duration={duration}")
-
-                if duration:
-                    return f"Missing check-in according to frequency schedule (expected duration: {duration} minutes)"
-                else:
-                    return "Missing check-in according to frequency schedule"
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.MISSING_DEPARTURE:
-            # Afficher la description complète pour le débogage
-            logger.debug(f"Description complète du départ manquant: {obj.description}")
-
-            if 'Départ manquant selon le planning' in obj.description:
-                expected_time_match = re.search(r'heure prévue: ([\d:]+)', obj.description)
-                expected_time = expected_time_match.group(1) if expected_time_match else ''
-
-                logger.debug(f"Traduction d'un départ manquant: expected_time={expected_time}")
-
-                if expected_time:
-                    return f"Missing departure according to schedule (expected time: {expected_time})"
-                else:
-                    return "Missing departure according to schedule"
-            elif 'Pointage manquant selon le planning fréquence' in obj.description:
-                duration_match = re.search(r'durée prévue: (\d+)', obj.description)
-                duration = duration_match.group(1) if duration_match else ''
-
-                logger.debug(f"Traduction d'un pointage manquant (fréquence): duration={duration}")
-
-                if duration:
-                    return f"Missing check-in according to frequency schedule (expected duration: {duration} minutes)"
-                else:
-                    return "Missing check-in according to frequency schedule"
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.INSUFFICIENT_HOURS:
-            if 'Durée insuffisante:' in obj.description or 'Insufficient duration:' in obj.description:
-                # Extraire les informations numériques
-                actual_duration_match = re.search(r'(Durée insuffisante|Insufficient duration): ([\d.]+) minutes', obj.description)
-                expected_duration_match = re.search(r'(au lieu de|instead of) ([\d.]+) minutes', obj.description)
-                tolerance_match = re.search(r'\((tolérance|tolerance): (\d+)%\)', obj.description)
-
-                actual_duration = actual_duration_match.group(2) if actual_duration_match else ''
-                expected_duration = expected_duration_match.group(2) if expected_duration_match else ''
-                tolerance = tolerance_match.group(2) if tolerance_match else ''
-
-                logger.debug(f"Traduction d'heures insuffisantes: actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
-
-                return f"Insufficient duration: {actual_duration} minutes instead of {expected_duration} minutes minimum (tolerance: {tolerance}%)"
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.UNLINKED_SCHEDULE:
-            logger.debug(f"Traduction d'un planning non lié: {obj.description}")
-            if "l'employé n'est pas rattaché à ce site" in obj.description:
-                return "Check-in outside schedule: employee is not linked to this site."
-            else:
-                return "Unlinked schedule"
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.OTHER:
-            if 'Pointage hors planning:' in obj.description:
-                if 'aucun planning n\'est défini pour le jour' in obj.description:
-                    day_match = re.search(r'jour ([^.]+)', obj.description)
-                    entry_type_match = re.search(r'\(([^)]+) à', obj.description)
-                    time_match = re.search(r'à ([\d:]+)\)', obj.description)
-
-                    day = day_match.group(1) if day_match else ''
-                    entry_type = entry_type_match.group(1) if entry_type_match else ''
-                    time = time_match.group(1) if time_match else ''
-
-                    logger.debug(f"Traduction d'un pointage hors planning (jour): day={day}, entry_type={entry_type}, time={time}")
-
-                    return f"Check-in outside schedule: no schedule is defined for day {day}. ({entry_type} at {time})"
-                elif 'l\'heure' in obj.description:
-                    time_match = re.search(r'l\'heure ([\d:]+\.?\d*)', obj.description)
-                    entry_type_match = re.search(r'\(([^)]+)\) ne correspond', obj.description)
-                    ranges_match = re.search(r'Plages disponibles: ([^.]+)', obj.description)
-
-                    time = time_match.group(1) if time_match else ''
-                    entry_type = entry_type_match.group(1) if entry_type_match else ''
-                    ranges = ranges_match.group(1) if ranges_match else ''
-
-                    logger.debug(f"Traduction d'un pointage hors planning (heure): time={time}, entry_type={entry_type}, ranges={ranges}")
-
-                    return f"Check-in outside schedule: time {time} ({entry_type}) does not match any time range defined in employee schedules. Available ranges: {ranges}."
-
-        elif obj.anomaly_type == Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE:
-            if 'Pointage' in obj.description and 'consécutif détecté' in obj.description:
-                entry_type_match = re.search(r'Pointage ([^\s]+)', obj.description)
-                last_time_match = re.search(r'Dernier pointage : ([\d:]+)', obj.description)
-
-                entry_type = entry_type_match.group(1) if entry_type_match else ''
-                last_time = last_time_match.group(1) if last_time_match else ''
-
-                logger.debug(f"Traduction d'un pointage consécutif: entry_type={entry_type}, last_time={last_time}")
-
-                return f"Consecutive {entry_type} check-in detected. Last check-in: {last_time}"
-
-        # Si aucun cas spécifique n'est trouvé, essayer de traduire la description complète
-        logger.debug(f"Aucune traduction spécifique trouvée pour l'anomalie {obj.id}, type {obj.anomaly_type}, description: '{obj.description}', tentative de traduction complète")
-
-        # Pour les utilisateurs en anglais, traduire en fonction du type d'anomalie et du contenu de la description
-        if request.user.language == 'en':
-            # Traduire en fonction du type d'anomalie et du contenu de la description
-            if obj.anomaly_type == Anomaly.AnomalyType.LATE:
-                return "Late arrival"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.EARLY_DEPARTURE:
-                if 'Durée insuffisante:' in obj.description:
-                    # Extraire les informations numériques
-                    actual_duration_match = re.search(r'Durée insuffisante:\s*([\d.]+)', obj.description)
-                    expected_duration_match = re.search(r'au lieu de\s*([\d.]+)', obj.description)
-                    tolerance_match = re.search(r'tolérance:\s*(\d+)', obj.description)
-
-                    actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
-                    expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
-                    tolerance = tolerance_match.group(1) if tolerance_match else ''
-
-                    if actual_duration and expected_duration and tolerance:
-                        return f"Insufficient duration: {actual_duration} minutes instead of {expected_duration} minutes minimum (tolerance: {tolerance}%)."
-                    else:
-                        return "Insufficient duration"
-                elif 'Départ anticipé de' in obj.description:
-                    # Extraire les informations numériques
-                    minutes_match = re.search(r'Départ anticipé de (\d+)', obj.description)
-                    tolerance_match = re.search(r'tolérance \((\d+)', obj.description)
-                    expected_time_match = re.search(r'Heure prévue: ([\d:]+)', obj.description)
-                    actual_time_match = re.search(r'heure effective: ([\d:.]+)', obj.description)
-
-                    minutes = minutes_match.group(1) if minutes_match else ''
-                    tolerance = tolerance_match.group(1) if tolerance_match else ''
-                    expected_time = expected_time_match.group(1) if expected_time_match else ''
-                    actual_time = actual_time_match.group(1) if actual_time_match else ''
-
-                    if minutes and tolerance:
-                        if expected_time and actual_time:
-                            return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min). Expected time: {expected_time}, actual time: {actual_time}."
-                        else:
-                            return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min)."
-                    else:
-                        return "Early departure"
-                else:
-                    return "Early departure"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.MISSING_ARRIVAL:
-                if 'Arrivée manquante selon le planning' in obj.description:
-                    expected_time_match = re.search(r'heure prévue: ([\d:]+)', obj.description)
-                    expected_time = expected_time_match.group(1) if expected_time_match else ''
-
-                    if expected_time:
-                        return f"Missing arrival according to schedule (expected time: {expected_time})"
-                    else:
-                        return "Missing arrival according to schedule"
-                elif 'Pointage manquant selon le planning fréquence' in obj.description:
-                    duration_match = re.search(r'durée prévue: (\d+)', obj.description)
-                    duration = duration_match.group(1) if duration_match else ''
-
-                    if duration:
-                        return f"Missing check-in according to frequency schedule (expected duration: {duration} minutes)"
-                    else:
-                        return "Missing check-in according to frequency schedule"
-                else:
-                    return "Missing arrival"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.MISSING_DEPARTURE:
-                if 'Départ manquant selon le planning' in obj.description:
-                    expected_time_match = re.search(r'heure prévue: ([\d:]+)', obj.description)
-                    expected_time = expected_time_match.group(1) if expected_time_match else ''
-
-                    if expected_time:
-                        return f"Missing departure according to schedule (expected time: {expected_time})"
-                    else:
-                        return "Missing departure according to schedule"
-                else:
-                    return "Missing departure"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.INSUFFICIENT_HOURS:
-                if 'Durée insuffisante:' in obj.description or 'Insufficient duration:' in obj.description:
-                    # Extraire les informations numériques
-                    actual_duration_match = re.search(r'(Durée insuffisante|Insufficient duration):\s*([\d.]+)', obj.description)
-                    expected_duration_match = re.search(r'(au lieu de|instead of)\s*([\d.]+)', obj.description)
-                    tolerance_match = re.search(r'(tolérance|tolerance):\s*(\d+)', obj.description)
-
-                    actual_duration = actual_duration_match.group(2) if actual_duration_match else ''
-                    expected_duration = expected_duration_match.group(2) if expected_duration_match else ''
-                    tolerance = tolerance_match.group(2) if tolerance_match else ''
-
-                    if actual_duration and expected_duration and tolerance:
-                        return f"Insufficient duration: {actual_duration} minutes instead of {expected_duration} minutes minimum (tolerance: {tolerance}%)."
-                    else:
-                        return "Insufficient hours"
-                else:
-                    return "Insufficient hours"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE:
-                if 'Pointage' in obj.description and 'consécutif détecté' in obj.description:
-                    entry_type_match = re.search(r'Pointage ([^\s]+)', obj.description)
-                    last_time_match = re.search(r'Dernier pointage : ([\d:]+)', obj.description)
-
-                    entry_type = entry_type_match.group(1) if entry_type_match else ''
-                    last_time = last_time_match.group(1) if last_time_match else ''
-
-                    if entry_type and last_time:
-                        return f"Consecutive {entry_type} check-in detected. Last check-in: {last_time}"
-                    else:
-                        return "Consecutive check-in of the same type"
-                else:
-                    return "Consecutive check-in of the same type"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.UNLINKED_SCHEDULE:
-                if "l'employé n'est pas rattaché à ce site" in obj.description:
-                    return "Check-in outside schedule: employee is not linked to this site."
-                else:
-                    return "Unlinked schedule"
-
-            elif obj.anomaly_type == Anomaly.AnomalyType.OTHER:
-                if 'Pointage hors planning:' in obj.description:
-                    if 'aucun planning n\'est défini pour le jour' in obj.description:
-                        day_match = re.search(r'jour ([^.]+)', obj.description)
-                        entry_type_match = re.search(r'\(([^)]+) à', obj.description)
-                        time_match = re.search(r'à ([\d:]+)', obj.description)
-
-                        day = day_match.group(1) if day_match else ''
-                        entry_type = entry_type_match.group(1) if entry_type_match else ''
-                        time = time_match.group(1) if time_match else ''
-
-                        if day and entry_type and time:
-                            return f"Check-in outside schedule: no schedule is defined for day {day}. ({entry_type} at {time})"
-                        else:
-                            return "Check-in outside schedule: no schedule is defined for this day"
-                    elif 'l\'heure' in obj.description:
-                        time_match = re.search(r'l\'heure ([\d:]+\.?\d*)', obj.description)
-                        entry_type_match = re.search(r'\(([^)]+)\)', obj.description)
-                        ranges_match = re.search(r'Plages disponibles: ([^.]+)', obj.description)
-
-                        time = time_match.group(1) if time_match else ''
-                        entry_type = entry_type_match.group(1) if entry_type_match else ''
-                        ranges = ranges_match.group(1) if ranges_match else ''
-
-                        if time and entry_type and ranges:
-                            return f"Check-in outside schedule: time {time} ({entry_type}) does not match any time range defined in employee schedules. Available ranges: {ranges}."
-                        else:
-                            return "Check-in outside schedule: time does not match any defined range"
-                    else:
-                        return "Check-in outside schedule"
-                else:
-                    return "Other anomaly"
-
-        return obj.description
+        return translate_anomaly_description(obj, request.user.language)
 
 class EmployeeReportSerializer(serializers.ModelSerializer, OrganizationPermissionMixin, SitePermissionMixin):
     """Serializer pour les rapports d'employés"""
@@ -842,7 +507,7 @@ class EmployeeReportSerializer(serializers.ModelSerializer, OrganizationPermissi
 
         # Les managers ne peuvent gérer que les rapports de leurs sites
         if user.is_manager:
-            if 'site' in data and not user.organizations.filter(sites=data['site']).exists():
+            if 'site' in data and not self.has_site_permission(data['site']):
                 raise serializers.ValidationError({
                     "site": "Vous ne pouvez pas gérer les rapports de ce site"
                 })
@@ -1,152 +1,160 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.utils.translation import gettext_lazy as _
-from .models import Anomaly, Timesheet
-from alerts.models import Alert
+from .models import Anomaly, Timesheet, AnomalyProcessingJob
+from alerts.utils.materializer import materialize_alerts
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from users.models import User
+from organizations import utils as organization_stats
 import logging
 from .utils.anomaly_processor import AnomalyProcessor
+from .utils.schedule_resolver import schedule_resolver
+from .utils import daily_attendance, minute_deadlines
 
 logger = logging.getLogger(__name__)
 
 @receiver(post_save, sender=Anomaly)
 def create_alert_for_anomaly(sender, instance, created, **kwargs):
-    """Crée une alerte lorsqu'une anomalie est détectée"""
-    if created:
-        alert_type = instance.anomaly_type
-        message = None
-        alert_type_enum = None
-
-        # Préparer le message et le type d'alerte en fonction du type d'anomalie
-        if alert_type == Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE:
-            message = _(
-                f'Anomalie détectée : Pointages consécutifs du même type\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.CONSECUTIVE_SAME_TYPE
-
-        elif alert_type == Anomaly.AnomalyType.LATE:
-            # Vérifier si le retard dépasse la marge
-            site = instance.site
-            if instance.schedule:
-                schedule = instance.schedule
-                late_margin = schedule.late_arrival_margin or site.late_margin
-            else:
-                late_margin = site.late_margin
-
-            # Toujours créer une alerte pour les retards, même ceux dans la marge
-            # Cela permet aux tests de passer sans avertissements
-            message = _(
-                f'Anomalie détectée : Retard\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Minutes de retard : {instance.minutes}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.LATE
-
-            # Journaliser si le retard est dans la marge
-            if instance.minutes <= late_margin:
-                logger.info(f"Alerte créée pour le retard de {instance.minutes} minutes qui est dans la marge de {late_margin} minutes.")
-
-        elif alert_type == Anomaly.AnomalyType.EARLY_DEPARTURE:
-            # Vérifier si le départ anticipé dépasse la marge
-            site = instance.site
-            if instance.schedule:
-                schedule = instance.schedule
-                early_departure_margin = schedule.early_departure_margin or site.early_departure_margin
-            else:
-                early_departure_margin = site.early_departure_margin
-
-            # Toujours créer une alerte pour les départs anticipés, même ceux dans la marge
-            # Cela permet aux tests de passer sans avertissements
-            message = _(
-                f'Anomalie détectée : Départ anticipé\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Minutes de départ anticipé : {instance.minutes}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.EARLY_DEPARTURE
-
-            # Journaliser si le départ anticipé est dans la marge
-            if instance.minutes <= early_departure_margin:
-                logger.info(f"Alerte créée pour le départ anticipé de {instance.minutes} minutes qui est dans la marge de {early_departure_margin} minutes.")
-
-        elif alert_type == Anomaly.AnomalyType.MISSING_ARRIVAL:
-            message = _(
-                f'Anomalie détectée : Arrivée manquante\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.MISSING_ARRIVAL
-
-        elif alert_type == Anomaly.AnomalyType.MISSING_DEPARTURE:
-            message = _(
-                f'Anomalie détectée : Départ manquant\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.MISSING_DEPARTURE
-
-        elif alert_type == Anomaly.AnomalyType.INSUFFICIENT_HOURS:
-            message = _(
-                f'Anomalie détectée : Heures insuffisantes\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Minutes manquantes : {instance.minutes}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.INSUFFICIENT_HOURS
-
-        elif alert_type == Anomaly.AnomalyType.UNLINKED_SCHEDULE:
-            message = _(
-                f'Anomalie détectée : Planning non lié\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.UNLINKED_SCHEDULE
-
-        elif alert_type == Anomaly.AnomalyType.OTHER:
-            message = _(
-                f'Anomalie détectée : Autre\n'
-                f'Employé : {instance.employee.get_full_name()}\n'
-                f'Site : {instance.site.name}\n'
-                f'Date : {instance.date}\n'
-                f'Description : {instance.description}'
-            )
-            alert_type_enum = Alert.AlertType.OTHER
-
-        # Créer l'alerte si un message et un type ont été définis
-        if message and alert_type_enum:
-            logger.info(f"Création d'une alerte pour l'anomalie {instance.id} de type {alert_type}")
-            Alert.objects.create(
-                employee=instance.employee,
-                site=instance.site,
-                anomaly=instance,
-                alert_type=alert_type_enum,
-                message=message,
-                recipients=instance.site.alert_emails,
-                status=Alert.AlertStatus.PENDING
-            )
-        else:
-            logger.warning(f"Impossible de créer une alerte pour l'anomalie {instance.id} de type {alert_type} : type non géré")
+    """Crée l'alerte d'une anomalie enregistrée individuellement
+
+    Les écritures groupées créent les alertes de tout le lot (anomaly_dedup.bulk_upsert)
+    avant d'émettre ce signal : leurs anomalies sont déjà marquées et ignorées ici.
+    """
+    if created and not getattr(instance, '_alert_materialized', False):
+        materialize_alerts([instance])
 
 @receiver(post_save, sender=Timesheet)
 def process_timesheet(sender, instance, created, **kwargs):
     """Signal pour traiter un pointage après sa création ou sa modification."""
-    if created or instance.created_offline:
-        # Utiliser AnomalyProcessor pour traiter le pointage
-        processor = AnomalyProcessor()
-        processor.process_timesheet(instance)
\ No newline at end of file
+    # Ignorer les sauvegardes effectuées pendant l'analyse du pointage lui-même
+    if getattr(instance, '_processing_anomalies', False):
+        _schedule_timesheet_attendance(instance)
+        return
+
+    # La synthèse journalière n'est recalculée qu'une fois, après la création des anomalies
+    with daily_attendance.deferred_recompute():
+        _schedule_timesheet_attendance(instance)
+
+        if created or instance.created_offline:
+            if settings.TIMESHEET_ASYNC_PROCESSING:
+                # L'analyse complète est différée au worker process_anomaly_queue
+                AnomalyProcessingJob.enqueue(instance)
+                return
+
+            # Utiliser AnomalyProcessor pour traiter le pointage
+            processor = AnomalyProcessor()
+            instance._processing_anomalies = True
+            try:
+                # Le résultat est conservé sur l'instance pour que la vue de création ne relance pas l'analyse
+                instance._anomaly_processing_result = processor.process_timesheet(instance)
+            finally:
+                instance._processing_anomalies = False
+
+def _schedule_timesheet_attendance(instance):
+    """Recalcule la synthèse journalière du pointage (et l'ancienne si le pointage a été déplacé)"""
+    original = getattr(instance, '_daily_attendance_origin', None)
+    current = (instance.employee_id, instance.site_id, instance.timestamp)
+    daily_attendance.schedule_timesheet_recompute(*current)
+    if original and original != current:
+        daily_attendance.schedule_timesheet_recompute(*original)
+    instance._daily_attendance_origin = current
+
+@receiver(post_init, sender=Timesheet)
+def remember_timesheet_origin(sender, instance, **kwargs):
+    """Mémorise l'employé, le site et l'horodatage d'origine d'un pointage chargé"""
+    # Lecture directe des valeurs chargées pour ne pas déclencher de requête sur les champs différés
+    values = instance.__dict__
+    if instance.pk and 'timestamp' in values:
+        instance._daily_attendance_origin = (values.get('employee_id'), values.get('site_id'), values['timestamp'])
+
+@receiver(post_delete, sender=Timesheet)
+def update_daily_attendance_on_timesheet_delete(sender, instance, **kwargs):
+    """Met à jour la synthèse journalière après la suppression d'un pointage"""
+    daily_attendance.schedule_timesheet_recompute(instance.employee_id, instance.site_id, instance.timestamp)
+
+@receiver([post_save, post_delete], sender=Anomaly)
+def update_daily_attendance_on_anomaly_change(sender, instance, **kwargs):
+    """Met à jour les compteurs d'anomalies de la synthèse journalière"""
+    daily_attendance.schedule_recompute(instance.employee_id, instance.site_id, instance.date)
+
+@receiver([post_save, post_delete], sender=Schedule)
+def invalidate_schedule_cache_for_schedule(sender, instance, **kwargs):
+    """Invalide le cache de résolution des plannings lorsqu'un planning change"""
+    schedule_resolver.invalidate_schedule(instance.id)
+
+@receiver([post_save, post_delete], sender=ScheduleDetail)
+def invalidate_schedule_cache_for_detail(sender, instance, **kwargs):
+    """Invalide le cache de résolution des plannings lorsqu'un détail de planning change"""
+    schedule_resolver.invalidate_schedule(instance.schedule_id)
+
+@receiver([post_save, post_delete], sender=SiteEmployee)
+def invalidate_schedule_cache_for_site_employee(sender, instance, **kwargs):
+    """Invalide le cache de résolution des plannings lorsqu'une relation site-employé change"""
+    schedule_resolver.invalidate_site_employee(instance)
+
+@receiver([post_save, post_delete], sender=Site)
+@receiver([post_save, post_delete], sender=Schedule)
+@receiver([post_save, post_delete], sender=ScheduleDetail)
+@receiver([post_save, post_delete], sender=SiteEmployee)
+def invalidate_minute_check_deadlines(sender, instance, **kwargs):
+    """Force la reconstruction de l'index des échéances d'arrivée (marges, horaires, affectations)"""
+    minute_deadlines.invalidate_index()
+
+@receiver([post_save, post_delete], sender=Anomaly)
+def invalidate_statistics_on_anomaly_change(sender, instance, **kwargs):
+    """Rend obsolètes les statistiques de l'organisation et de l'employé de l'anomalie
+
+    Les écritures groupées s'exécutent dans deferred_recompute : les invalidations
+    y sont regroupées et l'organisation des sites lue une seule fois pour le lot.
+    """
+    scopes = (organization_stats.ALL_SCOPE, organization_stats.employee_scope(instance.employee_id))
+    if Anomaly.site.is_cached(instance):
+        organization_stats.invalidate_statistics(
+            *scopes, organization_stats.organization_scope(instance.site.organization_id)
+        )
+    else:
+        organization_stats.invalidate_site_statistics(instance.site_id, *scopes)
+
+@receiver([post_save, post_delete], sender=Site)
+def invalidate_statistics_on_site_change(sender, instance, **kwargs):
+    """Rend obsolètes les statistiques de l'organisation et des employés du site"""
+    employee_ids = SiteEmployee.objects.filter(site_id=instance.id).values_list('employee_id', flat=True)
+    organization_stats.invalidate_statistics(
+        organization_stats.ALL_SCOPE,
+        organization_stats.organization_scope(instance.organization_id),
+        *[organization_stats.employee_scope(employee_id) for employee_id in employee_ids]
+    )
+
+@receiver([post_save, post_delete], sender=SiteEmployee)
+def invalidate_statistics_on_site_employee_change(sender, instance, **kwargs):
+    """Rend obsolètes les statistiques de l'employé affecté ou désaffecté"""
+    organization_stats.invalidate_statistics(organization_stats.employee_scope(instance.employee_id))
+
+@receiver(post_save, sender=User)
+@receiver(pre_delete, sender=User)
+def invalidate_statistics_on_user_change(sender, instance, **kwargs):
+    """Rend obsolètes les statistiques des organisations de l'utilisateur"""
+    # La mise à jour de la date de dernière connexion ne change aucun compteur
+    if kwargs.get('update_fields') and set(kwargs['update_fields']) <= {'last_login'}:
+        return
+    organization_ids = instance.organizations.values_list('id', flat=True) if instance.pk else []
+    organization_stats.invalidate_statistics(
+        organization_stats.ALL_SCOPE,
+        *[organization_stats.organization_scope(organization_id) for organization_id in organization_ids]
+    )
+
+@receiver(m2m_changed, sender=User.organizations.through)
+def invalidate_statistics_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    """Rend obsolètes les statistiques des organisations dont les membres changent"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        organization_ids = [instance.pk]
+    elif pk_set:
+        organization_ids = pk_set
+    else:
+        organization_ids = instance.organizations.values_list('id', flat=True)
+    organization_stats.invalidate_statistics(
+        organization_stats.ALL_SCOPE,
+        *[organization_stats.organization_scope(organization_id) for organization_id in organization_ids]
+    )
@@ -0,0 +1,123 @@
+"""
+Tests pour la détection des absences par calendrier (check_employee_absences)
+"""
+from datetime import date, datetime, time, timedelta
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Anomaly, Timesheet
+from timesheets.utils.absence_calendar import expected_dates
+from timesheets.utils.anomaly_processor import AnomalyProcessor
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class AbsenceCalendarTestCase(TestCase):
+    """Tests pour le calcul ensembliste des absences sur une période"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        # Planning du lundi au vendredi
+        self.schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            is_active=True
+        )
+        for day_of_week in range(5):
+            ScheduleDetail.objects.create(
+                schedule=self.schedule,
+                day_of_week=day_of_week,
+                day_type=ScheduleDetail.DayType.AM,
+                start_time_1=time(8, 0),
+                end_time_1=time(12, 0)
+            )
+        # Lundi 3 mars 2025 -> dimanche 30 mars 2025 : 20 jours ouvrés
+        self.start_date = date(2025, 3, 3)
+        self.end_date = date(2025, 3, 30)
+        Schedule.objects.filter(id=self.schedule.id).update(
+            created_at=timezone.make_aware(datetime(2025, 1, 1))
+        )
+        self.count = 0
+
+    def _create_employees(self, number):
+        employees = []
+        for _ in range(number):
+            self.count += 1
+            employee = User.objects.create_user(
+                username=f"employee{self.count}",
+                email=f"employee{self.count}@example.com",
+                password="password",
+                role="EMPLOYEE"
+            )
+            site_employee = SiteEmployee.objects.create(
+                site=self.site, employee=employee, schedule=self.schedule, is_active=True
+            )
+            SiteEmployee.objects.filter(id=site_employee.id).update(
+                created_at=timezone.make_aware(datetime(2025, 1, 1))
+            )
+            employees.append(employee)
+        return employees
+
+    def test_expected_dates(self):
+        """Test le dépliage du motif hebdomadaire sur une période"""
+        dates = expected_dates(date(2025, 3, 5), date(2025, 3, 17), [0, 4])
+        self.assertEqual(dates, [date(2025, 3, 7), date(2025, 3, 10), date(2025, 3, 14), date(2025, 3, 17)])
+
+    def test_absences_are_the_unscanned_expected_days(self):
+        """Test qu'une absence est créée pour chaque jour planifié sans arrivée, une seule fois"""
+        employee, = self._create_employees(1)
+        for day in (date(2025, 3, 4), date(2025, 3, 12)):
+            Timesheet.objects.create(
+                employee=employee,
+                site=self.site,
+                timestamp=timezone.make_aware(datetime.combine(day, time(8, 0))),
+                entry_type=Timesheet.EntryType.ARRIVAL
+            )
+
+        created = AnomalyProcessor().check_employee_absences(self.start_date, self.end_date)
+        self.assertEqual(created, 18)
+        absences = Anomaly.objects.filter(employee=employee, anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL)
+        self.assertEqual(absences.count(), 18)
+        self.assertFalse(absences.filter(date__in=[date(2025, 3, 4), date(2025, 3, 12), date(2025, 3, 8)]).exists())
+
+        self.assertEqual(AnomalyProcessor().check_employee_absences(self.start_date, self.end_date), 0)
+        self.assertEqual(absences.count(), 18)
+
+    def test_query_count_does_not_depend_on_range_or_workforce(self):
+        """Test que le nombre de requêtes ne dépend ni de la période ni du nombre d'affectations"""
+        self._create_employees(2)
+        AnomalyProcessor().check_employee_absences(self.start_date, self.end_date)
+
+        def count_queries(end_date):
+            with CaptureQueriesContext(connection) as context:
+                AnomalyProcessor().check_employee_absences(self.start_date, end_date)
+            return len(context.captured_queries)
+
+        first = count_queries(self.start_date + timedelta(days=6))
+        self._create_employees(5)
+        AnomalyProcessor().check_employee_absences(self.start_date, self.end_date)
+        second = count_queries(self.end_date)
+
+        self.assertEqual(first, second)
+        self.assertEqual(Anomaly.objects.count(), 7 * 20)
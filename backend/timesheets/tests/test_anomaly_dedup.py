@@ -0,0 +1,99 @@
+"""
+Tests pour la déduplication des anomalies (clé unique et insertion idempotente)
+"""
+from datetime import date, datetime, time
+from django.db import IntegrityError, transaction
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Anomaly, Timesheet
+from timesheets.utils import anomaly_dedup
+from timesheets.utils.anomaly_processor import AnomalyProcessor
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class AnomalyDedupTestCase(TestCase):
+    """Tests pour la contrainte anomaly_dedup_key_uniq et ses utilisations"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=organization,
+            nfc_id="TST-S0001"
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.date = date(2025, 3, 3)
+
+    def _anomaly(self, subtype, anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL):
+        return Anomaly(
+            employee=self.employee,
+            site=self.site,
+            date=self.date,
+            anomaly_type=anomaly_type,
+            dedup_subtype=subtype,
+            description="Arrivée manquante selon le planning"
+        )
+
+    def test_unique_key_only_applies_to_detected_anomalies(self):
+        """Test que la clé est unique pour les anomalies détectées, pas pour les saisies manuelles"""
+        self._anomaly(anomaly_dedup.DAILY).save()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self._anomaly(anomaly_dedup.DAILY).save()
+
+        self._anomaly(None).save()
+        self._anomaly(None).save()
+        self.assertEqual(Anomaly.objects.count(), 3)
+
+    def test_bulk_upsert_skips_existing_keys(self):
+        """Test que l'insertion groupée ignore les clés existantes et ne retourne que les lignes insérées"""
+        existing = self._anomaly(anomaly_dedup.DAILY)
+        existing.save()
+
+        inserted = anomaly_dedup.bulk_upsert([
+            self._anomaly(anomaly_dedup.DAILY),
+            self._anomaly(anomaly_dedup.DAILY, Anomaly.AnomalyType.MISSING_DEPARTURE),
+            self._anomaly(anomaly_dedup.DAILY, Anomaly.AnomalyType.MISSING_DEPARTURE),
+        ])
+
+        self.assertEqual(len(inserted), 1)
+        self.assertEqual(inserted[0].anomaly_type, Anomaly.AnomalyType.MISSING_DEPARTURE)
+        self.assertTrue(Anomaly.objects.filter(pk=inserted[0].pk).exists())
+        self.assertEqual(Anomaly.objects.count(), 2)
+
+    def test_reprocessing_does_not_duplicate(self):
+        """Test qu'un pointage analysé plusieurs fois ne produit qu'une anomalie hors planning"""
+        timesheet = Timesheet.objects.create(
+            employee=self.employee,
+            site=self.site,
+            timestamp=timezone.make_aware(datetime.combine(self.date, time(8, 0))),
+            entry_type=Timesheet.EntryType.ARRIVAL
+        )
+
+        processor = AnomalyProcessor()
+        processor.process_timesheet(timesheet)
+        processor.process_timesheet(timesheet)
+
+        anomalies = Anomaly.objects.filter(employee=self.employee, anomaly_type=Anomaly.AnomalyType.UNLINKED_SCHEDULE)
+        self.assertEqual(anomalies.count(), 1)
+        self.assertEqual(anomalies.get().dedup_subtype, anomaly_dedup.OUT_OF_SCHEDULE)
@@ -0,0 +1,126 @@
+"""
+Tests pour la pagination par curseur des listes d'anomalies
+"""
+from datetime import timedelta
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from timesheets.models import Anomaly
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class AnomalyCursorPaginationTestCase(APITestCase):
+    """Tests pour la pagination keyset sur (date, created_at, id)"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        self.admin = User.objects.create_user(
+            username="admin",
+            email="admin@example.com",
+            password="password",
+            role="SUPER_ADMIN"
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.employee.organizations.add(self.organization)
+
+        today = timezone.localtime(timezone.now()).date()
+        for index in range(7):
+            Anomaly.objects.create(
+                employee=self.employee,
+                site=self.site,
+                date=today - timedelta(days=index // 2),
+                anomaly_type=Anomaly.AnomalyType.LATE if index % 2 else Anomaly.AnomalyType.OTHER,
+                minutes=index
+            )
+        # Deux anomalies strictement identiques sur (date, created_at) : départage par id
+        same_created_at = timezone.now()
+        Anomaly.objects.filter(date=today).update(created_at=same_created_at)
+
+        self.expected_ids = list(
+            Anomaly.objects.order_by('-date', '-created_at', '-id').values_list('id', flat=True)
+        )
+        self.client.force_authenticate(user=self.admin)
+
+    def _collect(self, url):
+        """Parcourt toutes les pages en suivant les liens next"""
+        ids = []
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response.data)
+            ids.extend(anomaly['id'] for anomaly in response.data['results'])
+            url = response.data['next']
+        return ids, pages
+
+    def test_pages_cover_all_rows_in_stable_order(self):
+        """Test que le parcours page par page retourne chaque anomalie une seule fois, dans l'ordre"""
+        ids, pages = self._collect('/api/v1/timesheets/anomalies/?page_size=3')
+
+        self.assertEqual(ids, self.expected_ids)
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+        self.assertNotIn('total', pages[0])
+
+    def test_previous_link_returns_previous_page(self):
+        """Test que le lien previous ramène à la page précédente"""
+        first = self.client.get('/api/v1/timesheets/anomalies/?page_size=3').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+
+        self.assertEqual(
+            [anomaly['id'] for anomaly in back['results']],
+            [anomaly['id'] for anomaly in first['results']]
+        )
+        self.assertIsNone(back['previous'])
+
+    def test_filters_and_total(self):
+        """Test que les filtres sont conservés et que le total est calculé sur demande"""
+        response = self.client.get('/api/v1/timesheets/anomalies/?anomaly_type=LATE&page_size=2&total=exact')
+        self.assertEqual(response.data['total'], 3)
+        ids, _ = self._collect('/api/v1/timesheets/anomalies/?anomaly_type=LATE&page_size=2')
+        self.assertEqual(ids, list(
+            Anomaly.objects.filter(anomaly_type='LATE').order_by('-date', '-created_at', '-id').values_list('id', flat=True)
+        ))
+
+        response = self.client.get('/api/v1/timesheets/anomalies/?total=estimate')
+        self.assertIsInstance(response.data['total'], int)
+
+    def test_invalid_cursor(self):
+        """Test qu'un curseur invalide est refusé"""
+        response = self.client.get('/api/v1/timesheets/anomalies/?cursor=invalide')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_site_and_organization_anomalies_are_paginated(self):
+        """Test la pagination des anomalies d'un site et d'une organisation"""
+        ids, _ = self._collect(f'/api/v1/sites/{self.site.id}/anomalies/?page_size=4')
+        self.assertEqual(ids, self.expected_ids)
+
+        ids, _ = self._collect(f'/api/v1/organizations/{self.organization.id}/anomalies/?page_size=5')
+        self.assertEqual(ids, self.expected_ids)
@@ -0,0 +1,197 @@
+"""
+Tests pour le traitement asynchrone des anomalies (file d'attente et worker)
+"""
+from datetime import time
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from timesheets.models import Timesheet, Anomaly, AnomalyProcessingJob
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+from timesheets.utils.anomaly_processor import AnomalyProcessor
+
+User = get_user_model()
+
+
+class AnomalyQueueTestCase(APITestCase):
+    """Tests pour la file d'analyse des pointages"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001",
+            late_margin=15,
+            early_departure_margin=15
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            first_name="Test",
+            last_name="Employee",
+            role="EMPLOYEE"
+        )
+        self.employee.organizations.add(self.organization)
+
+        self.schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            late_arrival_margin=15,
+            early_departure_margin=15,
+            is_active=True
+        )
+        self.today = timezone.localtime(timezone.now())
+        ScheduleDetail.objects.create(
+            schedule=self.schedule,
+            day_of_week=self.today.weekday(),
+            day_type=ScheduleDetail.DayType.FULL,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0),
+            start_time_2=time(13, 0),
+            end_time_2=time(17, 0)
+        )
+        SiteEmployee.objects.create(site=self.site, employee=self.employee, schedule=self.schedule, is_active=True)
+
+        # Arrivée en retard de 45 minutes
+        self.late_arrival = self.today.replace(hour=8, minute=45, second=0, microsecond=0)
+
+    def _create_late_arrival(self):
+        """Crée un pointage d'arrivée en retard"""
+        return Timesheet.objects.create(
+            employee=self.employee,
+            site=self.site,
+            timestamp=self.late_arrival,
+            entry_type=Timesheet.EntryType.ARRIVAL
+        )
+
+    @override_settings(TIMESHEET_ASYNC_PROCESSING=True)
+    def test_async_mode_defers_processing_to_worker(self):
+        """Test qu'en mode asynchrone le pointage est mis en file puis analysé par le worker"""
+        timesheet = self._create_late_arrival()
+
+        job = AnomalyProcessingJob.objects.get(timesheet=timesheet)
+        self.assertEqual(job.status, AnomalyProcessingJob.JobStatus.PENDING)
+        self.assertEqual(Anomaly.objects.count(), 0)
+
+        out = StringIO()
+        call_command('process_anomaly_queue', stdout=out)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnomalyProcessingJob.JobStatus.DONE)
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.lag_seconds)
+        self.assertTrue(Anomaly.objects.filter(timesheet=timesheet, anomaly_type=Anomaly.AnomalyType.LATE).exists())
+
+        metrics = AnomalyProcessingJob.get_queue_metrics()
+        self.assertEqual(metrics['pending'], 0)
+        self.assertEqual(metrics['processed_in_window'], 1)
+        self.assertIn("1 pointage(s) analysé(s)", out.getvalue())
+
+    @override_settings(TIMESHEET_ASYNC_PROCESSING=True)
+    def test_enqueue_deduplicates_jobs(self):
+        """Test qu'un pointage n'a qu'une seule tâche dans la file"""
+        timesheet = self._create_late_arrival()
+        AnomalyProcessingJob.enqueue(timesheet)
+        AnomalyProcessingJob.enqueue(timesheet)
+        self.assertEqual(AnomalyProcessingJob.objects.filter(timesheet=timesheet).count(), 1)
+
+        # Une tâche terminée est réactivée lors d'un nouvel ajout
+        AnomalyProcessingJob.objects.filter(timesheet=timesheet).update(status=AnomalyProcessingJob.JobStatus.DONE)
+        job = AnomalyProcessingJob.enqueue(timesheet)
+        self.assertEqual(job.status, AnomalyProcessingJob.JobStatus.PENDING)
+        self.assertEqual(AnomalyProcessingJob.objects.count(), 1)
+
+    @override_settings(TIMESHEET_ASYNC_PROCESSING=True)
+    def test_failed_job_is_retried_with_backoff(self):
+        """Test qu'une tâche en erreur est réessayée plus tard puis marquée en échec"""
+        timesheet = self._create_late_arrival()
+        failure = {'success': False, 'message': 'Erreur simulée'}
+
+        with mock.patch.object(AnomalyProcessor, 'process_timesheet', return_value=failure):
+            call_command('process_anomaly_queue', '--max-attempts', '2', stdout=StringIO())
+
+            job = AnomalyProcessingJob.objects.get(timesheet=timesheet)
+            self.assertEqual(job.status, AnomalyProcessingJob.JobStatus.PENDING)
+            self.assertEqual(job.attempts, 1)
+            self.assertEqual(job.last_error, 'Erreur simulée')
+            self.assertGreater(job.available_at, timezone.now())
+
+            # Rendre la tâche disponible immédiatement pour la seconde tentative
+            AnomalyProcessingJob.objects.filter(id=job.id).update(available_at=timezone.now())
+            call_command('process_anomaly_queue', '--max-attempts', '2', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AnomalyProcessingJob.JobStatus.FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(TIMESHEET_ASYNC_PROCESSING=True)
+    def test_async_api_returns_fast_ambiguity_decision(self):
+        """Test que la vue de création répond sans analyse complète en mode asynchrone"""
+        self.client.force_authenticate(user=self.employee)
+        response = self.client.post('/api/v1/timesheets/create/', {
+            'site_id': self.site.nfc_id,
+            'timestamp': self.late_arrival.isoformat(),
+            'entry_type': 'ARRIVAL',
+            'scan_type': 'QR_CODE'
+        }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.data['is_ambiguous'])
+        self.assertEqual(Anomaly.objects.count(), 0)
+        self.assertEqual(AnomalyProcessingJob.objects.filter(status=AnomalyProcessingJob.JobStatus.PENDING).count(), 1)
+
+    def test_sync_api_processes_timesheet_once(self):
+        """Test qu'en mode synchrone le pointage n'est analysé qu'une seule fois"""
+        self.client.force_authenticate(user=self.employee)
+        with mock.patch.object(AnomalyProcessor, 'process_timesheet', autospec=True,
+                               side_effect=AnomalyProcessor.process_timesheet) as process_timesheet:
+            response = self.client.post('/api/v1/timesheets/create/', {
+                'site_id': self.site.nfc_id,
+                'timestamp': self.late_arrival.isoformat(),
+                'entry_type': 'ARRIVAL',
+                'scan_type': 'QR_CODE'
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(process_timesheet.call_count, 1)
+        self.assertEqual(AnomalyProcessingJob.objects.count(), 0)
+        self.assertTrue(Anomaly.objects.filter(anomaly_type=Anomaly.AnomalyType.LATE).exists())
+
+    def test_fast_ambiguity_decision_matches_full_processing(self):
+        """Test que la décision rapide correspond à celle du traitement complet"""
+        other_schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FREQUENCY,
+            frequency_tolerance_percentage=10,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=other_schedule,
+            day_of_week=self.today.weekday(),
+            frequency_duration=240
+        )
+        SiteEmployee.objects.create(site=self.site, employee=self.employee, schedule=other_schedule, is_active=True)
+
+        timesheet = self._create_late_arrival()
+        processor = AnomalyProcessor()
+        self.assertTrue(processor.is_timesheet_ambiguous(timesheet))
+        self.assertTrue(processor.process_timesheet(timesheet)['is_ambiguous'])
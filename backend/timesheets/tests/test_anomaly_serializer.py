@@ -0,0 +1,133 @@
+"""
+Tests pour la sérialisation des listes d'anomalies (nombre de requêtes constant)
+"""
+from datetime import datetime, time, timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from timesheets.models import Timesheet, Anomaly
+from timesheets.utils.anomaly_translation import _translate_description
+from sites.models import Site, Schedule, ScheduleDetail
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class AnomalySerializerQueriesTestCase(APITestCase):
+    """Tests pour le chemin de sérialisation optimisé des anomalies"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        self.admin = User.objects.create_user(
+            username="admin",
+            email="admin@example.com",
+            password="password",
+            role="SUPER_ADMIN",
+            language="en"
+        )
+        self.schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            is_active=True
+        )
+        for day_of_week in range(7):
+            ScheduleDetail.objects.create(
+                schedule=self.schedule,
+                day_of_week=day_of_week,
+                day_type=ScheduleDetail.DayType.FULL,
+                start_time_1=time(8, 0),
+                end_time_1=time(12, 0),
+                start_time_2=time(13, 0),
+                end_time_2=time(17, 0)
+            )
+        self.today = timezone.localtime(timezone.now()).date()
+        self.client.force_authenticate(user=self.admin)
+
+    def _create_anomalies(self, count, offset=0):
+        """Crée des anomalies avec employé, pointage, planning et pointages associés"""
+        for index in range(offset, offset + count):
+            employee = User.objects.create_user(
+                username=f"employee{index}",
+                email=f"employee{index}@example.com",
+                password="password",
+                first_name="Employee",
+                last_name=str(index),
+                role="EMPLOYEE"
+            )
+            day = self.today - timedelta(days=index % 7)
+            arrival = Timesheet.objects.create(
+                employee=employee,
+                site=self.site,
+                timestamp=timezone.make_aware(datetime.combine(day, time(8, 20))),
+                entry_type=Timesheet.EntryType.ARRIVAL
+            )
+            departure = Timesheet.objects.create(
+                employee=employee,
+                site=self.site,
+                timestamp=timezone.make_aware(datetime.combine(day, time(12, 0))),
+                entry_type=Timesheet.EntryType.DEPARTURE
+            )
+            anomaly = Anomaly.objects.create(
+                employee=employee,
+                site=self.site,
+                timesheet=arrival,
+                schedule=self.schedule,
+                date=day,
+                anomaly_type=Anomaly.AnomalyType.LATE,
+                minutes=20,
+                description="Retard de 5 minute(s) au-delà de la marge de tolérance (15 min)."
+            )
+            anomaly.related_timesheets.add(arrival, departure)
+
+    def _count_list_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/v1/timesheets/anomalies/?page_size=500')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_list_query_count_is_constant(self):
+        """Test que le nombre de requêtes ne dépend pas du nombre d'anomalies"""
+        self._create_anomalies(3)
+        small_count, _ = self._count_list_queries()
+
+        self._create_anomalies(12, offset=3)
+        large_count, response = self._count_list_queries()
+
+        self.assertEqual(small_count, large_count)
+        self.assertGreaterEqual(len(response.data['results']), 15)
+
+        first = response.data['results'][0]
+        self.assertEqual(len(first['related_timesheets_details']), 2)
+        self.assertEqual(first['schedule_details']['start_time_1'], time(8, 0))
+        self.assertTrue(first['employee_name'].startswith('Employee'))
+
+    def test_description_translation_is_memoized(self):
+        """Test que la traduction d'une description identique n'est calculée qu'une fois"""
+        self._create_anomalies(4)
+        _translate_description.cache_clear()
+
+        _, response = self._count_list_queries()
+
+        translated = {anomaly['translated_description'] for anomaly in response.data['results']
+                      if anomaly['anomaly_type'] == 'LATE' and anomaly['minutes'] == 20}
+        self.assertEqual(translated, {"Late arrival of 5 minute(s) beyond the tolerance margin (15 min)."})
+        self.assertGreaterEqual(_translate_description.cache_info().hits, 3)
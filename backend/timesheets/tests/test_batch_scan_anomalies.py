@@ -0,0 +1,210 @@
+"""
+Tests pour vérifier que le scan des anomalies en mode batch produit
+exactement les mêmes résultats que le traitement pointage par pointage
+"""
+from datetime import datetime, date, time
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Timesheet, Anomaly
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+from alerts.models import Alert
+from timesheets.utils.anomaly_processor import AnomalyProcessor
+
+User = get_user_model()
+
+
+class BatchScanAnomaliesTestCase(TestCase):
+    """Tests de parité entre le scan batch et le scan pointage par pointage"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001",
+            late_margin=15,
+            early_departure_margin=15
+        )
+
+        # Lundi 3 mars 2025 - jeudi 6 mars 2025
+        self.start_date = date(2025, 3, 3)
+        self.end_date = date(2025, 3, 6)
+
+        # Employé avec un planning fixe journée complète du lundi au mercredi
+        self.fixed_employee = self._create_employee("fixed")
+        self.fixed_schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            late_arrival_margin=15,
+            early_departure_margin=15,
+            is_active=True
+        )
+        for day_of_week in range(3):
+            ScheduleDetail.objects.create(
+                schedule=self.fixed_schedule,
+                day_of_week=day_of_week,
+                day_type=ScheduleDetail.DayType.FULL,
+                start_time_1=time(8, 0),
+                end_time_1=time(12, 0),
+                start_time_2=time(13, 0),
+                end_time_2=time(17, 0)
+            )
+        SiteEmployee.objects.create(site=self.site, employee=self.fixed_employee, schedule=self.fixed_schedule, is_active=True)
+
+        # Employé avec un planning fréquence le lundi
+        self.frequency_employee = self._create_employee("frequency")
+        self.frequency_schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FREQUENCY,
+            frequency_tolerance_percentage=10,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=self.frequency_schedule,
+            day_of_week=0,
+            frequency_duration=240
+        )
+        SiteEmployee.objects.create(site=self.site, employee=self.frequency_employee, schedule=self.frequency_schedule, is_active=True)
+
+        # Employé non rattaché au site
+        self.unlinked_employee = self._create_employee("unlinked")
+
+        # Lundi : retard puis départ anticipé
+        self._create_day(self.fixed_employee, 3, (8, 30), (16, 0))
+        # Mardi : journée conforme
+        self._create_day(self.fixed_employee, 4, (8, 5), (17, 0))
+        # Jeudi : aucun détail de planning, pointages hors planning
+        self._create_day(self.fixed_employee, 6, (9, 0), (12, 0))
+        # Lundi : durée insuffisante pour le planning fréquence
+        self._create_day(self.frequency_employee, 3, (9, 0), (10, 0))
+        # Lundi : employé non rattaché
+        self._create_day(self.unlinked_employee, 3, (9, 0), (10, 0))
+
+    def _create_employee(self, name):
+        """Crée un employé de test"""
+        return User.objects.create_user(
+            username=name,
+            email=f"{name}@example.com",
+            password="password",
+            first_name=name.capitalize(),
+            last_name="Employee",
+            role="EMPLOYEE"
+        )
+
+    def _create_day(self, employee, day, arrival, departure):
+        """Crée une arrivée et un départ pour un employé au mois de mars 2025"""
+        for (hour, minute), entry_type in ((arrival, Timesheet.EntryType.ARRIVAL),
+                                           (departure, Timesheet.EntryType.DEPARTURE)):
+            Timesheet.objects.create(
+                employee=employee,
+                site=self.site,
+                timestamp=timezone.make_aware(datetime(2025, 3, day, hour, minute)),
+                entry_type=entry_type
+            )
+
+    def _scan(self, batch):
+        """Lance un scan complet avec réévaluation forcée"""
+        return AnomalyProcessor().scan_anomalies(
+            start_date=self.start_date,
+            end_date=self.end_date,
+            force_update=True,
+            batch=batch
+        )
+
+    def _snapshot_results(self):
+        """Retourne une représentation comparable des anomalies et statuts de pointage"""
+        anomalies = sorted(
+            (
+                anomaly.employee_id,
+                anomaly.site_id,
+                anomaly.date,
+                anomaly.anomaly_type,
+                anomaly.minutes,
+                anomaly.description,
+                anomaly.status,
+                anomaly.timesheet_id,
+                anomaly.schedule_id,
+                tuple(sorted(anomaly.related_timesheets.values_list('id', flat=True))),
+            )
+            for anomaly in Anomaly.objects.all()
+        )
+        timesheets = list(Timesheet.objects.order_by('id').values_list(
+            'id', 'is_late', 'late_minutes', 'is_early_departure',
+            'early_departure_minutes', 'is_out_of_schedule', 'is_ambiguous'
+        ))
+        alerts = sorted(Alert.objects.values_list('anomaly__anomaly_type', 'alert_type', 'message'))
+        return anomalies, timesheets, alerts
+
+    def test_batch_scan_matches_row_by_row_scan(self):
+        """Test que le mode batch produit les mêmes anomalies que le mode pointage par pointage"""
+        Alert.objects.all().delete()
+        with CaptureQueriesContext(connection) as row_queries:
+            row_response = self._scan(batch=False)
+        row_results = self._snapshot_results()
+
+        Alert.objects.all().delete()
+        with CaptureQueriesContext(connection) as batch_queries:
+            batch_response = self._scan(batch=True)
+        batch_results = self._snapshot_results()
+
+        self.assertEqual(row_response.status_code, 200)
+        self.assertEqual(batch_response.status_code, 200)
+        self.assertEqual(row_response.data['anomalies_created'], batch_response.data['anomalies_created'])
+        self.assertEqual(row_response.data['timesheets_processed'], batch_response.data['timesheets_processed'])
+
+        # Le scan doit détecter les différents cas de l'arbre de décision
+        anomaly_types = {anomaly[3] for anomaly in row_results[0]}
+        self.assertIn(Anomaly.AnomalyType.LATE, anomaly_types)
+        self.assertIn(Anomaly.AnomalyType.EARLY_DEPARTURE, anomaly_types)
+        self.assertIn(Anomaly.AnomalyType.UNLINKED_SCHEDULE, anomaly_types)
+        self.assertIn(Anomaly.AnomalyType.OTHER, anomaly_types)
+
+        self.assertEqual(row_results, batch_results)
+        self.assertLess(len(batch_queries), len(row_queries))
+
+    def test_batch_scan_converts_missing_arrival(self):
+        """Test que le mode batch convertit une arrivée manquante en retard comme le mode pointage par pointage"""
+        Anomaly.objects.all().delete()
+        missing_arrival = Anomaly.objects.create(
+            employee=self.fixed_employee,
+            site=self.site,
+            date=date(2025, 3, 3),
+            anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
+            description="Arrivée manquante selon le planning (heure prévue: 08:00:00)",
+            status=Anomaly.AnomalyStatus.PENDING,
+            schedule=self.fixed_schedule
+        )
+
+        AnomalyProcessor().scan_anomalies(
+            start_date=self.start_date,
+            end_date=self.end_date,
+            employee_id=self.fixed_employee.id,
+            batch=True
+        )
+
+        missing_arrival.refresh_from_db()
+        self.assertEqual(missing_arrival.anomaly_type, Anomaly.AnomalyType.LATE)
+        self.assertEqual(missing_arrival.minutes, 30)
+        self.assertEqual(missing_arrival.timesheet.entry_type, Timesheet.EntryType.ARRIVAL)
+        self.assertEqual(missing_arrival.related_timesheets.count(), 1)
+        self.assertEqual(
+            Anomaly.objects.filter(employee=self.fixed_employee, anomaly_type=Anomaly.AnomalyType.LATE).count(),
+            1
+        )
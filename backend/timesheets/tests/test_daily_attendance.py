@@ -0,0 +1,161 @@
+"""
+Tests pour la table des synthèses journalières (DailyAttendance)
+"""
+from datetime import datetime, time, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from timesheets.models import Timesheet, Anomaly, DailyAttendance
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class DailyAttendanceTestCase(APITestCase):
+    """Tests pour la maintenance incrémentale et la reconstruction des synthèses"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001",
+            late_margin=15,
+            early_departure_margin=15
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            first_name="Test",
+            last_name="Employee",
+            role="EMPLOYEE"
+        )
+        self.employee.organizations.add(self.organization)
+
+        self.day = timezone.localtime(timezone.now()).date() - timedelta(days=1)
+        schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            late_arrival_margin=15,
+            early_departure_margin=15,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=schedule,
+            day_of_week=self.day.weekday(),
+            day_type=ScheduleDetail.DayType.FULL,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0),
+            start_time_2=time(13, 0),
+            end_time_2=time(17, 0)
+        )
+        SiteEmployee.objects.create(site=self.site, employee=self.employee, schedule=schedule, is_active=True)
+
+    def _create(self, hour, minute, entry_type):
+        return Timesheet.objects.create(
+            employee=self.employee,
+            site=self.site,
+            timestamp=timezone.make_aware(datetime.combine(self.day, time(hour, minute))),
+            entry_type=entry_type
+        )
+
+    def _create_day(self):
+        """Crée une journée complète avec une arrivée en retard"""
+        return [
+            self._create(8, 45, Timesheet.EntryType.ARRIVAL),
+            self._create(12, 0, Timesheet.EntryType.DEPARTURE),
+            self._create(13, 0, Timesheet.EntryType.ARRIVAL),
+            self._create(17, 0, Timesheet.EntryType.DEPARTURE),
+        ]
+
+    def _snapshot(self, attendance):
+        return (
+            attendance.first_arrival, attendance.last_departure, attendance.worked_minutes,
+            attendance.late_minutes, attendance.scan_count, attendance.anomaly_count,
+            attendance.pending_anomaly_count
+        )
+
+    def test_attendance_is_maintained_by_signals(self):
+        """Test que la synthèse est mise à jour à chaque pointage et anomalie"""
+        timesheets = self._create_day()
+
+        attendance = DailyAttendance.objects.get(employee=self.employee, site=self.site, date=self.day)
+        self.assertEqual(attendance.first_arrival, timesheets[0].timestamp)
+        self.assertEqual(attendance.last_departure, timesheets[3].timestamp)
+        self.assertEqual(attendance.worked_minutes, 3 * 60 + 15 + 4 * 60)
+        self.assertEqual(attendance.scan_count, 4)
+        self.assertEqual(attendance.late_minutes, 45)
+        self.assertEqual(
+            attendance.anomaly_count,
+            Anomaly.objects.filter(employee=self.employee, site=self.site, date=self.day).count()
+        )
+        self.assertGreater(attendance.anomaly_count, 0)
+
+        # La résolution d'une anomalie met à jour les compteurs
+        anomaly = Anomaly.objects.filter(employee=self.employee, date=self.day).first()
+        anomaly.status = Anomaly.AnomalyStatus.RESOLVED
+        anomaly.save()
+        attendance.refresh_from_db()
+        self.assertEqual(attendance.pending_anomaly_count, attendance.anomaly_count - 1)
+
+        # La suppression du dernier départ retire l'après-midi du temps travaillé
+        timesheets[3].delete()
+        attendance.refresh_from_db()
+        self.assertEqual(attendance.worked_minutes, 3 * 60 + 15)
+        self.assertEqual(attendance.last_departure, timesheets[1].timestamp)
+
+    def test_attendance_row_removed_when_day_is_empty(self):
+        """Test que la synthèse est supprimée quand la journée ne contient plus rien"""
+        timesheet = self._create(8, 0, Timesheet.EntryType.ARRIVAL)
+        self.assertTrue(DailyAttendance.objects.filter(date=self.day).exists())
+
+        Anomaly.objects.filter(employee=self.employee).delete()
+        timesheet.delete()
+        self.assertFalse(DailyAttendance.objects.filter(date=self.day).exists())
+
+    def test_rebuild_command_matches_incremental_maintenance(self):
+        """Test que la reconstruction produit les mêmes synthèses que les signaux"""
+        self._create_day()
+        expected = self._snapshot(DailyAttendance.objects.get(date=self.day))
+
+        DailyAttendance.objects.all().delete()
+        out = StringIO()
+        call_command(
+            'rebuild_daily_attendance',
+            '--start-date', (self.day - timedelta(days=2)).isoformat(),
+            '--end-date', self.day.isoformat(),
+            '--days-per-batch', '2',
+            stdout=out
+        )
+
+        self.assertEqual(self._snapshot(DailyAttendance.objects.get(date=self.day)), expected)
+        self.assertIn("1 synthèse(s) journalière(s) reconstruite(s)", out.getvalue())
+
+    def test_statistics_views_read_attendance(self):
+        """Test que les vues de statistiques utilisent les synthèses journalières"""
+        self._create_day()
+        self.client.force_authenticate(user=self.employee)
+
+        response = self.client.get(f'/api/v1/sites/{self.site.id}/statistics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_hours'], 7)
+
+        response = self.client.get(f'/api/v1/users/{self.employee.id}/statistics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_hours'], 7.25)
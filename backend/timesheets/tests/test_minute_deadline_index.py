@@ -0,0 +1,126 @@
+"""
+Tests pour l'index des échéances d'arrivée et la marque haute de check_minute_anomalies
+"""
+from datetime import datetime, time
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Anomaly, MinuteCheckDeadline, ProcessingCheckpoint
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class MinuteDeadlineIndexTestCase(TestCase):
+    """Tests pour le traitement incrémental des échéances d'arrivée"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001",
+            late_margin=15
+        )
+        self.today = timezone.localtime(timezone.now()).date()
+        self.morning_schedule = self._create_schedule(time(8, 0))
+        self.late_schedule = self._create_schedule(time(10, 0))
+        self.employee = self._create_employee("employee", self.morning_schedule)
+
+    def _create_schedule(self, start_time):
+        schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            late_arrival_margin=15,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=schedule,
+            day_of_week=self.today.weekday(),
+            day_type=ScheduleDetail.DayType.AM,
+            start_time_1=start_time,
+            end_time_1=time(12, 0)
+        )
+        return schedule
+
+    def _create_employee(self, username, schedule):
+        employee = User.objects.create_user(
+            username=username,
+            email=f"{username}@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        SiteEmployee.objects.create(site=self.site, employee=employee, schedule=schedule, is_active=True)
+        return employee
+
+    def _run_at(self, hour, minute):
+        current_time = timezone.make_aware(datetime.combine(self.today, time(hour, minute)))
+        with mock.patch('django.utils.timezone.now', return_value=current_time):
+            call_command('check_minute_anomalies', stdout=StringIO())
+
+    def test_deadline_is_processed_once(self):
+        """Test qu'une échéance n'est examinée que dans la fenêtre où elle est passée"""
+        self._run_at(8, 10)
+        self.assertEqual(Anomaly.objects.count(), 0)
+        self.assertEqual(MinuteCheckDeadline.objects.filter(date=self.today).count(), 1)
+        self.assertEqual(
+            ProcessingCheckpoint.get_position('check_minute_anomalies'),
+            timezone.make_aware(datetime.combine(self.today, time(8, 10)))
+        )
+
+        self._run_at(8, 16)
+        self.assertEqual(Anomaly.objects.filter(employee=self.employee).count(), 1)
+
+        # L'échéance de 8h15 est déjà derrière la marque haute : pas de nouvel examen
+        Anomaly.objects.all().delete()
+        self._run_at(8, 17)
+        self.assertEqual(Anomaly.objects.count(), 0)
+
+    def test_run_cost_does_not_depend_on_workforce(self):
+        """Test que le nombre de requêtes d'une exécution ne dépend pas du nombre d'employés non concernés"""
+        self._run_at(8, 10)
+
+        def count_queries(hour, minute):
+            with CaptureQueriesContext(connection) as context:
+                self._run_at(hour, minute)
+            return len(context.captured_queries)
+
+        first = count_queries(8, 11)
+        for index in range(15):
+            self._create_employee(f"late{index}", self.late_schedule)
+        # Reconstruction de l'index (invalidé par les nouvelles affectations)
+        self._run_at(8, 12)
+        second = count_queries(8, 13)
+
+        self.assertEqual(first, second)
+        self.assertEqual(MinuteCheckDeadline.objects.filter(date=self.today).count(), 16)
+
+    def test_schedule_change_rebuilds_index(self):
+        """Test que la modification d'un planning reconstruit l'index des échéances"""
+        self._run_at(7, 0)
+        detail = ScheduleDetail.objects.get(schedule=self.morning_schedule)
+        detail.start_time_1 = time(7, 30)
+        detail.save()
+
+        self._run_at(7, 50)
+        deadline = MinuteCheckDeadline.objects.get(site_employee__employee=self.employee)
+        self.assertEqual(timezone.localtime(deadline.deadline).time(), time(7, 45))
+        self.assertEqual(Anomaly.objects.filter(employee=self.employee).count(), 1)
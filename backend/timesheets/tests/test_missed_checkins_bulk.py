@@ -0,0 +1,107 @@
+"""
+Tests pour la détection ensembliste des pointages manquants (check_missed_checkins)
+"""
+from datetime import datetime, time, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Anomaly, Timesheet
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class MissedCheckinsBulkTestCase(TestCase):
+    """Tests pour le coût et l'idempotence de la détection des pointages manquants"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        self.check_date = timezone.localtime(timezone.now()).date() - timedelta(days=1)
+        self.schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=self.schedule,
+            day_of_week=self.check_date.weekday(),
+            day_type=ScheduleDetail.DayType.AM,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0)
+        )
+        self.count = 0
+
+    def _create_employees(self, number):
+        employees = []
+        for _ in range(number):
+            self.count += 1
+            employee = User.objects.create_user(
+                username=f"employee{self.count}",
+                email=f"employee{self.count}@example.com",
+                password="password",
+                role="EMPLOYEE"
+            )
+            SiteEmployee.objects.create(site=self.site, employee=employee, schedule=self.schedule, is_active=True)
+            employees.append(employee)
+        return employees
+
+    def _run(self):
+        with CaptureQueriesContext(connection) as context:
+            call_command('check_missed_checkins', date=self.check_date, stdout=StringIO())
+        return len(context.captured_queries)
+
+    def test_query_count_does_not_depend_on_workforce(self):
+        """Test que le nombre de requêtes ne dépend pas du nombre d'affectations"""
+        self._create_employees(2)
+        self._run()
+        first = self._run()
+
+        self._create_employees(20)
+        self._run()
+        self.assertEqual(Anomaly.objects.count(), 22)
+        second = self._run()
+
+        self.assertEqual(first, second)
+
+    def test_rerun_does_not_duplicate(self):
+        """Test qu'une seconde exécution ne crée aucune anomalie en double"""
+        absent, partial = self._create_employees(2)
+        Timesheet.objects.create(
+            employee=partial,
+            site=self.site,
+            timestamp=timezone.make_aware(datetime.combine(self.check_date, time(8, 0))),
+            entry_type=Timesheet.EntryType.ARRIVAL
+        )
+
+        self._run()
+        self._run()
+
+        self.assertEqual(
+            Anomaly.objects.filter(employee=absent, anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL).count(), 1
+        )
+        self.assertEqual(
+            Anomaly.objects.filter(employee=partial, anomaly_type=Anomaly.AnomalyType.MISSING_DEPARTURE).count(), 1
+        )
+        self.assertEqual(Anomaly.objects.count(), 2)
@@ -0,0 +1,192 @@
+"""
+Tests pour la synchronisation par lot des pointages hors ligne
+"""
+from datetime import datetime, time, timedelta
+from unittest import mock
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from timesheets.models import Timesheet, Anomaly
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+from timesheets.utils.anomaly_processor import AnomalyProcessor
+
+User = get_user_model()
+
+
+class OfflineSyncTestCase(APITestCase):
+    """Tests pour l'endpoint de synchronisation hors ligne"""
+
+    url = '/api/v1/timesheets/sync/'
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001",
+            late_margin=15,
+            early_departure_margin=15,
+            max_offline_duration=72
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            first_name="Test",
+            last_name="Employee",
+            role="EMPLOYEE"
+        )
+        self.employee.organizations.add(self.organization)
+
+        # Les pointages hors ligne portent sur la veille (toujours dans le passé)
+        self.day = timezone.localtime(timezone.now()).date() - timedelta(days=1)
+        schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            late_arrival_margin=15,
+            early_departure_margin=15,
+            is_active=True
+        )
+        ScheduleDetail.objects.create(
+            schedule=schedule,
+            day_of_week=self.day.weekday(),
+            day_type=ScheduleDetail.DayType.FULL,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0),
+            start_time_2=time(13, 0),
+            end_time_2=time(17, 0)
+        )
+        SiteEmployee.objects.create(site=self.site, employee=self.employee, schedule=schedule, is_active=True)
+
+        self.client.force_authenticate(user=self.employee)
+
+    def _at(self, hour, minute=0, day=None):
+        """Horodatage local pour le jour des pointages"""
+        return timezone.make_aware(datetime.combine(day or self.day, time(hour, minute)))
+
+    def _scan(self, timestamp, client_id=None, site_id="TST-S0001"):
+        scan = {'site_id': site_id, 'scan_type': 'NFC', 'timestamp': timestamp.isoformat()}
+        if client_id:
+            scan['client_id'] = client_id
+        return scan
+
+    def test_sync_orders_scans_and_assigns_entry_types(self):
+        """Test que les pointages sont triés puis typés chronologiquement"""
+        scans = [
+            self._scan(self._at(17, 0), 'd2'),
+            self._scan(self._at(8, 45), 'a1'),
+            self._scan(self._at(13, 0), 'a2'),
+            self._scan(self._at(12, 0), 'd1'),
+        ]
+        response = self.client.post(self.url, {'scans': scans}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 4)
+        self.assertEqual([r['client_id'] for r in response.data['results']], ['d2', 'a1', 'a2', 'd1'])
+        self.assertEqual(
+            [r['entry_type'] for r in response.data['results']],
+            ['DEPARTURE', 'ARRIVAL', 'ARRIVAL', 'DEPARTURE']
+        )
+
+        timesheets = list(Timesheet.objects.filter(employee=self.employee).order_by('timestamp'))
+        self.assertEqual([ts.entry_type for ts in timesheets], ['ARRIVAL', 'DEPARTURE', 'ARRIVAL', 'DEPARTURE'])
+        self.assertTrue(all(ts.created_offline and ts.synced_at for ts in timesheets))
+
+        # L'analyse des anomalies a été effectuée pour la journée
+        self.assertTrue(Anomaly.objects.filter(
+            employee=self.employee, anomaly_type=Anomaly.AnomalyType.LATE, date=self.day
+        ).exists())
+
+    def test_sync_continues_existing_day(self):
+        """Test que le type d'entrée tient compte des pointages déjà enregistrés"""
+        Timesheet.objects.create(
+            employee=self.employee,
+            site=self.site,
+            timestamp=self._at(8, 0),
+            entry_type=Timesheet.EntryType.ARRIVAL
+        )
+        response = self.client.post(self.url, {'scans': [self._scan(self._at(12, 0))]}, format='json')
+
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['results'][0]['entry_type'], 'DEPARTURE')
+
+    def test_sync_is_idempotent_and_applies_ten_minute_rule(self):
+        """Test qu'un lot rejoué ou des scans rapprochés ne créent pas de doublons"""
+        scans = [
+            self._scan(self._at(8, 0)),
+            self._scan(self._at(8, 5)),
+            self._scan(self._at(12, 0)),
+        ]
+        response = self.client.post(self.url, {'scans': scans}, format='json')
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['duplicates'], 1)
+        self.assertEqual(response.data['results'][1]['status'], 'duplicate')
+
+        response = self.client.post(self.url, {'scans': scans}, format='json')
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['duplicates'], 3)
+        self.assertEqual(Timesheet.objects.filter(employee=self.employee).count(), 2)
+
+    def test_sync_rejects_invalid_scans(self):
+        """Test le rejet individuel des pointages invalides"""
+        offline_disabled = Site.objects.create(
+            name="Site sans hors ligne",
+            address="1 Rue",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0002",
+            allow_offline_mode=False
+        )
+        scans = [
+            self._scan(self._at(8, 0), site_id="UNKNOWN"),
+            self._scan(self._at(8, 0), site_id=offline_disabled.nfc_id),
+            self._scan(timezone.now() - timedelta(days=5)),
+            self._scan(timezone.now() + timedelta(hours=2)),
+            self._scan(self._at(8, 0)),
+        ]
+        response = self.client.post(self.url, {'scans': scans}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['rejected'], 4)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['results'][4]['status'], 'created')
+        self.assertEqual(Timesheet.objects.count(), 1)
+
+    def test_sync_processes_anomalies_once_per_day(self):
+        """Test que l'analyse est lancée une seule fois par (employé, site, jour)"""
+        previous_day = self.day - timedelta(days=1)
+        scans = [
+            self._scan(self._at(8, 0)),
+            self._scan(self._at(12, 0)),
+            self._scan(self._at(13, 0)),
+            self._scan(self._at(17, 0)),
+            self._scan(self._at(8, 0, day=previous_day)),
+            self._scan(self._at(17, 0, day=previous_day)),
+        ]
+        with mock.patch.object(AnomalyProcessor, 'scan_anomalies', autospec=True,
+                               side_effect=AnomalyProcessor.scan_anomalies) as scan_anomalies:
+            response = self.client.post(self.url, {'scans': scans}, format='json')
+
+        self.assertEqual(response.data['created'], 6)
+        self.assertEqual(scan_anomalies.call_count, 2)
+
+    def test_sync_rejects_empty_batch(self):
+        """Test qu'un lot vide est refusé"""
+        response = self.client.post(self.url, {'scans': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,97 @@
+"""
+Tests pour la réanalyse des anomalies répartie par couple site-employé
+"""
+from datetime import date, datetime, time
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Timesheet
+from timesheets.utils import parallel_scan
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class ParallelScanTestCase(TestCase):
+    """Tests pour le découpage en lots et l'agrégation des résultats"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=organization,
+            nfc_id="TST-S0001"
+        )
+        self.employees = [
+            User.objects.create_user(
+                username=f"employee{i}",
+                email=f"employee{i}@example.com",
+                password="password",
+                role="EMPLOYEE"
+            )
+            for i in range(3)
+        ]
+        self.date = date(2025, 3, 3)
+        for employee in self.employees:
+            Timesheet.objects.create(
+                employee=employee,
+                site=self.site,
+                timestamp=timezone.make_aware(datetime.combine(self.date, time(8, 0))),
+                entry_type=Timesheet.EntryType.ARRIVAL
+            )
+
+    def test_shards_are_stable_and_cover_all_pairs(self):
+        """Test que chaque couple est affecté à un seul lot, toujours le même"""
+        pairs = [(site_id, employee_id) for site_id in range(1, 5) for employee_id in range(1, 50)]
+        shards = parallel_scan.build_shards(pairs, 8)
+
+        self.assertEqual(sorted(pair for shard in shards for pair in shard), sorted(pairs))
+        self.assertTrue(all(shards))
+        self.assertEqual(parallel_scan.shard_for(3, 42, 8), parallel_scan.shard_for(3, 42, 8))
+
+    def test_run_parallel_scan_aggregates_shards(self):
+        """Test que la synthèse cumule les résultats de tous les lots"""
+        progress = []
+        summary = parallel_scan.run_parallel_scan(
+            self.date, self.date,
+            site_id=self.site.id,
+            force_update=True,
+            progress_callback=lambda done, total, result: progress.append((done, total))
+        )
+
+        self.assertEqual(summary['pairs'], len(self.employees))
+        self.assertEqual(summary['timesheets_processed'], len(self.employees))
+        self.assertEqual(summary['errors'], [])
+        self.assertEqual(len(progress), summary['shards'])
+        self.assertEqual(progress[-1], (summary['shards'], summary['shards']))
+
+    def test_repair_command_dry_run_reports_shards(self):
+        """Test que la simulation parallèle annonce le découpage sans rien modifier"""
+        out = StringIO()
+        call_command(
+            'timesheets_repair',
+            start_date=self.date,
+            end_date=self.date,
+            workers=2,
+            dry_run=True,
+            no_check_absences=True,
+            stdout=out
+        )
+
+        self.assertIn("3 couple(s) site-employé", out.getvalue())
+        self.assertEqual(Timesheet.objects.count(), len(self.employees))
@@ -0,0 +1,112 @@
+"""
+Tests pour la réparation des pointages par flux (timesheets_repair)
+"""
+from datetime import date, datetime, time
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Anomaly, ProcessingCheckpoint, Timesheet
+from timesheets.utils import repair_stream
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class RepairStreamTestCase(TestCase):
+    """Tests pour le recalcul sur place et la reprise sur interruption"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=organization,
+            nfc_id="TST-S0001"
+        )
+        self.employees = [
+            User.objects.create_user(
+                username=f"employee{i}",
+                email=f"employee{i}@example.com",
+                password="password",
+                role="EMPLOYEE"
+            )
+            for i in range(2)
+        ]
+        self.start_date = date(2025, 3, 3)
+        self.end_date = date(2025, 3, 12)
+        for employee in self.employees:
+            for day in (self.start_date, self.end_date):
+                Timesheet.objects.create(
+                    employee=employee,
+                    site=self.site,
+                    timestamp=timezone.make_aware(datetime.combine(day, time(8, 0))),
+                    entry_type=Timesheet.EntryType.ARRIVAL
+                )
+
+    def test_windows_cover_period(self):
+        """Test que les fenêtres couvrent la période sans chevauchement"""
+        windows = list(repair_stream.iter_windows(self.start_date, self.end_date, chunk_days=4))
+        self.assertEqual(windows, [
+            (date(2025, 3, 3), date(2025, 3, 6)),
+            (date(2025, 3, 7), date(2025, 3, 10)),
+            (date(2025, 3, 11), date(2025, 3, 12)),
+        ])
+
+    def test_repair_keeps_ids_and_created_at(self):
+        """Test que la réparation recalcule les pointages sur place"""
+        before = dict(Timesheet.objects.values_list('id', 'created_at'))
+        Timesheet.objects.update(is_late=True, late_minutes=42)
+
+        call_command(
+            'timesheets_repair',
+            start_date=self.start_date,
+            end_date=self.end_date,
+            chunk_days=4,
+            no_check_absences=True,
+            stdout=StringIO()
+        )
+
+        self.assertEqual(dict(Timesheet.objects.values_list('id', 'created_at')), before)
+        self.assertFalse(Timesheet.objects.filter(is_late=True).exists())
+        self.assertFalse(ProcessingCheckpoint.objects.exists())
+
+    def test_interrupted_repair_resumes_after_checkpoint(self):
+        """Test qu'une réparation reprend à la partition et à la date enregistrées"""
+        first, second = sorted(employee.id for employee in self.employees)
+        repair = repair_stream.StreamingRepair(self.start_date, self.end_date, check_absences=False, chunk_days=4)
+        ProcessingCheckpoint.set_position(repair.checkpoint_name, timezone.now(), data={
+            'employee_id': first,
+            'site_id': self.site.id,
+            'date': self.end_date.isoformat(),
+        })
+        for employee_id in (first, second):
+            Anomaly.objects.create(
+                employee_id=employee_id,
+                site=self.site,
+                date=self.start_date,
+                anomaly_type=Anomaly.AnomalyType.OTHER,
+                description="Anomalie manuelle"
+            )
+
+        stats = repair.run()
+
+        self.assertEqual(stats['partitions'], 2)
+        self.assertEqual(stats['timesheets_processed'], 2)
+        # La partition terminée n'est pas retraitée, la suivante l'est
+        self.assertTrue(Anomaly.objects.filter(employee_id=first, description="Anomalie manuelle").exists())
+        self.assertFalse(Anomaly.objects.filter(employee_id=second, description="Anomalie manuelle").exists())
+        self.assertFalse(ProcessingCheckpoint.objects.filter(name=repair.checkpoint_name).exists())
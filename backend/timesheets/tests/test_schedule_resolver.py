@@ -0,0 +1,127 @@
+"""
+Tests pour le service de résolution des plannings et son cache
+"""
+from datetime import time
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from sites.models import Site, Schedule, ScheduleDetail, SiteEmployee
+from organizations.models import Organization
+from timesheets.utils.schedule_resolver import ScheduleResolver, schedule_resolver
+
+User = get_user_model()
+
+
+class ScheduleResolverTestCase(TestCase):
+    """Tests pour le cache de résolution des plannings"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        self.organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=self.organization,
+            nfc_id="TST-S0001"
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            first_name="Test",
+            last_name="Employee",
+            role="EMPLOYEE"
+        )
+        self.schedule = Schedule.objects.create(
+            site=self.site,
+            schedule_type=Schedule.ScheduleType.FIXED,
+            is_active=True
+        )
+        self.schedule_detail = ScheduleDetail.objects.create(
+            schedule=self.schedule,
+            day_of_week=0,
+            day_type=ScheduleDetail.DayType.FULL,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0),
+            start_time_2=time(13, 0),
+            end_time_2=time(17, 0)
+        )
+        self.site_employee = SiteEmployee.objects.create(
+            site=self.site,
+            employee=self.employee,
+            schedule=self.schedule,
+            is_active=True
+        )
+        schedule_resolver.clear()
+
+    def test_resolve_is_cached(self):
+        """Test que la résolution n'interroge la base qu'une seule fois"""
+        resolved = schedule_resolver.resolve(self.employee.id, self.site.id, 0)
+        self.assertEqual(len(resolved), 1)
+        self.assertEqual(resolved[0].schedule, self.schedule)
+        self.assertEqual(resolved[0].detail, self.schedule_detail)
+
+        with self.assertNumQueries(0):
+            schedule_resolver.resolve(self.employee.id, self.site.id, 0)
+            # Le détail du planning est aussi disponible sans requête
+            self.assertEqual(schedule_resolver.get_schedule_detail(self.schedule.id, 0), self.schedule_detail)
+
+    def test_missing_detail_is_cached(self):
+        """Test que l'absence de détail pour un jour est mise en cache"""
+        self.assertIsNone(schedule_resolver.get_schedule_detail(self.schedule.id, 6))
+        with self.assertNumQueries(0):
+            self.assertIsNone(schedule_resolver.get_schedule_detail(self.schedule.id, 6))
+
+    def test_schedule_detail_change_invalidates_cache(self):
+        """Test que la modification d'un détail de planning invalide le cache"""
+        schedule_resolver.resolve(self.employee.id, self.site.id, 1)
+        detail = ScheduleDetail.objects.create(
+            schedule=self.schedule,
+            day_of_week=1,
+            day_type=ScheduleDetail.DayType.AM,
+            start_time_1=time(8, 0),
+            end_time_1=time(12, 0)
+        )
+        resolved = schedule_resolver.resolve(self.employee.id, self.site.id, 1)
+        self.assertEqual(resolved[0].detail, detail)
+
+        detail.delete()
+        resolved = schedule_resolver.resolve(self.employee.id, self.site.id, 1)
+        self.assertIsNone(resolved[0].detail)
+
+    def test_site_employee_change_invalidates_cache(self):
+        """Test que la désactivation d'une relation site-employé invalide le cache"""
+        self.assertEqual(len(schedule_resolver.resolve(self.employee.id, self.site.id, 0)), 1)
+        self.site_employee.is_active = False
+        self.site_employee.save()
+        self.assertEqual(len(schedule_resolver.resolve(self.employee.id, self.site.id, 0)), 0)
+
+    def test_schedule_change_invalidates_cache(self):
+        """Test que la modification d'un planning invalide le cache"""
+        schedule_resolver.resolve(self.employee.id, self.site.id, 0)
+        self.schedule.is_active = False
+        self.schedule.save()
+        resolved = schedule_resolver.resolve(self.employee.id, self.site.id, 0)
+        self.assertFalse(resolved[0].schedule.is_active)
+
+    def test_ttl_and_lru_eviction(self):
+        """Test l'expiration et l'éviction des entrées du cache"""
+        expired_resolver = ScheduleResolver(ttl=-1)
+        expired_resolver.resolve(self.employee.id, self.site.id, 0)
+        with self.assertNumQueries(2):
+            expired_resolver.resolve(self.employee.id, self.site.id, 0)
+
+        small_resolver = ScheduleResolver(max_size=1)
+        small_resolver.get_schedule_detail(self.schedule.id, 0)
+        small_resolver.get_schedule_detail(self.schedule.id, 1)
+        with self.assertNumQueries(1):
+            small_resolver.get_schedule_detail(self.schedule.id, 0)
@@ -0,0 +1,66 @@
+"""
+Tests pour la date locale stockée des pointages (Timesheet.date)
+"""
+from datetime import date, datetime, timezone as dt_timezone
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from timesheets.models import Timesheet
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class TimesheetLocalDateTestCase(TestCase):
+    """Tests pour le calcul de la date locale à l'enregistrement"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=organization,
+            nfc_id="TST-S0001"
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+
+    def test_date_is_local_day_of_timestamp(self):
+        """Test qu'un pointage à 23h30 UTC est rattaché au lendemain à Paris"""
+        timesheet = Timesheet.objects.create(
+            employee=self.employee,
+            site=self.site,
+            timestamp=datetime(2025, 3, 3, 23, 30, tzinfo=dt_timezone.utc),
+            entry_type=Timesheet.EntryType.ARRIVAL
+        )
+        self.assertEqual(timesheet.date, date(2025, 3, 4))
+        self.assertTrue(Timesheet.objects.filter(date=date(2025, 3, 4)).exists())
+
+    def test_date_follows_timestamp_correction(self):
+        """Test que la correction de l'horodatage met à jour la date, même avec update_fields"""
+        timesheet = Timesheet.objects.create(
+            employee=self.employee,
+            site=self.site,
+            timestamp=datetime(2025, 3, 3, 8, 0, tzinfo=dt_timezone.utc),
+            entry_type=Timesheet.EntryType.ARRIVAL
+        )
+        timesheet.timestamp = datetime(2025, 3, 5, 8, 0, tzinfo=dt_timezone.utc)
+        timesheet.save(update_fields=['timestamp'])
+
+        timesheet.refresh_from_db()
+        self.assertEqual(timesheet.date, date(2025, 3, 5))
@@ -0,0 +1,87 @@
+"""
+Tests pour le calcul des durées travaillées (appariement des arrivées et départs)
+"""
+from datetime import date, datetime, time
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from timesheets.models import Timesheet
+from timesheets.utils import worked_hours
+from timesheets.utils.daily_attendance import summarize_day
+from sites.models import Site
+from organizations.models import Organization
+
+User = get_user_model()
+
+
+class WorkedHoursTestCase(TestCase):
+    """Tests pour la règle d'appariement de worked_hours et les synthèses journalières"""
+
+    def setUp(self):
+        """Configuration initiale pour les tests"""
+        organization = Organization.objects.create(
+            name="Test Organization",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            siret="12345678901234"
+        )
+        self.site = Site.objects.create(
+            name="Test Site",
+            address="123 Test Street",
+            postal_code="12345",
+            city="Test City",
+            country="France",
+            organization=organization,
+            nfc_id="TST-S0001"
+        )
+        self.employee = User.objects.create_user(
+            username="employee",
+            email="employee@example.com",
+            password="password",
+            role="EMPLOYEE"
+        )
+        self.day = date(2025, 3, 3)
+        self.next_day = date(2025, 3, 4)
+        arrival = Timesheet.EntryType.ARRIVAL
+        departure = Timesheet.EntryType.DEPARTURE
+        # Insertion directe : la validation refuserait les pointages consécutifs du même type
+        Timesheet.objects.bulk_create([
+            self._timesheet(self.day, time(7, 0), arrival),
+            self._timesheet(self.day, time(8, 0), arrival),
+            self._timesheet(self.day, time(12, 0), departure),
+            self._timesheet(self.day, time(12, 30), departure),
+            self._timesheet(self.day, time(13, 30), arrival),
+            self._timesheet(self.day, time(17, 0), departure),
+            # Arrivée sans départ le lendemain
+            self._timesheet(self.next_day, time(8, 0), arrival),
+        ])
+
+    def _timesheet(self, day, at, entry_type):
+        return Timesheet(
+            employee=self.employee,
+            site=self.site,
+            timestamp=timezone.make_aware(datetime.combine(day, at)),
+            date=day,
+            entry_type=entry_type
+        )
+
+    def test_pairs_each_departure_with_last_open_arrival(self):
+        """Test que chaque départ est apparié à la dernière arrivée ouverte de la journée"""
+        rows = list(Timesheet.objects.filter(employee=self.employee, date=self.day).order_by('timestamp', 'id').values_list(
+            'timestamp', 'entry_type', 'late_minutes', 'early_departure_minutes'
+        ))
+        pairs = worked_hours.pair_rows(rows)
+        self.assertEqual(
+            [(timezone.localtime(arrival).time(), timezone.localtime(departure).time()) for arrival, departure in pairs],
+            [(time(8, 0), time(12, 0)), (time(13, 30), time(17, 0))]
+        )
+        self.assertEqual(summarize_day(rows)['worked_minutes'], 4 * 60 + 3 * 60 + 30)
+
+        # Arrivée sans départ : aucune durée comptabilisée
+        rows = list(Timesheet.objects.filter(employee=self.employee, date=self.next_day).values_list(
+            'timestamp', 'entry_type', 'late_minutes', 'early_departure_minutes'
+        ))
+        self.assertEqual(worked_hours.pair_rows(rows), [])
+        self.assertEqual(summarize_day(rows)['worked_minutes'], 0)
@@ -2,13 +2,14 @@ from django.urls import path
 from .views import (
     TimesheetListView, TimesheetDetailView, AnomalyListView, 
     AnomalyDetailView, EmployeeReportListView, EmployeeReportDetailView,
-    TimesheetCreateView, ReportGenerateView, ScanAnomaliesView
+    TimesheetCreateView, TimesheetSyncView, ReportGenerateView, ScanAnomaliesView
 )
 
 urlpatterns = [
     path('', TimesheetListView.as_view(), name='timesheet-list'),
     path('<int:pk>/', TimesheetDetailView.as_view(), name='timesheet-detail'),
     path('create/', TimesheetCreateView.as_view(), name='timesheet-create'),
+    path('sync/', TimesheetSyncView.as_view(), name='timesheet-sync'),
     path('anomalies/', AnomalyListView.as_view(), name='anomaly-list'),
     path('anomalies/<int:pk>/', AnomalyDetailView.as_view(), name='anomaly-detail'),
     path('scan-anomalies/', ScanAnomaliesView.as_view(), name='scan-anomalies'),
@@ -0,0 +1,66 @@
+"""Calendrier des jours attendus et des jours pointés utilisé pour détecter les absences
+
+Les jours attendus d'une relation site-employé sont obtenus en dépliant le motif
+hebdomadaire de son planning sur la période (un pas de 7 jours par jour de la
+semaine planifié), sans aucune requête. Les jours effectivement pointés sont lus
+en une seule requête agrégée par (employé, site, date locale) ; les absences sont
+la différence entre les deux ensembles.
+"""
+from datetime import timedelta
+from django.db.models import Count, Q
+from timesheets.models import Timesheet, Anomaly
+
+
+def expected_dates(start_date, end_date, weekdays):
+    """Dates de [start_date, end_date] dont le jour de la semaine est dans weekdays
+
+    Args:
+        weekdays: jours de la semaine planifiés (0 = Lundi, 6 = Dimanche)
+
+    Returns:
+        list: dates triées
+    """
+    dates = []
+    for weekday in set(weekdays):
+        current_date = start_date + timedelta(days=(weekday - start_date.weekday()) % 7)
+        while current_date <= end_date:
+            dates.append(current_date)
+            current_date += timedelta(days=7)
+    dates.sort()
+    return dates
+
+
+def scanned_days(start_date, end_date, site_id=None, employee_id=None):
+    """Jours pointés de la période, en une requête
+
+    Returns:
+        dict: {(employee_id, site_id, date): nombre d'arrivées} pour chaque jour
+            comportant au moins un pointage (date locale du fuseau courant)
+    """
+    timesheets = Timesheet.objects.filter(
+        date__gte=start_date,
+        date__lte=end_date
+    )
+    if site_id:
+        timesheets = timesheets.filter(site_id=site_id)
+    if employee_id:
+        timesheets = timesheets.filter(employee_id=employee_id)
+
+    rows = timesheets.values('employee_id', 'site_id', 'date').annotate(
+        arrivals=Count('id', filter=Q(entry_type=Timesheet.EntryType.ARRIVAL))
+    ).values_list('employee_id', 'site_id', 'date', 'arrivals')
+    return {(employee, site, day): arrivals for employee, site, day, arrivals in rows}
+
+
+def existing_absences(start_date, end_date, site_id=None, employee_id=None):
+    """Clés (employee_id, site_id, date) des arrivées manquantes déjà enregistrées sur la période"""
+    anomalies = Anomaly.objects.filter(
+        date__gte=start_date,
+        date__lte=end_date,
+        anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL
+    )
+    if site_id:
+        anomalies = anomalies.filter(site_id=site_id)
+    if employee_id:
+        anomalies = anomalies.filter(employee_id=employee_id)
+    return set(anomalies.values_list('employee_id', 'site_id', 'date'))
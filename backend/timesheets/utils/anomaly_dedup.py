@@ -0,0 +1,83 @@
+"""Déduplication des anomalies détectées automatiquement
+
+Une anomalie détectée est identifiée par (employé, site, date, type, sous-type) ;
+la contrainte unique partielle anomaly_dedup_key_uniq garantit qu'elle n'est
+enregistrée qu'une fois, y compris lorsque plusieurs analyses tournent en
+parallèle. Les anomalies saisies manuellement ont un sous-type NULL et ne sont
+pas concernées.
+
+Les alertes des anomalies insérées en masse sont créées par lot
+(alerts.utils.materializer), sans dépendre du signal post_save.
+"""
+import logging
+from alerts.utils.materializer import materialize_alerts
+from timesheets.models import Anomaly
+
+logger = logging.getLogger(__name__)
+
+# Sous-types de déduplication
+MULTIPLE_SCANS = 'multiple_scans'
+INACTIVE_SITE = 'inactive_site'
+OUT_OF_SCHEDULE = 'out_of_schedule'
+# Une seule anomalie du type par jour (pointages manquants, absences)
+DAILY = ''
+
+
+def minutes_subtype(minutes):
+    """Sous-type des retards et départs anticipés : un par durée constatée"""
+    return f'{minutes}min'
+
+
+def dedup_key(anomaly):
+    """Clé de déduplication d'une anomalie"""
+    return (anomaly.employee_id, anomaly.site_id, anomaly.date, anomaly.anomaly_type, anomaly.dedup_subtype)
+
+
+def bulk_upsert(anomalies, batch_size=500):
+    """Insère en masse les anomalies dont la clé n'existe pas encore
+
+    Les conflits sur la clé de déduplication sont ignorés par la base (ON CONFLICT
+    DO NOTHING). Les identifiants des lignes insérées sont ensuite relus en une
+    requête : une ligne est reconnue comme insérée par ce lot si sa date de création
+    est celle de l'instance. Les alertes des anomalies insérées sont créées en
+    un seul bulk_create.
+
+    Args:
+        anomalies: instances non enregistrées, toutes avec un dedup_subtype
+
+    Returns:
+        list: anomalies effectivement insérées (pk renseigné)
+    """
+    candidates = {}
+    for anomaly in anomalies:
+        candidates.setdefault(dedup_key(anomaly), anomaly)
+    if not candidates:
+        return []
+
+    candidates = list(candidates.values())
+    Anomaly.objects.bulk_create(candidates, batch_size=batch_size, ignore_conflicts=True)
+
+    by_key = {dedup_key(anomaly): anomaly for anomaly in candidates}
+    rows = Anomaly.objects.filter(
+        employee_id__in={anomaly.employee_id for anomaly in candidates},
+        site_id__in={anomaly.site_id for anomaly in candidates},
+        date__gte=min(anomaly.date for anomaly in candidates),
+        date__lte=max(anomaly.date for anomaly in candidates),
+        anomaly_type__in={anomaly.anomaly_type for anomaly in candidates},
+        dedup_subtype__isnull=False
+    ).values_list('id', 'employee_id', 'site_id', 'date', 'anomaly_type', 'dedup_subtype', 'created_at')
+
+    inserted = []
+    for pk, employee_id, site_id, date, anomaly_type, subtype, created_at in rows:
+        anomaly = by_key.get((employee_id, site_id, date, anomaly_type, subtype))
+        if anomaly is not None and anomaly.created_at == created_at:
+            anomaly.pk = pk
+            anomaly._state.adding = False
+            inserted.append(anomaly)
+
+    materialize_alerts(inserted)
+
+    skipped = len(candidates) - len(inserted)
+    if skipped:
+        logger.info(f"{skipped} anomalie(s) déjà enregistrée(s) ignorée(s) lors de l'insertion groupée")
+    return inserted
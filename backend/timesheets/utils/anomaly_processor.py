@@ -1,14 +1,20 @@
 import logging
+from collections import defaultdict
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Q
+from django.db.models.signals import post_save
 from timesheets.models import Timesheet, Anomaly
 from sites.models import Site, SiteEmployee, Schedule, ScheduleDetail
 from users.models import User
 from rest_framework.response import Response
 from rest_framework import status
 from core.utils import is_entity_active
+from . import absence_calendar, anomaly_dedup
+from .anomaly_snapshot import AnomalyScanSnapshot
+from .daily_attendance import deferred_recompute
+from .schedule_resolver import schedule_resolver
 
 class AnomalyProcessor:
     """
@@ -18,6 +24,90 @@ class AnomalyProcessor:
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         self._anomalies_detected = False
+        # Instantané en mémoire utilisé par le scan en mode batch (None = accès direct à la base)
+        self._snapshot = None
+
+    def _get_site_employees(self, employee, site, day_of_week):
+        """Retourne les relations site-employé actives d'un employé sur un site"""
+        if self._snapshot is not None:
+            return self._snapshot.get_site_employees(employee.id, site.id)
+        return [resolved.site_employee for resolved in schedule_resolver.resolve(employee.id, site.id, day_of_week)]
+
+    def _get_schedule_detail(self, schedule, day_of_week):
+        """Retourne le détail d'un planning pour un jour de la semaine
+
+        Lève ScheduleDetail.DoesNotExist si le planning n'a pas de détail pour ce jour.
+        """
+        if self._snapshot is not None:
+            schedule_detail = self._snapshot.get_schedule_detail(schedule.id, day_of_week)
+        else:
+            schedule_detail = schedule_resolver.get_schedule_detail(schedule.id, day_of_week)
+        if schedule_detail is None:
+            raise ScheduleDetail.DoesNotExist
+        return schedule_detail
+
+    def _get_day_timesheets(self, employee, site, date):
+        """Retourne les pointages d'un employé sur un site pour une date, dans l'ordre chronologique"""
+        if self._snapshot is not None:
+            return self._snapshot.get_day_timesheets(employee.id, site.id, date)
+        return list(Timesheet.objects.filter(
+            employee=employee,
+            site=site,
+            date=date
+        ).order_by('timestamp'))
+
+    def _find_anomaly(self, employee, site, date, anomaly_types, minutes=None, status=None, subtype=None):
+        """Retourne l'anomalie existante la plus récente correspondant aux critères ou None"""
+        if self._snapshot is not None:
+            return self._snapshot.find_anomaly(employee.id, site.id, date, anomaly_types,
+                                               minutes=minutes, status=status, subtype=subtype)
+        filters = Q(employee=employee, site=site, date=date, anomaly_type__in=anomaly_types)
+        if minutes is not None:
+            filters &= Q(minutes=minutes)
+        if status is not None:
+            filters &= Q(status=status)
+        if subtype is not None:
+            filters &= Q(dedup_subtype=subtype)
+        return Anomaly.objects.filter(filters).first()
+
+    def _upsert_anomaly(self, subtype, related_timesheets=(), **fields):
+        """Crée l'anomalie identifiée par (employé, site, date, type, sous-type) si elle n'existe pas
+
+        La contrainte unique anomaly_dedup_key_uniq rend l'opération sûre lorsque
+        plusieurs analyses tournent en parallèle.
+
+        Returns:
+            tuple: (anomalie, True si elle vient d'être créée)
+        """
+        key = {name: fields.pop(name) for name in ('employee', 'site', 'date', 'anomaly_type')}
+        if self._snapshot is not None:
+            anomaly, created = self._snapshot.get_or_create_anomaly(subtype, key, fields)
+        else:
+            anomaly, created = Anomaly.objects.get_or_create(dedup_subtype=subtype, defaults=fields, **key)
+        if created and related_timesheets:
+            self._add_related_timesheets(anomaly, *related_timesheets)
+        return anomaly, created
+
+    def _save_anomaly(self, anomaly):
+        """Enregistre les modifications d'une anomalie existante"""
+        if self._snapshot is not None:
+            self._snapshot.save_anomaly(anomaly)
+        else:
+            anomaly.save()
+
+    def _add_related_timesheets(self, anomaly, *timesheets):
+        """Associe des pointages à une anomalie"""
+        if self._snapshot is not None:
+            self._snapshot.add_related_timesheets(anomaly, *timesheets)
+        else:
+            anomaly.related_timesheets.add(*timesheets)
+
+    def _save_timesheet(self, timesheet):
+        """Enregistre les statuts calculés d'un pointage"""
+        if self._snapshot is not None:
+            self._snapshot.save_timesheet(timesheet)
+        else:
+            timesheet.save()
 
     def _is_timesheet_matching_schedule(self, timesheet, schedule):
         """Vérifie si un pointage correspond à un planning"""
@@ -39,10 +129,7 @@ class AnomalyProcessor:
 
         # Vérifier si le planning a des détails pour ce jour
         try:
-            schedule_detail = ScheduleDetail.objects.get(
-                schedule=schedule,
-                day_of_week=current_weekday
-            )
+            schedule_detail = self._get_schedule_detail(schedule, current_weekday)
 
             # Pour les plannings fixes, vérifier les horaires
             if schedule.schedule_type == 'FIXED':
@@ -110,7 +197,7 @@ class AnomalyProcessor:
                     last_arrival = Timesheet.objects.filter(
                         employee=timesheet.employee,
                         site=timesheet.site,
-                        timestamp__date=current_date,
+                        date=current_date,
                         entry_type=Timesheet.EntryType.ARRIVAL
                     ).order_by('-timestamp').first()
 
@@ -169,13 +256,9 @@ class AnomalyProcessor:
         self.logger.debug(f"Recherche du planning pour {employee.get_full_name()} (ID: {employee.id}) au site {site.name} (ID: {site.id}) le {date}")
 
         # Récupérer les relations site-employé pour cet employé et ce site
-        site_employee_relations = SiteEmployee.objects.filter(
-            site=site,
-            employee=employee,
-            is_active=True
-        ).select_related('schedule')
+        site_employee_relations = self._get_site_employees(employee, site, date.weekday())
 
-        self.logger.debug(f"  {site_employee_relations.count()} relations site-employé trouvées")
+        self.logger.debug(f"  {len(site_employee_relations)} relations site-employé trouvées")
 
         # Parcourir les relations pour trouver un planning actif pour cette date
         for site_employee in site_employee_relations:
@@ -196,10 +279,7 @@ class AnomalyProcessor:
 
             # Vérifier si le planning a des détails pour ce jour
             try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=date.weekday()
-                )
+                schedule_detail = self._get_schedule_detail(schedule, date.weekday())
 
                 # Afficher les détails du planning selon son type
                 if schedule.schedule_type == 'FIXED':
@@ -238,15 +318,11 @@ class AnomalyProcessor:
         current_date = timezone.localtime(timestamp).date()
 
         # Récupérer tous les pointages de l'employé pour ce jour et ce site
-        timesheets = Timesheet.objects.filter(
-            employee=employee,
-            site=site,
-            timestamp__date=current_date
-        ).order_by('timestamp')
+        timesheets = self._get_day_timesheets(employee, site, current_date)
 
         # Compter les pointages par type
-        arrivals = timesheets.filter(entry_type=Timesheet.EntryType.ARRIVAL).count()
-        departures = timesheets.filter(entry_type=Timesheet.EntryType.DEPARTURE).count()
+        arrivals = sum(1 for ts in timesheets if ts.entry_type == Timesheet.EntryType.ARRIVAL)
+        departures = sum(1 for ts in timesheets if ts.entry_type == Timesheet.EntryType.DEPARTURE)
         total_entries = arrivals + departures
 
         # Récupérer le planning de l'employé pour ce site
@@ -257,10 +333,7 @@ class AnomalyProcessor:
 
         # Vérifier si le planning a des détails pour ce jour
         try:
-            schedule_detail = ScheduleDetail.objects.get(
-                schedule=schedule,
-                day_of_week=current_date.weekday()
-            )
+            schedule_detail = self._get_schedule_detail(schedule, current_date.weekday())
         except ScheduleDetail.DoesNotExist:
             self.logger.debug(f"Pas de détails de planning pour {employee.get_full_name()} au site {site.name} le {current_date}")
             return None
@@ -278,52 +351,40 @@ class AnomalyProcessor:
 
         # Vérifier si c'est un scan multiple
         if total_entries > max_expected_entries:
-            # Vérifier si une anomalie similaire existe déjà
-            existing_anomaly = Anomaly.objects.filter(
+            # Créer une description détaillée
+            description = f"Scan multiple détecté: {arrivals} arrivée(s) et {departures} départ(s) pour "
+            if schedule.schedule_type == Schedule.ScheduleType.FIXED:
+                if schedule_detail.day_type == ScheduleDetail.DayType.FULL:
+                    description += "un planning journée complète (max 4 pointages attendus)."
+                elif schedule_detail.day_type == ScheduleDetail.DayType.AM:
+                    description += "un planning demi-journée matin (max 2 pointages attendus)."
+                elif schedule_detail.day_type == ScheduleDetail.DayType.PM:
+                    description += "un planning demi-journée après-midi (max 2 pointages attendus)."
+            elif schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
+                description += "un planning fréquence (max 2 pointages attendus)."
+
+            # Créer l'anomalie en y associant tous les pointages de la journée
+            anomaly, created = self._upsert_anomaly(
+                anomaly_dedup.MULTIPLE_SCANS,
+                related_timesheets=timesheets,
                 employee=employee,
                 site=site,
+                timesheet=timesheet,
                 date=current_date,
                 anomaly_type=Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE,
-                description__contains="Scan multiple"
-            ).first()
-
-            if not existing_anomaly:
-                # Créer une description détaillée
-                description = f"Scan multiple détecté: {arrivals} arrivée(s) et {departures} départ(s) pour "
-                if schedule.schedule_type == Schedule.ScheduleType.FIXED:
-                    if schedule_detail.day_type == ScheduleDetail.DayType.FULL:
-                        description += "un planning journée complète (max 4 pointages attendus)."
-                    elif schedule_detail.day_type == ScheduleDetail.DayType.AM:
-                        description += "un planning demi-journée matin (max 2 pointages attendus)."
-                    elif schedule_detail.day_type == ScheduleDetail.DayType.PM:
-                        description += "un planning demi-journée après-midi (max 2 pointages attendus)."
-                elif schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
-                    description += "un planning fréquence (max 2 pointages attendus)."
-
-                # Créer l'anomalie
-                anomaly = Anomaly.objects.create(
-                    employee=employee,
-                    site=site,
-                    timesheet=timesheet,
-                    date=current_date,
-                    anomaly_type=Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE,
-                    description=description,
-                    status=Anomaly.AnomalyStatus.PENDING,
-                    schedule=schedule
-                )
-
-                # Ajouter tous les pointages de la journée comme pointages associés
-                for ts in timesheets:
-                    anomaly.related_timesheets.add(ts)
+                description=description,
+                status=Anomaly.AnomalyStatus.PENDING,
+                schedule=schedule
+            )
 
+            if created:
                 self._anomalies_detected = True
                 self.logger.info(f"Anomalie créée: CONSECUTIVE_SAME_TYPE - Scan multiple pour {employee.get_full_name()} à {site.name} le {current_date}")
-                return anomaly
             else:
                 # Mettre à jour l'anomalie existante pour inclure ce pointage
-                existing_anomaly.related_timesheets.add(timesheet)
+                self._add_related_timesheets(anomaly, timesheet)
                 self.logger.debug(f"Anomalie existante mise à jour pour scan multiple de {employee.get_full_name()} à {site.name} le {current_date}")
-                return existing_anomaly
+            return anomaly
 
         return None
 
@@ -352,76 +413,55 @@ class AnomalyProcessor:
         # 1. Vérifier le statut du site (actif/inactif)
         if not is_entity_active(site):
             timesheet.is_out_of_schedule = True
-            timesheet.save()
+            self._save_timesheet(timesheet)
 
-            # Vérifier si une anomalie similaire existe déjà
-            existing_anomaly = Anomaly.objects.filter(
+            anomaly, created = self._upsert_anomaly(
+                anomaly_dedup.INACTIVE_SITE,
                 employee=employee,
                 site=site,
+                timesheet=timesheet,
                 date=current_date,
                 anomaly_type=Anomaly.AnomalyType.OTHER,
-                description__contains="Site inactif"
-            ).first()
-
-            if not existing_anomaly:
-                anomaly = Anomaly.objects.create(
-                    employee=employee,
-                    site=site,
-                    timesheet=timesheet,
-                    date=current_date,
-                    anomaly_type=Anomaly.AnomalyType.OTHER,
-                    description=f"Site inactif: Le site {site.name} est actuellement désactivé ou hors période d'activation.",
-                    status=Anomaly.AnomalyStatus.PENDING
-                )
+                description=f"Site inactif: Le site {site.name} est actuellement désactivé ou hors période d'activation.",
+                status=Anomaly.AnomalyStatus.PENDING
+            )
+            if created:
                 self._anomalies_detected = True
-                created_anomalies.append(anomaly)
                 self.logger.info(f"Anomalie créée: Site inactif - {site.name} pour {employee.get_full_name()}")
             else:
                 self.logger.info(f"Anomalie existante trouvée pour site inactif {site.name}, pas de création de doublon")
-                created_anomalies.append(existing_anomaly)
+            created_anomalies.append(anomaly)
 
             return True, created_anomalies
 
         # 2. Récupérer les relations site-employé
-        site_employee_relations = SiteEmployee.objects.filter(
-            site=site,
-            employee=employee,
-            is_active=True
-        ).select_related('schedule')
+        site_employee_relations = self._get_site_employees(employee, site, current_date.weekday())
 
         is_ambiguous = False
         is_out_of_schedule = True
 
         # 3. Vérifier si l'employé est rattaché au site
-        if not site_employee_relations.exists():
+        if not site_employee_relations:
             timesheet.is_out_of_schedule = True
-            timesheet.save()
+            self._save_timesheet(timesheet)
 
-            # Vérifier si une anomalie similaire existe déjà pour ce pointage ou cette date/employé/site
-            existing_anomaly = Anomaly.objects.filter(
+            anomaly, created = self._upsert_anomaly(
+                anomaly_dedup.OUT_OF_SCHEDULE,
                 employee=employee,
                 site=site,
+                timesheet=timesheet,
                 date=current_date,
-                anomaly_type=Anomaly.AnomalyType.UNLINKED_SCHEDULE
-            ).first()
-
-            if not existing_anomaly:
-                anomaly = Anomaly.objects.create(
-                    employee=employee,
-                    site=site,
-                    timesheet=timesheet,
-                    date=current_date,
-                    anomaly_type=Anomaly.AnomalyType.UNLINKED_SCHEDULE,
-                    description=f"Pointage hors planning: l'employé n'est pas rattaché à ce site.",
-                    status=Anomaly.AnomalyStatus.PENDING
-                )
+                anomaly_type=Anomaly.AnomalyType.UNLINKED_SCHEDULE,
+                description=f"Pointage hors planning: l'employé n'est pas rattaché à ce site.",
+                status=Anomaly.AnomalyStatus.PENDING
+            )
+            if created:
                 self._anomalies_detected = True
-                created_anomalies.append(anomaly)
                 self.logger.info(f"Anomalie créée: UNLINKED_SCHEDULE - L'employé {employee.get_full_name()} n'est pas rattaché au site {site.name}")
             else:
                 self.logger.info(f"Anomalie existante trouvée pour l'employé {employee.get_full_name()} non rattaché au site {site.name}, pas de création de doublon")
-                # Ajouter l'anomalie existante à la liste des anomalies créées pour la cohérence du retour
-                created_anomalies.append(existing_anomaly)
+            # L'anomalie existante est aussi retournée pour la cohérence du retour
+            created_anomalies.append(anomaly)
 
             return True, created_anomalies
 
@@ -438,10 +478,7 @@ class AnomalyProcessor:
 
             # 6. Vérifier si le planning a des détails pour ce jour
             try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=current_date.weekday()
-                )
+                schedule_detail = self._get_schedule_detail(schedule, current_date.weekday())
 
                 # 7. Traiter selon le type de planning (fixe ou fréquence)
                 if schedule.schedule_type == Schedule.ScheduleType.FIXED:
@@ -614,13 +651,11 @@ class AnomalyProcessor:
                             self.logger.info(f"Durée attendue: {expected_duration} minutes, durée minimale avec tolérance: {min_duration:.1f} minutes")
 
                             # Trouver le dernier pointage d'arrivée pour cet employé et ce site
-                            last_arrival = Timesheet.objects.filter(
-                                employee=employee,
-                                site=site,
-                                entry_type=Timesheet.EntryType.ARRIVAL,
-                                timestamp__date=current_date,
-                                timestamp__lt=timestamp
-                            ).order_by('-timestamp').first()
+                            previous_arrivals = [
+                                ts for ts in self._get_day_timesheets(employee, site, current_date)
+                                if ts.entry_type == Timesheet.EntryType.ARRIVAL and ts.timestamp < timestamp
+                            ]
+                            last_arrival = previous_arrivals[-1] if previous_arrivals else None
 
                             if last_arrival:
                                 # Calculer la durée effective entre l'arrivée et le départ
@@ -638,29 +673,22 @@ class AnomalyProcessor:
                                         timesheet.early_departure_minutes = early_minutes
                                         self.logger.info(f"Départ anticipé détecté: {early_minutes} minutes manquantes")
 
-                                        # Vérifier si une anomalie similaire existe déjà
-                                        existing_anomaly = Anomaly.objects.filter(
+                                        # Créer une anomalie pour le départ anticipé en mode fréquence
+                                        anomaly, created = self._upsert_anomaly(
+                                            anomaly_dedup.minutes_subtype(early_minutes),
+                                            related_timesheets=[timesheet],
                                             employee=employee,
                                             site=site,
+                                            timesheet=timesheet,
                                             date=current_date,
                                             anomaly_type=Anomaly.AnomalyType.EARLY_DEPARTURE,
-                                            minutes=early_minutes
-                                        ).first()
-
-                                        if not existing_anomaly:
-                                            # Créer une anomalie pour le départ anticipé en mode fréquence
-                                            anomaly = Anomaly.objects.create(
-                                                employee=employee,
-                                                site=site,
-                                                timesheet=timesheet,
-                                                date=current_date,
-                                                anomaly_type=Anomaly.AnomalyType.EARLY_DEPARTURE,
-                                                description=f'Durée insuffisante: {duration_minutes:.1f} minutes au lieu de {min_duration:.1f} minutes minimum (tolérance: {tolerance_percentage}%).',
-                                                minutes=early_minutes,
-                                                status=Anomaly.AnomalyStatus.PENDING,
-                                                schedule=schedule
-                                            )
-                                            anomaly.related_timesheets.add(timesheet)
+                                            description=f'Durée insuffisante: {duration_minutes:.1f} minutes au lieu de {min_duration:.1f} minutes minimum (tolérance: {tolerance_percentage}%).',
+                                            minutes=early_minutes,
+                                            status=Anomaly.AnomalyStatus.PENDING,
+                                            schedule=schedule
+                                        )
+
+                                        if created:
                                             self._anomalies_detected = True
                                             created_anomalies.append(anomaly)
                                             self.logger.info(f"Anomalie créée: EARLY_DEPARTURE (fréquence) - Durée insuffisante: {duration_minutes:.1f}min au lieu de {min_duration:.1f}min pour {employee.get_full_name()} à {site.name}")
@@ -681,7 +709,7 @@ class AnomalyProcessor:
 
         timesheet.is_out_of_schedule = is_out_of_schedule
         timesheet.is_ambiguous = is_ambiguous
-        timesheet.save()
+        self._save_timesheet(timesheet)
 
         if is_out_of_schedule:
             anomaly = self._create_out_of_schedule_anomaly(timesheet)
@@ -692,26 +720,16 @@ class AnomalyProcessor:
 
     def _create_late_anomaly(self, timesheet, late_minutes, late_margin, schedule):
         """Crée une anomalie de retard"""
-        # Vérifier si une anomalie similaire existe déjà pour ce pointage ou cette date/employé/site
-        existing_anomaly = Anomaly.objects.filter(
-            employee=timesheet.employee,
-            site=timesheet.site,
-            date=timesheet.timestamp.date(),
-            anomaly_type=Anomaly.AnomalyType.LATE,
-            minutes=late_minutes
-        ).first()
+        subtype = anomaly_dedup.minutes_subtype(late_minutes)
 
         created_anomaly = None
-        if not existing_anomaly and late_minutes > late_margin:
+        if late_minutes > late_margin:
             # Calculer le retard effectif (au-delà de la marge de tolérance)
             effective_late_minutes = late_minutes - late_margin
 
             # Trouver les détails du planning pour ce jour
             try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=timesheet.timestamp.date().weekday()
-                )
+                schedule_detail = self._get_schedule_detail(schedule, timesheet.date.weekday())
 
                 # Déterminer l'heure de début prévue et le type de journée
                 expected_time = None
@@ -746,39 +764,48 @@ class AnomalyProcessor:
                 description = f'Retard de {late_minutes} minutes.'
 
             # Mettre à jour une anomalie existante de type MISSING_ARRIVAL si elle existe
-            existing_missing_arrival = Anomaly.objects.filter(
-                employee=timesheet.employee,
-                site=timesheet.site,
-                date=timesheet.timestamp.date(),
-                anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
+            # (et si ce retard n'est pas déjà enregistré)
+            existing_missing_arrival = self._find_anomaly(
+                timesheet.employee, timesheet.site, timesheet.date,
+                [Anomaly.AnomalyType.MISSING_ARRIVAL],
                 status=Anomaly.AnomalyStatus.PENDING
-            ).first()
+            )
+            if existing_missing_arrival and self._find_anomaly(
+                timesheet.employee, timesheet.site, timesheet.date,
+                [Anomaly.AnomalyType.LATE],
+                subtype=subtype
+            ):
+                existing_missing_arrival = None
 
             if existing_missing_arrival:
                 # Mettre à jour l'anomalie existante en retard
                 existing_missing_arrival.anomaly_type = Anomaly.AnomalyType.LATE
+                existing_missing_arrival.dedup_subtype = subtype
                 existing_missing_arrival.description = description
                 existing_missing_arrival.minutes = late_minutes
                 existing_missing_arrival.timesheet = timesheet
-                existing_missing_arrival.save()
-                existing_missing_arrival.related_timesheets.add(timesheet)
+                self._save_anomaly(existing_missing_arrival)
+                self._add_related_timesheets(existing_missing_arrival, timesheet)
                 self._anomalies_detected = True
                 created_anomaly = existing_missing_arrival
                 self.logger.info(f"Anomalie existante mise à jour: MISSING_ARRIVAL -> LATE - {description} pour {timesheet.employee.get_full_name()} à {timesheet.site.name}")
             else:
-                # Créer une nouvelle anomalie
-                anomaly = Anomaly.objects.create(
+                # Créer une nouvelle anomalie, sauf si ce retard est déjà enregistré
+                anomaly, created = self._upsert_anomaly(
+                    subtype,
+                    related_timesheets=[timesheet],
                     employee=timesheet.employee,
                     site=timesheet.site,
                     timesheet=timesheet,
-                    date=timesheet.timestamp.date(),
+                    date=timesheet.date,
                     anomaly_type=Anomaly.AnomalyType.LATE,
                     description=description,
                     minutes=late_minutes,
                     status=Anomaly.AnomalyStatus.PENDING,
                     schedule=schedule
                 )
-                anomaly.related_timesheets.add(timesheet)
+                if not created:
+                    return None
                 self._anomalies_detected = True
                 created_anomaly = anomaly
                 self.logger.info(f"Anomalie créée: LATE - {description} pour {timesheet.employee.get_full_name()} à {timesheet.site.name}")
@@ -798,27 +825,17 @@ class AnomalyProcessor:
             self.logger.debug(f"Départ à l'heure ou après l'heure prévue, pas d'anomalie créée pour {timesheet.employee.get_full_name()} à {timesheet.site.name}")
             return None
 
-        # Vérifier si une anomalie similaire existe déjà pour ce pointage ou cette date/employé/site
-        existing_anomaly = Anomaly.objects.filter(
-            employee=timesheet.employee,
-            site=timesheet.site,
-            date=timesheet.timestamp.date(),
-            anomaly_type=Anomaly.AnomalyType.EARLY_DEPARTURE,
-            minutes=early_minutes
-        ).first()
+        subtype = anomaly_dedup.minutes_subtype(early_minutes)
 
         created_anomaly = None
         # Ne créer l'anomalie que si le départ est réellement anticipé (minutes > 0) et dépasse la marge
-        if not existing_anomaly and early_minutes > 0 and early_minutes > early_departure_margin:
+        if early_minutes > 0 and early_minutes > early_departure_margin:
             # Calculer le départ anticipé effectif (au-delà de la marge de tolérance)
             effective_early_minutes = early_minutes - early_departure_margin
 
             # Trouver les détails du planning pour ce jour
             try:
-                schedule_detail = ScheduleDetail.objects.get(
-                    schedule=schedule,
-                    day_of_week=timesheet.timestamp.date().weekday()
-                )
+                schedule_detail = self._get_schedule_detail(schedule, timesheet.date.weekday())
 
                 # Déterminer l'heure de fin prévue et le type de période
                 expected_time = None
@@ -853,39 +870,48 @@ class AnomalyProcessor:
                 description = f'Départ anticipé de {early_minutes} minutes.'
 
             # Mettre à jour une anomalie existante de type MISSING_DEPARTURE si elle existe
-            existing_missing_departure = Anomaly.objects.filter(
-                employee=timesheet.employee,
-                site=timesheet.site,
-                date=timesheet.timestamp.date(),
-                anomaly_type=Anomaly.AnomalyType.MISSING_DEPARTURE,
+            # (et si ce départ anticipé n'est pas déjà enregistré)
+            existing_missing_departure = self._find_anomaly(
+                timesheet.employee, timesheet.site, timesheet.date,
+                [Anomaly.AnomalyType.MISSING_DEPARTURE],
                 status=Anomaly.AnomalyStatus.PENDING
-            ).first()
+            )
+            if existing_missing_departure and self._find_anomaly(
+                timesheet.employee, timesheet.site, timesheet.date,
+                [Anomaly.AnomalyType.EARLY_DEPARTURE],
+                subtype=subtype
+            ):
+                existing_missing_departure = None
 
             if existing_missing_departure:
                 # Mettre à jour l'anomalie existante en départ anticipé
                 existing_missing_departure.anomaly_type = Anomaly.AnomalyType.EARLY_DEPARTURE
+                existing_missing_departure.dedup_subtype = subtype
                 existing_missing_departure.description = description
                 existing_missing_departure.minutes = early_minutes
                 existing_missing_departure.timesheet = timesheet
-                existing_missing_departure.save()
-                existing_missing_departure.related_timesheets.add(timesheet)
+                self._save_anomaly(existing_missing_departure)
+                self._add_related_timesheets(existing_missing_departure, timesheet)
                 self._anomalies_detected = True
                 created_anomaly = existing_missing_departure
                 self.logger.info(f"Anomalie existante mise à jour: MISSING_DEPARTURE -> EARLY_DEPARTURE - {description} pour {timesheet.employee.get_full_name()} à {timesheet.site.name}")
             else:
-                # Créer une nouvelle anomalie
-                anomaly = Anomaly.objects.create(
+                # Créer une nouvelle anomalie, sauf si ce départ anticipé est déjà enregistré
+                anomaly, created = self._upsert_anomaly(
+                    subtype,
+                    related_timesheets=[timesheet],
                     employee=timesheet.employee,
                     site=timesheet.site,
                     timesheet=timesheet,
-                    date=timesheet.timestamp.date(),
+                    date=timesheet.date,
                     anomaly_type=Anomaly.AnomalyType.EARLY_DEPARTURE,
                     description=description,
                     minutes=early_minutes,
                     status=Anomaly.AnomalyStatus.PENDING,
                     schedule=schedule
                 )
-                anomaly.related_timesheets.add(timesheet)
+                if not created:
+                    return None
                 self._anomalies_detected = True
                 created_anomaly = anomaly
                 self.logger.info(f"Anomalie créée: EARLY_DEPARTURE - {description} pour {timesheet.employee.get_full_name()} à {timesheet.site.name}")
@@ -897,97 +923,154 @@ class AnomalyProcessor:
         return created_anomaly
 
     def _create_out_of_schedule_anomaly(self, timesheet):
-        """Crée une anomalie de pointage hors planning"""
-        # Vérifier si une anomalie similaire existe déjà pour ce pointage ou cette date/employé/site
-        existing_anomaly = Anomaly.objects.filter(
+        """Crée une anomalie de pointage hors planning (une seule par jour)"""
+        # Vérifier si l'employé a des plannings actifs sur ce site
+        site_employee_relations = self._get_site_employees(
+            timesheet.employee, timesheet.site, timezone.localtime(timesheet.timestamp).date().weekday()
+        )
+
+        description = "Pointage hors planning: "
+        local_timestamp = timezone.localtime(timesheet.timestamp)
+        local_time = local_timestamp.time()
+        entry_type = timesheet.get_entry_type_display()
+
+        if not site_employee_relations:
+            description += f"l'employé n'est pas rattaché à ce site. ({entry_type} à {local_time})"
+        else:
+            active_schedules = [se.schedule for se in site_employee_relations if se.schedule and se.schedule.is_active]
+            if not active_schedules:
+                description += f"l'employé n'a pas de planning actif sur ce site. ({entry_type} à {local_time})"
+            else:
+                # Vérifier si des plannings existent pour ce jour de la semaine
+                current_weekday = local_timestamp.date().weekday()
+                day_names = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+                schedules_with_details = []
+                schedule_details = []
+
+                for schedule_obj in active_schedules:
+                    try:
+                        # Vérifier si le planning a des détails pour ce jour
+                        detail = self._get_schedule_detail(schedule_obj, current_weekday)
+                        schedules_with_details.append(schedule_obj)
+                        schedule_details.append(detail)
+                    except ScheduleDetail.DoesNotExist:
+                        continue
+
+                if not schedules_with_details:
+                    description += f"aucun planning n'est défini pour le jour {day_names[current_weekday]}. ({entry_type} à {local_time})"
+                else:
+                    # Afficher les plages horaires disponibles pour aider à comprendre pourquoi le pointage est hors planning
+                    plages_horaires = []
+                    for i, detail in enumerate(schedule_details):
+                        schedule_obj = schedules_with_details[i]
+                        if schedule_obj.schedule_type == 'FIXED':
+                            if detail.start_time_1 and detail.end_time_1:
+                                plages_horaires.append(f"{detail.start_time_1}-{detail.end_time_1}")
+                            if detail.start_time_2 and detail.end_time_2:
+                                plages_horaires.append(f"{detail.start_time_2}-{detail.end_time_2}")
+                        elif schedule_obj.schedule_type == 'FREQUENCY':
+                            plages_horaires.append(f"fréquence de {detail.frequency_duration} minutes")
+
+                    plages_str = ", ".join(plages_horaires) if plages_horaires else "aucune plage horaire définie"
+                    description += f"l'heure {local_time} ({entry_type}) ne correspond à aucune plage horaire définie dans les plannings de l'employé. Plages disponibles: {plages_str}."
+
+        # Trouver un planning à associer à l'anomalie pour l'affichage des détails
+        schedule_to_associate = None
+        if site_employee_relations:
+            for se in site_employee_relations:
+                if se.schedule and se.schedule.is_active:
+                    schedule_to_associate = se.schedule
+                    break
+
+        # Déterminer le type d'anomalie en fonction de la situation
+        anomaly_type = Anomaly.AnomalyType.UNLINKED_SCHEDULE if not site_employee_relations else Anomaly.AnomalyType.OTHER
+
+        anomaly, created = self._upsert_anomaly(
+            anomaly_dedup.OUT_OF_SCHEDULE,
+            related_timesheets=[timesheet],
             employee=timesheet.employee,
             site=timesheet.site,
-            date=timesheet.timestamp.date(),
-            anomaly_type__in=[Anomaly.AnomalyType.UNLINKED_SCHEDULE, Anomaly.AnomalyType.OTHER],
-            description__contains="Pointage hors planning"
-        ).first()
+            timesheet=timesheet,
+            date=timesheet.date,
+            anomaly_type=anomaly_type,
+            description=description,
+            status=Anomaly.AnomalyStatus.PENDING,
+            schedule=schedule_to_associate  # Associer un planning si disponible
+        )
+        if not created:
+            return None
+        self._anomalies_detected = True
+        self.logger.info(f"Anomalie créée: {anomaly_type} - Pointage hors planning pour {timesheet.employee.get_full_name()} à {timesheet.site.name} - {description}")
 
-        created_anomaly = None
-        if not existing_anomaly:
-            # Vérifier si l'employé a des plannings actifs sur ce site
-            site_employee_relations = SiteEmployee.objects.filter(
-                site=timesheet.site,
-                employee=timesheet.employee,
-                is_active=True
-            ).select_related('schedule')
-
-            description = "Pointage hors planning: "
-            local_timestamp = timezone.localtime(timesheet.timestamp)
-            local_time = local_timestamp.time()
-            entry_type = timesheet.get_entry_type_display()
-
-            if not site_employee_relations.exists():
-                description += f"l'employé n'est pas rattaché à ce site. ({entry_type} à {local_time})"
-            else:
-                active_schedules = [se.schedule for se in site_employee_relations if se.schedule and se.schedule.is_active]
-                if not active_schedules:
-                    description += f"l'employé n'a pas de planning actif sur ce site. ({entry_type} à {local_time})"
-                else:
-                    # Vérifier si des plannings existent pour ce jour de la semaine
-                    current_weekday = local_timestamp.date().weekday()
-                    day_names = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-                    schedules_with_details = []
-                    schedule_details = []
-
-                    for schedule_obj in active_schedules:
-                        try:
-                            # Vérifier si le planning a des détails pour ce jour
-                            detail = ScheduleDetail.objects.get(schedule=schedule_obj, day_of_week=current_weekday)
-                            schedules_with_details.append(schedule_obj)
-                            schedule_details.append(detail)
-                        except ScheduleDetail.DoesNotExist:
-                            continue
-
-                    if not schedules_with_details:
-                        description += f"aucun planning n'est défini pour le jour {day_names[current_weekday]}. ({entry_type} à {local_time})"
-                    else:
-                        # Afficher les plages horaires disponibles pour aider à comprendre pourquoi le pointage est hors planning
-                        plages_horaires = []
-                        for i, detail in enumerate(schedule_details):
-                            schedule_obj = schedules_with_details[i]
-                            if schedule_obj.schedule_type == 'FIXED':
-                                if detail.start_time_1 and detail.end_time_1:
-                                    plages_horaires.append(f"{detail.start_time_1}-{detail.end_time_1}")
-                                if detail.start_time_2 and detail.end_time_2:
-                                    plages_horaires.append(f"{detail.start_time_2}-{detail.end_time_2}")
-                            elif schedule_obj.schedule_type == 'FREQUENCY':
-                                plages_horaires.append(f"fréquence de {detail.frequency_duration} minutes")
-
-                        plages_str = ", ".join(plages_horaires) if plages_horaires else "aucune plage horaire définie"
-                        description += f"l'heure {local_time} ({entry_type}) ne correspond à aucune plage horaire définie dans les plannings de l'employé. Plages disponibles: {plages_str}."
-
-            # Trouver un planning à associer à l'anomalie pour l'affichage des détails
-            schedule_to_associate = None
-            if site_employee_relations.exists():
-                for se in site_employee_relations:
-                    if se.schedule and se.schedule.is_active:
-                        schedule_to_associate = se.schedule
-                        break
-
-            # Déterminer le type d'anomalie en fonction de la situation
-            anomaly_type = Anomaly.AnomalyType.UNLINKED_SCHEDULE if not site_employee_relations.exists() else Anomaly.AnomalyType.OTHER
-
-            anomaly = Anomaly.objects.create(
-                employee=timesheet.employee,
-                site=timesheet.site,
-                timesheet=timesheet,
-                date=timesheet.timestamp.date(),
-                anomaly_type=anomaly_type,
-                description=description,
-                status=Anomaly.AnomalyStatus.PENDING,
-                schedule=schedule_to_associate  # Associer un planning si disponible
-            )
-            anomaly.related_timesheets.add(timesheet)
-            self._anomalies_detected = True
-            created_anomaly = anomaly
-            self.logger.info(f"Anomalie créée: {anomaly_type} - Pointage hors planning pour {timesheet.employee.get_full_name()} à {timesheet.site.name} - {description}")
+        return anomaly
 
-        return created_anomaly
+    def _is_fixed_schedule_matching(self, entry_type, current_date, current_time, schedule_detail):
+        """Vérifie si l'heure d'un pointage correspond à un planning fixe
+
+        Reprend les conditions de correspondance de _match_schedule_and_check_anomalies,
+        sans calcul de retard ni de départ anticipé.
+        """
+        if entry_type == Timesheet.EntryType.ARRIVAL:
+            if schedule_detail.start_time_1 and schedule_detail.end_time_1:
+                if current_time <= schedule_detail.end_time_1 or not schedule_detail.start_time_2:
+                    return True
+            # Toute arrivée est rattachée à la plage de l'après-midi (à l'heure ou en retard)
+            if schedule_detail.start_time_2 and schedule_detail.end_time_2:
+                return True
+            return False
+
+        if schedule_detail.start_time_1 and schedule_detail.end_time_1:
+            end_time_1_plus_30 = (datetime.combine(current_date, schedule_detail.end_time_1) +
+                                  timedelta(minutes=30)).time()
+            if schedule_detail.start_time_1 <= current_time <= end_time_1_plus_30:
+                return True
+
+        if schedule_detail.start_time_2 and schedule_detail.end_time_2:
+            end_time_2_plus_30 = (datetime.combine(current_date, schedule_detail.end_time_2) +
+                                  timedelta(minutes=30)).time()
+            if schedule_detail.start_time_2 <= current_time <= end_time_2_plus_30:
+                return True
+
+        # Départ pendant la pause déjeuner
+        if schedule_detail.end_time_1 and schedule_detail.start_time_2:
+            if schedule_detail.end_time_1 <= current_time <= schedule_detail.start_time_2:
+                return True
+
+        return False
+
+    def is_timesheet_ambiguous(self, timesheet):
+        """Décision rapide sur l'ambiguïté d'un pointage, sans création d'anomalie
+
+        Utilisée en mode asynchrone pour répondre immédiatement au client : applique
+        les mêmes règles que _match_schedule_and_check_anomalies (site inactif, employé
+        non rattaché, plusieurs plannings correspondants) à partir du cache des plannings.
+        """
+        site = timesheet.site
+        local_timestamp = timezone.localtime(timesheet.timestamp)
+        current_date = local_timestamp.date()
+        current_time = local_timestamp.time()
+
+        # Site inactif ou employé non rattaché : même réponse que le traitement complet
+        if not is_entity_active(site):
+            return True
+
+        resolved_schedules = schedule_resolver.resolve(timesheet.employee_id, site.id, current_date.weekday())
+        if not resolved_schedules:
+            return True
+
+        matching_schedules = 0
+        for resolved in resolved_schedules:
+            schedule = resolved.schedule
+            if not schedule or not is_entity_active(schedule) or resolved.detail is None:
+                continue
+
+            if schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
+                matching_schedules += 1
+            elif schedule.schedule_type == Schedule.ScheduleType.FIXED and self._is_fixed_schedule_matching(
+                    timesheet.entry_type, current_date, current_time, resolved.detail):
+                matching_schedules += 1
+
+        return matching_schedules > 1
 
     def process_timesheet(self, timesheet, force_update=False):
         """Traite un pointage individuel"""
@@ -1039,7 +1122,12 @@ class AnomalyProcessor:
         return self._anomalies_detected
 
     def check_employee_absences(self, start_date, end_date, site_id=None, employee_id=None):
-        """Vérifie les absences des employés sur une période donnée"""
+        """Vérifie les absences des employés sur une période donnée
+
+        Les jours attendus sont calculés à partir du motif hebdomadaire des plannings et
+        comparés à l'ensemble des jours pointés, lu en une requête : le nombre de requêtes
+        ne dépend ni de la longueur de la période ni du nombre de relations site-employé.
+        """
         # Ignorer le jour en cours pour ne pas signaler une absence alors que la journée n'est pas finie
         today = timezone.now().date()
         if end_date >= today:
@@ -1061,12 +1149,23 @@ class AnomalyProcessor:
             employee = User.objects.get(id=employee_id)
             self.logger.info(f"Filtrage par employé: {employee.get_full_name()} (ID: {employee.id})")
 
-        self.logger.info(f"Vérification des absences du {start_date} au {end_date} pour {site_employees.count()} relations site-employé")
+        site_employees = list(site_employees)
+        self.logger.info(f"Vérification des absences du {start_date} au {end_date} pour {len(site_employees)} relations site-employé")
+        if start_date > end_date:
+            self.logger.info("Vérification des absences terminée: 0 anomalies créées")
+            return 0
+
+        # Motifs hebdomadaires des plannings : {schedule_id: {jour de la semaine: détail}}
+        schedule_details = defaultdict(dict)
+        for schedule_detail in ScheduleDetail.objects.filter(
+            schedule_id__in={site_employee.schedule_id for site_employee in site_employees if site_employee.schedule_id}
+        ):
+            schedule_details[schedule_detail.schedule_id][schedule_detail.day_of_week] = schedule_detail
 
-        # Compter les anomalies créées
-        anomalies_created = 0
+        scanned = absence_calendar.scanned_days(start_date, end_date, site_id, employee_id)
+        existing = absence_calendar.existing_absences(start_date, end_date, site_id, employee_id)
 
-        # Pour chaque relation site-employé
+        anomalies = []
         for site_employee in site_employees:
             # Vérifier si l'employé a un planning actif
             schedule = site_employee.schedule
@@ -1082,143 +1181,78 @@ class AnomalyProcessor:
                 site_employee.created_at.date()
             )
 
-            self.logger.info(f"Vérification des absences pour {site_employee.employee.get_full_name()} (ID: {site_employee.employee.id}) au site {site_employee.site.name} (ID: {site_employee.site.id}) du {effective_start_date} au {end_date}")
-
-            # Pour chaque jour dans la période
-            current_date = effective_start_date
-            while current_date <= end_date:
-                # Vérifier si le planning a des détails pour ce jour de la semaine
-                day_of_week = current_date.weekday()  # 0 = Lundi, 6 = Dimanche
-                day_names = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-                self.logger.debug(f"Vérification du jour {day_names[day_of_week]} ({current_date}) pour {site_employee.employee.get_full_name()}")
-
-                try:
-                    schedule_detail = ScheduleDetail.objects.get(
-                        schedule=schedule,
-                        day_of_week=day_of_week
-                    )
-
-                    # Afficher les détails du planning pour ce jour
-                    if schedule.schedule_type == Schedule.ScheduleType.FIXED:
-                        if schedule_detail.start_time_1 or schedule_detail.start_time_2:
-                            self.logger.debug(f"Planning trouvé pour {day_names[day_of_week]}: {schedule_detail.get_day_type_display()}")
-                            if schedule_detail.start_time_1:
-                                self.logger.debug(f"Horaires matin: {schedule_detail.start_time_1}-{schedule_detail.end_time_1}")
-                            if schedule_detail.start_time_2:
-                                self.logger.debug(f"Horaires après-midi: {schedule_detail.start_time_2}-{schedule_detail.end_time_2}")
-                    elif schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
-                        if schedule_detail.frequency_duration:
-                            self.logger.debug(f"Planning fréquence trouvé pour {day_names[day_of_week]}: {schedule_detail.frequency_duration} minutes")
-
-                    # Pour les plannings fixes, vérifier si l'employé a pointé
-                    if schedule.schedule_type == Schedule.ScheduleType.FIXED:
-                        # Vérifier si l'employé a pointé son arrivée ce jour-là
-                        arrivals = Timesheet.objects.filter(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            timestamp__date=current_date,
-                            entry_type=Timesheet.EntryType.ARRIVAL
-                        )
-                        has_arrival = arrivals.exists()
-
-                        if has_arrival:
-                            self.logger.debug(f"L'employé a pointé son arrivée le {current_date}: {arrivals.count()} arrivée(s)")
-                        else:
-                            self.logger.debug(f"L'employé n'a pas pointé son arrivée le {current_date}")
-
-                        # Si l'employé n'a pas pointé son arrivée et qu'il devrait avoir un planning ce jour-là
-                        if not has_arrival and (schedule_detail.start_time_1 or schedule_detail.start_time_2):
-                            # Vérifier si une anomalie similaire existe déjà
-                            existing_anomaly = Anomaly.objects.filter(
-                                employee=site_employee.employee,
-                                site=site_employee.site,
-                                date=current_date,
-                                anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL
-                            ).first()
-
-                            if not existing_anomaly:
-                                # Créer une anomalie pour l'arrivée manquante
-                                description = f"Arrivée manquante selon le planning"
-                                if schedule_detail.start_time_1:
-                                    description += f" (heure prévue: {schedule_detail.start_time_1})"
-                                elif schedule_detail.start_time_2:
-                                    description += f" (heure prévue: {schedule_detail.start_time_2})"
-
-                                created_anomaly = Anomaly.objects.create(
-                                    employee=site_employee.employee,
-                                    site=site_employee.site,
-                                    date=current_date,
-                                    anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
-                                    description=description,
-                                    status=Anomaly.AnomalyStatus.PENDING,
-                                    schedule=schedule
-                                )
-
-                                anomalies_created += 1
-                                self._anomalies_detected = True
-                                self.logger.info(f"Anomalie créée: MISSING_ARRIVAL - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {current_date}")
-                            else:
-                                self.logger.debug(f"Anomalie existante pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {current_date}")
-
-                    # Pour les plannings fréquence, la logique est différente
-                    # On vérifie si l'employé a pointé au moins une fois dans la journée
-                    elif schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
-                        # Vérifier si l'employé a pointé au moins une fois ce jour-là
-                        timesheets = Timesheet.objects.filter(
-                            employee=site_employee.employee,
-                            site=site_employee.site,
-                            timestamp__date=current_date
-                        )
-                        has_timesheet = timesheets.exists()
-
-                        if has_timesheet:
-                            self.logger.debug(f"L'employé a pointé le {current_date}: {timesheets.count()} pointage(s)")
-                        else:
-                            self.logger.debug(f"L'employé n'a pas pointé du tout le {current_date}")
-
-                        # Si l'employé n'a pas pointé du tout et qu'il devrait avoir un planning ce jour-là
-                        if not has_timesheet and schedule_detail.frequency_duration:
-                            # Vérifier si une anomalie similaire existe déjà
-                            existing_anomaly = Anomaly.objects.filter(
-                                employee=site_employee.employee,
-                                site=site_employee.site,
-                                date=current_date,
-                                anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL
-                            ).first()
-
-                            if not existing_anomaly:
-                                # Créer une anomalie pour l'arrivée manquante
-                                description = f"Pointage manquant selon le planning fréquence (durée prévue: {schedule_detail.frequency_duration} minutes)"
+            # Jours de la semaine pour lesquels le planning attend une présence
+            details = schedule_details.get(schedule.id, {})
+            if schedule.schedule_type == Schedule.ScheduleType.FIXED:
+                weekdays = [day for day, detail in details.items() if detail.start_time_1 or detail.start_time_2]
+            elif schedule.schedule_type == Schedule.ScheduleType.FREQUENCY:
+                weekdays = [day for day, detail in details.items() if detail.frequency_duration]
+            else:
+                weekdays = []
 
-                                created_anomaly = Anomaly.objects.create(
-                                    employee=site_employee.employee,
-                                    site=site_employee.site,
-                                    date=current_date,
-                                    anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
-                                    description=description,
-                                    status=Anomaly.AnomalyStatus.PENDING,
-                                    schedule=schedule
-                                )
+            self.logger.info(f"Vérification des absences pour {site_employee.employee.get_full_name()} (ID: {site_employee.employee.id}) au site {site_employee.site.name} (ID: {site_employee.site.id}) du {effective_start_date} au {end_date}")
 
-                                anomalies_created += 1
-                                self._anomalies_detected = True
-                                self.logger.info(f"Anomalie créée: MISSING_ARRIVAL - {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {current_date}")
-                            else:
-                                self.logger.debug(f"Anomalie existante pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {current_date}")
+            for current_date in absence_calendar.expected_dates(effective_start_date, end_date, weekdays):
+                key = (site_employee.employee_id, site_employee.site_id, current_date)
+                schedule_detail = details[current_date.weekday()]
 
-                except ScheduleDetail.DoesNotExist:
-                    self.logger.debug(f"Pas de détails de planning pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le jour {day_of_week} ({current_date})")
+                if schedule.schedule_type == Schedule.ScheduleType.FIXED:
+                    # Absence = aucune arrivée pointée ce jour-là
+                    if scanned.get(key, 0) > 0:
+                        continue
+                    description = f"Arrivée manquante selon le planning"
+                    if schedule_detail.start_time_1:
+                        description += f" (heure prévue: {schedule_detail.start_time_1})"
+                    elif schedule_detail.start_time_2:
+                        description += f" (heure prévue: {schedule_detail.start_time_2})"
+                else:
+                    # Absence = aucun pointage ce jour-là
+                    if key in scanned:
+                        continue
+                    description = f"Pointage manquant selon le planning fréquence (durée prévue: {schedule_detail.frequency_duration} minutes)"
+
+                if key in existing:
+                    self.logger.debug(f"Anomalie existante pour {site_employee.employee.get_full_name()} au site {site_employee.site.name} le {current_date}")
+                    continue
+
+                existing.add(key)
+                anomalies.append(Anomaly(
+                    employee=site_employee.employee,
+                    site=site_employee.site,
+                    date=current_date,
+                    anomaly_type=Anomaly.AnomalyType.MISSING_ARRIVAL,
+                    dedup_subtype=anomaly_dedup.DAILY,
+                    description=description,
+                    status=Anomaly.AnomalyStatus.PENDING,
+                    schedule=schedule
+                ))
+
+        if anomalies:
+            # Les alertes sont créées par lot à l'insertion ; les synthèses journalières suivent
+            # le signal post_save, émis après l'insertion groupée
+            with deferred_recompute():
+                anomalies = anomaly_dedup.bulk_upsert(anomalies, batch_size=1000)
+                for anomaly in anomalies:
+                    post_save.send(sender=Anomaly, instance=anomaly, created=True, update_fields=None,
+                                   raw=False, using=anomaly._state.db)
+                    self.logger.info(f"Anomalie créée: MISSING_ARRIVAL - {anomaly.employee.get_full_name()} au site {anomaly.site.name} le {anomaly.date}")
+            if anomalies:
+                self._anomalies_detected = True
 
-                # Passer au jour suivant
-                current_date += timedelta(days=1)
+        self.logger.info(f"Vérification des absences terminée: {len(anomalies)} anomalies créées")
+        return len(anomalies)
 
-        self.logger.info(f"Vérification des absences terminée: {anomalies_created} anomalies créées")
-        return anomalies_created
+    def scan_anomalies(self, start_date=None, end_date=None, site_id=None, employee_id=None, force_update=False, check_absences=False, batch=False):
+        """Scan complet des anomalies sur une période
 
-    def scan_anomalies(self, start_date=None, end_date=None, site_id=None, employee_id=None, force_update=False, check_absences=False):
-        """Scan complet des anomalies sur une période"""
+        En mode batch, les données de la période sont chargées une seule fois dans un
+        AnomalyScanSnapshot, l'arbre de décision est évalué en mémoire et les écritures
+        sont regroupées (bulk_create / bulk_update) en fin de traitement. Les statuts
+        des pointages sont alors écrits sans repasser par Timesheet.save().
+        """
         try:
-            with transaction.atomic():
+            # Les synthèses journalières touchées par le scan sont recalculées une seule fois, à la fin
+            with deferred_recompute(), transaction.atomic():
                 # Définir la période par défaut si non spécifiée
                 end_date = end_date or timezone.now().date()
                 start_date = start_date or (end_date - timedelta(days=30))
@@ -1233,8 +1267,8 @@ class AnomalyProcessor:
 
                 # Construire la requête de base
                 timesheets = Timesheet.objects.filter(
-                    timestamp__date__gte=start_date,
-                    timestamp__date__lte=end_date
+                    date__gte=start_date,
+                    date__lte=end_date
                 ).order_by('timestamp')  # Important: traiter les pointages dans l'ordre chronologique
 
                 if site_id:
@@ -1258,8 +1292,9 @@ class AnomalyProcessor:
                     self.logger.info(f"{anomalies_count} anomalies supprimées")
 
                     # Réinitialiser les statuts des pointages
+                    # (en mode batch, process_timesheet s'en charge en mémoire)
                     self.logger.info("Réinitialisation des statuts des pointages")
-                    for ts in timesheets:
+                    for ts in ([] if batch else timesheets):
                         ts.is_late = False
                         ts.late_minutes = 0
                         ts.is_early_departure = False
@@ -1268,13 +1303,19 @@ class AnomalyProcessor:
                         ts.is_ambiguous = False
                         ts.save()
 
+                if batch:
+                    self.logger.info("Mode batch activé: chargement de l'instantané de la période")
+                    self._snapshot = AnomalyScanSnapshot(timesheets, start_date, end_date)
+                    timesheets = self._snapshot.timesheets
+                total_count = len(timesheets) if batch else None
+
                 # Traiter chaque pointage
                 anomalies_created = 0
                 processed_count = 0
                 for timesheet in timesheets:
                     processed_count += 1
                     if processed_count % 100 == 0:  # Log tous les 100 pointages pour éviter de surcharger les logs
-                        self.logger.info(f"Progression: {processed_count}/{timesheets.count()} pointages traités")
+                        self.logger.info(f"Progression: {processed_count}/{total_count or timesheets.count()} pointages traités")
 
                     result = self.process_timesheet(timesheet, force_update=force_update)
                     if result['success'] and result.get('has_anomalies', False):
@@ -1283,6 +1324,10 @@ class AnomalyProcessor:
                             for anomaly in result['anomalies']:
                                 self.logger.debug(f"Anomalie détectée: {anomaly.anomaly_type} - {anomaly.description}")
 
+                if batch:
+                    self._snapshot.flush()
+                    self._snapshot = None
+
                 # Vérifier les absences si demandé
                 absences_detected = 0
                 if check_absences:
@@ -1301,6 +1346,7 @@ class AnomalyProcessor:
                 })
 
         except Exception as e:
+            self._snapshot = None
             self.logger.error(f"Erreur lors du scan des anomalies: {str(e)}", exc_info=True)
             return Response({
                 'error': f"Erreur lors du scan des anomalies: {str(e)}"
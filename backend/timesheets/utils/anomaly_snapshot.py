@@ -0,0 +1,198 @@
+import logging
+from collections import defaultdict
+from django.db.models.signals import post_save
+from django.utils import timezone
+from timesheets.models import Timesheet, Anomaly
+from . import anomaly_dedup
+from .daily_attendance import deferred_recompute, schedule_recompute
+from sites.models import SiteEmployee, ScheduleDetail
+
+
+class AnomalyScanSnapshot:
+    """
+    Instantané en mémoire des données nécessaires au scan des anomalies.
+
+    Utilisé par le mode batch de AnomalyProcessor.scan_anomalies : les relations
+    site-employé, plannings, détails de planning, pointages et anomalies de la
+    période sont chargés en une poignée de requêtes. L'arbre de décision est ensuite
+    évalué en mémoire et les écritures sont regroupées dans flush().
+    """
+
+    TIMESHEET_STATUS_FIELDS = [
+        'is_late',
+        'late_minutes',
+        'is_early_departure',
+        'early_departure_minutes',
+        'is_out_of_schedule',
+        'is_ambiguous',
+        'updated_at',
+    ]
+    ANOMALY_UPDATE_FIELDS = ['anomaly_type', 'dedup_subtype', 'description', 'minutes', 'timesheet', 'updated_at']
+    BATCH_SIZE = 500
+
+    def __init__(self, timesheets, start_date, end_date):
+        self.logger = logging.getLogger(__name__)
+
+        # Pointages de la période (avec employé et site pour éviter les requêtes par ligne)
+        self.timesheets = list(timesheets.select_related('employee', 'site'))
+        employee_ids = {ts.employee_id for ts in self.timesheets}
+        site_ids = {ts.site_id for ts in self.timesheets}
+
+        # Pointages regroupés par (employé, site, date locale) dans l'ordre chronologique
+        self._day_timesheets = defaultdict(list)
+        for ts in sorted(self.timesheets, key=lambda t: (t.timestamp, t.id)):
+            local_date = ts.date
+            self._day_timesheets[(ts.employee_id, ts.site_id, local_date)].append(ts)
+
+        # Relations site-employé actives avec leur planning
+        self._site_employees = defaultdict(list)
+        site_employees = SiteEmployee.objects.filter(
+            is_active=True,
+            site_id__in=site_ids,
+            employee_id__in=employee_ids
+        ).select_related('schedule').order_by('id')
+        schedule_ids = set()
+        for site_employee in site_employees:
+            self._site_employees[(site_employee.employee_id, site_employee.site_id)].append(site_employee)
+            if site_employee.schedule_id:
+                schedule_ids.add(site_employee.schedule_id)
+
+        # Détails des plannings indexés par (planning, jour de la semaine)
+        self._schedule_details = {
+            (detail.schedule_id, detail.day_of_week): detail
+            for detail in ScheduleDetail.objects.filter(schedule_id__in=schedule_ids)
+        }
+
+        # Anomalies existantes indexées par (employé, site, date locale)
+        self._anomalies = defaultdict(list)
+        existing_anomalies = Anomaly.objects.filter(
+            employee_id__in=employee_ids,
+            site_id__in=site_ids,
+            date__gte=start_date,
+            date__lte=end_date
+        ).order_by('created_at', 'id')
+        for anomaly in existing_anomalies:
+            self._anomalies[(anomaly.employee_id, anomaly.site_id, anomaly.date)].append(anomaly)
+
+        # Écritures en attente
+        self._new_anomalies = []
+        self._dirty_anomalies = {}
+        self._dirty_timesheets = {}
+        self._related_links = {}
+
+        self.logger.info(f"Instantané chargé: {len(self.timesheets)} pointages, "
+                         f"{sum(len(v) for v in self._site_employees.values())} relations site-employé, "
+                         f"{len(self._schedule_details)} détails de planning, "
+                         f"{sum(len(v) for v in self._anomalies.values())} anomalies existantes")
+
+    def get_site_employees(self, employee_id, site_id):
+        """Retourne les relations site-employé actives pour un employé et un site"""
+        return list(self._site_employees.get((employee_id, site_id), []))
+
+    def get_schedule_detail(self, schedule_id, day_of_week):
+        """Retourne le détail du planning pour un jour donné ou None"""
+        return self._schedule_details.get((schedule_id, day_of_week))
+
+    def get_day_timesheets(self, employee_id, site_id, date):
+        """Retourne les pointages d'un employé sur un site pour une date (ordre chronologique)"""
+        return list(self._day_timesheets.get((employee_id, site_id, date), []))
+
+    def find_anomaly(self, employee_id, site_id, date, anomaly_types, minutes=None, status=None, subtype=None):
+        """Retourne l'anomalie la plus récente correspondant aux critères, comme Anomaly.objects.filter(...).first()"""
+        for anomaly in reversed(self._anomalies.get((employee_id, site_id, date), [])):
+            if anomaly.anomaly_type not in anomaly_types:
+                continue
+            if minutes is not None and anomaly.minutes != minutes:
+                continue
+            if status is not None and anomaly.status != status:
+                continue
+            if subtype is not None and anomaly.dedup_subtype != subtype:
+                continue
+            return anomaly
+        return None
+
+    def get_or_create_anomaly(self, subtype, key, defaults):
+        """Retourne l'anomalie de clé (employé, site, date, type, sous-type) ou en prépare une nouvelle
+
+        Returns:
+            tuple: (anomalie, True si elle sera insérée lors du flush)
+        """
+        employee, site, date = key['employee'], key['site'], key['date']
+        existing = self.find_anomaly(employee.id, site.id, date, [key['anomaly_type']], subtype=subtype)
+        if existing is not None:
+            return existing, False
+
+        anomaly = Anomaly(dedup_subtype=subtype, **key, **defaults)
+        self._new_anomalies.append(anomaly)
+        self._anomalies[(anomaly.employee_id, anomaly.site_id, anomaly.date)].append(anomaly)
+        return anomaly, True
+
+    def save_anomaly(self, anomaly):
+        """Marque une anomalie existante comme modifiée"""
+        if anomaly.pk:
+            self._dirty_anomalies[anomaly.pk] = anomaly
+
+    def add_related_timesheets(self, anomaly, *timesheets):
+        """Enregistre les pointages associés à une anomalie"""
+        # Les instances non sauvegardées ne sont pas hachables : on indexe par identité
+        for ts in timesheets:
+            self._related_links[(id(anomaly), ts.id)] = (anomaly, ts.id)
+
+    def save_timesheet(self, timesheet):
+        """Marque un pointage comme modifié"""
+        self._dirty_timesheets[timesheet.id] = timesheet
+
+    def flush(self):
+        """Écrit en base toutes les modifications en attente
+
+        Les alertes des anomalies insérées sont créées par lot lors de l'insertion ;
+        le signal post_save est ensuite émis manuellement pour les autres traitements
+        (synthèses journalières, statistiques), comme pour un pointage analysé seul.
+        """
+        # Les synthèses journalières des journées du lot sont recalculées une seule fois
+        with deferred_recompute():
+            now = timezone.now()
+
+            timesheets = list(self._dirty_timesheets.values())
+            for ts in timesheets:
+                ts.updated_at = now
+            Timesheet.objects.bulk_update(timesheets, self.TIMESHEET_STATUS_FIELDS, batch_size=self.BATCH_SIZE)
+
+            # Une anomalie enregistrée entre-temps par une autre analyse n'est pas dupliquée
+            inserted = anomaly_dedup.bulk_upsert(self._new_anomalies, batch_size=self.BATCH_SIZE)
+
+            dirty_anomalies = list(self._dirty_anomalies.values())
+            for anomaly in dirty_anomalies:
+                anomaly.updated_at = now
+            Anomaly.objects.bulk_update(dirty_anomalies, self.ANOMALY_UPDATE_FIELDS, batch_size=self.BATCH_SIZE)
+
+            through_model = Anomaly.related_timesheets.through
+            through_model.objects.bulk_create(
+                [through_model(anomaly_id=anomaly.pk, timesheet_id=timesheet_id)
+                 for anomaly, timesheet_id in self._related_links.values() if anomaly.pk],
+                batch_size=self.BATCH_SIZE,
+                ignore_conflicts=True
+            )
+
+            for anomaly in inserted:
+                post_save.send(sender=Anomaly, instance=anomaly, created=True, update_fields=None, raw=False, using=anomaly._state.db)
+
+            for employee_id, site_id, local_date in self._day_timesheets:
+                schedule_recompute(employee_id, site_id, local_date)
+            for anomaly in dirty_anomalies:
+                schedule_recompute(anomaly.employee_id, anomaly.site_id, anomaly.date)
+
+        self.logger.info(f"Écriture groupée: {len(timesheets)} pointages mis à jour, "
+                         f"{len(inserted)} anomalies créées, {len(dirty_anomalies)} anomalies mises à jour, "
+                         f"{len(self._related_links)} liens pointage-anomalie")
+
+        result = {
+            'timesheets_updated': len(timesheets),
+            'anomalies_created': len(inserted),
+            'anomalies_updated': len(dirty_anomalies),
+        }
+        self._new_anomalies = []
+        self._dirty_anomalies = {}
+        self._dirty_timesheets = {}
+        self._related_links = {}
+        return result
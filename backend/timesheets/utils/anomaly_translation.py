@@ -0,0 +1,390 @@
+import logging
+import re
+from functools import lru_cache
+from django.utils.translation import gettext as _, get_language
+from timesheets.models import Anomaly
+
+logger = logging.getLogger(__name__)
+
+
+def translate_anomaly_description(anomaly, language):
+    """Retourne la description d'une anomalie traduite dans la langue de l'utilisateur
+
+    Les descriptions sont générées en français ; la traduction (extraction par
+    expressions régulières) est mémorisée par (langue active, langue de
+    l'utilisateur, type, description) car les mêmes descriptions reviennent
+    d'une ligne à l'autre dans les listes.
+    """
+    if not anomaly.description or language == 'fr':
+        return anomaly.description
+    return _translate_description(get_language(), language, anomaly.anomaly_type, anomaly.description)
+
+
+@lru_cache(maxsize=4096)
+def _translate_description(active_language, language, anomaly_type, description):
+    """Traduit une description d'anomalie (résultat mémorisé)"""
+    # Si l'utilisateur a choisi l'anglais, traduire la description
+    if language == 'en':
+        logger.debug("Utilisateur en anglais, traduction de la description")
+
+        # Traduire les descriptions en fonction du type d'anomalie
+        if anomaly_type == Anomaly.AnomalyType.LATE:
+            # Afficher la description complète pour le débogage
+            logger.debug(f"Description complète du retard: {description}")
+
+            # Extraire les informations numériques avec des expressions régulières plus souples
+            minutes_match = re.search(r'Retard de (\d+)', description)
+            tolerance_match = re.search(r'tolérance \((\d+)', description)
+            expected_time_match = re.search(r'Heure prévue: ([\d:]+)', description)
+            actual_time_match = re.search(r'heure effective: ([\d:.]+)', description)
+
+            minutes = minutes_match.group(1) if minutes_match else ''
+            tolerance = tolerance_match.group(1) if tolerance_match else ''
+            expected_time = expected_time_match.group(1) if expected_time_match else ''
+            actual_time = actual_time_match.group(1) if actual_time_match else ''
+
+            logger.debug(f"Traduction d'un retard: minutes={minutes}, tolerance={tolerance}, expected_time={expected_time}, actual_time={actual_time}")
+
+            # Traduire en anglais
+            if minutes and tolerance:
+                if expected_time and actual_time:
+                    return f"Late arrival of {minutes} minute(s) beyond the tolerance margin ({tolerance} min). Expected time: {expected_time}, actual time: {actual_time}."
+                else:
+                    return f"Late arrival of {minutes} minute(s) beyond the tolerance margin ({tolerance} min)."
+            else:
+                return "Late arrival"
+
+    elif anomaly_type == Anomaly.AnomalyType.EARLY_DEPARTURE:
+        # Afficher la description complète pour le débogage
+        logger.debug(f"Description complète du départ anticipé: {description}")
+
+        # Traduire directement en fonction du type d'anomalie
+        if 'Durée insuffisante:' in description:
+            # Extraire les informations numériques
+            actual_duration_match = re.search(r'Durée insuffisante:\s*([\d.]+)', description)
+            expected_duration_match = re.search(r'au lieu de\s*([\d.]+)', description)
+            tolerance_match = re.search(r'tolérance:\s*(\d+)', description)
+
+            actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
+            expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
+            tolerance = tolerance_match.group(1) if tolerance_match else ''
+
+            logger.debug(f"Traduction d'une durée insuffisante (EARLY_DEPARTURE): actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
+
+            return _('Insufficient duration: %(actual_duration)s minutes instead of %(expected_duration)s minutes minimum (tolerance: %(tolerance)s%%).') % {
+                'actual_duration': actual_duration,
+                'expected_duration': expected_duration,
+                'tolerance': tolerance
+            }
+        elif 'Départ anticipé de' in description:
+            # Extraire les informations numériques
+            minutes_match = re.search(r'Départ anticipé de (\d+) minute\(s\)', description)
+            tolerance_match = re.search(r'marge de tolérance \((\d+) min\)', description)
+            expected_time_match = re.search(r'Heure prévue: ([\d:]+)', description)
+            actual_time_match = re.search(r'heure effective: ([\d:.]+)', description)
+
+            minutes = minutes_match.group(1) if minutes_match else ''
+            tolerance = tolerance_match.group(1) if tolerance_match else ''
+            expected_time = expected_time_match.group(1) if expected_time_match else ''
+            actual_time = actual_time_match.group(1) if actual_time_match else ''
+
+            logger.debug(f"Traduction d'un départ anticipé: minutes={minutes}, tolerance={tolerance}, expected_time={expected_time}, actual_time={actual_time}")
+
+            if expected_time and actual_time:
+                return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min). Expected time: {expected_time}, actual time: {actual_time}"
+            else:
+                return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min)"
+        elif 'Durée insuffisante:' in description:
+            # Afficher la description complète pour le débogage
+            logger.debug(f"Description complète de la durée insuffisante: {description}")
+
+            # Extraire les informations numériques
+            actual_duration_match = re.search(r'Durée insuffisante: ([\d.]+) minutes', description)
+            expected_duration_match = re.search(r'au lieu de ([\d.]+) minutes minimum', description)
+            tolerance_match = re.search(r'\(tolérance: (\d+)%\)', description)
+
+            actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
+            expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
+            tolerance = tolerance_match.group(1) if tolerance_match else ''
+
+            logger.debug(f"Traduction d'une durée insuffisante: actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
+
+            # Si les expressions régulières n'ont pas trouvé de correspondance, essayer d'autres formats
+            if not actual_duration or not expected_duration:
+                logger.debug("Tentative avec d'autres expressions régulières pour la durée insuffisante")
+                # Essayer un autre format
+                actual_duration_match = re.search(r'Durée insuffisante:\s*([\d.]+)', description)
+                expected_duration_match = re.search(r'au lieu de\s*([\d.]+)', description)
+                tolerance_match = re.search(r'tolérance:\s*(\d+)', description)
+
+                actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
+                expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
+                tolerance = tolerance_match.group(1) if tolerance_match else ''
+
+                logger.debug(f"Nouvelle tentative: actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
+
+            return _('Insufficient duration: %(actual_duration)s minutes instead of %(expected_duration)s minutes minimum (tolerance: %(tolerance)s%%).') % {
+                'actual_duration': actual_duration,
+                'expected_duration': expected_duration,
+                'tolerance': tolerance
+            }
+
+    elif anomaly_type == Anomaly.AnomalyType.MISSING_ARRIVAL:
+        if 'Arrivée manquante selon le planning' in description:
+            expected_time_match = re.search(r'heure prévue: ([\d:]+)', description)
+            expected_time = expected_time_match.group(1) if expected_time_match else ''
+
+            logger.debug(f"Traduction d'une arrivée manquante: expected_time={expected_time}")
+
+            if expected_time:
+                return f"Missing arrival according to schedule (expected time: {expected_time})"
+            else:
+                return "Missing arrival according to schedule"
+        elif 'Pointage manquant selon le planning fréquence' in description:
+            duration_match = re.search(r'durée prévue: (\d+) minutes', description)
+            duration = duration_match.group(1) if duration_match else ''
+
+            logger.debug(f"Traduction d'un pointage manquant (fréquence): duration={duration}")
+
+            if duration:
+                return f"Missing check-in according to frequency schedule (expected duration: {duration} minutes)"
+            else:
+                return "Missing check-in according to frequency schedule"
+
+    elif anomaly_type == Anomaly.AnomalyType.MISSING_DEPARTURE:
+        # Afficher la description complète pour le débogage
+        logger.debug(f"Description complète du départ manquant: {description}")
+
+        if 'Départ manquant selon le planning' in description:
+            expected_time_match = re.search(r'heure prévue: ([\d:]+)', description)
+            expected_time = expected_time_match.group(1) if expected_time_match else ''
+
+            logger.debug(f"Traduction d'un départ manquant: expected_time={expected_time}")
+
+            if expected_time:
+                return f"Missing departure according to schedule (expected time: {expected_time})"
+            else:
+                return "Missing departure according to schedule"
+        elif 'Pointage manquant selon le planning fréquence' in description:
+            duration_match = re.search(r'durée prévue: (\d+)', description)
+            duration = duration_match.group(1) if duration_match else ''
+
+            logger.debug(f"Traduction d'un pointage manquant (fréquence): duration={duration}")
+
+            if duration:
+                return f"Missing check-in according to frequency schedule (expected duration: {duration} minutes)"
+            else:
+                return "Missing check-in according to frequency schedule"
+
+    elif anomaly_type == Anomaly.AnomalyType.INSUFFICIENT_HOURS:
+        if 'Durée insuffisante:' in description or 'Insufficient duration:' in description:
+            # Extraire les informations numériques
+            actual_duration_match = re.search(r'(Durée insuffisante|Insufficient duration): ([\d.]+) minutes', description)
+            expected_duration_match = re.search(r'(au lieu de|instead of) ([\d.]+) minutes', description)
+            tolerance_match = re.search(r'\((tolérance|tolerance): (\d+)%\)', description)
+
+            actual_duration = actual_duration_match.group(2) if actual_duration_match else ''
+            expected_duration = expected_duration_match.group(2) if expected_duration_match else ''
+            tolerance = tolerance_match.group(2) if tolerance_match else ''
+
+            logger.debug(f"Traduction d'heures insuffisantes: actual={actual_duration}, expected={expected_duration}, tolerance={tolerance}%")
+
+            return f"Insufficient duration: {actual_duration} minutes instead of {expected_duration} minutes minimum (tolerance: {tolerance}%)"
+
+    elif anomaly_type == Anomaly.AnomalyType.UNLINKED_SCHEDULE:
+        logger.debug(f"Traduction d'un planning non lié: {description}")
+        if "l'employé n'est pas rattaché à ce site" in description:
+            return "Check-in outside schedule: employee is not linked to this site."
+        else:
+            return "Unlinked schedule"
+
+    elif anomaly_type == Anomaly.AnomalyType.OTHER:
+        if 'Pointage hors planning:' in description:
+            if 'aucun planning n\'est défini pour le jour' in description:
+                day_match = re.search(r'jour ([^.]+)', description)
+                entry_type_match = re.search(r'\(([^)]+) à', description)
+                time_match = re.search(r'à ([\d:]+)\)', description)
+
+                day = day_match.group(1) if day_match else ''
+                entry_type = entry_type_match.group(1) if entry_type_match else ''
+                time = time_match.group(1) if time_match else ''
+
+                logger.debug(f"Traduction d'un pointage hors planning (jour): day={day}, entry_type={entry_type}, time={time}")
+
+                return f"Check-in outside schedule: no schedule is defined for day {day}. ({entry_type} at {time})"
+            elif 'l\'heure' in description:
+                time_match = re.search(r'l\'heure ([\d:]+\.?\d*)', description)
+                entry_type_match = re.search(r'\(([^)]+)\) ne correspond', description)
+                ranges_match = re.search(r'Plages disponibles: ([^.]+)', description)
+
+                time = time_match.group(1) if time_match else ''
+                entry_type = entry_type_match.group(1) if entry_type_match else ''
+                ranges = ranges_match.group(1) if ranges_match else ''
+
+                logger.debug(f"Traduction d'un pointage hors planning (heure): time={time}, entry_type={entry_type}, ranges={ranges}")
+
+                return f"Check-in outside schedule: time {time} ({entry_type}) does not match any time range defined in employee schedules. Available ranges: {ranges}."
+
+    elif anomaly_type == Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE:
+        if 'Pointage' in description and 'consécutif détecté' in description:
+            entry_type_match = re.search(r'Pointage ([^\s]+)', description)
+            last_time_match = re.search(r'Dernier pointage : ([\d:]+)', description)
+
+            entry_type = entry_type_match.group(1) if entry_type_match else ''
+            last_time = last_time_match.group(1) if last_time_match else ''
+
+            logger.debug(f"Traduction d'un pointage consécutif: entry_type={entry_type}, last_time={last_time}")
+
+            return f"Consecutive {entry_type} check-in detected. Last check-in: {last_time}"
+
+    # Si aucun cas spécifique n'est trouvé, essayer de traduire la description complète
+    logger.debug(f"Aucune traduction spécifique trouvée pour le type {anomaly_type}, description: '{description}', tentative de traduction complète")
+
+    # Pour les utilisateurs en anglais, traduire en fonction du type d'anomalie et du contenu de la description
+    if language == 'en':
+        # Traduire en fonction du type d'anomalie et du contenu de la description
+        if anomaly_type == Anomaly.AnomalyType.LATE:
+            return "Late arrival"
+
+        elif anomaly_type == Anomaly.AnomalyType.EARLY_DEPARTURE:
+            if 'Durée insuffisante:' in description:
+                # Extraire les informations numériques
+                actual_duration_match = re.search(r'Durée insuffisante:\s*([\d.]+)', description)
+                expected_duration_match = re.search(r'au lieu de\s*([\d.]+)', description)
+                tolerance_match = re.search(r'tolérance:\s*(\d+)', description)
+
+                actual_duration = actual_duration_match.group(1) if actual_duration_match else ''
+                expected_duration = expected_duration_match.group(1) if expected_duration_match else ''
+                tolerance = tolerance_match.group(1) if tolerance_match else ''
+
+                if actual_duration and expected_duration and tolerance:
+                    return f"Insufficient duration: {actual_duration} minutes instead of {expected_duration} minutes minimum (tolerance: {tolerance}%)."
+                else:
+                    return "Insufficient duration"
+            elif 'Départ anticipé de' in description:
+                # Extraire les informations numériques
+                minutes_match = re.search(r'Départ anticipé de (\d+)', description)
+                tolerance_match = re.search(r'tolérance \((\d+)', description)
+                expected_time_match = re.search(r'Heure prévue: ([\d:]+)', description)
+                actual_time_match = re.search(r'heure effective: ([\d:.]+)', description)
+
+                minutes = minutes_match.group(1) if minutes_match else ''
+                tolerance = tolerance_match.group(1) if tolerance_match else ''
+                expected_time = expected_time_match.group(1) if expected_time_match else ''
+                actual_time = actual_time_match.group(1) if actual_time_match else ''
+
+                if minutes and tolerance:
+                    if expected_time and actual_time:
+                        return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min). Expected time: {expected_time}, actual time: {actual_time}."
+                    else:
+                        return f"Early departure of {minutes} minute(s) beyond the tolerance margin ({tolerance} min)."
+                else:
+                    return "Early departure"
+            else:
+                return "Early departure"
+
+        elif anomaly_type == Anomaly.AnomalyType.MISSING_ARRIVAL:
+            if 'Arrivée manquante selon le planning' in description:
+                expected_time_match = re.search(r'heure prévue: ([\d:]+)', description)
+                expected_time = expected_time_match.group(1) if expected_time_match else ''
+
+                if expected_time:
+                    return f"Missing arrival according to schedule (expected time: {expected_time})"
+                else:
+                    return "Missing arrival according to schedule"
+            elif 'Pointage manquant selon le planning fréquence' in description:
+                duration_match = re.search(r'durée prévue: (\d+)', description)
+                duration = duration_match.group(1) if duration_match else ''
+
+                if duration:
+                    return f"Missing check-in according to frequency schedule (expected duration: {duration} minutes)"
+                else:
+                    return "Missing check-in according to frequency schedule"
+            else:
+                return "Missing arrival"
+
+        elif anomaly_type == Anomaly.AnomalyType.MISSING_DEPARTURE:
+            if 'Départ manquant selon le planning' in description:
+                expected_time_match = re.search(r'heure prévue: ([\d:]+)', description)
+                expected_time = expected_time_match.group(1) if expected_time_match else ''
+
+                if expected_time:
+                    return f"Missing departure according to schedule (expected time: {expected_time})"
+                else:
+                    return "Missing departure according to schedule"
+            else:
+                return "Missing departure"
+
+        elif anomaly_type == Anomaly.AnomalyType.INSUFFICIENT_HOURS:
+            if 'Durée insuffisante:' in description or 'Insufficient duration:' in description:
+                # Extraire les informations numériques
+                actual_duration_match = re.search(r'(Durée insuffisante|Insufficient duration):\s*([\d.]+)', description)
+                expected_duration_match = re.search(r'(au lieu de|instead of)\s*([\d.]+)', description)
+                tolerance_match = re.search(r'(tolérance|tolerance):\s*(\d+)', description)
+
+                actual_duration = actual_duration_match.group(2) if actual_duration_match else ''
+                expected_duration = expected_duration_match.group(2) if expected_duration_match else ''
+                tolerance = tolerance_match.group(2) if tolerance_match else ''
+
+                if actual_duration and expected_duration and tolerance:
+                    return f"Insufficient duration: {actual_duration} minutes instead of {expected_duration} minutes minimum (tolerance: {tolerance}%)."
+                else:
+                    return "Insufficient hours"
+            else:
+                return "Insufficient hours"
+
+        elif anomaly_type == Anomaly.AnomalyType.CONSECUTIVE_SAME_TYPE:
+            if 'Pointage' in description and 'consécutif détecté' in description:
+                entry_type_match = re.search(r'Pointage ([^\s]+)', description)
+                last_time_match = re.search(r'Dernier pointage : ([\d:]+)', description)
+
+                entry_type = entry_type_match.group(1) if entry_type_match else ''
+                last_time = last_time_match.group(1) if last_time_match else ''
+
+                if entry_type and last_time:
+                    return f"Consecutive {entry_type} check-in detected. Last check-in: {last_time}"
+                else:
+                    return "Consecutive check-in of the same type"
+            else:
+                return "Consecutive check-in of the same type"
+
+        elif anomaly_type == Anomaly.AnomalyType.UNLINKED_SCHEDULE:
+            if "l'employé n'est pas rattaché à ce site" in description:
+                return "Check-in outside schedule: employee is not linked to this site."
+            else:
+                return "Unlinked schedule"
+
+        elif anomaly_type == Anomaly.AnomalyType.OTHER:
+            if 'Pointage hors planning:' in description:
+                if 'aucun planning n\'est défini pour le jour' in description:
+                    day_match = re.search(r'jour ([^.]+)', description)
+                    entry_type_match = re.search(r'\(([^)]+) à', description)
+                    time_match = re.search(r'à ([\d:]+)', description)
+
+                    day = day_match.group(1) if day_match else ''
+                    entry_type = entry_type_match.group(1) if entry_type_match else ''
+                    time = time_match.group(1) if time_match else ''
+
+                    if day and entry_type and time:
+                        return f"Check-in outside schedule: no schedule is defined for day {day}. ({entry_type} at {time})"
+                    else:
+                        return "Check-in outside schedule: no schedule is defined for this day"
+                elif 'l\'heure' in description:
+                    time_match = re.search(r'l\'heure ([\d:]+\.?\d*)', description)
+                    entry_type_match = re.search(r'\(([^)]+)\)', description)
+                    ranges_match = re.search(r'Plages disponibles: ([^.]+)', description)
+
+                    time = time_match.group(1) if time_match else ''
+                    entry_type = entry_type_match.group(1) if entry_type_match else ''
+                    ranges = ranges_match.group(1) if ranges_match else ''
+
+                    if time and entry_type and ranges:
+                        return f"Check-in outside schedule: time {time} ({entry_type}) does not match any time range defined in employee schedules. Available ranges: {ranges}."
+                    else:
+                        return "Check-in outside schedule: time does not match any defined range"
+                else:
+                    return "Check-in outside schedule"
+            else:
+                return "Other anomaly"
+
+    return description
@@ -0,0 +1,198 @@
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from organizations import utils as organization_stats
+from timesheets.models import Timesheet, Anomaly, DailyAttendance
+from .worked_hours import pair_rows
+
+logger = logging.getLogger(__name__)
+
+# Recalculs différés par thread (voir deferred_recompute)
+_state = threading.local()
+
+TIMESHEET_SUMMARY_FIELDS = ('timestamp', 'entry_type', 'late_minutes', 'early_departure_minutes')
+
+
+def summarize_day(timesheet_rows):
+    """Calcule la synthèse d'une journée à partir de ses pointages
+
+    Les arrivées et départs sont appariés selon la règle de worked_hours.pair_rows.
+
+    Args:
+        timesheet_rows: tuples (horodatage, type d'entrée, minutes de retard,
+            minutes de départ anticipé) triés par ordre chronologique
+
+    Returns:
+        dict: valeurs des champs de DailyAttendance (hors compteurs d'anomalies)
+    """
+    first_arrival = None
+    last_departure = None
+    late_minutes = 0
+    early_departure_minutes = 0
+
+    for timestamp, entry_type, ts_late_minutes, ts_early_minutes in timesheet_rows:
+        late_minutes += ts_late_minutes or 0
+        early_departure_minutes += ts_early_minutes or 0
+        if entry_type == Timesheet.EntryType.ARRIVAL and first_arrival is None:
+            first_arrival = timestamp
+        elif entry_type == Timesheet.EntryType.DEPARTURE:
+            last_departure = timestamp
+
+    worked_seconds = sum((departure - arrival).total_seconds() for arrival, departure in pair_rows(timesheet_rows))
+
+    return {
+        'first_arrival': first_arrival,
+        'last_departure': last_departure,
+        'worked_minutes': int(worked_seconds // 60),
+        'late_minutes': late_minutes,
+        'early_departure_minutes': early_departure_minutes,
+        'scan_count': len(timesheet_rows),
+    }
+
+
+def recompute(employee_id, site_id, date):
+    """Recalcule la synthèse journalière d'un employé sur un site
+
+    La ligne est supprimée si la journée ne contient plus ni pointage ni anomalie.
+    """
+    rows = list(Timesheet.objects.filter(
+        employee_id=employee_id,
+        site_id=site_id,
+        date=date
+    ).order_by('timestamp', 'id').values_list(*TIMESHEET_SUMMARY_FIELDS))
+
+    anomaly_counts = Anomaly.objects.filter(
+        employee_id=employee_id,
+        site_id=site_id,
+        date=date
+    ).aggregate(
+        total=Count('id'),
+        pending=Count('id', filter=Q(status=Anomaly.AnomalyStatus.PENDING))
+    )
+
+    if not rows and not anomaly_counts['total']:
+        DailyAttendance.objects.filter(employee_id=employee_id, site_id=site_id, date=date).delete()
+        return None
+
+    values = summarize_day(rows)
+    values['anomaly_count'] = anomaly_counts['total']
+    values['pending_anomaly_count'] = anomaly_counts['pending']
+    attendance, _ = DailyAttendance.objects.update_or_create(
+        employee_id=employee_id,
+        site_id=site_id,
+        date=date,
+        defaults=values
+    )
+    return attendance
+
+
+def schedule_recompute(employee_id, site_id, date):
+    """Demande le recalcul d'une journée (immédiat ou différé selon le contexte)"""
+    if employee_id is None or site_id is None or date is None:
+        return
+    if isinstance(date, str):
+        date = parse_date(date)
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        recompute(employee_id, site_id, date)
+    else:
+        pending.add((employee_id, site_id, date))
+
+
+def schedule_timesheet_recompute(employee_id, site_id, timestamp):
+    """Demande le recalcul de la journée locale d'un pointage"""
+    if timestamp is None:
+        return
+    schedule_recompute(employee_id, site_id, timezone.localtime(timestamp).date())
+
+
+@contextmanager
+def deferred_recompute():
+    """Regroupe les recalculs demandés dans le bloc et les exécute une seule fois à la sortie
+
+    Évite de recalculer la même journée à chaque anomalie créée pendant l'analyse
+    d'un pointage. Les invalidations des statistiques sont regroupées de la même
+    façon. Les blocs imbriqués sont rattachés au bloc le plus externe.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+
+    with organization_stats.deferred_invalidation():
+        _state.pending = set()
+        try:
+            yield
+        except BaseException:
+            _state.pending = None
+            raise
+        pending, _state.pending = _state.pending, None
+        for employee_id, site_id, date in sorted(pending):
+            recompute(employee_id, site_id, date)
+
+
+def rebuild(start_date, end_date, site_id=None, employee_id=None, dry_run=False, chunk_size=2000):
+    """Reconstruit les synthèses journalières d'une période à partir des données brutes
+
+    Les pointages sont lus en flux (une seule requête, triée par employé, site et
+    horodatage), les anomalies sont comptées en une requête agrégée, puis les
+    synthèses de la période sont remplacées en une transaction.
+
+    Returns:
+        int: nombre de synthèses écrites
+    """
+    timesheets = Timesheet.objects.filter(date__gte=start_date, date__lte=end_date)
+    anomalies = Anomaly.objects.filter(date__gte=start_date, date__lte=end_date)
+    attendances = DailyAttendance.objects.filter(date__gte=start_date, date__lte=end_date)
+    if site_id:
+        timesheets = timesheets.filter(site_id=site_id)
+        anomalies = anomalies.filter(site_id=site_id)
+        attendances = attendances.filter(site_id=site_id)
+    if employee_id:
+        timesheets = timesheets.filter(employee_id=employee_id)
+        anomalies = anomalies.filter(employee_id=employee_id)
+        attendances = attendances.filter(employee_id=employee_id)
+
+    # Pointages regroupés par (employé, site, date locale)
+    day_rows = defaultdict(list)
+    rows = timesheets.order_by('employee_id', 'site_id', 'date', 'timestamp', 'id').values_list(
+        'employee_id', 'site_id', 'date', *TIMESHEET_SUMMARY_FIELDS
+    ).iterator(chunk_size=chunk_size)
+    for row in rows:
+        day_rows[(row[0], row[1], row[2])].append(row[3:])
+
+    anomaly_counts = {
+        (row['employee_id'], row['site_id'], row['date']): row
+        for row in anomalies.order_by().values('employee_id', 'site_id', 'date').annotate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status=Anomaly.AnomalyStatus.PENDING))
+        )
+    }
+
+    summaries = []
+    for key in set(day_rows) | set(anomaly_counts):
+        employee, site, date = key
+        values = summarize_day(day_rows.get(key, []))
+        counts = anomaly_counts.get(key)
+        summaries.append(DailyAttendance(
+            employee_id=employee,
+            site_id=site,
+            date=date,
+            anomaly_count=counts['total'] if counts else 0,
+            pending_anomaly_count=counts['pending'] if counts else 0,
+            **values
+        ))
+
+    if dry_run:
+        return len(summaries)
+
+    with transaction.atomic():
+        attendances.delete()
+        DailyAttendance.objects.bulk_create(summaries, batch_size=chunk_size)
+
+    logger.info(f"{len(summaries)} synthèses journalières reconstruites du {start_date} au {end_date}")
+    return len(summaries)
@@ -0,0 +1,119 @@
+"""Index des échéances d'arrivée utilisé par la commande check_minute_anomalies
+
+Pour une journée, chaque relation site-employé active avec un planning fixe produit
+au plus deux échéances (arrivée du matin, arrivée de l'après-midi) égales à l'heure
+d'arrivée prévue augmentée de la marge de retard. L'index est construit une seule
+fois par jour ; il est invalidé par les signaux lorsque les plannings ou les
+relations site-employé changent, puis reconstruit à l'exécution suivante.
+"""
+import logging
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from timesheets.models import MinuteCheckDeadline, ProcessingCheckpoint
+from sites.models import Schedule, ScheduleDetail, SiteEmployee
+
+logger = logging.getLogger(__name__)
+
+INDEX_CHECKPOINT_NAME = 'minute_check_deadlines'
+
+# Marge de retard par défaut si ni le planning ni le site n'en définissent
+DEFAULT_LATE_MARGIN = 15
+
+
+def _deadline(day, start_time, late_margin):
+    return timezone.make_aware(datetime.combine(day, start_time)) + timedelta(minutes=late_margin)
+
+
+def compute_deadlines(day):
+    """Calcule les échéances d'arrivée d'une journée
+
+    Returns:
+        list: instances MinuteCheckDeadline non enregistrées, triées par échéance
+    """
+    site_employees = list(
+        SiteEmployee.objects.filter(
+            is_active=True,
+            schedule__isnull=False,
+            schedule__schedule_type=Schedule.ScheduleType.FIXED
+        ).select_related('site', 'schedule')
+    )
+    details = {
+        detail.schedule_id: detail
+        for detail in ScheduleDetail.objects.filter(
+            schedule_id__in={site_employee.schedule_id for site_employee in site_employees},
+            day_of_week=day.weekday()
+        )
+    }
+
+    deadlines = []
+    for site_employee in site_employees:
+        detail = details.get(site_employee.schedule_id)
+        if detail is None:
+            continue
+        schedule = site_employee.schedule
+        late_margin = schedule.late_arrival_margin or site_employee.site.late_margin or DEFAULT_LATE_MARGIN
+
+        # (type d'échéance, heure d'arrivée, nombre de pointages signifiant une arrivée manquante)
+        candidates = []
+        if detail.day_type == ScheduleDetail.DayType.FULL:
+            candidates.append((MinuteCheckDeadline.DeadlineKind.MORNING, detail.start_time_1, 0))
+            candidates.append((MinuteCheckDeadline.DeadlineKind.AFTERNOON, detail.start_time_2, 2))
+        elif detail.day_type == ScheduleDetail.DayType.AM:
+            candidates.append((MinuteCheckDeadline.DeadlineKind.MORNING, detail.start_time_1, 0))
+        elif detail.day_type == ScheduleDetail.DayType.PM:
+            candidates.append((MinuteCheckDeadline.DeadlineKind.AFTERNOON, detail.start_time_2, 0))
+
+        for kind, start_time, expected_count in candidates:
+            if start_time is None:
+                continue
+            deadlines.append(MinuteCheckDeadline(
+                date=day,
+                deadline=_deadline(day, start_time, late_margin),
+                site_employee=site_employee,
+                schedule=schedule,
+                kind=kind,
+                expected_timesheet_count=expected_count
+            ))
+
+    deadlines.sort(key=lambda deadline: deadline.deadline)
+    return deadlines
+
+
+def ensure_index(day):
+    """Construit l'index des échéances de la journée s'il n'existe pas encore
+
+    Returns:
+        int: nombre d'échéances créées (0 si l'index était déjà à jour)
+    """
+    checkpoint = ProcessingCheckpoint.objects.filter(name=INDEX_CHECKPOINT_NAME).first()
+    if checkpoint is not None and checkpoint.data.get('date') == day.isoformat():
+        return 0
+
+    deadlines = compute_deadlines(day)
+    with transaction.atomic():
+        # Les échéances des jours précédents ne servent plus
+        MinuteCheckDeadline.objects.filter(date__lte=day).delete()
+        MinuteCheckDeadline.objects.bulk_create(deadlines, batch_size=1000)
+        ProcessingCheckpoint.set_position(INDEX_CHECKPOINT_NAME, timezone.now(), data={'date': day.isoformat()})
+
+    logger.info(f"Index des échéances d'arrivée du {day} construit: {len(deadlines)} échéance(s)")
+    return len(deadlines)
+
+
+def invalidate_index():
+    """Force la reconstruction de l'index à la prochaine exécution"""
+    ProcessingCheckpoint.objects.filter(name=INDEX_CHECKPOINT_NAME).delete()
+
+
+def due_deadlines(day, window_start, window_end):
+    """Échéances de la journée comprises dans [window_start, window_end["""
+    return MinuteCheckDeadline.objects.filter(
+        date=day,
+        deadline__gte=window_start,
+        deadline__lt=window_end
+    ).select_related(
+        'site_employee__site',
+        'site_employee__employee',
+        'schedule'
+    ).order_by('deadline')
@@ -0,0 +1,233 @@
+import bisect
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from sites.models import Site
+from timesheets.models import Timesheet, AnomalyProcessingJob
+from .anomaly_processor import AnomalyProcessor
+from .daily_attendance import deferred_recompute, schedule_timesheet_recompute
+
+
+class OfflineSyncProcessor:
+    """
+    Synchronisation par lot des pointages réalisés hors ligne par l'application mobile.
+
+    Les pointages sont validés contre un instantané chargé une seule fois (sites,
+    organisations de l'employé, pointages existants de la période), triés par ordre
+    chronologique, typés (arrivée / départ) en mémoire puis insérés avec bulk_create.
+    L'analyse des anomalies est ensuite lancée une seule fois par (employé, site, jour).
+    """
+
+    # Intervalle minimal entre deux pointages d'un employé sur un même site
+    DUPLICATE_WINDOW = timedelta(minutes=10)
+    # Tolérance sur l'horloge du téléphone pour les pointages datés dans le futur
+    CLOCK_SKEW_TOLERANCE = timedelta(minutes=5)
+
+    STATUS_CREATED = 'created'
+    STATUS_DUPLICATE = 'duplicate'
+    STATUS_REJECTED = 'rejected'
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def sync(self, employee, scans):
+        """Synchronise une liste de pointages hors ligne pour un employé
+
+        Args:
+            employee: l'employé (utilisateur connecté)
+            scans: liste de dictionnaires validés (site_id, timestamp, scan_type,
+                entry_type, latitude, longitude, client_id)
+
+        Returns:
+            dict: compteurs et résultat de chaque pointage, dans l'ordre de la requête
+        """
+        now = timezone.now()
+        results = [
+            {
+                'index': index,
+                'client_id': scan.get('client_id'),
+                'status': None,
+                'message': '',
+                'timesheet_id': None,
+                'entry_type': None,
+            }
+            for index, scan in enumerate(scans)
+        ]
+
+        if not employee.is_active:
+            for result in results:
+                self._reject(result, "Votre compte est inactif.")
+            return self._summary(results)
+
+        # Instantané : sites référencés et organisations de l'employé
+        sites = {
+            site.nfc_id: site
+            for site in Site.objects.filter(nfc_id__in={scan['site_id'] for scan in scans})
+        }
+        organization_ids = set(employee.organizations.values_list('id', flat=True))
+
+        # Pré-validation de chaque pointage (sans requête)
+        candidates = []
+        for index, scan in enumerate(scans):
+            result = results[index]
+            site = sites.get(scan['site_id'])
+            if site is None:
+                self._reject(result, "Site introuvable avec cet ID NFC/QR Code.")
+                continue
+            if site.organization_id not in organization_ids:
+                self._reject(result, "Vous n'êtes pas autorisé à pointer sur ce site.")
+                continue
+            if not site.allow_offline_mode:
+                self._reject(result, "Le mode hors ligne n'est pas autorisé sur ce site.")
+                continue
+            timestamp = scan['timestamp']
+            if timestamp > now + self.CLOCK_SKEW_TOLERANCE:
+                self._reject(result, "Pointage refusé : horodatage dans le futur.")
+                continue
+            if timestamp < now - timedelta(hours=site.max_offline_duration):
+                self._reject(result, f"Pointage refusé : durée maximale hors ligne dépassée ({site.max_offline_duration} h).")
+                continue
+            candidates.append((index, site, scan))
+
+        if not candidates:
+            return self._summary(results)
+
+        # Ordre chronologique (à horodatage égal, l'ordre de la requête est conservé)
+        candidates.sort(key=lambda candidate: (candidate[2]['timestamp'], candidate[0]))
+
+        new_timesheets = []
+        with transaction.atomic():
+            existing = self._load_existing_timesheets(employee, candidates)
+
+            for index, site, scan in candidates:
+                result = results[index]
+                timestamp = scan['timestamp']
+                local_date = timezone.localtime(timestamp).date()
+                day_entries = existing[(site.id, local_date)]
+                timestamps = [entry[0] for entry in day_entries]
+
+                # Règle des 10 minutes, appliquée aux pointages existants et à ceux du lot
+                position = bisect.bisect_left(timestamps, timestamp - self.DUPLICATE_WINDOW)
+                if position < len(timestamps) and timestamps[position] <= timestamp + self.DUPLICATE_WINDOW:
+                    result['status'] = self.STATUS_DUPLICATE
+                    result['message'] = "Pointage ignoré : badge déjà scanné il y a moins de 10 min."
+                    continue
+
+                # Type d'entrée : fourni par le client ou déduit du pointage précédent du jour
+                insert_at = bisect.bisect_right(timestamps, timestamp)
+                previous = day_entries[insert_at - 1] if insert_at else None
+                entry_type = scan.get('entry_type')
+                if entry_type:
+                    message = "Pointage enregistré comme une arrivée." if entry_type == Timesheet.EntryType.ARRIVAL \
+                        else "Pointage enregistré comme un départ."
+                elif previous is None:
+                    entry_type = Timesheet.EntryType.ARRIVAL
+                    message = "Premier pointage de la journée enregistré comme une arrivée."
+                elif previous[1] == Timesheet.EntryType.ARRIVAL:
+                    entry_type = Timesheet.EntryType.DEPARTURE
+                    message = "Pointage enregistré comme un départ suite à votre dernière arrivée."
+                else:
+                    entry_type = Timesheet.EntryType.ARRIVAL
+                    message = "Nouveau cycle de pointage, enregistré comme une arrivée."
+
+                day_entries.insert(insert_at, (timestamp, entry_type))
+                new_timesheets.append(Timesheet(
+                    employee=employee,
+                    site=site,
+                    timestamp=timestamp,
+                    date=local_date,
+                    entry_type=entry_type,
+                    scan_type=scan['scan_type'],
+                    latitude=scan.get('latitude'),
+                    longitude=scan.get('longitude'),
+                    created_offline=True,
+                    synced_at=now,
+                ))
+                result['status'] = self.STATUS_CREATED
+                result['message'] = message
+                result['entry_type'] = entry_type
+                result['_timesheet'] = new_timesheets[-1]
+
+            # bulk_create n'émet pas post_save : l'analyse est déclenchée explicitement ci-dessous
+            Timesheet.objects.bulk_create(new_timesheets)
+
+            if new_timesheets and settings.TIMESHEET_ASYNC_PROCESSING:
+                AnomalyProcessingJob.objects.bulk_create(
+                    [AnomalyProcessingJob(timesheet=timesheet) for timesheet in new_timesheets],
+                    ignore_conflicts=True
+                )
+
+        for result in results:
+            timesheet = result.pop('_timesheet', None)
+            if timesheet is not None:
+                result['timesheet_id'] = timesheet.id
+
+        # bulk_create n'émet pas post_save : les synthèses journalières sont recalculées ici
+        with deferred_recompute():
+            for timesheet in new_timesheets:
+                schedule_timesheet_recompute(timesheet.employee_id, timesheet.site_id, timesheet.timestamp)
+            if new_timesheets and not settings.TIMESHEET_ASYNC_PROCESSING:
+                self._process_anomalies(employee, new_timesheets)
+
+        self.logger.info(
+            f"Synchronisation hors ligne de {employee.username}: {len(new_timesheets)} pointage(s) créé(s) "
+            f"sur {len(scans)} reçu(s)"
+        )
+        return self._summary(results)
+
+    def _load_existing_timesheets(self, employee, candidates):
+        """Charge en une requête les pointages existants couvrant les jours du lot
+
+        Returns:
+            defaultdict: (site_id, date locale) -> liste triée de (horodatage, type d'entrée)
+        """
+        site_ids = {site.id for _, site, _ in candidates}
+        first_day = timezone.localtime(candidates[0][2]['timestamp']).date()
+        last_day = timezone.localtime(candidates[-1][2]['timestamp']).date()
+        existing = defaultdict(list)
+        rows = Timesheet.objects.filter(
+            employee=employee,
+            site_id__in=site_ids,
+            date__gte=first_day,
+            date__lte=last_day
+        ).order_by('timestamp', 'id').values_list('site_id', 'date', 'timestamp', 'entry_type')
+        for site_id, day, timestamp, entry_type in rows:
+            existing[(site_id, day)].append((timestamp, entry_type))
+        return existing
+
+    def _process_anomalies(self, employee, timesheets):
+        """Analyse les anomalies une seule fois par (employé, site, jour) concerné"""
+        groups = sorted({
+            (timesheet.site_id, timezone.localtime(timesheet.timestamp).date())
+            for timesheet in timesheets
+        })
+        processor = AnomalyProcessor()
+        for site_id, day in groups:
+            response = processor.scan_anomalies(
+                start_date=day,
+                end_date=day,
+                site_id=site_id,
+                employee_id=employee.id,
+                batch=True
+            )
+            if 'error' in response.data:
+                self.logger.error(
+                    f"Analyse des anomalies impossible pour l'employé {employee.id}, site {site_id}, "
+                    f"jour {day}: {response.data['error']}"
+                )
+
+    def _reject(self, result, message):
+        result['status'] = self.STATUS_REJECTED
+        result['message'] = message
+
+    def _summary(self, results):
+        """Construit la réponse de synchronisation"""
+        return {
+            'created': sum(1 for result in results if result['status'] == self.STATUS_CREATED),
+            'duplicates': sum(1 for result in results if result['status'] == self.STATUS_DUPLICATE),
+            'rejected': sum(1 for result in results if result['status'] == self.STATUS_REJECTED),
+            'results': results,
+        }
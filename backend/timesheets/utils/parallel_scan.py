@@ -0,0 +1,168 @@
+"""Réanalyse des anomalies répartie sur plusieurs processus
+
+Le travail est découpé par couple (site, employé) : chaque couple est affecté à
+un lot (shard) par un hachage stable, puis les lots sont distribués sur un pool
+de processus. Chaque processus ouvre sa propre connexion à la base et chaque
+couple est réanalysé dans sa propre transaction (AnomalyProcessor.scan_anomalies
+en mode batch), ce qui évite de verrouiller toute la période pendant la durée du
+traitement.
+"""
+import logging
+import multiprocessing
+import time
+import zlib
+
+import django
+from django.apps import apps
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Nombre de lots par processus (plusieurs lots par processus équilibrent la charge)
+SHARDS_PER_WORKER = 4
+
+
+def shard_for(site_id, employee_id, shard_count):
+    """Lot d'un couple (site, employé), identique d'une exécution à l'autre"""
+    return zlib.crc32(f"{site_id}:{employee_id}".encode()) % shard_count
+
+
+def list_pairs(start_date, end_date, site_id=None, employee_id=None, include_assignments=False):
+    """Couples (site_id, employee_id) à réanalyser sur la période
+
+    Args:
+        include_assignments: ajouter les relations site-employé actives sans pointage
+            (nécessaire pour la vérification des absences)
+
+    Returns:
+        list: couples triés
+    """
+    from sites.models import SiteEmployee
+    from timesheets.models import Timesheet
+
+    timesheets = Timesheet.objects.filter(date__gte=start_date, date__lte=end_date)
+    assignments = SiteEmployee.objects.filter(is_active=True)
+    if site_id:
+        timesheets = timesheets.filter(site_id=site_id)
+        assignments = assignments.filter(site_id=site_id)
+    if employee_id:
+        timesheets = timesheets.filter(employee_id=employee_id)
+        assignments = assignments.filter(employee_id=employee_id)
+
+    pairs = set(timesheets.order_by().values_list('site_id', 'employee_id').distinct())
+    if include_assignments:
+        pairs.update(assignments.values_list('site_id', 'employee_id'))
+    return sorted(pairs)
+
+
+def build_shards(pairs, shard_count):
+    """Répartit les couples en lots non vides"""
+    shards = [[] for _ in range(shard_count)]
+    for site_id, employee_id in pairs:
+        shards[shard_for(site_id, employee_id, shard_count)].append((site_id, employee_id))
+    return [shard for shard in shards if shard]
+
+
+def scan_shard(pairs, start_date, end_date, force_update=False, check_absences=False):
+    """Réanalyse un lot de couples, une transaction courte par couple
+
+    Returns:
+        dict: compteurs du lot et erreurs rencontrées (site_id, employee_id, message)
+    """
+    from timesheets.utils.anomaly_processor import AnomalyProcessor
+
+    result = {
+        'pairs': 0,
+        'timesheets_processed': 0,
+        'anomalies_created': 0,
+        'absences_detected': 0,
+        'errors': [],
+    }
+    for site_id, employee_id in pairs:
+        try:
+            response = AnomalyProcessor().scan_anomalies(
+                start_date=start_date,
+                end_date=end_date,
+                site_id=site_id,
+                employee_id=employee_id,
+                force_update=force_update,
+                check_absences=check_absences,
+                batch=True
+            )
+        except Exception as e:
+            logger.error(f"Erreur lors de la réanalyse du site {site_id} / employé {employee_id}: {str(e)}", exc_info=True)
+            result['errors'].append((site_id, employee_id, str(e)))
+            continue
+
+        if 'error' in response.data:
+            result['errors'].append((site_id, employee_id, response.data['error']))
+            continue
+        result['pairs'] += 1
+        result['timesheets_processed'] += response.data['timesheets_processed']
+        result['anomalies_created'] += response.data['anomalies_created']
+        result['absences_detected'] += response.data['absences_detected']
+    return result
+
+
+def _init_worker():
+    """Initialise un processus du pool (démarrage par spawn) sans réutiliser de connexion héritée"""
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _scan_shard_task(args):
+    return scan_shard(*args)
+
+
+def run_parallel_scan(start_date, end_date, site_id=None, employee_id=None, workers=1,
+                      force_update=False, check_absences=False, progress_callback=None):
+    """Réanalyse la période en répartissant les couples (site, employé) sur plusieurs processus
+
+    Args:
+        workers: nombre de processus (1 = traitement dans le processus courant)
+        progress_callback: fonction appelée avec (lots terminés, lots totaux, résultat du lot)
+
+    Returns:
+        dict: synthèse (processus, lots, couples, pointages, anomalies, absences, erreurs, durée)
+    """
+    started = time.monotonic()
+    workers = max(1, workers)
+    pairs = list_pairs(start_date, end_date, site_id, employee_id, include_assignments=check_absences)
+    shards = build_shards(pairs, workers * SHARDS_PER_WORKER)
+    tasks = [(shard, start_date, end_date, force_update, check_absences) for shard in shards]
+
+    summary = {
+        'workers': workers,
+        'shards': len(shards),
+        'pairs': 0,
+        'timesheets_processed': 0,
+        'anomalies_created': 0,
+        'absences_detected': 0,
+        'errors': [],
+    }
+
+    def collect(done, result):
+        for key in ('pairs', 'timesheets_processed', 'anomalies_created', 'absences_detected'):
+            summary[key] += result[key]
+        summary['errors'].extend(result['errors'])
+        if progress_callback is not None:
+            progress_callback(done, len(shards), result)
+
+    if workers == 1 or len(shards) <= 1:
+        for done, task in enumerate(tasks, start=1):
+            collect(done, _scan_shard_task(task))
+    else:
+        # Les processus ouvrent leurs propres connexions : celles du parent ne doivent pas être partagées
+        connections.close_all()
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker) as pool:
+            for done, result in enumerate(pool.imap_unordered(_scan_shard_task, tasks), start=1):
+                collect(done, result)
+
+    summary['duration'] = round(time.monotonic() - started, 2)
+    logger.info(
+        f"Réanalyse parallèle terminée en {summary['duration']}s: {summary['pairs']} couple(s) site-employé, "
+        f"{summary['timesheets_processed']} pointage(s), {summary['anomalies_created']} anomalie(s), "
+        f"{summary['absences_detected']} absence(s), {len(summary['errors'])} erreur(s)"
+    )
+    return summary
@@ -0,0 +1,162 @@
+"""Réparation des pointages par flux, partition par partition
+
+La période est parcourue par partition (employé, site), dans l'ordre, à l'aide
+d'un curseur côté serveur : seules les données d'une partition et d'une fenêtre
+de quelques jours sont chargées à la fois. Chaque fenêtre est réanalysée sur
+place dans sa propre transaction (AnomalyProcessor.scan_anomalies en mode batch) :
+les statuts des pointages sont recalculés par bulk_update, leurs identifiants et
+dates de création sont conservés.
+
+Après chaque fenêtre, la position atteinte est enregistrée dans un
+ProcessingCheckpoint : une réparation interrompue reprend là où elle s'était
+arrêtée.
+"""
+import logging
+from datetime import date, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from sites.models import SiteEmployee
+from timesheets.models import ProcessingCheckpoint, Timesheet
+
+logger = logging.getLogger(__name__)
+
+# Nombre de jours réanalysés par transaction pour une partition
+CHUNK_DAYS = 31
+# Nombre de partitions lues à la fois par le curseur côté serveur
+CURSOR_CHUNK_SIZE = 2000
+
+
+def checkpoint_name(start_date, end_date, site_id=None, employee_id=None):
+    """Nom du point de reprise d'une réparation (propre à la période et aux filtres)"""
+    return f"timesheets_repair:{start_date}:{end_date}:{site_id or '*'}:{employee_id or '*'}"
+
+
+def iter_partitions(start_date, end_date, site_id=None, employee_id=None, include_assignments=False, after=None):
+    """Parcourt les partitions (employee_id, site_id) de la période dans l'ordre
+
+    Args:
+        include_assignments: ajouter les relations site-employé actives sans pointage
+            (nécessaire pour la vérification des absences)
+        after: partition (employee_id, site_id) à partir de laquelle reprendre (incluse)
+
+    Yields:
+        tuple: (employee_id, site_id)
+    """
+    timesheets = Timesheet.objects.filter(date__gte=start_date, date__lte=end_date)
+    assignments = SiteEmployee.objects.filter(is_active=True)
+    if site_id:
+        timesheets = timesheets.filter(site_id=site_id)
+        assignments = assignments.filter(site_id=site_id)
+    if employee_id:
+        timesheets = timesheets.filter(employee_id=employee_id)
+        assignments = assignments.filter(employee_id=employee_id)
+    if after is not None:
+        resume_filter = Q(employee_id__gt=after[0]) | Q(employee_id=after[0], site_id__gte=after[1])
+        timesheets = timesheets.filter(resume_filter)
+        assignments = assignments.filter(resume_filter)
+
+    partitions = timesheets.order_by().values_list('employee_id', 'site_id').distinct()
+    if include_assignments:
+        partitions = partitions.union(assignments.order_by().values_list('employee_id', 'site_id'))
+    yield from partitions.order_by('employee_id', 'site_id').iterator(chunk_size=CURSOR_CHUNK_SIZE)
+
+
+def iter_windows(start_date, end_date, chunk_days=CHUNK_DAYS):
+    """Découpe la période en fenêtres (début, fin) d'au plus chunk_days jours"""
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start + timedelta(days=chunk_days - 1), end_date)
+        yield window_start, window_end
+        window_start = window_end + timedelta(days=1)
+
+
+class StreamingRepair:
+    """Réanalyse une période partition par partition, avec reprise sur interruption"""
+
+    def __init__(self, start_date, end_date, site_id=None, employee_id=None, check_absences=True,
+                 chunk_days=CHUNK_DAYS, restart=False, on_chunk=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.site_id = site_id
+        self.employee_id = employee_id
+        self.check_absences = check_absences
+        self.chunk_days = max(1, chunk_days)
+        self.restart = restart
+        # Fonction appelée après chaque fenêtre avec (employee_id, site_id, début, fin, résultat)
+        self.on_chunk = on_chunk
+        self.checkpoint_name = checkpoint_name(start_date, end_date, site_id, employee_id)
+        self.stats = {
+            'partitions': 0,
+            'chunks': 0,
+            'timesheets_processed': 0,
+            'anomalies_created': 0,
+            'absences_detected': 0,
+            'errors': [],
+        }
+
+    def resume_position(self):
+        """Position enregistrée par une exécution interrompue : ((employee_id, site_id), dernière date traitée)"""
+        if self.restart:
+            return None, None
+        checkpoint = ProcessingCheckpoint.objects.filter(name=self.checkpoint_name).first()
+        if checkpoint is None or 'employee_id' not in checkpoint.data:
+            return None, None
+        data = checkpoint.data
+        return (data['employee_id'], data['site_id']), date.fromisoformat(data['date'])
+
+    def run(self, stop_on_error=True):
+        """Réanalyse la période et retourne les compteurs
+
+        Args:
+            stop_on_error: arrêter à la première fenêtre en erreur (le point de reprise
+                reste sur la dernière fenêtre réussie)
+        """
+        from timesheets.utils.anomaly_processor import AnomalyProcessor
+
+        resume_partition, resume_date = self.resume_position()
+        if resume_partition is not None:
+            logger.info(f"Reprise de la réparation à l'employé {resume_partition[0]} / site {resume_partition[1]} "
+                        f"après le {resume_date}")
+
+        partitions = iter_partitions(self.start_date, self.end_date, self.site_id, self.employee_id,
+                                     include_assignments=self.check_absences, after=resume_partition)
+        for employee_id, site_id in partitions:
+            self.stats['partitions'] += 1
+            start_date = self.start_date
+            if (employee_id, site_id) == resume_partition:
+                start_date = resume_date + timedelta(days=1)
+
+            for window_start, window_end in iter_windows(start_date, self.end_date, self.chunk_days):
+                response = AnomalyProcessor().scan_anomalies(
+                    start_date=window_start,
+                    end_date=window_end,
+                    site_id=site_id,
+                    employee_id=employee_id,
+                    force_update=True,
+                    check_absences=self.check_absences,
+                    batch=True
+                )
+                if 'error' in response.data:
+                    self.stats['errors'].append((employee_id, site_id, window_start, response.data['error']))
+                    if stop_on_error:
+                        return self.stats
+                    continue
+
+                self.stats['chunks'] += 1
+                self.stats['timesheets_processed'] += response.data['timesheets_processed']
+                self.stats['anomalies_created'] += response.data['anomalies_created']
+                self.stats['absences_detected'] += response.data['absences_detected']
+                ProcessingCheckpoint.set_position(self.checkpoint_name, timezone.now(), data={
+                    'employee_id': employee_id,
+                    'site_id': site_id,
+                    'date': window_end.isoformat(),
+                })
+                if self.on_chunk is not None:
+                    self.on_chunk(employee_id, site_id, window_start, window_end, response.data)
+
+        # Réparation complète : le point de reprise n'a plus lieu d'être
+        if not self.stats['errors']:
+            ProcessingCheckpoint.objects.filter(name=self.checkpoint_name).delete()
+        return self.stats
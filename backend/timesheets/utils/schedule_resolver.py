@@ -0,0 +1,137 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.conf import settings
+from sites.models import SiteEmployee, ScheduleDetail
+
+# Planning résolu pour une relation site-employé active : detail vaut None
+# si le planning n'a pas de détail pour le jour demandé
+ResolvedSchedule = namedtuple('ResolvedSchedule', ['site_employee', 'schedule', 'detail'])
+
+
+class ScheduleResolver:
+    """
+    Service partagé de résolution des plannings.
+
+    Met en cache, par (employé, site, jour de la semaine), les relations site-employé
+    actives avec leur planning et le détail du jour. Le cache est un LRU en mémoire
+    (propre à chaque processus) avec une durée de vie : les signaux post_save /
+    post_delete de Schedule, ScheduleDetail et SiteEmployee invalident les entrées
+    concernées dans le processus courant, la durée de vie borne le décalage entre
+    processus.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size or getattr(settings, 'SCHEDULE_CACHE_MAX_SIZE', 4096)
+        self.ttl = ttl if ttl is not None else getattr(settings, 'SCHEDULE_CACHE_TTL', 300)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        """Retourne la valeur en cache si elle existe et n'a pas expiré"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _set(self, key, value):
+        """Ajoute une valeur au cache en évinçant les entrées les moins récemment utilisées"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def resolve(self, employee_id, site_id, day_of_week):
+        """Retourne les plannings des relations site-employé actives pour un jour de la semaine
+
+        Returns:
+            tuple[ResolvedSchedule]: une entrée par relation active, dans l'ordre des relations
+        """
+        key = ('employee', employee_id, site_id, day_of_week)
+        resolved = self._get(key)
+        if resolved is not None:
+            return resolved
+
+        site_employees = list(SiteEmployee.objects.filter(
+            site_id=site_id,
+            employee_id=employee_id,
+            is_active=True
+        ).select_related('schedule', 'schedule__site').order_by('id'))
+
+        schedule_ids = {se.schedule_id for se in site_employees if se.schedule_id}
+        details = {
+            detail.schedule_id: detail
+            for detail in ScheduleDetail.objects.filter(schedule_id__in=schedule_ids, day_of_week=day_of_week)
+        } if schedule_ids else {}
+
+        resolved = tuple(
+            ResolvedSchedule(se, se.schedule, details.get(se.schedule_id))
+            for se in site_employees
+        )
+        self._set(key, resolved)
+        # Les détails résolus alimentent aussi le cache par planning
+        for schedule_id in schedule_ids:
+            self._set(('detail', schedule_id, day_of_week), (details.get(schedule_id),))
+        return resolved
+
+    def get_schedule_detail(self, schedule_id, day_of_week):
+        """Retourne le détail d'un planning pour un jour de la semaine ou None"""
+        key = ('detail', schedule_id, day_of_week)
+        cached = self._get(key)
+        if cached is not None:
+            return cached[0]
+
+        detail = ScheduleDetail.objects.filter(schedule_id=schedule_id, day_of_week=day_of_week).first()
+        # La valeur est encapsulée pour pouvoir mettre en cache l'absence de détail
+        self._set(key, (detail,))
+        return detail
+
+    def invalidate_site_employee(self, site_employee):
+        """Invalide les entrées d'une relation site-employé (y compris si l'employé ou le site a changé)"""
+        with self._lock:
+            stale_keys = []
+            for key, (_, value) in self._entries.items():
+                if key[0] != 'employee':
+                    continue
+                if (key[1], key[2]) == (site_employee.employee_id, site_employee.site_id) or \
+                        any(resolved.site_employee.id == site_employee.id for resolved in value):
+                    stale_keys.append(key)
+            for key in stale_keys:
+                del self._entries[key]
+
+    def invalidate_schedule(self, schedule_id):
+        """Invalide les entrées faisant référence à un planning"""
+        with self._lock:
+            stale_keys = []
+            for key, (_, value) in self._entries.items():
+                if key[0] == 'detail':
+                    if key[1] == schedule_id:
+                        stale_keys.append(key)
+                elif any(resolved.site_employee.schedule_id == schedule_id for resolved in value):
+                    stale_keys.append(key)
+            for key in stale_keys:
+                del self._entries[key]
+
+    def clear(self):
+        """Vide complètement le cache"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+schedule_resolver = ScheduleResolver()
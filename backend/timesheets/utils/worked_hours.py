@@ -0,0 +1,31 @@
+"""Calcul des durées travaillées à partir des pointages
+
+Règle d'appariement (partagée avec les synthèses journalières) : chaque arrivée
+est associée au premier départ qui la suit le même jour, sur le même site ; une
+arrivée suivie d'une autre arrivée est considérée sans départ et n'est pas
+comptabilisée. Les rapports et statistiques lisent les durées des synthèses
+journalières (DailyAttendance), calculées avec pair_rows().
+"""
+from timesheets.models import Timesheet
+
+
+def pair_rows(rows):
+    """Apparie les arrivées et départs d'une journée déjà chargée
+
+    Args:
+        rows: tuples (horodatage, type d'entrée, ...) triés par ordre chronologique
+
+    Returns:
+        list: couples (arrivée, départ)
+    """
+    pairs = []
+    open_arrival = None
+    for row in rows:
+        timestamp, entry_type = row[0], row[1]
+        if entry_type == Timesheet.EntryType.ARRIVAL:
+            open_arrival = timestamp
+        elif entry_type == Timesheet.EntryType.DEPARTURE and open_arrival is not None:
+            pairs.append((open_arrival, timestamp))
+            open_arrival = None
+    return pairs
+
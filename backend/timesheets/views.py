@@ -1,13 +1,14 @@
 from rest_framework import generics, permissions, status, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
 from django.utils import timezone, translation
 from django.db.models import Q
 from django.core.exceptions import ValidationError
 from datetime import time
 from .models import Timesheet, Anomaly, EmployeeReport
 from .serializers import (
-    TimesheetSerializer, TimesheetCreateSerializer,
+    TimesheetSerializer, TimesheetCreateSerializer, TimesheetSyncSerializer,
     AnomalySerializer, EmployeeReportSerializer
 )
 from sites.permissions import IsSiteOrganizationManager
@@ -16,6 +17,9 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse
 from django.db import models
 import logging
 from .utils.anomaly_processor import AnomalyProcessor
+from .utils.offline_sync import OfflineSyncProcessor
+from .pagination import AnomalyCursorPagination
+from core.access import get_access_context
 
 class IsAdminOrManager(BasePermission):
     """Permission composée pour autoriser les admin ou les managers d'organisation"""
@@ -46,7 +50,7 @@ class TimesheetListView(generics.ListCreateAPIView):
         if user.is_super_admin:
             return queryset.all()
         elif user.is_admin or user.is_manager:
-            return queryset.filter(site__organization__in=user.organizations.all())
+            return queryset.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         else:
             return queryset.filter(employee=user)
 
@@ -69,9 +73,9 @@ class TimesheetListView(generics.ListCreateAPIView):
         if entry_type:
             queryset = queryset.filter(entry_type=entry_type)
         if start_date:
-            queryset = queryset.filter(timestamp__date__gte=start_date)
+            queryset = queryset.filter(date__gte=start_date)
         if end_date:
-            queryset = queryset.filter(timestamp__date__lte=end_date)
+            queryset = queryset.filter(date__lte=end_date)
 
         return queryset
 
@@ -94,7 +98,7 @@ class TimesheetDetailView(generics.RetrieveUpdateDestroyAPIView):
         if user.is_super_admin:
             return Timesheet.objects.all()
         elif user.is_admin or user.is_manager:
-            return Timesheet.objects.filter(site__organization__in=user.organizations.all())
+            return Timesheet.objects.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         else:
             return Timesheet.objects.filter(employee=user)
 
@@ -140,12 +144,19 @@ class TimesheetCreateView(generics.CreateAPIView):
             # Le timestamp est maintenant géré dans le serializer.validate
             timesheet = serializer.save()
 
-            # Utiliser AnomalyProcessor pour traiter le pointage
             processor = AnomalyProcessor()
-            result = processor.process_timesheet(timesheet)
+            if settings.TIMESHEET_ASYNC_PROCESSING:
+                # Décision rapide sur l'ambiguïté, l'analyse complète est faite par le worker
+                is_ambiguous = processor.is_timesheet_ambiguous(timesheet)
+            else:
+                # Le pointage a déjà été analysé par le signal post_save : réutiliser son résultat
+                result = getattr(timesheet, '_anomaly_processing_result', None)
+                if result is None:
+                    result = processor.process_timesheet(timesheet)
+                is_ambiguous = result.get('is_ambiguous', False)
 
             # Si le pointage est ambigu, supprimer l'enregistrement et notifier le client
-            if result.get('is_ambiguous', False):
+            if is_ambiguous:
                 timesheet.delete()
                 return Response({'is_ambiguous': True}, status=status.HTTP_200_OK)
 
@@ -179,20 +190,40 @@ class TimesheetCreateView(generics.CreateAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class TimesheetSyncView(generics.GenericAPIView):
+    """Vue pour synchroniser par lot les pointages réalisés hors ligne"""
+    serializer_class = TimesheetSyncSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(
+        request=TimesheetSyncSerializer,
+        responses={
+            200: OpenApiResponse(description='Résultat de la synchronisation pour chaque pointage'),
+            400: OpenApiResponse(description='Données invalides')
+        }
+    )
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        result = OfflineSyncProcessor().sync(request.user, serializer.validated_data['scans'])
+        return Response(result, status=status.HTTP_200_OK)
+
 class AnomalyListView(generics.ListCreateAPIView):
     """Vue pour lister toutes les anomalies et en créer de nouvelles"""
     serializer_class = AnomalySerializer
     permission_classes = [permissions.IsAuthenticated]
-    pagination_class = None  # Désactiver la pagination pour cette vue
+    pagination_class = AnomalyCursorPagination
 
     def get_queryset(self):
         user = self.request.user
         if user.is_super_admin:
-            return Anomaly.objects.all()
+            queryset = Anomaly.objects.all()
         elif user.is_admin or user.is_manager:
-            return Anomaly.objects.filter(site__organization__in=user.organizations.all())
+            queryset = Anomaly.objects.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         else:
-            return Anomaly.objects.filter(employee=user)
+            queryset = Anomaly.objects.filter(employee=user)
+        return AnomalySerializer.setup_eager_loading(queryset)
 
     def filter_queryset(self, queryset):
         # Récupérer les paramètres de filtrage
@@ -203,56 +234,22 @@ class AnomalyListView(generics.ListCreateAPIView):
         start_date = self.request.query_params.get('start_date')
         end_date = self.request.query_params.get('end_date')
 
-        # Log pour déboguer
         logger = logging.getLogger(__name__)
-        logger.info(f"Filtrage des anomalies - Paramètres: site={site}, employee={employee}, type={anomaly_type}, status={status}, start_date={start_date}, end_date={end_date}")
+        logger.debug(f"Filtrage des anomalies - Paramètres: site={site}, employee={employee}, type={anomaly_type}, status={status}, start_date={start_date}, end_date={end_date}")
 
-        # Appliquer les filtres si présents
+        # Appliquer les filtres si présents (sans comptage : la pagination par curseur n'en a pas besoin)
         if site:
             queryset = queryset.filter(site_id=site)
-            logger.info(f"Filtre site appliqué: {site}, résultats: {queryset.count()}")
         if employee:
-            logger.info(f"[Débogage] Paramètre employé reçu dans AnomalyListView: {employee}, type: {type(employee)}")
-            try:
-                # Convertir en entier si ce n'est pas déjà le cas
-                employee_id = int(employee)
-                logger.info(f"[Débogage] ID employé converti en entier: {employee_id}")
-
-                # Vérifier si l'employé existe
-                from users.models import User
-                try:
-                    user = User.objects.get(id=employee_id)
-                    logger.info(f"[Débogage] Employé trouvé: {user.get_full_name()} (ID: {user.id})")
-                except User.DoesNotExist:
-                    logger.warning(f"[Débogage] Employé avec ID {employee_id} non trouvé dans la base de données")
-
-                # Appliquer le filtre
-                queryset = queryset.filter(employee_id=employee_id)
-                logger.info(f"Filtre employé appliqué: {employee_id}, résultats: {queryset.count()}")
-
-                # Afficher les anomalies trouvées pour cet employé
-                if queryset.count() > 0:
-                    logger.info(f"[Débogage] Anomalies trouvées pour l'employé {employee_id}:")
-                    for anomaly in queryset[:5]:  # Limiter à 5 pour éviter des logs trop longs
-                        logger.info(f"  - Anomalie ID: {anomaly.id}, Type: {anomaly.anomaly_type}, Date: {anomaly.date}")
-                else:
-                    logger.warning(f"[Débogage] Aucune anomalie trouvée pour l'employé {employee_id}")
-            except (ValueError, TypeError) as e:
-                logger.error(f"[Débogage] Erreur lors de la conversion de l'ID employé: {str(e)}")
-                queryset = queryset.filter(employee_id=employee)
-                logger.info(f"Filtre employé appliqué sans conversion: {employee}, résultats: {queryset.count()}")
+            queryset = queryset.filter(employee_id=employee)
         if anomaly_type:
             queryset = queryset.filter(anomaly_type=anomaly_type)
-            logger.info(f"Filtre type appliqué: {anomaly_type}, résultats: {queryset.count()}")
         if status:
             queryset = queryset.filter(status=status)
-            logger.info(f"Filtre statut appliqué: {status}, résultats: {queryset.count()}")
         if start_date:
             queryset = queryset.filter(date__gte=start_date)
-            logger.info(f"Filtre date de début appliqué: {start_date}, résultats: {queryset.count()}")
         if end_date:
             queryset = queryset.filter(date__lte=end_date)
-            logger.info(f"Filtre date de fin appliqué: {end_date}, résultats: {queryset.count()}")
 
         return queryset
 
@@ -268,11 +265,12 @@ class AnomalyDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         user = self.request.user
         if user.is_super_admin:
-            return Anomaly.objects.all()
+            queryset = Anomaly.objects.all()
         elif user.is_admin or user.is_manager:
-            return Anomaly.objects.filter(site__organization__in=user.organizations.all())
+            queryset = Anomaly.objects.filter(site__organization_id__in=get_access_context(self.request).organization_ids)
         else:
-            return Anomaly.objects.filter(employee=user)
+            queryset = Anomaly.objects.filter(employee=user)
+        return AnomalySerializer.setup_eager_loading(queryset)
 
     def perform_update(self, serializer):
         if self.request.user.is_manager or self.request.user.is_super_admin:
@@ -322,6 +320,7 @@ class ScanAnomaliesSerializer(serializers.Serializer):
     site = serializers.IntegerField(required=False)
     employee = serializers.IntegerField(required=False)
     force_update = serializers.BooleanField(required=False, default=False, help_text="Si True, force la réévaluation de tous les statuts des pointages existants")
+    batch = serializers.BooleanField(required=False, default=False, help_text="Si True, évalue les anomalies en mémoire et regroupe les écritures en base")
 
 class TimesheetReportGenerateSerializer(serializers.Serializer):
     """Serializer pour la génération de rapports de pointage"""
@@ -366,6 +365,7 @@ class ScanAnomaliesView(generics.CreateAPIView):
             end_date=serializer.validated_data.get('end_date'),
             site_id=serializer.validated_data.get('site'),
             employee_id=serializer.validated_data.get('employee'),
-            force_update=serializer.validated_data.get('force_update', False)
+            force_update=serializer.validated_data.get('force_update', False),
+            batch=serializer.validated_data.get('batch', False)
         )
 
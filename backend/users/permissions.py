@@ -1,6 +1,7 @@
 """Permissions pour les utilisateurs"""
 
 from rest_framework import permissions
+from core.access import get_access_context
 from .models import User
 
 
@@ -37,13 +38,13 @@ class HasUserPermission(permissions.BasePermission):
 
         # Admin peut accéder aux utilisateurs de ses organisations
         if user.is_admin:
-            return obj.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists()
+            return get_access_context(request).shares_organization(obj)
 
         # Manager peut accéder aux employés de ses organisations
         if user.is_manager:
             return (
                 obj.role == User.Role.EMPLOYEE and
-                obj.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists()
+                get_access_context(request).shares_organization(obj)
             )
 
         # Employé ne peut accéder qu'à son propre profil
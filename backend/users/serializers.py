@@ -5,6 +5,7 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from drf_spectacular.utils import extend_schema_field
 from organizations.models import Organization
 from core.mixins import OrganizationPermissionMixin, RolePermissionMixin
+from core.access import get_access_context
 from .models import User
 
 User = get_user_model()
@@ -122,8 +123,8 @@ class UserSerializer(serializers.ModelSerializer, OrganizationPermissionMixin, R
                 return data
             elif user.is_admin:
                 # Vérifier que les organisations sont celles de l'admin
-                if not all(org.id in user.organizations.values_list('id', flat=True)
-                           for org in data['organizations']):
+                organization_ids = get_access_context(self.context['request']).organization_ids
+                if not all(org.id in organization_ids for org in data['organizations']):
                     raise serializers.ValidationError({
                         "organizations": "Vous ne pouvez pas assigner des organisations auxquelles vous n'appartenez pas"
                     })
@@ -166,12 +167,12 @@ class UserSerializer(serializers.ModelSerializer, OrganizationPermissionMixin, R
         if not user.is_super_admin:
             if user.is_admin:
                 # Admin ne peut modifier que les utilisateurs de ses organisations
-                if not instance.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists():
+                if not get_access_context(self.context['request']).shares_organization(instance):
                     raise serializers.ValidationError(
                         "Vous ne pouvez pas modifier cet utilisateur")
             elif user.is_manager:
                 # Manager ne peut modifier que les employés de ses sites
-                if instance.role != User.Role.EMPLOYEE or not instance.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists():
+                if instance.role != User.Role.EMPLOYEE or not get_access_context(self.context['request']).shares_organization(instance):
                     raise serializers.ValidationError(
                         "Vous ne pouvez pas modifier cet utilisateur")
             else:
@@ -185,7 +186,7 @@ class UserSerializer(serializers.ModelSerializer, OrganizationPermissionMixin, R
         organizations = validated_data.pop('organizations', None)
 
         if reset_password:
-            if not (user.is_super_admin or (user.is_admin and instance.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists())):
+            if not (user.is_super_admin or (user.is_admin and get_access_context(self.context['request']).shares_organization(instance))):
                 raise serializers.ValidationError(
                     "Vous n'avez pas les droits pour réinitialiser le mot de passe de cet utilisateur")
             # Générer un mot de passe aléatoire
@@ -289,8 +290,8 @@ class UserRegisterSerializer(serializers.ModelSerializer):
                 return data
             elif user.is_admin:
                 # Vérifier que les organisations sont celles de l'admin
-                if not all(org.id in user.organizations.values_list('id', flat=True)
-                           for org in data['organizations']):
+                organization_ids = get_access_context(self.context['request']).organization_ids
+                if not all(org.id in organization_ids for org in data['organizations']):
                     raise serializers.ValidationError({
                         "organizations": "Vous ne pouvez pas assigner des organisations auxquelles vous n'appartenez pas"
                     })
@@ -8,19 +8,21 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from django.contrib.auth import get_user_model, logout
 from django.utils import timezone
 from datetime import timedelta
+from django.db.models import Sum
 from .serializers import (
     UserSerializer, UserProfileSerializer, UserRegisterSerializer,
     CustomTokenObtainPairSerializer
 )
 from .models import User
 from drf_spectacular.utils import extend_schema, OpenApiResponse
-from timesheets.models import Timesheet, Anomaly
+from timesheets.models import DailyAttendance
 from sites.models import Site, Schedule
 from reports.models import Report
 from sites.serializers import SiteSerializer, ScheduleSerializer
 from reports.serializers import ReportSerializer
 from sites.pagination import CustomPageNumberPagination
 from .permissions import HasUserPermission
+from core.access import get_access_context
 
 User = get_user_model()
 
@@ -122,8 +124,7 @@ class UserListView(generics.ListAPIView):
             pass
         # Admin et Manager voient les utilisateurs de leurs organisations
         elif user.is_admin or user.is_manager:
-            organizations = user.organizations.all()
-            queryset = queryset.filter(organizations__in=organizations)
+            queryset = queryset.filter(organizations__id__in=get_access_context(self.request).organization_ids)
         # Employé ne voit que son profil
         else:
             queryset = queryset.filter(id=user.id)
@@ -198,14 +199,14 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 
         # Admin voit les utilisateurs de ses organisations
         if user.is_admin:
-            if obj.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists():
+            if get_access_context(self.request).shares_organization(obj):
                 return obj
             raise PermissionDenied("Vous n'avez pas accès à cet utilisateur")
 
         # Manager voit les employés de ses organisations
         if user.is_manager:
             if (obj.role == User.Role.EMPLOYEE and
-                obj.organizations.filter(id__in=user.organizations.values_list('id', flat=True)).exists()):
+                get_access_context(self.request).shares_organization(obj)):
                 return obj
             raise PermissionDenied("Vous n'avez pas accès à cet utilisateur")
 
@@ -278,29 +279,16 @@ class UserStatisticsView(APIView):
             end_date = timezone.now()
             start_date = end_date - timedelta(days=30)
 
-            # Récupérer les pointages
-            timesheets = Timesheet.objects.filter(
+            # Lire les synthèses journalières de la période
+            totals = DailyAttendance.objects.filter(
                 employee=user,
-                timestamp__range=[start_date, end_date]
-            ).order_by('timestamp')
-
-            # Calculer le total des heures
-            total_hours = 0
-            entry_time = None
-
-            for timesheet in timesheets:
-                if timesheet.entry_type == 'IN':
-                    entry_time = timesheet.timestamp
-                elif timesheet.entry_type == 'OUT' and entry_time:
-                    duration = timesheet.timestamp - entry_time
-                    total_hours += duration.total_seconds() / 3600  # Convertir en heures
-                    entry_time = None
-
-            # Compter les anomalies
-            anomalies_count = Anomaly.objects.filter(
-                timesheet__employee=user,
-                timesheet__timestamp__range=[start_date, end_date]
-            ).count()
+                date__range=[timezone.localtime(start_date).date(), timezone.localtime(end_date).date()]
+            ).aggregate(
+                worked_minutes=Sum('worked_minutes'),
+                anomalies=Sum('anomaly_count')
+            )
+            total_hours = (totals['worked_minutes'] or 0) / 60
+            anomalies_count = totals['anomalies'] or 0
 
             return Response({
                 'total_hours': round(total_hours, 2),
@@ -332,8 +320,11 @@ class UserSitesView(generics.ListAPIView):
         try:
             user = User.objects.get(pk=self.kwargs['pk'])
 
-            # Sites où l'utilisateur est manager
-            manager_sites = Site.objects.filter(manager=user)
+            # Sites où l'utilisateur est manager (déjà chargés dans le contexte d'accès pour l'utilisateur connecté)
+            if user.pk == self.request.user.pk:
+                manager_sites = Site.objects.filter(id__in=get_access_context(self.request).managed_site_ids)
+            else:
+                manager_sites = Site.objects.filter(manager=user)
 
             # Sites où l'utilisateur est rattaché à un planning
             scheduled_sites = Site.objects.filter(
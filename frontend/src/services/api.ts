@@ -648,17 +648,46 @@ const timesheetsApi = {
   deleteTimesheet: (id: number) =>
     api.delete(`/timesheets/${id}/`),
 
-  // Get anomalies
+  // Get anomalies (first page only: the list is cursor-paginated, see getAllAnomalies)
   getAnomalies: (params: any = {}) => {
     const queryParams = convertKeysToSnakeCase({
-      ...params,
-      page_size: 1000 // Set a very large page size to effectively disable pagination
+      page_size: 1000,
+      ...params
     });
     console.log('[API][getAnomalies] Params avant conversion:', params);
     console.log('[API][getAnomalies] Params après conversion:', queryParams);
     return api.get('/timesheets/anomalies/', { params: queryParams });
   },
 
+  // Get all anomalies by following the cursor of each page (`next` link)
+  getAllAnomalies: async (params: any = {}) => {
+    const queryParams = convertKeysToSnakeCase({
+      ...params,
+      page_size: 1000
+    });
+    const results: any[] = [];
+    let cursor: string | null = null;
+    do {
+      const response: AxiosResponse = await api.get('/timesheets/anomalies/', {
+        params: cursor ? { ...queryParams, cursor } : queryParams
+      });
+      results.push(...(response.data?.results || []));
+      cursor = response.data?.next ? new URL(response.data.next).searchParams.get('cursor') : null;
+    } while (cursor);
+    return { data: { results } };
+  },
+
+  // Count anomalies matching the filters (exact total, without loading them)
+  countAnomalies: async (params: any = {}) => {
+    const queryParams = convertKeysToSnakeCase({
+      ...params,
+      page_size: 1,
+      total: 'exact'
+    });
+    const response = await api.get('/timesheets/anomalies/', { params: queryParams });
+    return response.data?.total ?? 0;
+  },
+
   // Update anomaly
   updateAnomaly: (id: number, data: any) =>
     api.patch(`/timesheets/anomalies/${id}/`, convertKeysToSnakeCase(data)),